@@ -7,11 +7,18 @@ from flask import Flask
 
 from .config import get_config
 from .errors import register_error_handlers
+from .json_provider import init_json_provider
 from .routes import register_routes
 from .utils.logging_config import configure_logging
 from .utils.action_logger import init_action_logger
+from .metrics import init_metrics
+from .tracing import init_tracing
+from .n_plus_one import init_n_plus_one_detector
+from .profiler import init_profiler
+from .memory import init_memory_monitor
 from .simplified_real_kerberos_auth import init_simplified_real_kerberos_auth
 from .api import init_api
+from .commands import register_commands
 
 
 def create_app(env_or_config: Optional[str | Dict[str, Any]] = None) -> Flask:
@@ -26,8 +33,16 @@ def create_app(env_or_config: Optional[str | Dict[str, Any]] = None) -> Flask:
         config_cls = get_config(env_or_config)
         app.config.from_object(config_cls)
 
+    init_json_provider(app)
     configure_logging(app)
     register_error_handlers(app)
+    # Трассировка и метрики — до остальных хуков: корневой спан и время запроса
+    # включают аутентификацию и журнал действий
+    init_tracing(app)
+    init_metrics(app)
+    init_n_plus_one_detector(app)
+    init_profiler(app)
+    init_memory_monitor(app)
     init_action_logger(app)
     
     # Initialize Simplified Real Kerberos Authentication (ONLY)
@@ -40,6 +55,7 @@ def create_app(env_or_config: Optional[str | Dict[str, Any]] = None) -> Flask:
     app.logger.info("API and Database initialized")
     
     register_routes(app)
+    register_commands(app)
 
     app.logger.info("Flask application initialized")
     return app
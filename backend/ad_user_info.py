@@ -7,6 +7,8 @@ import re
 import logging
 from typing import Dict, Optional
 
+from .tracing import traced
+
 logger = logging.getLogger(__name__)
 
 
@@ -325,6 +327,7 @@ class ADUserInfo:
         }
 
 
+@traced('auth.ad_enrichment')
 def get_user_info_by_login(login: str) -> dict:
     """
     Функция-обертка для удобного использования класса
@@ -2,13 +2,14 @@
 API endpoints для работы с пользователями, курсами и прогрессом.
 """
 
+import os
 from typing import List, Dict, Any, Optional
-from flask import Blueprint, request, jsonify, g
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from flask import Blueprint, Response, current_app, request, jsonify, g, stream_with_context
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, false, or_
 
 from .models import (
-    User, Course, Lesson,
+    User, Course, CourseStats, Lesson,
     UserCourseProgress, UserLessonProgress,
     Question, Answer, QuestionAttachment, AnswerAttachment
 )
@@ -19,21 +20,79 @@ api_bp = Blueprint('api', __name__, url_prefix='/api')
 # Глобальный менеджер базы данных
 # Используем тот же экземпляр, что и в models.py
 from .models import db_manager
+from .loaders import loader_options
+from .search_index import build_match_query, render_snippet, search_hits, search_index_available
+from .serializers import serialize_user, serialize_users
+from .statistics import course_stats_map, read_statistics
+from .tracing import span
+from .user_suggest import suggest_index
 from .utils.action_logger import record_user_action
+from .utils.pagination import (
+    CursorError, Page, count_total, paginate, parse_page_request, sort_expression
+)
 
 
 def get_db_session() -> Session:
-    """Получить сессию базы данных."""
+    """Получить сессию базы данных: для GET/HEAD — только для чтения, иначе пишущую."""
+    if request.method in ('GET', 'HEAD'):
+        return db_manager.get_read_session()
     return db_manager.get_session()
 
 
+# Допустимые поля сортировки для списков. Каждое поле покрыто индексом
+# (см. models.py), второй ключ сортировки — id.
+USER_SORT_OPTIONS = {
+    'id': User.id,
+    'username': User.username,
+    'full_name': sort_expression(User.full_name),
+    'department': User.department,
+    'created_at': sort_expression(User.created_at),
+}
+
+QUESTION_SORT_OPTIONS = {
+    'created_at': sort_expression(Question.created_at),
+    'id': Question.id,
+}
+
+
+def _page_request(sort_options, default_sort: str, default_desc: bool = False):
+    return parse_page_request(
+        request.args,
+        sort_options,
+        default_sort,
+        default_desc=default_desc,
+        default_limit=current_app.config.get('API_PAGE_SIZE_DEFAULT', 50),
+        max_limit=current_app.config.get('API_PAGE_SIZE_MAX', 500),
+    )
+
+
+def _page_payload(key: str, items: List[Dict[str, Any]], page: Page, page_request) -> Dict[str, Any]:
+    """Собрать ответ списка: без пагинации — прежний формат, с ней — курсор."""
+    payload: Dict[str, Any] = {key: items}
+    if page_request.paginated:
+        payload['next_cursor'] = page.next_cursor
+        payload['has_more'] = page.has_more
+        payload['limit'] = page_request.limit
+        if page.total is not None:
+            payload['total'] = page.total
+    else:
+        payload['total'] = len(items)
+    return payload
+
+
 @api_bp.route('/users', methods=['GET'])
 def get_users():
-    """Получить список всех пользователей."""
+    """Получить список пользователей.
+
+    Поддерживает keyset-пагинацию: ``limit``, ``cursor``, ``sort``
+    (id, username, full_name, department, created_at), ``order`` (asc/desc)
+    и ``include_total`` (true/estimate).
+    """
     session = get_db_session()
     try:
         department = request.args.get('department')
         search = request.args.get('search')
+        page_request = _page_request(USER_SORT_OPTIONS, 'id')
 
         query = session.query(User)
 
@@ -48,17 +107,42 @@ def get_users():
                 )
             )
 
-        users = query.all()
-        result = [user.to_dict() for user in users]
+        total = count_total(query, page_request.include_total, User.id, bool(department or search))
+        page = paginate(query, page_request, USER_SORT_OPTIONS, User.id)
+        page.total = total
+        result = serialize_users(session, page.items)
 
-        return jsonify({'users': result, 'total': len(result)})
+        return jsonify(_page_payload('users', result, page, page_request))
 
+    except CursorError as exc:
+        return jsonify({'error': str(exc)}), 400
     except Exception as exc:
         return jsonify({'error': str(exc)}), 500
     finally:
         session.close()
 
 
+@api_bp.route('/users/suggest', methods=['GET'])
+def suggest_users():
+    """Подсказки пользователей по началу логина, ФИО или отдела.
+
+    Ищет по in-memory индексу воркера (см. user_suggest.py), а не по БД:
+    регистр и «ё»/«е» не различаются, каждое слово запроса — префикс.
+    """
+    try:
+        query = request.args.get('q', '')
+        max_limit = current_app.config.get('USER_SUGGEST_MAX_LIMIT', 20)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), max_limit)
+
+        suggest_index.maybe_refresh(get_db_session, source=db_manager.database_url)
+
+        users = [entry.to_dict() for entry in suggest_index.search(query, limit)]
+        return jsonify({'query': query, 'users': users})
+
+    except Exception as exc:
+        return jsonify({'error': str(exc)}), 500
+
+
 @api_bp.route('/users/<int:user_id>/role', methods=['PUT'])
 def update_user_role(user_id: int):
     """Изменить роль пользователя (доступно только администраторам)."""
@@ -79,7 +163,7 @@ def update_user_role(user_id: int):
 
         old_role = user.role
         if old_role == new_role:
-            return jsonify({'message': 'Роль не изменилась', 'user': user.to_dict()}), 200
+            return jsonify({'message': 'Роль не изменилась', 'user': serialize_user(session, user)}), 200
 
         user.role = new_role
 
@@ -89,7 +173,7 @@ def update_user_role(user_id: int):
             f"изменил роль пользователя {user.username} с {old_role} на {new_role}"
         )
 
-        return jsonify({'message': 'Роль успешно обновлена', 'user': user.to_dict()}), 200
+        return jsonify({'message': 'Роль успешно обновлена', 'user': serialize_user(session, user)}), 200
 
     except Exception as exc:
         session.rollback()
@@ -98,6 +182,32 @@ def update_user_role(user_id: int):
         session.close()
 
 
+def _user_progress_rows(session: Session, user_id: int) -> List[UserCourseProgress]:
+    """Прогресс пользователя по курсам вместе с курсами (одним запросом)."""
+    return (
+        session.query(UserCourseProgress)
+        .options(joinedload(UserCourseProgress.course))
+        .filter(UserCourseProgress.user_id == user_id)
+        .order_by(UserCourseProgress.id)
+        .all()
+    )
+
+
+def _course_progress_entries(session: Session, user: User) -> List[Dict[str, Any]]:
+    """Курсы пользователя вместе с прогрессом; число записавшихся — из course_stats."""
+    progress_rows = _user_progress_rows(session, user.id)
+    stats = course_stats_map(session, [progress.course_id for progress in progress_rows])
+    entries = []
+    for progress in progress_rows:
+        course_stats = stats.get(progress.course_id)
+        course_data = progress.course.to_dict(
+            users_enrolled=course_stats.enrolled_users if course_stats else 0
+        )
+        course_data.update(progress.to_dict())
+        entries.append(course_data)
+    return entries
+
+
 @api_bp.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id: int):
     """Получить информацию о конкретном пользователе."""
@@ -108,17 +218,10 @@ def get_user(user_id: int):
             return jsonify({'error': 'Пользователь не найден'}), 404
         
         # Получаем детальную информацию о прогрессе
-        user_data = user.to_dict()
+        user_data = serialize_user(session, user)
         
         # Добавляем информацию о курсах
-        course_progress = []
-        for progress in user.course_progress:
-            course_data = progress.course.to_dict()
-            progress_data = progress.to_dict()
-            course_data.update(progress_data)
-            course_progress.append(course_data)
-        
-        user_data['course_progress'] = course_progress
+        user_data['course_progress'] = _course_progress_entries(session, user)
         
         return jsonify(user_data)
     
@@ -138,7 +241,7 @@ def get_user_progress(user_id: int):
             return jsonify({'error': 'Пользователь не найден'}), 404
         
         progress_data = []
-        for progress in user.course_progress:
+        for progress in _user_progress_rows(session, user_id):
             course = progress.course
             progress_info = {
                 'course_id': course.id,
@@ -146,7 +249,7 @@ def get_user_progress(user_id: int):
                 'course_description': course.description,
                 'total_lessons': course.total_lessons,
                 'lessons_completed': progress.lessons_completed,
-                'progress_percentage': progress.get_progress_percentage(),
+                'progress_percentage': progress.get_progress_percentage(course.total_lessons),
                 'is_completed': progress.is_completed,
                 'started_at': progress.started_at.isoformat() if progress.started_at else None,
                 'completed_at': progress.completed_at.isoformat() if progress.completed_at else None
@@ -182,9 +285,13 @@ def get_courses():
     session = get_db_session()
     try:
         courses = session.query(Course).filter(Course.is_active == True).all()
+        stats = course_stats_map(session, [course.id for course in courses])
         
         return jsonify({
-            'courses': [course.to_dict() for course in courses],
+            'courses': [
+                course.to_dict(users_enrolled=stats[course.id].enrolled_users if course.id in stats else 0)
+                for course in courses
+            ],
             'total': len(courses)
         })
     
@@ -203,7 +310,8 @@ def get_course(course_id: int):
         if not course:
             return jsonify({'error': 'Курс не найден'}), 404
         
-        course_data = course.to_dict()
+        course_stats = session.get(CourseStats, course_id)
+        course_data = course.to_dict(users_enrolled=course_stats.enrolled_users if course_stats else 0)
         
         # Добавляем информацию об уроках
         lessons = session.query(Lesson).filter(
@@ -220,6 +328,123 @@ def get_course(course_id: int):
         session.close()
 
 
+@api_bp.route('/lessons/<int:lesson_id>/complete', methods=['POST'])
+def complete_lesson(lesson_id: int):
+    """Отметить урок пройденным для текущего пользователя.
+
+    Идемпотентно: повторный вызов возвращает текущий прогресс с
+    ``already_completed: true`` и ничего не меняет.
+    """
+    from .progress import complete_lesson as record_lesson_completion
+
+    session = get_db_session()
+    try:
+        current_user = g.get('user_info', {})
+        username = current_user.get('username')
+        if not username:
+            return jsonify({'error': 'Пользователь не аутентифицирован'}), 401
+
+        user = session.query(User).filter(User.username == username).first()
+        if not user:
+            return jsonify({'error': 'Пользователь не найден в БД'}), 404
+
+        lesson = (
+            session.query(Lesson)
+            .options(joinedload(Lesson.course))
+            .filter(Lesson.id == lesson_id, Lesson.is_active == True)
+            .first()
+        )
+        if not lesson:
+            return jsonify({'error': 'Урок не найден'}), 404
+
+        completion = record_lesson_completion(session, user.id, lesson, lesson.course.total_lessons or 0)
+        payload = completion.to_dict()
+        action = f"прошёл урок «{lesson.title}» курса «{lesson.course.title}»"
+        session.commit()
+
+        if completion.newly_completed:
+            record_user_action(action)
+
+        return jsonify(payload)
+
+    except Exception as exc:
+        session.rollback()
+        return jsonify({'error': str(exc)}), 500
+    finally:
+        session.close()
+
+
+@api_bp.route('/progress/ingest', methods=['POST'])
+def ingest_progress():
+    """Пакетный импорт отметок уроков из потока JSONL (только администраторы).
+
+    Тело читается потоком; поддерживается ``Content-Encoding: gzip``.
+    Параметр ``batch_size`` — размер пачки upsert'ов.
+    """
+    from .ingestion import DEFAULT_BATCH_SIZE, ingest_progress as run_ingestion, open_stream
+    from .n_plus_one import allow_repeated_queries
+
+    current_user = g.get('user_info', {}) or {}
+    if current_user.get('role') != 'admin':
+        return jsonify({'error': 'Недостаточно прав для импорта прогресса'}), 403
+
+    batch_size = request.args.get('batch_size', DEFAULT_BATCH_SIZE, type=int)
+    if not batch_size or batch_size < 1:
+        return jsonify({'error': 'batch_size должен быть положительным числом'}), 400
+
+    session = get_db_session()
+    try:
+        stream = open_stream(request.stream, request.headers.get('Content-Encoding'))
+        # Пачки намеренно выполняют одни и те же выражения
+        with allow_repeated_queries():
+            report = run_ingestion(session, stream, batch_size=batch_size)
+
+        record_user_action(
+            f"импортировал прогресс: {report.completions} отметок уроков, "
+            f"обновлено сводок {report.rollups_updated}"
+        )
+        return jsonify(report.to_dict())
+
+    except Exception as exc:
+        session.rollback()
+        return jsonify({'error': str(exc)}), 500
+    finally:
+        session.close()
+
+
+@api_bp.route('/reports/progress.<fmt>', methods=['GET'])
+def export_progress_report(fmt: str):
+    """Выгрузить прогресс «пользователи × курсы» в CSV или XLSX (только администраторы).
+
+    Фильтры: ``department`` и ``course_id`` (можно повторять). Ответ отдаётся
+    потоком, строки читаются из курсора БД пачками.
+    """
+    from datetime import datetime
+    from .reports import EXPORT_FORMATS, ProgressReportFilter, progress_report_chunks
+
+    current_user = g.get('user_info', {}) or {}
+    if current_user.get('role') != 'admin':
+        return jsonify({'error': 'Недостаточно прав для выгрузки отчёта'}), 403
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Недопустимый формат отчёта'}), 404
+
+    filters = ProgressReportFilter(
+        departments=[d.strip() for d in request.args.getlist('department') if d.strip()],
+        course_ids=request.args.getlist('course_id', type=int),
+    )
+    mimetype, _ = EXPORT_FORMATS[fmt]
+    filename = f"progress_{datetime.now():%Y%m%d_%H%M}.{fmt}"
+
+    record_user_action(f"выгрузил отчёт о прогрессе ({fmt})")
+    # Сессию закрывает генератор, когда отчёт отдан (или клиент отключился)
+    chunks = progress_report_chunks(get_db_session(), filters, fmt)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
 @api_bp.route('/courses/<int:course_id>/users', methods=['GET'])
 def get_course_users(course_id: int):
     """Получить список пользователей, проходящих курс."""
@@ -229,9 +454,15 @@ def get_course_users(course_id: int):
         if not course:
             return jsonify({'error': 'Курс не найден'}), 404
         
-        # Получаем прогресс пользователей по курсу
+        # Получаем прогресс пользователей по курсу (пользователи — тем же запросом)
+        progress_rows = (
+            session.query(UserCourseProgress)
+            .options(joinedload(UserCourseProgress.user))
+            .filter(UserCourseProgress.course_id == course_id)
+            .all()
+        )
         progress_data = []
-        for progress in course.user_progress:
+        for progress in progress_rows:
             user = progress.user
             progress_info = {
                 'user_id': user.id,
@@ -239,7 +470,7 @@ def get_course_users(course_id: int):
                 'full_name': user.full_name,
                 'department': user.department,
                 'lessons_completed': progress.lessons_completed,
-                'progress_percentage': progress.get_progress_percentage(),
+                'progress_percentage': progress.get_progress_percentage(course.total_lessons),
                 'is_completed': progress.is_completed,
                 'started_at': progress.started_at.isoformat() if progress.started_at else None,
                 'completed_at': progress.completed_at.isoformat() if progress.completed_at else None
@@ -248,6 +479,11 @@ def get_course_users(course_id: int):
         
         # Сортируем по проценту выполнения (по убыванию)
         progress_data.sort(key=lambda x: x['progress_percentage'], reverse=True)
+
+        # Итоги — из материализованных счётчиков курса
+        course_stats = session.get(CourseStats, course_id) or CourseStats(
+            course_id=course_id, enrolled_users=0, completed_users=0, lessons_completed_sum=0
+        )
         
         return jsonify({
             'course_id': course_id,
@@ -255,12 +491,9 @@ def get_course_users(course_id: int):
             'total_lessons': course.total_lessons,
             'users': progress_data,
             'summary': {
-                'total_users': len(progress_data),
-                'completed_users': len([p for p in progress_data if p['is_completed']]),
-                'average_progress': round(
-                    sum(p['progress_percentage'] for p in progress_data) / len(progress_data) 
-                    if progress_data else 0, 2
-                )
+                'total_users': course_stats.enrolled_users,
+                'completed_users': course_stats.completed_users,
+                'average_progress': course_stats.average_progress(course.total_lessons)
             }
         })
     
@@ -294,46 +527,7 @@ def get_statistics():
     """Получить общую статистику по системе."""
     session = get_db_session()
     try:
-        # Общая статистика
-        total_users = session.query(User).count()
-        active_users = session.query(User).filter(User.is_active == True).count()
-        total_courses = session.query(Course).filter(Course.is_active == True).count()
-        
-        # Статистика по отделам
-        departments_stats = []
-        departments = session.query(User.department).distinct().all()
-        for dept in departments:
-            if dept[0]:
-                dept_users = session.query(User).filter(User.department == dept[0]).count()
-                departments_stats.append({
-                    'department': dept[0],
-                    'users_count': dept_users
-                })
-        
-        # Статистика по курсам
-        courses_stats = []
-        courses = session.query(Course).filter(Course.is_active == True).all()
-        for course in courses:
-            enrolled_users = len(course.user_progress)
-            completed_users = len([p for p in course.user_progress if p.is_completed])
-            courses_stats.append({
-                'course_id': course.id,
-                'course_title': course.title,
-                'total_lessons': course.total_lessons,
-                'enrolled_users': enrolled_users,
-                'completed_users': completed_users,
-                'completion_rate': round((completed_users / enrolled_users * 100) if enrolled_users > 0 else 0, 2)
-            })
-        
-        return jsonify({
-            'overview': {
-                'total_users': total_users,
-                'active_users': active_users,
-                'total_courses': total_courses
-            },
-            'departments': departments_stats,
-            'courses': courses_stats
-        })
+        return jsonify(read_statistics(session))
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -345,7 +539,15 @@ def get_statistics():
 
 @api_bp.route('/questions', methods=['GET'])
 def list_questions():
-    """Список вопросов. Поддерживает фильтры: author_id, mine(true), search, resolved(true/false)."""
+    """Список вопросов. Поддерживает фильтры: author_id, mine(true), search, resolved(true/false).
+
+    Пагинация — как у /api/users (``limit``, ``cursor``, ``sort``, ``order``,
+    ``include_total``); по умолчанию сортировка по дате создания, новые первыми.
+    ``search`` идёт через FTS5-индекс (вопрос, теги и ответы, поиск по
+    префиксам слов): результаты по умолчанию упорядочены по релевантности
+    (``sort=relevance``) и содержат ``snippet`` — HTML-экранированный фрагмент
+    с подсветкой ``<mark>``.
+    """
     session = get_db_session()
     try:
         from flask import g
@@ -357,7 +559,9 @@ def list_questions():
         search = request.args.get('search', type=str)
         resolved = request.args.get('resolved')
 
-        query = session.query(Question).order_by(Question.created_at.desc())
+        query = session.query(Question).options(*loader_options('question.list'))
+        sort_options, default_sort, default_desc = QUESTION_SORT_OPTIONS, 'created_at', True
+        filtered = bool(author_id or mine or search or resolved in ('true', 'false'))
 
         if author_id:
             query = query.filter(Question.author_id == author_id)
@@ -366,15 +570,42 @@ def list_questions():
             if user:
                 query = query.filter(Question.author_id == user.id)
 
-        if search:
+        with_snippets = False
+        if search and search_index_available(db_manager.engine):
+            # Полнотекстовый поиск: ранжирование bm25, по умолчанию — по релевантности
+            match_query = build_match_query(search)
+            if match_query is None:
+                query = query.filter(false())
+            else:
+                hits = search_hits(match_query)
+                query = query.join(hits, hits.c.question_id == Question.id).add_columns(hits.c.snippet)
+                sort_options = dict(QUESTION_SORT_OPTIONS, relevance=hits.c.rank)
+                default_sort, default_desc = 'relevance', False
+                with_snippets = True
+        elif search:
             like = f"%{search}%"
             query = query.filter(or_(Question.title.ilike(like), Question.body.ilike(like)))
 
         if resolved in ('true', 'false'):
             query = query.filter(Question.is_resolved == (resolved == 'true'))
 
-        questions = query.all()
-        return jsonify({'questions': [q.to_dict(include_relations=False) for q in questions]})
+        page_request = _page_request(sort_options, default_sort, default_desc=default_desc)
+        total = count_total(query, page_request.include_total, Question.id, filtered)
+        page = paginate(query, page_request, sort_options, Question.id)
+        page.total = total
+
+        questions = []
+        for item in page.items:
+            if with_snippets:
+                question, snippet = item
+                data = question.to_dict(include_relations=False)
+                data['snippet'] = render_snippet(snippet)
+            else:
+                data = item.to_dict(include_relations=False)
+            questions.append(data)
+        return jsonify(_page_payload('questions', questions, page, page_request))
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -385,7 +616,12 @@ def list_questions():
 def get_question(qid: int):
     session = get_db_session()
     try:
-        q = session.query(Question).filter(Question.id == qid).first()
+        q = (
+            session.query(Question)
+            .options(*loader_options('question.detail'))
+            .filter(Question.id == qid)
+            .first()
+        )
         if not q:
             return jsonify({'error': 'Вопрос не найден'}), 404
         return jsonify(q.to_dict(include_relations=True))
@@ -437,10 +673,16 @@ def create_question():
 def list_answers(qid: int):
     session = get_db_session()
     try:
-        q = session.query(Question).filter(Question.id == qid).first()
-        if not q:
+        if not session.query(Question.id).filter(Question.id == qid).first():
             return jsonify({'error': 'Вопрос не найден'}), 404
-        return jsonify({'answers': [a.to_dict() for a in q.answers]})
+        answers = (
+            session.query(Answer)
+            .options(*loader_options('answer.list'))
+            .filter(Answer.question_id == qid)
+            .order_by(Answer.id)
+            .all()
+        )
+        return jsonify({'answers': [a.to_dict() for a in answers]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -486,37 +728,60 @@ def create_answer(qid: int):
         session.close()
 
 
+def _save_uploaded_file(file) -> tuple[str, int]:
+    """Сохранить файл из запроса в uploads; (имя на диске, размер в байтах)."""
+    import secrets
+    uploads_dir = os.path.join(api_bp.root_path, 'uploads')
+    os.makedirs(uploads_dir, exist_ok=True)
+    ext = os.path.splitext(file.filename)[1]
+    stored = secrets.token_hex(16) + ext
+    path = os.path.join(uploads_dir, stored)
+    with span('upload.save', **{'file.name': stored, 'file.mime_type': file.mimetype}) as save_span:
+        file.save(path)
+        size = os.path.getsize(path)
+        if save_span is not None:
+            save_span.set_attribute('file.size', size)
+    return stored, size
+
+
+def _discard_uploaded_file(stored: str) -> None:
+    try:
+        os.remove(os.path.join(api_bp.root_path, 'uploads', stored))
+    except OSError:
+        pass
+
+
 @api_bp.route('/questions/<int:qid>/attachments', methods=['POST'])
 def upload_question_attachment(qid: int):
-    """Загрузка файлов к вопросу."""
+    """Загрузка файлов к вопросу.
+
+    Тело multipart разбирается и файл сохраняется до первого запроса к БД:
+    пишущее соединение одно, и держать его на время приёма файла нельзя.
+    """
+    file = request.files.get('file')
+    if not file:
+        return jsonify({'error': 'Файл не передан'}), 400
+    stored, size = _save_uploaded_file(file)
+
     session = get_db_session()
     try:
         q = session.query(Question).filter(Question.id == qid).first()
         if not q:
+            _discard_uploaded_file(stored)
             return jsonify({'error': 'Вопрос не найден'}), 404
-        file = request.files.get('file')
-        if not file:
-            return jsonify({'error': 'Файл не передан'}), 400
-
-        import os, secrets
-        uploads_dir = os.path.join(api_bp.root_path, 'uploads')
-        os.makedirs(uploads_dir, exist_ok=True)
-        ext = os.path.splitext(file.filename)[1]
-        stored = secrets.token_hex(16) + ext
-        path = os.path.join(uploads_dir, stored)
-        file.save(path)
         att = QuestionAttachment(
             question_id=q.id,
             stored_filename=stored,
             original_filename=file.filename,
             mime_type=file.mimetype,
-            size_bytes=os.path.getsize(path),
+            size_bytes=size,
         )
         session.add(att)
         session.commit()
         return jsonify({'attachment': att.to_dict()}), 201
     except Exception as e:
         session.rollback()
+        _discard_uploaded_file(stored)
         return jsonify({'error': str(e)}), 500
     finally:
         session.close()
@@ -524,37 +789,35 @@ def upload_question_attachment(qid: int):
 
 @api_bp.route('/answers/<int:aid>/attachments', methods=['POST'])
 def upload_answer_attachment(aid: int):
+    file = request.files.get('file')
+    if not file:
+        return jsonify({'error': 'Файл не передан'}), 400
+    stored, size = _save_uploaded_file(file)
+
     session = get_db_session()
     try:
         a = session.query(Answer).filter(Answer.id == aid).first()
         if not a:
+            _discard_uploaded_file(stored)
             return jsonify({'error': 'Ответ не найден'}), 404
-        file = request.files.get('file')
-        if not file:
-            return jsonify({'error': 'Файл не передан'}), 400
-
-        import os, secrets
-        uploads_dir = os.path.join(api_bp.root_path, 'uploads')
-        os.makedirs(uploads_dir, exist_ok=True)
-        ext = os.path.splitext(file.filename)[1]
-        stored = secrets.token_hex(16) + ext
-        path = os.path.join(uploads_dir, stored)
-        file.save(path)
         att = AnswerAttachment(
             answer_id=a.id,
             stored_filename=stored,
             original_filename=file.filename,
             mime_type=file.mimetype,
-            size_bytes=os.path.getsize(path),
+            size_bytes=size,
         )
         session.add(att)
         session.commit()
         return jsonify({'attachment': att.to_dict()}), 201
     except Exception as e:
         session.rollback()
+        _discard_uploaded_file(stored)
         return jsonify({'error': str(e)}), 500
     finally:
         session.close()
+
+
 @api_bp.route('/users/register', methods=['POST'])
 def register_user():
     """Ручная регистрация пользователя (для тестирования)"""
@@ -571,7 +834,7 @@ def register_user():
         if existing_user:
             return jsonify({
                 'message': 'User already exists',
-                'user': existing_user.to_dict()
+                'user': serialize_user(session, existing_user)
             }), 200
         
         # Создаем нового пользователя
@@ -587,7 +850,7 @@ def register_user():
         
         return jsonify({
             'message': 'User registered successfully',
-            'user': new_user.to_dict()
+            'user': serialize_user(session, new_user)
         }), 201
     
     except Exception as e:
@@ -614,7 +877,7 @@ def check_user_registration():
         return jsonify({
             'username': username,
             'user_registered': bool(user),
-            'user_data': user.to_dict() if user else None,
+            'user_data': serialize_user(session, user) if user else None,
         })
     
     except Exception as e:
@@ -647,17 +910,10 @@ def get_current_user_info():
             })
         
         # Получаем детальную информацию о пользователе
-        user_data = user.to_dict()
+        user_data = serialize_user(session, user)
         
         # Добавляем информацию о курсах
-        course_progress = []
-        for progress in user.course_progress:
-            course_data = progress.course.to_dict()
-            progress_data = progress.to_dict()
-            course_data.update(progress_data)
-            course_progress.append(course_data)
-        
-        user_data['course_progress'] = course_progress
+        user_data['course_progress'] = _course_progress_entries(session, user)
         user_data['authenticated'] = True
         user_data['in_database'] = True
         
@@ -669,21 +925,176 @@ def get_current_user_info():
         session.close()
 
 
+@api_bp.route('/admin/slow-queries', methods=['GET', 'DELETE'])
+def slow_queries():
+    """Медленные SQL-запросы процесса (только администраторы).
+
+    GET — образцы от новых к старым (``limit``) и сводка по тексту выражения;
+    DELETE — очистить буфер.
+    """
+    current_user = g.get('user_info', {}) or {}
+    if current_user.get('role') != 'admin':
+        return jsonify({'error': 'Недостаточно прав для просмотра медленных запросов'}), 403
+
+    log = db_manager.slow_queries
+    if request.method == 'DELETE':
+        log.clear()
+        return jsonify({'cleared': True})
+
+    limit = request.args.get('limit', 50, type=int)
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit должен быть положительным числом'}), 400
+    return jsonify({
+        'threshold_ms': log.threshold_ms,
+        'explain': log.explain,
+        'samples': [sample.to_dict() for sample in log.samples(limit)],
+        'statements': log.summary(),
+    })
+
+
+def _memory_monitor_or_error():
+    """Монитор памяти этого процесса или ответ с ошибкой.
+
+    Состояние tracemalloc и снимки живут в одном воркере gunicorn, а запросы
+    попадают в разные воркеры. Параметр ``pid`` (в строке запроса или теле
+    JSON) нацеливает запрос на конкретный воркер: чужой воркер отвечает 409
+    со своим ``pid``, и запрос повторяют (keep-alive соединение обычно
+    остаётся на одном воркере).
+    """
+    current_user = g.get('user_info', {}) or {}
+    if current_user.get('role') != 'admin':
+        return None, (jsonify({'error': 'Недостаточно прав для просмотра памяти'}), 403)
+    from .memory import get_memory_monitor
+    target = request.args.get('pid', type=int)
+    if target is None and request.is_json:
+        body_pid = (request.get_json(silent=True) or {}).get('pid')
+        target = body_pid if isinstance(body_pid, int) else None
+    if target is not None and target != os.getpid():
+        return None, (jsonify({
+            'error': f'Запрос обработал воркер {os.getpid()}, а не {target}; повторите запрос',
+            'pid': os.getpid(),
+        }), 409)
+    return get_memory_monitor(), None
+
+
+@api_bp.route('/admin/memory', methods=['GET'])
+def memory_status():
+    """RSS воркера во времени, состояние tracemalloc и подозреваемые в утечке (только администраторы).
+
+    Данные относятся к ответившему воркеру (поле ``pid``).
+    """
+    monitor, denied = _memory_monitor_or_error()
+    if denied:
+        return denied
+    return jsonify(monitor.status())
+
+
+@api_bp.route('/admin/memory/objects', methods=['GET'])
+def memory_objects():
+    """Живые экземпляры моделей SQLAlchemy и сессии ответившего воркера (полный обход gc)."""
+    monitor, denied = _memory_monitor_or_error()
+    if denied:
+        return denied
+    from .memory import orm_object_counts
+    return jsonify(orm_object_counts())
+
+
+@api_bp.route('/admin/memory/tracemalloc', methods=['POST'])
+def memory_tracemalloc():
+    """Включить (``{"action": "start", "frames": N}``) или выключить tracemalloc.
+
+    Действует только на ответивший воркер; его ``pid`` возвращается в ответе
+    и передаётся в следующие шаги (снимки, разница, выключение).
+    """
+    monitor, denied = _memory_monitor_or_error()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action == 'start':
+        frames = data.get('frames', 1)
+        if not isinstance(frames, int) or not 1 <= frames <= 100:
+            return jsonify({'error': 'frames должен быть числом от 1 до 100'}), 400
+        monitor.start_tracemalloc(frames)
+    elif action == 'stop':
+        monitor.stop_tracemalloc()
+    else:
+        return jsonify({'error': 'action должен быть start или stop'}), 400
+    return jsonify({'pid': os.getpid(), **monitor.status()['tracemalloc']})
+
+
+@api_bp.route('/admin/memory/snapshots', methods=['POST'])
+def memory_snapshot():
+    """Снять снимок tracemalloc в воркере ``pid``; 409, если в нём трассировка выключена."""
+    monitor, denied = _memory_monitor_or_error()
+    if denied:
+        return denied
+    try:
+        snapshot = monitor.take_snapshot()
+    except RuntimeError as e:
+        return jsonify({'error': str(e), 'pid': os.getpid()}), 409
+    limit = request.args.get('limit', 10, type=int)
+    snapshot['top'] = monitor.top(snapshot['id'], limit=max(limit or 0, 0))
+    return jsonify({'pid': os.getpid(), **snapshot}), 201
+
+
+@api_bp.route('/admin/memory/diff', methods=['GET'])
+def memory_diff():
+    """Разница двух снимков воркера ``pid`` (``from``, ``to``) по ``group_by``: lineno, filename или traceback."""
+    monitor, denied = _memory_monitor_or_error()
+    if denied:
+        return denied
+    from .memory import GROUP_BY
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in GROUP_BY:
+        return jsonify({'error': f"group_by должен быть одним из: {', '.join(GROUP_BY)}"}), 400
+    old_id = request.args.get('from', type=int)
+    new_id = request.args.get('to', type=int)
+    limit = request.args.get('limit', 30, type=int)
+    if old_id is None or new_id is None:
+        return jsonify({'error': 'Нужны параметры from и to'}), 400
+    try:
+        stats = monitor.diff(old_id, new_id, group_by, max(limit or 0, 0))
+    except KeyError as e:
+        return jsonify({'error': f'Снимок {e.args[0]} не найден', 'pid': os.getpid()}), 404
+    return jsonify({'pid': os.getpid(), 'from': old_id, 'to': new_id, 'group_by': group_by, 'stats': stats})
+
+
 def init_api(app):
     """Инициализировать API для приложения."""
     app.register_blueprint(api_bp)
     
     # Инициализируем базу данных
-    db_manager.create_tables()
-
-    # Очищаем устаревшие/лишние таблицы и записи (mac_users, kerberos_users)
-    try:
-        db_manager.cleanup_legacy_and_kerberos()
-    except Exception:
-        pass
-    
-    # Создаем тестовые данные если нужно
-    if app.config.get('DATABASE_INIT_SAMPLE_DATA', True):
-        db_manager.init_sample_data()
+    from .schema_version import ensure_schema
+    from .sqlite_pragmas import SqlitePragmaProfile, start_wal_checkpointer
+
+    db_manager.configure(
+        app.config.get('DATABASE_URL'),
+        SqlitePragmaProfile.from_config(app.config),
+        writer_pool_size=app.config.get('DATABASE_WRITER_POOL_SIZE'),
+        reader_pool_size=app.config.get('DATABASE_READER_POOL_SIZE'),
+    )
+    db_manager.slow_queries.configure(
+        app.config.get('SLOW_QUERY_THRESHOLD_MS', 0),
+        app.config.get('SLOW_QUERY_LOG_SIZE', 200),
+        explain=app.config.get('SLOW_QUERY_EXPLAIN', True),
+    )
+    suggest_index.configure(
+        app.config.get('USER_SUGGEST_REFRESH_SECONDS', 5.0),
+        app.config.get('USER_SUGGEST_FULL_REBUILD_SECONDS', 600.0),
+    )
+    # Миграции, очистка устаревших таблиц (mac_users) и базовые данные выполняются
+    # один раз: воркер с актуальной отметкой версии делает один SELECT. Перенос
+    # kerberos_users — только flask backfill, воркер о нём предупреждает
+    ensure_schema(
+        db_manager,
+        sample_data=app.config.get('DATABASE_INIT_SAMPLE_DATA', True),
+        auto_migrate=app.config.get('DATABASE_AUTO_MIGRATE', True),
+    )
+    start_wal_checkpointer(
+        db_manager,
+        app.config.get('SQLITE_CHECKPOINT_INTERVAL_SECONDS', 0),
+        app.config.get('SQLITE_WAL_TRUNCATE_BYTES', 64 * 1024 * 1024),
+    )
     
     return api_bp
@@ -0,0 +1,311 @@
+"""
+Пакетные миграции данных (backfill), не блокирующие БД надолго.
+
+Миграция описывается ``Backfill``: исходная таблица, ключ (по умолчанию
+rowid) и функция, обрабатывающая диапазон ключей ``(low, high]`` набором
+SQL-выражений. ``run_backfill`` идёт по таблице диапазонами по
+``batch_size`` строк; каждый пакет — отдельная короткая транзакция, в которой
+обновляется и контрольная точка ``backfill_checkpoints``. Поэтому:
+
+- воркеры продолжают обслуживать запросы — блокировка записи держится
+  только на время пакета, а между пакетами выдерживается пауза;
+- прерванная миграция при следующем запуске продолжается с последнего
+  зафиксированного ключа;
+- ``dry_run`` выполняет пакеты и откатывает их, показывая, сколько строк
+  изменится, без записи контрольных точек.
+
+После последнего пакета выполняется ``finalize`` (например, удаление
+legacy-таблицы и пересчёт счётчиков), и миграция помечается завершённой.
+Запуск вручную: ``flask backfill [NAME] [--dry-run]``.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .models import BackfillCheckpoint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_SLEEP_SECONDS = 0.05
+MAX_RETRIES = 5
+
+
+@dataclass(frozen=True)
+class Backfill:
+    """Описание пакетной миграции данных."""
+
+    name: str
+    description: str
+    table: str
+    # (соединение, low, high) -> число изменённых строк для ключей в (low, high]
+    apply: Callable[[Connection, int, int], int]
+    key: str = 'rowid'
+    finalize: Optional[Callable[[Connection], None]] = None
+
+
+@dataclass
+class BackfillReport:
+    """Ход и итог миграции (с учётом пакетов из прошлых запусков)."""
+
+    name: str
+    dry_run: bool = False
+    batches: int = 0
+    rows_processed: int = 0
+    rows_changed: int = 0
+    rows_remaining: int = 0
+    last_key: int = 0
+    done: bool = False
+    elapsed: float = 0.0
+
+
+def _table_exists(conn: Connection, table: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table}
+    ).first() is not None
+
+
+def _load_checkpoint(conn: Connection, name: str):
+    table = BackfillCheckpoint.__table__
+    return conn.execute(select(table).where(table.c.name == name)).first()
+
+
+def _save_checkpoint(conn: Connection, report: BackfillReport, status: str) -> None:
+    now = datetime.utcnow()
+    values = {
+        'name': report.name,
+        'last_key': report.last_key,
+        'rows_processed': report.rows_processed,
+        'rows_changed': report.rows_changed,
+        'status': status,
+        'updated_at': now,
+        'finished_at': now if status == 'done' else None,
+    }
+    stmt = sqlite_insert(BackfillCheckpoint.__table__).values(started_at=now, **values)
+    conn.execute(stmt.on_conflict_do_update(index_elements=['name'], set_=values))
+
+
+def _next_range(engine: Engine, backfill: Backfill, last_key: int, batch_size: int):
+    """Верхняя граница и число строк следующего пакета (поиск по ключу, без OFFSET)."""
+    with engine.connect() as conn:
+        return conn.execute(text(
+            f"SELECT max(k), count(*) FROM ("
+            f"SELECT {backfill.key} AS k FROM {backfill.table} WHERE {backfill.key} > :last "
+            f"ORDER BY {backfill.key} LIMIT :limit)"
+        ), {'last': last_key, 'limit': batch_size}).one()
+
+
+def _remaining(engine: Engine, backfill: Backfill, last_key: int) -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            text(f"SELECT count(*) FROM {backfill.table} WHERE {backfill.key} > :last"), {'last': last_key}
+        ).scalar()
+
+
+def _with_retries(operation):
+    """Повторить транзакцию, если БД занята дольше busy_timeout (пакет идемпотентен)."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return operation()
+        except OperationalError as exc:
+            if attempt == MAX_RETRIES or 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            delay = 0.1 * 2 ** attempt
+            logger.warning("БД занята, повтор пакета через %.1f с: %s", delay, exc)
+            time.sleep(delay)
+
+
+def run_backfill(
+    engine: Engine,
+    backfill: Backfill,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    sleep_seconds: float = DEFAULT_SLEEP_SECONDS,
+    dry_run: bool = False,
+    restart: bool = False,
+    progress: Optional[Callable[[BackfillReport], None]] = None,
+) -> BackfillReport:
+    """Выполнить (или продолжить) миграцию пакетами; ``progress`` вызывается после каждого пакета."""
+    started = time.monotonic()
+    report = BackfillReport(backfill.name, dry_run=dry_run)
+    with engine.connect() as conn:
+        if not _table_exists(conn, backfill.table):
+            report.done = True
+            return report
+        checkpoint = None if restart else _load_checkpoint(conn, backfill.name)
+    if restart and not dry_run:
+        with engine.begin() as conn:
+            conn.execute(delete(BackfillCheckpoint).where(BackfillCheckpoint.name == backfill.name))
+
+    if checkpoint is not None:
+        report.last_key = checkpoint.last_key
+        report.rows_processed = checkpoint.rows_processed
+        report.rows_changed = checkpoint.rows_changed
+        if checkpoint.status == 'done':
+            report.done = True
+            return report
+    report.rows_remaining = _remaining(engine, backfill, report.last_key)
+
+    while True:
+        high, count = _next_range(engine, backfill, report.last_key, batch_size)
+        if high is None:
+            break
+
+        def apply_batch():
+            with engine.connect() as conn:
+                with conn.begin() as transaction:
+                    changed = backfill.apply(conn, report.last_key, high)
+                    if dry_run:
+                        transaction.rollback()
+                        return changed
+                    batch = BackfillReport(
+                        report.name, last_key=high, rows_processed=report.rows_processed + count,
+                        rows_changed=report.rows_changed + changed,
+                    )
+                    _save_checkpoint(conn, batch, 'running')
+            return changed
+
+        changed = _with_retries(apply_batch)
+        report.batches += 1
+        report.last_key = high
+        report.rows_processed += count
+        report.rows_changed += changed
+        report.rows_remaining = max(report.rows_remaining - count, 0)
+        report.elapsed = time.monotonic() - started
+        if progress:
+            progress(report)
+        if sleep_seconds:
+            time.sleep(sleep_seconds)
+
+    if not dry_run:
+        def finish():
+            with engine.begin() as conn:
+                if backfill.finalize:
+                    backfill.finalize(conn)
+                _save_checkpoint(conn, report, 'done')
+
+        _with_retries(finish)
+    report.done = True
+    report.elapsed = time.monotonic() - started
+    logger.info("Миграция %s%s: пакетов %s, изменено строк %s", backfill.name,
+                " (пробный прогон)" if dry_run else "", report.batches, report.rows_changed)
+    return report
+
+
+def backfill_status(engine: Engine) -> List[Dict[str, object]]:
+    """Состояние зарегистрированных миграций для ``flask backfill`` без аргументов."""
+    statuses = []
+    with engine.connect() as conn:
+        for backfill in BACKFILLS.values():
+            checkpoint = _load_checkpoint(conn, backfill.name)
+            if checkpoint is not None and checkpoint.status == 'done':
+                status, remaining = 'done', 0
+            elif not _table_exists(conn, backfill.table):
+                status, remaining = 'not needed', 0
+            else:
+                last_key = checkpoint.last_key if checkpoint is not None else 0
+                status = 'running' if checkpoint is not None else 'pending'
+                remaining = conn.execute(
+                    text(f"SELECT count(*) FROM {backfill.table} WHERE {backfill.key} > :last"), {'last': last_key}
+                ).scalar()
+            statuses.append({
+                'name': backfill.name,
+                'description': backfill.description,
+                'status': status,
+                'rows_processed': checkpoint.rows_processed if checkpoint is not None else 0,
+                'rows_remaining': remaining,
+            })
+    return statuses
+
+
+# ----------------------- Миграции -----------------------
+
+_KERBEROS_COLUMNS = (
+    'principal', 'realm', 'full_name', 'surname', 'fst_name', 'sec_name',
+    'department', 'position', 'email', 'role', 'is_active', 'last_login',
+)
+
+
+def _merge_kerberos_users_batch(conn: Connection, low: int, high: int) -> int:
+    """Перенести пачку строк kerberos_users в users двумя выражениями вместо запроса на строку.
+
+    Непустые значения legacy-таблицы заменяют значения users, пустые — не
+    затирают их. При повторе имени в пачке берётся последняя строка, как при
+    прежнем построчном переносе.
+    """
+    available = {row[1] for row in conn.execute(text("PRAGMA table_info('kerberos_users')"))}
+    columns = ', '.join(f"{'k.' + name if name in available else 'NULL'} AS {name}" for name in _KERBEROS_COLUMNS)
+    source = f"""
+        SELECT lower(k.username) AS username, {columns}
+        FROM kerberos_users k
+        WHERE k.rowid IN (
+            SELECT max(rowid) FROM kerberos_users
+            WHERE rowid > :low AND rowid <= :high AND coalesce(username, '') != ''
+            GROUP BY lower(username)
+        )
+    """
+    params = {'low': low, 'high': high}
+    # Отделы затронутых пользователей до и после пачки: их счётчики
+    # пересчитываются в той же транзакции, не дожидаясь finalize
+    touched = f"SELECT DISTINCT u.department FROM users u JOIN ({source}) AS s ON u.username = s.username"
+    departments = {row[0] for row in conn.execute(text(touched), params)}
+    conn.execute(text(f"""
+        INSERT INTO users (username, department, role, is_active, created_at, updated_at)
+        SELECT s.username, 'Общий отдел', 'user', 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM ({source}) AS s
+        WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.username = s.username)
+    """), params)
+    keep_existing = ('principal', 'realm', 'full_name', 'surname', 'fst_name', 'sec_name', 'position', 'email',
+                     'last_login')
+    assignments = ',\n'.join(
+        [f"{name} = coalesce(nullif(s.{name}, ''), users.{name})" for name in keep_existing]
+        + [
+            "department = coalesce(nullif(s.department, ''), nullif(users.department, ''), 'Общий отдел')",
+            "role = coalesce(nullif(s.role, ''), nullif(users.role, ''), 'user')",
+            "is_active = coalesce(s.is_active, users.is_active)",
+            "updated_at = CURRENT_TIMESTAMP",
+        ]
+    )
+    changed = conn.execute(text(f"""
+        UPDATE users SET {assignments}
+        FROM ({source}) AS s
+        WHERE users.username = s.username
+    """), params).rowcount
+    departments.update(row[0] for row in conn.execute(text(touched), params))
+    _rebuild_departments(conn, departments)
+    return changed
+
+
+def _rebuild_departments(conn: Connection, departments=None) -> None:
+    from .stats_counters import rebuild_department_counters
+
+    # Пользователи добавлены в обход ORM — счётчики отделов пересчитываются
+    session = Session(bind=conn)
+    try:
+        rebuild_department_counters(session, departments)
+    finally:
+        session.close()
+
+
+def _finish_kerberos_merge(conn: Connection) -> None:
+    _rebuild_departments(conn)
+    conn.execute(text("DROP TABLE IF EXISTS kerberos_users"))
+
+
+MERGE_KERBEROS_USERS = Backfill(
+    name='merge-kerberos-users',
+    description="Перенос legacy-таблицы kerberos_users в users",
+    table='kerberos_users',
+    apply=_merge_kerberos_users_batch,
+    finalize=_finish_kerberos_merge,
+)
+
+BACKFILLS: Dict[str, Backfill] = {backfill.name: backfill for backfill in (MERGE_KERBEROS_USERS,)}
@@ -0,0 +1,197 @@
+"""
+CLI-команды Flask для обслуживания БД.
+
+Запуск: ``flask --app backend.wsgi <команда>`` (или ``FLASK_APP=backend.wsgi``).
+"""
+
+import click
+from flask import Flask
+
+from .models import db_manager
+
+
+def register_commands(app: Flask) -> None:
+    @app.cli.command("db-upgrade")
+    @click.option("--force", is_flag=True, help="Выполнить все шаги независимо от отметки версии")
+    @click.option("--sample-data/--no-sample-data", default=None,
+                  help="Наполнять базовые курсы и уроки (по умолчанию — DATABASE_INIT_SAMPLE_DATA)")
+    def db_upgrade(force, sample_data):
+        """Выполнить миграции схемы и наполнение базовыми данными."""
+        from .schema_version import SCHEMA_VERSION, upgrade_database
+
+        if sample_data is None:
+            sample_data = app.config.get('DATABASE_INIT_SAMPLE_DATA', True)
+        steps = upgrade_database(db_manager, sample_data=sample_data, force=force)
+        if steps:
+            click.echo(f"✅ Выполнено: {', '.join(steps)} (версия схемы {SCHEMA_VERSION})")
+        else:
+            click.echo(f"✅ Схема БД актуальна (версия {SCHEMA_VERSION})")
+
+    @app.cli.command("backfill")
+    @click.argument("name", required=False)
+    @click.option("--batch-size", type=click.IntRange(min=1), default=None, help="Строк исходной таблицы в пакете")
+    @click.option("--sleep", "sleep_seconds", type=float, default=None, help="Пауза между пакетами, с")
+    @click.option("--dry-run", is_flag=True, help="Выполнить пакеты и откатить их")
+    @click.option("--restart", is_flag=True, help="Начать заново, игнорируя контрольную точку")
+    def backfill(name, batch_size, sleep_seconds, dry_run, restart):
+        """Выполнить пакетную миграцию данных NAME (без NAME — показать состояние миграций)."""
+        from .backfill import BACKFILLS, DEFAULT_BATCH_SIZE, DEFAULT_SLEEP_SECONDS, backfill_status, run_backfill
+
+        if name is None:
+            for status in backfill_status(db_manager.engine):
+                click.echo(
+                    f"{status['name']:<24} {status['status']:<10} обработано {status['rows_processed']}, "
+                    f"осталось {status['rows_remaining']} — {status['description']}"
+                )
+            return
+        if name not in BACKFILLS:
+            raise click.BadParameter(f"неизвестная миграция; доступны: {', '.join(BACKFILLS)}", param_hint="NAME")
+
+        def show_progress(report):
+            click.echo(
+                f"   пакет {report.batches}: обработано {report.rows_processed}, изменено {report.rows_changed}, "
+                f"осталось {report.rows_remaining} ({report.elapsed:.1f} с)"
+            )
+
+        report = run_backfill(
+            db_manager.engine, BACKFILLS[name],
+            batch_size=batch_size or DEFAULT_BATCH_SIZE,
+            sleep_seconds=DEFAULT_SLEEP_SECONDS if sleep_seconds is None else sleep_seconds,
+            dry_run=dry_run, restart=restart, progress=show_progress,
+        )
+        mode = " (пробный прогон, изменения откачены)" if dry_run else ""
+        click.echo(f"✅ {name}{mode}: пакетов {report.batches}, обработано {report.rows_processed}, "
+                   f"изменено {report.rows_changed}")
+
+    @app.cli.command("synthetic-data")
+    @click.option("--users", type=click.IntRange(min=1), default=50_000, show_default=True)
+    @click.option("--departments", type=click.IntRange(min=1), default=40, show_default=True)
+    @click.option("--courses", type=click.IntRange(min=1), default=200, show_default=True)
+    @click.option("--lessons-per-course", type=click.IntRange(min=1), default=25, show_default=True)
+    @click.option("--courses-per-user", type=click.IntRange(min=0), default=8, show_default=True)
+    @click.option("--completion", type=click.FloatRange(0, 1), default=0.5, show_default=True,
+                  help="Средняя доля пройденных уроков в начатом курсе")
+    @click.option("--questions", type=click.IntRange(min=0), default=20_000, show_default=True)
+    @click.option("--answers-per-question", type=click.IntRange(min=0), default=3, show_default=True)
+    @click.option("--attachment-ratio", type=click.FloatRange(0, 1), default=0.1, show_default=True)
+    @click.option("--content-bytes", type=click.IntRange(min=0), default=8_000, show_default=True,
+                  help="Размер content урока")
+    @click.option("--seed", type=int, default=42, show_default=True)
+    @click.option("--replace", is_flag=True, help="Удалить существующие пользователей, курсы, прогресс и вопросы")
+    def synthetic_data(users, departments, courses, lessons_per_course, courses_per_user, completion, questions,
+                       answers_per_question, attachment_ratio, content_bytes, seed, replace):
+        """Заполнить БД синтетическими данными для нагрузочного тестирования."""
+        import time
+
+        from .synthetic_data import SyntheticVolumes, generate_dataset
+
+        volumes = SyntheticVolumes(
+            users=users, departments=departments, courses=courses, lessons_per_course=lessons_per_course,
+            courses_per_user=courses_per_user, completion=completion, questions=questions,
+            answers_per_question=answers_per_question, attachment_ratio=attachment_ratio,
+            lesson_content_bytes=content_bytes,
+        )
+        started = time.perf_counter()
+        try:
+            generate_dataset(
+                db_manager, volumes, seed=seed, replace=replace,
+                progress=lambda table, rows, seconds: click.echo(f"   {table}: {rows} ({seconds:.1f} с)"),
+            )
+        except ValueError as e:
+            click.echo(f"❌ {e}. Запустите с --replace, чтобы заменить данные")
+            raise SystemExit(1)
+        click.echo(f"✅ Синтетические данные загружены за {time.perf_counter() - started:.1f} с")
+
+    @app.cli.command("stats-rebuild")
+    def stats_rebuild():
+        """Пересчитать таблицы счётчиков статистики по сырым данным."""
+        from .stats_counters import rebuild_counters
+
+        session = db_manager.get_session()
+        try:
+            rebuild_counters(session)
+            session.commit()
+            click.echo("✅ Счётчики статистики пересобраны")
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    @app.cli.command("stats-check")
+    def stats_check():
+        """Сверить счётчики статистики с сырыми данными."""
+        from .stats_counters import check_counters
+
+        session = db_manager.get_session()
+        try:
+            problems = check_counters(session)
+        finally:
+            session.close()
+
+        if not problems:
+            click.echo("✅ Счётчики статистики согласованы")
+            return
+        for problem in problems:
+            click.echo(f"❌ {problem}")
+        raise SystemExit(1)
+
+    @app.cli.command("search-reindex")
+    @click.option("--batch-size", default=500, show_default=True, help="Вопросов в одной транзакции")
+    def search_reindex(batch_size):
+        """Пересоздать полнотекстовый индекс вопросов и ответов."""
+        from .search_index import rebuild_search_index
+
+        rebuild_search_index(db_manager.engine, batch_size=batch_size)
+        click.echo("✅ Поисковый индекс пересобран")
+
+    @app.cli.command("progress-reconcile")
+    @click.option("--course-id", "course_ids", type=int, multiple=True, help="Только эти курсы (можно повторять)")
+    def progress_reconcile(course_ids):
+        """Пересчитать сводный прогресс по курсам из отметок уроков."""
+        from .progress import reconcile_progress
+
+        session = db_manager.get_session()
+        try:
+            changed = reconcile_progress(session, course_ids or None)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        click.echo(f"✅ Прогресс сверен, исправлено строк: {changed}")
+
+    @app.cli.command("progress-ingest")
+    @click.argument("source", type=click.File("rb"))
+    @click.option("--batch-size", type=click.IntRange(min=1), default=None, help="Размер пачки upsert'ов")
+    @click.option("--gzip", "gzipped", is_flag=True, help="Файл сжат gzip")
+    def progress_ingest(source, batch_size, gzipped):
+        """Импортировать отметки уроков из JSONL-файла (``-`` — stdin)."""
+        from .ingestion import DEFAULT_BATCH_SIZE, ingest_progress, open_stream
+
+        session = db_manager.get_session()
+        try:
+            stream = open_stream(source, 'gzip' if gzipped or source.name.endswith('.gz') else None)
+            report = ingest_progress(session, stream, batch_size=batch_size or DEFAULT_BATCH_SIZE)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        click.echo(
+            f"✅ Импорт завершён: строк {report.lines}, отметок {report.completions}, "
+            f"сводок обновлено {report.rollups_updated}"
+        )
+        skipped = {
+            'глагол не о прохождении': report.skipped_verbs,
+            'неизвестный пользователь': report.unknown_users,
+            'неизвестный урок': report.unknown_lessons,
+            'ошибка разбора': report.invalid,
+        }
+        for reason, amount in skipped.items():
+            if amount:
+                click.echo(f"⚠️ Пропущено ({reason}): {amount}")
+        for error in report.errors:
+            click.echo(f"   {error}")
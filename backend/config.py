@@ -44,12 +44,13 @@ class BaseConfig:
 
     # Logging
     LOG_DIR = os.path.join(PROJECT_ROOT, "backend", "logs")
-    LOG_FILE = os.path.join(LOG_DIR, "app.log")
-    USER_ACTION_LOG = os.path.join(LOG_DIR, "user_actions.log")
+    LOG_FILE = os.environ.get("LOG_FILE", os.path.join(LOG_DIR, "app.log"))
+    USER_ACTION_LOG = os.environ.get("USER_ACTION_LOG", os.path.join(LOG_DIR, "user_actions.log"))
     ACTION_LOG_SKIP_PATHS = (
         "/static",
         "/templates/",
         "/backend/templates/",
+        "/metrics",
     )
     LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
     
@@ -67,15 +68,113 @@ class BaseConfig:
     _db_path = os.path.join(_backend_dir, 'users_courses.db')
     DATABASE_URL = os.environ.get("DATABASE_URL", f"sqlite:///{_db_path}")
     DATABASE_INIT_SAMPLE_DATA = os.environ.get("DATABASE_INIT_SAMPLE_DATA", "true").lower() == "true"
+    # Миграции при старте воркера, если отметка версии схемы устарела
+    # (см. schema_version.py); false — только предупреждение, миграции
+    # запускаются командой flask db-upgrade
+    DATABASE_AUTO_MIGRATE = os.environ.get("DATABASE_AUTO_MIGRATE", "true").lower() == "true"
+
+    # Keyset-пагинация списков (/api/users, /api/questions): включается
+    # параметром limit или cursor; размер страницы ограничен сверху.
+    API_PAGE_SIZE_DEFAULT = int(os.environ.get("API_PAGE_SIZE_DEFAULT", "50"))
+    API_PAGE_SIZE_MAX = int(os.environ.get("API_PAGE_SIZE_MAX", "500"))
+
+    # Ответы JSON (см. json_provider.py): без отступов при JSON_COMPACT=true,
+    # с отступами при false; не задан — отступы только в режиме отладки
+    JSON_COMPACT = (
+        os.environ["JSON_COMPACT"].lower() == "true" if "JSON_COMPACT" in os.environ else None
+    )
+
+    # Подсказки пользователей (/api/users/suggest): in-memory индекс воркера
+    # догружает изменения раз в REFRESH секунд и пересобирается раз в FULL_REBUILD
+    USER_SUGGEST_REFRESH_SECONDS = float(os.environ.get("USER_SUGGEST_REFRESH_SECONDS", "5"))
+    USER_SUGGEST_FULL_REBUILD_SECONDS = float(os.environ.get("USER_SUGGEST_FULL_REBUILD_SECONDS", "600"))
+    USER_SUGGEST_MAX_LIMIT = int(os.environ.get("USER_SUGGEST_MAX_LIMIT", "20"))
+
+    # Профиль SQLite (см. sqlite_pragmas.py): применяется к каждому соединению.
+    # Пустая строка в переменной окружения — не менять PRAGMA.
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")
+    SQLITE_MMAP_SIZE = os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KIB = os.environ.get("SQLITE_CACHE_SIZE_KIB", "20000")
+    SQLITE_TEMP_STORE = os.environ.get("SQLITE_TEMP_STORE", "MEMORY")
+    SQLITE_WAL_AUTOCHECKPOINT = os.environ.get("SQLITE_WAL_AUTOCHECKPOINT", "1000")
+    # Фоновый checkpoint WAL: PASSIVE раз в INTERVAL секунд (0 — выключен),
+    # TRUNCATE, если журнал больше TRUNCATE_BYTES
+    SQLITE_CHECKPOINT_INTERVAL_SECONDS = float(os.environ.get("SQLITE_CHECKPOINT_INTERVAL_SECONDS", "30"))
+    SQLITE_WAL_TRUNCATE_BYTES = int(os.environ.get("SQLITE_WAL_TRUNCATE_BYTES", str(64 * 1024 * 1024)))
+    # Пулы соединений файлового SQLite: GET-запросы читают через отдельный
+    # движок только для чтения (пул — по числу потоков воркера gunicorn),
+    # записи процесса выполняются по одной через пул пишущего движка
+    DATABASE_WRITER_POOL_SIZE = int(os.environ.get("DATABASE_WRITER_POOL_SIZE", "1"))
+    DATABASE_READER_POOL_SIZE = int(os.environ.get("DATABASE_READER_POOL_SIZE", "8"))
+
+    # Метрики Prometheus (/metrics, см. metrics.py): каждый воркер раз в
+    # METRICS_FLUSH_SECONDS пишет снимок в METRICS_DIR, /metrics складывает их
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(LOG_DIR, "metrics"))
+    METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+
+    # Журнал медленных SQL-запросов (см. slow_queries.py): выражения дольше
+    # порога (0 — выключен) попадают в лог и буфер /api/admin/slow-queries
+    # вместе с планом EXPLAIN QUERY PLAN
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "100"))
+    SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", "200"))
+    SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+
+    # Обнаружение N+1 (см. n_plus_one.py): одно выражение больше THRESHOLD раз
+    # за запрос — предупреждение в лог, с N_PLUS_ONE_RAISE — исключение.
+    # Включено в DevelopmentConfig и TestingConfig
+    N_PLUS_ONE_DETECTION = os.environ.get("N_PLUS_ONE_DETECTION", "false").lower() == "true"
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "5"))
+    N_PLUS_ONE_RAISE = os.environ.get("N_PLUS_ONE_RAISE", "false").lower() == "true"
+
+    # Профилирование запроса по требованию администратора (см. profiler.py):
+    # заголовок PROFILER_HEADER или параметр PROFILER_QUERY_PARAM, профили —
+    # в PROFILER_DIR, хранятся последние PROFILER_MAX_PROFILES
+    PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "true").lower() == "true"
+    PROFILER_HEADER = os.environ.get("PROFILER_HEADER", "X-Profile")
+    PROFILER_QUERY_PARAM = os.environ.get("PROFILER_QUERY_PARAM", "_profile")
+    PROFILER_DIR = os.environ.get("PROFILER_DIR", os.path.join(LOG_DIR, "profiles"))
+    PROFILER_MAX_PROFILES = int(os.environ.get("PROFILER_MAX_PROFILES", "50"))
+
+    # Трассировка (см. tracing.py): доля запросов в выборке (0 — выключена),
+    # трассы пишутся в TRACING_FILE в формате OTLP/JSON, по строке на запрос,
+    # файл ротируется как журнал приложения. Входящий traceparent с флагом
+    # sampled трассируется только с TRACING_FOLLOW_TRACEPARENT: заголовок может
+    # прислать любой клиент
+    TRACING_SAMPLE_RATE = float(os.environ.get("TRACING_SAMPLE_RATE", "0"))
+    TRACING_FILE = os.environ.get("TRACING_FILE", os.path.join(LOG_DIR, "traces.jsonl"))
+    TRACING_FOLLOW_TRACEPARENT = os.environ.get("TRACING_FOLLOW_TRACEPARENT", "false").lower() == "true"
+    TRACING_FILE_MAX_BYTES = int(os.environ.get("TRACING_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+    TRACING_FILE_BACKUP_COUNT = int(os.environ.get("TRACING_FILE_BACKUP_COUNT", "3"))
+
+    # Память воркера (см. memory.py): RSS замеряется раз в MEMORY_SAMPLE_SECONDS
+    # (0 — без фонового потока), история — MEMORY_HISTORY_SIZE точек. Воркер
+    # gunicorn с RSS выше MEMORY_RECYCLE_RSS_MB (0 — без потолка) плавно
+    # перезапускается; хранятся последние MEMORY_MAX_SNAPSHOTS снимков tracemalloc
+    MEMORY_SAMPLE_SECONDS = float(os.environ.get("MEMORY_SAMPLE_SECONDS", "60"))
+    MEMORY_HISTORY_SIZE = int(os.environ.get("MEMORY_HISTORY_SIZE", "1440"))
+    MEMORY_RECYCLE_RSS_MB = float(os.environ.get("MEMORY_RECYCLE_RSS_MB", "0"))
+    MEMORY_MAX_SNAPSHOTS = int(os.environ.get("MEMORY_MAX_SNAPSHOTS", "5"))
 
 
 class DevelopmentConfig(BaseConfig):
     DEBUG = True
+    N_PLUS_ONE_DETECTION = True
 
 
 class TestingConfig(BaseConfig):
     TESTING = True
     DEBUG = True
+    SQLITE_CHECKPOINT_INTERVAL_SECONDS = 0
+    # Фикстура db_session держит своё пишущее соединение, пока работают обработчики
+    DATABASE_WRITER_POOL_SIZE = 5
+    N_PLUS_ONE_DETECTION = True
+    # Аутентификация и обработчик вместе читают пользователя по логину до трёх раз
+    N_PLUS_ONE_THRESHOLD = 3
+    N_PLUS_ONE_RAISE = True
+    MEMORY_SAMPLE_SECONDS = 0
 
 
 class ProductionConfig(BaseConfig):
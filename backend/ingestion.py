@@ -0,0 +1,281 @@
+"""
+Пакетный импорт отметок о прохождении уроков (внешняя LMS, офлайн-экзамены).
+
+Вход — поток JSONL: одна запись на строку, в простом виде
+
+    {"user": "ivanov", "lesson": 12, "verb": "completed", "timestamp": "2024-03-01T10:00:00Z"}
+
+или в виде xAPI-подобного statement
+
+    {"actor": {"account": {"name": "ivanov"}}, "verb": {"id": ".../verbs/completed"},
+     "object": {"id": "https://lms.example/lessons/12"}, "timestamp": "..."}
+
+Строка может содержать и JSON-массив statements. Поток читается кусками,
+тело целиком в память не загружается. Пользователи (по логину и email) и
+уроки разрешаются по словарям, загруженным один раз в начале импорта.
+Отметки пишутся upsert'ом в ``user_lesson_progress`` пачками через
+executemany, каждая пачка — отдельная транзакция; сводки
+``user_course_progress`` пересчитываются в конце, по одному разу на
+затронутую пару (пользователь, курс). Импорт идемпотентен: прерванный
+запуск можно просто повторить.
+"""
+
+import gzip
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, IO, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import Lesson, User, UserLessonProgress
+from .progress import recompute_rollups
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+READ_CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 20
+
+# Глаголы xAPI, означающие прохождение урока; остальные пропускаются
+COMPLETION_VERBS = {'completed', 'passed', 'mastered'}
+
+_LESSON_REF_RE = re.compile(r'(\d+)/?$')
+
+
+class IngestionError(ValueError):
+    """Запись не удалось разобрать."""
+
+
+@dataclass
+class IngestionReport:
+    """Итоги импорта."""
+
+    lines: int = 0
+    completions: int = 0
+    skipped_verbs: int = 0
+    unknown_users: int = 0
+    unknown_lessons: int = 0
+    invalid: int = 0
+    rollups_updated: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def error(self, line_no: int, message: str) -> None:
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"строка {line_no}: {message}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'lines': self.lines,
+            'completions': self.completions,
+            'skipped_verbs': self.skipped_verbs,
+            'unknown_users': self.unknown_users,
+            'unknown_lessons': self.unknown_lessons,
+            'invalid': self.invalid,
+            'rollups_updated': self.rollups_updated,
+            'errors': self.errors,
+        }
+
+
+# ----------------------- Разбор потока -----------------------
+
+def iter_lines(stream: IO[bytes], chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """Строки бинарного потока; читает кусками по ``chunk_size`` байт."""
+    tail = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def open_stream(stream: IO[bytes], content_encoding: Optional[str] = None) -> IO[bytes]:
+    """Обернуть поток распаковкой gzip, если он сжат."""
+    if (content_encoding or '').lower() == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+
+def iter_statements(stream: IO[bytes]) -> Iterator[Tuple[int, Any]]:
+    """Пары (номер строки, запись или IngestionError) из потока JSONL."""
+    for line_no, raw in enumerate(iter_lines(stream), start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            yield line_no, IngestionError(f"некорректный JSON: {exc}")
+            continue
+        if isinstance(data, list):
+            for item in data:
+                yield line_no, item
+        else:
+            yield line_no, data
+
+
+def _verb(statement: Dict[str, Any]) -> str:
+    verb = statement.get('verb')
+    if isinstance(verb, dict):
+        verb = verb.get('id') or (verb.get('display') or {}).get('en-US')
+    return str(verb or '').rstrip('/').rsplit('/', 1)[-1].lower()
+
+
+def _actor(statement: Dict[str, Any]) -> Optional[str]:
+    if statement.get('user') is not None:
+        return str(statement['user']).strip().lower()
+    actor = statement.get('actor') or {}
+    account = actor.get('account') or {}
+    if account.get('name'):
+        return str(account['name']).strip().lower()
+    mbox = actor.get('mbox') or ''
+    if mbox:
+        return mbox[len('mailto:'):].strip().lower() if mbox.startswith('mailto:') else mbox.strip().lower()
+    return None
+
+
+def _lesson_id(statement: Dict[str, Any]) -> Optional[int]:
+    ref = statement.get('lesson')
+    if ref is None:
+        ref = (statement.get('object') or {}).get('id')
+    if isinstance(ref, int):
+        return ref
+    match = _LESSON_REF_RE.search(str(ref or ''))
+    return int(match.group(1)) if match else None
+
+
+def _timestamp(statement: Dict[str, Any]) -> datetime:
+    value = statement.get('timestamp')
+    if not value:
+        return datetime.now()
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    # В БД время хранится локальным и без часового пояса
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+# ----------------------- Импорт -----------------------
+
+class ProgressIngestor:
+    """Импорт отметок уроков в одну БД; словари загружаются при создании."""
+
+    def __init__(self, session: Session, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.session = session
+        self.batch_size = batch_size
+        self.users: Dict[str, int] = {}
+        for user_id, username, email in session.execute(select(User.id, User.username, User.email)):
+            self.users[username.lower()] = user_id
+            if email:
+                self.users.setdefault(email.lower(), user_id)
+        self.lessons: Dict[int, int] = dict(session.execute(select(Lesson.id, Lesson.course_id)).all())
+        # Завершаем читающую транзакцию: иначе пишущее соединение оставалось бы
+        # занятым, пока из медленного потока набирается первая пачка. Дальше
+        # соединение берётся только на запись пачки и возвращается после commit
+        session.rollback()
+        self.report = IngestionReport()
+        self.affected: Set[Tuple[int, int]] = set()
+        self._batch: Dict[Tuple[int, int], datetime] = {}
+
+    def ingest(self, stream: IO[bytes]) -> IngestionReport:
+        """Импортировать весь поток и пересчитать затронутые сводки."""
+        last_line = 0
+        for line_no, statement in iter_statements(stream):
+            if line_no != last_line:
+                self.report.lines += line_no - last_line
+                last_line = line_no
+            self.add(line_no, statement)
+        self.finish()
+        return self.report
+
+    def add(self, line_no: int, statement: Any) -> None:
+        report = self.report
+        if isinstance(statement, IngestionError):
+            report.error(line_no, str(statement))
+            return
+        if not isinstance(statement, dict):
+            report.error(line_no, "ожидался объект JSON")
+            return
+        if _verb(statement) not in COMPLETION_VERBS:
+            report.skipped_verbs += 1
+            return
+
+        user_id = self.users.get(_actor(statement) or '')
+        if user_id is None:
+            report.unknown_users += 1
+            return
+        lesson_id = _lesson_id(statement)
+        course_id = self.lessons.get(lesson_id) if lesson_id is not None else None
+        if course_id is None:
+            report.unknown_lessons += 1
+            return
+        try:
+            completed_at = _timestamp(statement)
+        except ValueError:
+            report.error(line_no, f"некорректный timestamp: {statement.get('timestamp')!r}")
+            return
+
+        key = (user_id, lesson_id)
+        # Внутри пачки одна строка на пару (пользователь, урок) — самая ранняя отметка
+        if key not in self._batch or completed_at < self._batch[key]:
+            self._batch[key] = completed_at
+        self.affected.add((user_id, course_id))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Записать накопленную пачку отметок одной транзакцией."""
+        if not self._batch:
+            return
+        now = datetime.now()
+        rows = [
+            {'user_id': user_id, 'lesson_id': lesson_id, 'is_completed': True, 'completed_at': completed_at,
+             'created_at': now, 'updated_at': now}
+            for (user_id, lesson_id), completed_at in self._batch.items()
+        ]
+        self.session.execute(_UPSERT, rows)
+        self.session.commit()
+        self.report.completions += len(rows)
+        self._batch.clear()
+
+    def finish(self) -> None:
+        """Дописать последнюю пачку и пересчитать сводки затронутых пар."""
+        self.flush()
+        if self.affected:
+            self.report.rollups_updated = recompute_rollups(self.session, self.affected)
+            self.session.commit()
+        logger.info("Импорт прогресса: %s", self.report.to_dict())
+
+
+def _upsert_statement():
+    stmt = sqlite_insert(UserLessonProgress)
+    excluded = stmt.excluded
+    # Уже пройденный урок остаётся пройденным с самой ранней датой отметки
+    return stmt.on_conflict_do_update(
+        index_elements=[UserLessonProgress.user_id, UserLessonProgress.lesson_id],
+        set_={
+            'is_completed': True,
+            'completed_at': case(
+                (UserLessonProgress.is_completed == True,  # noqa: E712
+                 func.min(func.coalesce(UserLessonProgress.completed_at, excluded.completed_at),
+                          excluded.completed_at)),
+                else_=excluded.completed_at,
+            ),
+            'updated_at': excluded.updated_at,
+        },
+    )
+
+
+_UPSERT = _upsert_statement()
+
+
+def ingest_progress(session: Session, stream: IO[bytes], batch_size: int = DEFAULT_BATCH_SIZE) -> IngestionReport:
+    """Импортировать поток JSONL отметок уроков (см. описание модуля)."""
+    return ProgressIngestor(session, batch_size=batch_size).ingest(stream)
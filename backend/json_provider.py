@@ -0,0 +1,115 @@
+"""
+JSON-провайдер Flask для ответов API.
+
+Стандартный ``DefaultJSONProvider`` на каждый ``jsonify`` заново создаёт
+``json.JSONEncoder``, сортирует ключи и экранирует кириллицу в ``\\uXXXX``
+(ответ с русским текстом вырастает в несколько раз). Здесь:
+
+- если установлен ``orjson``, кодирует он — сразу в байты, без промежуточной
+  строки; иначе используется один заранее созданный компактный кодировщик
+  stdlib (C-ускоритель, ``ensure_ascii=False``, без сортировки ключей и
+  проверки циклов);
+- ``datetime``/``date``/``time`` кодируются в ISO 8601 (как в ``to_dict``
+  моделей), ``Decimal`` — строкой без потери точности, ``UUID`` — строкой,
+  модели и другие объекты с ``to_dict()`` — его результатом, строки
+  SQLAlchemy (``Row``) — словарём, dataclass — ``asdict``;
+- вывод компактный; отступы включаются ``JSON_COMPACT=false`` или, если он
+  не задан, в режиме отладки (как у Flask).
+"""
+
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+try:  # необязательная зависимость: pip install orjson
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+
+def encode_default(o: Any) -> Any:
+    """Значение для типов, которых нет в JSON; TypeError — тип не поддерживается."""
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    to_dict = getattr(o, 'to_dict', None)
+    if callable(to_dict):
+        return to_dict()
+    as_dict = getattr(o, '_asdict', None)  # sqlalchemy.engine.Row, namedtuple
+    if callable(as_dict):
+        return as_dict()
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON-провайдер на orjson или переиспользуемом кодировщике stdlib."""
+
+    ensure_ascii = False
+    sort_keys = False
+    compact = None
+
+    def __init__(self, app):
+        super().__init__(app)
+        compact = app.config.get('JSON_COMPACT')
+        if compact is not None:
+            self.compact = compact
+        # 'orjson' или 'json'; бенчмарк переключает вручную для сравнения
+        self.backend = 'orjson' if orjson is not None else 'json'
+        self._compact_encoder = json.JSONEncoder(
+            ensure_ascii=False, check_circular=False, separators=(',', ':'), default=encode_default,
+        )
+        self._pretty_encoder = json.JSONEncoder(
+            ensure_ascii=False, check_circular=False, indent=2, default=encode_default,
+        )
+
+    def _pretty(self) -> bool:
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def dumps_bytes(self, obj: Any, pretty: bool = False) -> bytes:
+        """Закодировать в UTF-8; для ответов — без лишней копии строки."""
+        if self.backend == 'orjson':
+            option = orjson.OPT_NON_STR_KEYS
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=encode_default, option=option)
+        encoder = self._pretty_encoder if pretty else self._compact_encoder
+        return encoder.encode(obj).encode('utf-8')
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            # Явные параметры json.dumps (indent, sort_keys, ...) — через stdlib
+            kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+            kwargs.setdefault('default', encode_default)
+            return json.dumps(obj, **kwargs)
+        if self.backend == 'orjson':
+            return self.dumps_bytes(obj).decode('utf-8')
+        return self._compact_encoder.encode(obj)
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self._pretty()
+        return self._app.response_class(self.dumps_bytes(obj, pretty) + b"\n", mimetype=self.mimetype)
+
+
+def init_json_provider(app) -> FastJSONProvider:
+    app.json = FastJSONProvider(app)
+    return app.json
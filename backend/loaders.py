@@ -0,0 +1,59 @@
+"""
+Реестр планов загрузки связей для Q&A-эндпоинтов.
+
+``to_dict`` вопросов и ответов обращается к автору и вложениям; без явного
+плана каждое обращение — отдельный ленивый SELECT (N+1). План задаёт, как
+подгружается граф объектов для конкретного ответа API:
+
+- ``joinedload`` — для связей «многие к одному» (автор): один LEFT JOIN,
+  строк не прибавляет и работает вместе с LIMIT;
+- ``selectinload`` — для коллекций (ответы, вложения): один
+  ``SELECT … WHERE fk IN (…)`` на связь, независимо от числа родителей.
+
+Использование: ``session.query(Question).options(*loader_options('question.detail'))``.
+"""
+
+from typing import Dict, Tuple
+
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from .models import Answer, Question
+
+_PLANS: Dict[str, Tuple[LoaderOption, ...]] = {}
+
+
+def register_plan(name: str, *options: LoaderOption) -> None:
+    """Зарегистрировать (или заменить) план загрузки под именем ``name``."""
+    _PLANS[name] = tuple(options)
+
+
+def loader_options(name: str) -> Tuple[LoaderOption, ...]:
+    """Опции загрузки для ``Query.options``/``Select.options`` по имени плана."""
+    try:
+        return _PLANS[name]
+    except KeyError:
+        raise KeyError(f"Неизвестный план загрузки: {name}") from None
+
+
+# Список вопросов: только автор (include_relations=False)
+register_plan(
+    'question.list',
+    joinedload(Question.author),
+)
+
+# Вопрос целиком: автор, вложения, ответы с их авторами и вложениями
+register_plan(
+    'question.detail',
+    joinedload(Question.author),
+    selectinload(Question.attachments),
+    selectinload(Question.answers).joinedload(Answer.author),
+    selectinload(Question.answers).selectinload(Answer.attachments),
+)
+
+# Ответы на вопрос: автор и вложения каждого ответа
+register_plan(
+    'answer.list',
+    joinedload(Answer.author),
+    selectinload(Answer.attachments),
+)
@@ -0,0 +1,266 @@
+"""
+Память воркера: RSS во времени, tracemalloc и живые объекты ORM.
+
+- Фоновый поток раз в ``MEMORY_SAMPLE_SECONDS`` записывает RSS процесса в
+  кольцевой буфер на ``MEMORY_HISTORY_SIZE`` точек. Если задан
+  ``MEMORY_RECYCLE_RSS_MB`` и воркер работает под gunicorn, при превышении
+  потолка воркер посылает себе SIGTERM: gunicorn дообслуживает текущие
+  запросы и запускает новый воркер.
+- ``tracemalloc`` включается и выключается по запросу администратора;
+  снимки (последние ``MEMORY_MAX_SNAPSHOTS``) сравниваются по строкам или
+  файлам.
+- Подсчёт живых экземпляров моделей SQLAlchemy и сессий с их identity map,
+  размеры кэша ``re`` и число обработчиков логирования — подозреваемые в
+  медленном росте памяти.
+
+Все данные относятся к процессу, ответившему на запрос (поле ``pid``).
+"""
+
+import gc
+import itertools
+import logging
+import os
+import re
+import signal
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import current_app, request
+
+logger = logging.getLogger(__name__)
+
+GROUP_BY = ('lineno', 'filename', 'traceback')
+
+
+def rss_bytes() -> Optional[int]:
+    """Текущий RSS процесса (Linux: /proc/self/statm); None, если недоступен."""
+    try:
+        with open('/proc/self/statm', encoding='ascii') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class MemoryMonitor:
+    """RSS во времени, снимки tracemalloc и перезапуск воркера по потолку памяти."""
+
+    def __init__(self, interval: float = 60.0, history: int = 1440,
+                 ceiling_bytes: int = 0, max_snapshots: int = 5):
+        self.interval = interval
+        self.ceiling_bytes = ceiling_bytes
+        self.max_snapshots = max_snapshots
+        self.history: deque = deque(maxlen=max(history, 1))
+        self.snapshots: "OrderedDict[int, Dict[str, object]]" = OrderedDict()
+        self._snapshot_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.under_gunicorn = False
+        self.recycling = False
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    # ----------------------- RSS -----------------------
+
+    def start(self) -> None:
+        """Поток замеров (запускается при первом запросе воркера)."""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+
+    def _after_fork(self) -> None:
+        """Дочерний процесс (gunicorn --preload) начинает историю и поток заново."""
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.history.clear()
+        self.snapshots.clear()
+        self.recycling = False
+
+    def _run(self) -> None:
+        self.sample()
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Не удалось замерить память воркера")
+
+    def sample(self) -> Optional[int]:
+        rss = rss_bytes()
+        if rss is None:
+            return None
+        with self._lock:
+            self.history.append((time.time(), rss))
+        self._check_ceiling(rss)
+        return rss
+
+    def _check_ceiling(self, rss: int) -> None:
+        if not self.ceiling_bytes or rss <= self.ceiling_bytes or self.recycling:
+            return
+        if not self.under_gunicorn:
+            logger.warning("RSS %.1f МБ выше потолка %.1f МБ; перезапуск возможен только под gunicorn",
+                           rss / 2 ** 20, self.ceiling_bytes / 2 ** 20)
+            return
+        self.recycling = True
+        logger.warning("RSS %.1f МБ выше потолка %.1f МБ: воркер %s перезапускается",
+                       rss / 2 ** 20, self.ceiling_bytes / 2 ** 20, os.getpid())
+        # SIGTERM воркеру gunicorn — плавное завершение, мастер запустит замену
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def status(self) -> Dict[str, object]:
+        with self._lock:
+            history = [
+                {'at': datetime.fromtimestamp(at).isoformat(timespec='seconds'), 'rss_bytes': rss}
+                for at, rss in self.history
+            ]
+        return {
+            'pid': os.getpid(),
+            'rss_bytes': rss_bytes(),
+            'ceiling_bytes': self.ceiling_bytes or None,
+            'under_gunicorn': self.under_gunicorn,
+            'sample_seconds': self.interval,
+            'history': history,
+            'tracemalloc': {
+                'tracing': tracemalloc.is_tracing(),
+                'frames': tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+                'traced_bytes': tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+                'snapshots': [
+                    {'id': snapshot_id, 'at': entry['at'], 'traced_bytes': entry['traced_bytes']}
+                    for snapshot_id, entry in self.snapshots.items()
+                ],
+            },
+            'suspects': suspects(),
+        }
+
+    # ----------------------- tracemalloc -----------------------
+
+    def start_tracemalloc(self, frames: int = 1) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start(max(frames, 1))
+
+    def stop_tracemalloc(self) -> None:
+        tracemalloc.stop()
+        self.snapshots.clear()  # без трассировки снимки несравнимы с новыми
+
+    def take_snapshot(self) -> Dict[str, object]:
+        """Снимок tracemalloc (без кадров самого tracemalloc); RuntimeError, если он выключен."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc не запущен")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        with self._lock:
+            snapshot_id = next(self._snapshot_ids)
+            self.snapshots[snapshot_id] = {
+                'at': datetime.now().isoformat(timespec='seconds'),
+                'traced_bytes': tracemalloc.get_traced_memory()[0],
+                'snapshot': snapshot,
+            }
+            while len(self.snapshots) > self.max_snapshots:
+                self.snapshots.popitem(last=False)
+        return {'id': snapshot_id, **{k: v for k, v in self.snapshots[snapshot_id].items() if k != 'snapshot'}}
+
+    def diff(self, old_id: int, new_id: int, group_by: str = 'lineno', limit: int = 30) -> List[Dict[str, object]]:
+        """Разница снимков по строкам/файлам, от наибольшего роста; KeyError — снимка нет."""
+        old = self.snapshots[old_id]['snapshot']
+        new = self.snapshots[new_id]['snapshot']
+        stats = new.compare_to(old, group_by)
+        return [_stat_dict(stat) for stat in stats[:limit]]
+
+    def top(self, snapshot_id: int, group_by: str = 'lineno', limit: int = 30) -> List[Dict[str, object]]:
+        stats = self.snapshots[snapshot_id]['snapshot'].statistics(group_by)
+        return [_stat_dict(stat) for stat in stats[:limit]]
+
+
+def _stat_dict(stat) -> Dict[str, object]:
+    frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    result = {
+        'location': frames[0] if frames else '?',
+        'size_bytes': stat.size,
+        'count': stat.count,
+    }
+    if hasattr(stat, 'size_diff'):
+        result['size_diff_bytes'] = stat.size_diff
+        result['count_diff'] = stat.count_diff
+    if len(frames) > 1:
+        result['traceback'] = frames
+    return result
+
+
+# ----------------------- Объекты -----------------------
+
+def suspects() -> Dict[str, int]:
+    """Дешёвые показатели известных источников роста: кэш re и обработчики логирования."""
+    loggers = [logging.getLogger()] + [
+        item for item in logging.Logger.manager.loggerDict.values() if isinstance(item, logging.Logger)
+    ]
+    return {
+        're_cache_entries': len(getattr(re, '_cache', ())),
+        'loggers': len(loggers),
+        'logging_handlers': sum(len(item.handlers) for item in loggers),
+        'threads': threading.active_count(),
+    }
+
+
+def orm_object_counts() -> Dict[str, object]:
+    """Живые экземпляры моделей, сессии и записи их identity map (полный обход gc — только по запросу)."""
+    from sqlalchemy.orm import Session
+
+    from .models import Base
+
+    gc.collect()
+    model_classes = {mapper.class_ for mapper in Base.registry.mappers}
+    models: Counter = Counter()
+    sessions = 0
+    identity_entries = 0
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if cls in model_classes:
+            models[cls.__name__] += 1
+        elif isinstance(obj, Session):
+            sessions += 1
+            identity_entries += len(obj.identity_map)
+    return {
+        'pid': os.getpid(),
+        'models': dict(models.most_common()),
+        'sessions': sessions,
+        'identity_map_entries': identity_entries,
+    }
+
+
+# ----------------------- Подключение к приложению -----------------------
+
+def get_memory_monitor() -> Optional[MemoryMonitor]:
+    return current_app.extensions.get('memory')
+
+
+def init_memory_monitor(app) -> MemoryMonitor:
+    monitor = MemoryMonitor(
+        interval=app.config.get('MEMORY_SAMPLE_SECONDS', 60.0),
+        history=app.config.get('MEMORY_HISTORY_SIZE', 1440),
+        ceiling_bytes=int(app.config.get('MEMORY_RECYCLE_RSS_MB', 0) * 2 ** 20),
+        max_snapshots=app.config.get('MEMORY_MAX_SNAPSHOTS', 5),
+    )
+    app.extensions['memory'] = monitor
+
+    @app.before_request
+    def _start_memory_monitor():
+        if monitor._thread is None:
+            monitor.under_gunicorn = request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn')
+            monitor.start()
+
+    return monitor
@@ -0,0 +1,472 @@
+"""
+Метрики запросов в формате Prometheus (``GET /metrics``, только администраторы).
+
+По шаблону маршрута (``/api/users/<int:user_id>``, а не конкретному URL)
+собираются:
+
+- ``http_requests_total`` — запросы по методу, маршруту и коду ответа;
+- ``http_request_duration_seconds`` — гистограмма времени обработки;
+- ``http_requests_in_flight`` — запросы, обрабатываемые прямо сейчас;
+- ``http_response_size_bytes`` — гистограмма размера ответа (потоковые без
+  Content-Length не учитываются);
+- ``http_request_db_queries`` и ``http_request_db_seconds`` — число
+  SQL-выражений и время в БД на запрос (события ``before_cursor_execute`` /
+  ``after_cursor_execute``);
+- ``http_hook_duration_seconds`` — время хуков: ``auth`` (аутентификация в
+  before_request) и ``action_log`` (журнал действий в after_request).
+
+Каждый воркер gunicorn копит метрики в памяти и раз в
+``METRICS_FLUSH_SECONDS`` сбрасывает снимок в ``METRICS_DIR/metrics_<ppid>_<pid>.json``.
+Воркер, завершающийся штатно (в том числе при перезапуске по
+``max_requests`` или потолку памяти), сохраняет снимок при выходе.
+``/metrics`` складывает снимки всех воркеров того же мастера (``ppid``):
+счётчики и гистограммы суммируются, включая завершённые воркеры, а
+in-flight — только по живым. Снимки завершённых воркеров при сборке
+переносятся в общий снимок мастера ``metrics_<ppid>_0.json`` и удаляются,
+поэтому число файлов не растёт с перезапусками воркеров. Снимки прошлых
+запусков сервера (другой ``ppid``) не учитываются и удаляются.
+"""
+
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: gunicorn там не работает, воркер один
+    fcntl = None
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# имя -> (тип, описание, границы гистограммы)
+METRICS = {
+    'http_requests_total': ('counter', "Запросы по методу, маршруту и коду ответа", None),
+    'http_request_duration_seconds': ('histogram', "Время обработки запроса", LATENCY_BUCKETS),
+    'http_requests_in_flight': ('gauge', "Запросы в обработке", None),
+    'http_response_size_bytes': ('histogram', "Размер ответа", SIZE_BUCKETS),
+    'http_request_db_queries': ('histogram', "SQL-выражений на запрос", QUERY_BUCKETS),
+    'http_request_db_seconds': ('histogram', "Время SQL-выражений на запрос", LATENCY_BUCKETS),
+    'http_hook_duration_seconds': ('histogram', "Время хуков before_request/after_request", LATENCY_BUCKETS),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# pid в имени общего снимка завершённых воркеров мастера (настоящий pid не бывает 0)
+AGGREGATE_PID = 0
+
+
+def _labels(values: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in values.items()))
+
+
+class MetricsRegistry:
+    """Метрики одного процесса и сборка снимков всех воркеров."""
+
+    def __init__(self, directory: Optional[str], flush_interval: float = 5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._exit_flush_pid: Optional[int] = None
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.pid = os.getpid()
+            self.counters: Dict[Tuple[str, Labels], float] = {}
+            self.gauges: Dict[Tuple[str, Labels], float] = {}
+            # [счётчики по границам..., сумма, число наблюдений]
+            self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+    # ----------------------- Запись -----------------------
+
+    def inc(self, name: str, labels: Dict[str, object], value: float = 1) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge_add(self, name: str, labels: Dict[str, object], delta: float) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def observe(self, name: str, labels: Dict[str, object], value: float) -> None:
+        buckets = METRICS[name][2]
+        key = (name, _labels(labels))
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    # ----------------------- Снимки воркеров -----------------------
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+            }
+
+    def _path(self, ppid: int, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics_{ppid}_{pid}.json")
+
+    def flush(self) -> None:
+        """Записать снимок процесса (атомарно: через временный файл)."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getppid(), self.pid)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as handle:
+            json.dump(self.snapshot(), handle)
+        os.replace(f"{path}.tmp", path)
+
+    def start(self) -> None:
+        """Фоновый сброс снимков (запускается при первом запросе воркера)."""
+        if self.flush_interval <= 0 or not self.directory or (self._thread and self._thread.is_alive()):
+            return
+        if self._exit_flush_pid != os.getpid():
+            # Снимок последнего интервала не теряется при штатном выходе воркера
+            atexit.register(self._flush_at_exit, os.getpid())
+            self._exit_flush_pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+
+    def _flush_at_exit(self, pid: int) -> None:
+        if pid != os.getpid():
+            return  # обработчик унаследован через fork
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Не удалось сохранить снимок метрик при выходе")
+
+    def after_fork(self) -> None:
+        """В дочернем процессе (gunicorn --preload) метрики и поток начинаются заново."""
+        self.reset()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось сохранить снимок метрик")
+
+    def _snapshots(self) -> Iterable[Tuple[Dict[str, object], bool]]:
+        """Снимки воркеров текущего мастера: (снимок, процесс жив)."""
+        yield self.snapshot(), True
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        ppid = os.getppid()
+        dead: List[Tuple[int, str]] = []
+        for filename in os.listdir(self.directory):
+            if not filename.startswith('metrics_'):
+                continue
+            stem, extension = os.path.splitext(filename[len('metrics_'):])
+            try:
+                if extension == '.lock':
+                    file_ppid, file_pid = int(stem), AGGREGATE_PID
+                elif extension == '.json':
+                    file_ppid, file_pid = (int(part) for part in stem.split('_'))
+                else:
+                    continue
+            except ValueError:
+                continue
+            path = os.path.join(self.directory, filename)
+            if file_ppid != ppid:
+                if not _pid_alive(file_ppid):
+                    _remove_quietly(path)
+                continue
+            if file_pid in (self.pid, AGGREGATE_PID):
+                continue
+            if not _pid_alive(file_pid):
+                dead.append((file_pid, path))
+                continue
+            snapshot = _load_snapshot(path)
+            if snapshot is not None:
+                yield snapshot, True
+
+        if fcntl is None:
+            for _, path in dead:
+                snapshot = _load_snapshot(path)
+                if snapshot is not None:
+                    yield snapshot, False
+            return
+        if dead:
+            self._fold_dead_workers(ppid, dead)
+        aggregate = _load_snapshot(self._path(ppid, AGGREGATE_PID))
+        if aggregate is not None:
+            yield aggregate, False
+
+    def _fold_dead_workers(self, ppid: int, dead: List[Tuple[int, str]]) -> None:
+        """Перенести снимки завершённых воркеров в общий снимок мастера и удалить их.
+
+        Под файловой блокировкой: сборку могут одновременно выполнять несколько
+        воркеров. В общем снимке запоминаются перенесённые pid — если процесс
+        упал между записью суммы и удалением файла, снимок не учтётся дважды.
+        """
+        aggregate_path = self._path(ppid, AGGREGATE_PID)
+        with _file_lock(os.path.join(self.directory, f"metrics_{ppid}.lock")):
+            aggregate = _load_snapshot(aggregate_path) or {}
+            folded = {pid for pid in aggregate.get('folded', []) if os.path.exists(self._path(ppid, pid))}
+            merged = _empty_merged()
+            _merge_snapshot(merged, aggregate, include_gauges=False)
+            moved = []
+            for pid, path in dead:
+                if pid in folded:
+                    moved.append(path)
+                    continue
+                snapshot = _load_snapshot(path)
+                if snapshot is None:
+                    continue  # уже перенесён другим воркером
+                _merge_snapshot(merged, snapshot, include_gauges=False)
+                folded.add(pid)
+                moved.append(path)
+            if not moved:
+                return
+            result = _snapshot_from_merged(merged)
+            result.update(pid=AGGREGATE_PID, folded=sorted(folded))
+            with open(f"{aggregate_path}.tmp", 'w', encoding='utf-8') as handle:
+                json.dump(result, handle)
+            os.replace(f"{aggregate_path}.tmp", aggregate_path)
+            for path in moved:
+                _remove_quietly(path)
+
+    def collect(self) -> Dict[str, Dict[Labels, object]]:
+        """Сумма снимков всех воркеров: {метрика: {метки: значение или ряд гистограммы}}."""
+        merged = _empty_merged()
+        for snapshot, alive in self._snapshots():
+            _merge_snapshot(merged, snapshot, include_gauges=alive)
+        return merged
+
+    def render(self) -> str:
+        """Текст в формате экспозиции Prometheus 0.0.4."""
+        lines = []
+        for name, series in self.collect().items():
+            kind, description, buckets = METRICS[name]
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series.items()):
+                if kind != 'histogram':
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                for bound, count in zip(buckets, value):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _empty_merged() -> Dict[str, Dict[Labels, object]]:
+    return {name: {} for name in METRICS}
+
+
+def _merge_snapshot(merged: Dict[str, Dict[Labels, object]], snapshot: Dict[str, object],
+                    include_gauges: bool) -> None:
+    """Прибавить снимок к сумме; gauge — только для живых процессов."""
+    for name, labels, value in snapshot.get('counters', ()):
+        series = merged[name]
+        key = tuple(tuple(pair) for pair in labels)
+        series[key] = series.get(key, 0) + value
+    if include_gauges:
+        for name, labels, value in snapshot.get('gauges', ()):
+            series = merged[name]
+            key = tuple(tuple(pair) for pair in labels)
+            series[key] = series.get(key, 0) + value
+    for name, labels, values in snapshot.get('histograms', ()):
+        series = merged[name]
+        key = tuple(tuple(pair) for pair in labels)
+        current = series.get(key)
+        series[key] = list(values) if current is None else [a + b for a, b in zip(current, values)]
+
+
+def _snapshot_from_merged(merged: Dict[str, Dict[Labels, object]]) -> Dict[str, object]:
+    """Обратное к ``_merge_snapshot``: сумма счётчиков и гистограмм в формате снимка."""
+    snapshot = {'counters': [], 'gauges': [], 'histograms': []}
+    for name, series in merged.items():
+        kind = METRICS[name][0]
+        if kind == 'gauge':
+            continue
+        target = snapshot['histograms' if kind == 'histogram' else 'counters']
+        for labels, value in series.items():
+            target.append([name, [list(pair) for pair in labels], value])
+    return snapshot
+
+
+def _load_snapshot(path: str) -> Optional[Dict[str, object]]:
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None  # файла нет или он как раз перезаписывается
+
+
+@contextmanager
+def _file_lock(path: str):
+    with open(path, 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        f'{key}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # os.kill на Windows завершает процесс; gunicorn там не работает — воркер один
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def get_registry() -> Optional[MetricsRegistry]:
+    return current_app.extensions.get('metrics')
+
+
+def timed_hook(name: str):
+    """Декоратор хука before_request/after_request: время попадает в ``http_hook_duration_seconds``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry = get_registry()
+                if registry is not None:
+                    registry.observe('http_hook_duration_seconds', {'hook': name}, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+# ----------------------- SQL-выражения -----------------------
+
+_engine_listeners_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_metrics' in g:
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started or not has_request_context() or '_metrics' not in g:
+        return
+    state = g._metrics
+    state['queries'] += 1
+    state['db_seconds'] += time.perf_counter() - started.pop()
+
+
+def _install_engine_listeners() -> None:
+    """Слушатели на классе Engine: переживают ``db_manager.configure`` и учитывают оба движка."""
+    global _engine_listeners_installed
+    if _engine_listeners_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _engine_listeners_installed = True
+
+
+# ----------------------- Подключение к приложению -----------------------
+
+def init_metrics(app) -> Optional[MetricsRegistry]:
+    """Подключить сбор метрик; вызывается до остальных хуков, чтобы время включало их."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return None
+    registry = MetricsRegistry(app.config.get('METRICS_DIR'), app.config.get('METRICS_FLUSH_SECONDS', 5.0))
+    app.extensions['metrics'] = registry
+    os.register_at_fork(after_in_child=registry.after_fork)
+    _install_engine_listeners()
+
+    @app.before_request
+    def _start_request_metrics():
+        registry.start()
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        g._metrics = {'started': time.perf_counter(), 'route': route, 'queries': 0, 'db_seconds': 0.0}
+        registry.gauge_add('http_requests_in_flight', {'method': request.method, 'route': route}, 1)
+
+    @app.after_request
+    def _record_request_metrics(response):
+        state = g.pop('_metrics', None)
+        if state is None:
+            return response
+        labels = {'method': request.method, 'route': state['route']}
+        registry.gauge_add('http_requests_in_flight', labels, -1)
+        registry.inc('http_requests_total', {**labels, 'status': response.status_code})
+        registry.observe('http_request_duration_seconds', labels, time.perf_counter() - state['started'])
+        size = response.content_length
+        if size is None and not response.is_streamed:
+            size = response.calculate_content_length()
+        if size is not None:
+            registry.observe('http_response_size_bytes', labels, size)
+        registry.observe('http_request_db_queries', labels, state['queries'])
+        registry.observe('http_request_db_seconds', labels, state['db_seconds'])
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        # after_request не вызывался (исключение в самом хуке) — не оставляем «вечный» in-flight
+        state = g.pop('_metrics', None)
+        if state is not None:
+            registry.gauge_add('http_requests_in_flight', {'method': request.method, 'route': state['route']}, -1)
+
+    return registry
@@ -4,8 +4,8 @@
 
 from datetime import datetime
 import os
-from typing import List, Optional
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Boolean, Text, UniqueConstraint
+from typing import List, Optional, Tuple
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Boolean, Text, UniqueConstraint, Index
 from sqlalchemy import text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
@@ -26,14 +26,14 @@ class User(Base):
     sec_name = Column(String(100), nullable=True)  # Отчество
     principal = Column(String(200), unique=True, nullable=True, index=True)
     realm = Column(String(100), nullable=True, index=True)
-    department = Column(String(100), nullable=False)
+    department = Column(String(100), nullable=False, index=True)
     position = Column(String(100), nullable=True)  # Должность
     email = Column(String(200), unique=True, nullable=True)
     role = Column(String(20), nullable=False, default='user')
     is_active = Column(Boolean, default=True)
     last_login = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)
     
     # Связи
     course_progress = relationship("UserCourseProgress", back_populates="user", cascade="all, delete-orphan")
@@ -44,8 +44,21 @@ class User(Base):
     def __repr__(self):
         return f"<User(username='{self.username}', full_name='{self.full_name}', department='{self.department}')>"
     
-    def to_dict(self):
-        """Преобразование в словарь для JSON."""
+    def to_dict(self, progress_counters: Optional[Tuple[int, int, int]] = None):
+        """Преобразование в словарь для JSON.
+
+        ``progress_counters`` — заранее посчитанные (курсов начато, курсов
+        завершено, уроков пройдено). Для списков их считает
+        ``serializers.serialize_users`` одним запросом; без них счётчики
+        вычисляются по ленивой связи ``course_progress``.
+        """
+        if progress_counters is None:
+            progress_counters = (
+                len(self.course_progress),
+                len([cp for cp in self.course_progress if cp.is_completed]),
+                sum(cp.lessons_completed or 0 for cp in self.course_progress),
+            )
+        courses_enrolled, courses_completed, total_lessons_completed = progress_counters
         return {
             'id': self.id,
             'username': self.username,
@@ -63,8 +76,9 @@ class User(Base):
             'last_login': self.last_login.isoformat() if self.last_login else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'courses_completed': len([cp for cp in self.course_progress if cp.is_completed]),
-            'total_lessons_completed': sum(cp.lessons_completed for cp in self.course_progress)
+            'courses_enrolled': courses_enrolled,
+            'courses_completed': courses_completed,
+            'total_lessons_completed': total_lessons_completed
         }
     
     def _get_full_name_from_parts(self) -> str:
@@ -98,8 +112,14 @@ class Course(Base):
     def __repr__(self):
         return f"<Course(title='{self.title}', total_lessons={self.total_lessons})>"
     
-    def to_dict(self):
-        """Преобразование в словарь для JSON."""
+    def to_dict(self, users_enrolled: Optional[int] = None):
+        """Преобразование в словарь для JSON.
+
+        ``users_enrolled`` можно передать из таблицы счётчиков course_stats,
+        чтобы не загружать весь прогресс курса ради одного числа.
+        """
+        if users_enrolled is None:
+            users_enrolled = len(self.user_progress)
         return {
             'id': self.id,
             'title': self.title,
@@ -108,7 +128,7 @@ class Course(Base):
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'users_enrolled': len(self.user_progress)
+            'users_enrolled': users_enrolled
         }
 
 
@@ -125,6 +145,11 @@ class Lesson(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    # Уроки курса по порядку: WHERE course_id = ? AND is_active ORDER BY lesson_number
+    __table_args__ = (
+        Index('ix_lessons_course_active_number', 'course_id', 'is_active', 'lesson_number'),
+    )
     
     # Связи
     course = relationship("Course", back_populates="lessons")
@@ -160,6 +185,13 @@ class UserCourseProgress(Base):
     started_at = Column(DateTime, default=func.now())
     completed_at = Column(DateTime, nullable=True)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    # Одна сводка на пару (пользователь, курс); уникальный индекс обслуживает и
+    # выборки по пользователю, отдельный индекс — выборки по курсу
+    __table_args__ = (
+        Index('uq_user_course_progress_user_course', 'user_id', 'course_id', unique=True),
+        Index('ix_user_course_progress_course_id', 'course_id'),
+    )
     
     # Связи
     user = relationship("User", back_populates="course_progress")
@@ -182,11 +214,17 @@ class UserCourseProgress(Base):
             'progress_percentage': self.get_progress_percentage()
         }
     
-    def get_progress_percentage(self):
-        """Получить процент выполнения курса."""
-        if not self.course or self.course.total_lessons == 0:
+    def get_progress_percentage(self, total_lessons: Optional[int] = None):
+        """Получить процент выполнения курса.
+
+        ``total_lessons`` можно передать, если курс уже известен вызывающему, —
+        тогда связь ``course`` не подгружается.
+        """
+        if total_lessons is None:
+            total_lessons = self.course.total_lessons if self.course else 0
+        if not total_lessons:
             return 0
-        return round((self.lessons_completed / self.course.total_lessons) * 100, 2)
+        return round(((self.lessons_completed or 0) / total_lessons) * 100, 2)
 
 
 class UserLessonProgress(Base):
@@ -201,6 +239,12 @@ class UserLessonProgress(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
+    # Одна запись на пару (пользователь, урок): на этом держится идемпотентный
+    # upsert отметки о прохождении (см. progress.py)
+    __table_args__ = (
+        Index('uq_user_lesson_progress_user_lesson', 'user_id', 'lesson_id', unique=True),
+    )
+
     # Связи
     user = relationship("User")
     lesson = relationship("Lesson", back_populates="user_progress")
@@ -341,18 +385,176 @@ class AnswerAttachment(Base):
             'url': f"/uploads/{self.stored_filename}",
         }
 
+class DepartmentStats(Base):
+    """Материализованные счётчики пользователей по отделу.
+
+    Поддерживаются в той же транзакции, что и изменения users
+    (см. stats_counters.py); пересобираются командой ``flask stats-rebuild``.
+    """
+    __tablename__ = 'department_stats'
+
+    department = Column(String(100), primary_key=True)
+    users_count = Column(Integer, nullable=False, default=0)
+    active_users = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DepartmentStats(department='{self.department}', users_count={self.users_count})>"
+
+
+class CourseStats(Base):
+    """Материализованные счётчики прогресса по курсу.
+
+    Хранится сумма пройденных уроков, а не средний процент: среднее
+    вычисляется при чтении и остаётся верным при изменении total_lessons.
+    """
+    __tablename__ = 'course_stats'
+
+    course_id = Column(Integer, ForeignKey('courses.id'), primary_key=True)
+    enrolled_users = Column(Integer, nullable=False, default=0)
+    completed_users = Column(Integer, nullable=False, default=0)
+    lessons_completed_sum = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CourseStats(course_id={self.course_id}, enrolled_users={self.enrolled_users})>"
+
+    def average_progress(self, total_lessons: Optional[int]) -> float:
+        """Средний процент прохождения курса среди записавшихся."""
+        if not total_lessons or not self.enrolled_users:
+            return 0
+        return round(self.lessons_completed_sum / (self.enrolled_users * total_lessons) * 100, 2)
+
+
+class SchemaMeta(Base):
+    """Отметки версий схемы и базовых данных (см. schema_version.py).
+
+    Воркер при старте читает их одним запросом и запускает миграции, только
+    если отметка отстаёт от версии кода.
+    """
+    __tablename__ = 'schema_meta'
+
+    key = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SchemaMeta(key='{self.key}', version={self.version})>"
+
+
+class BackfillCheckpoint(Base):
+    """Состояние пакетной миграции данных (см. backfill.py).
+
+    ``last_key`` — последний обработанный ключ исходной таблицы; обновляется
+    в той же транзакции, что и пакет, поэтому прерванная миграция
+    продолжается с места остановки.
+    """
+    __tablename__ = 'backfill_checkpoints'
+
+    name = Column(String(100), primary_key=True)
+    last_key = Column(Integer, nullable=False, default=0)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    rows_changed = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False, default='running')  # running, done
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<BackfillCheckpoint(name='{self.name}', last_key={self.last_key}, status='{self.status}')>"
+
+
+# Индексы под keyset-пагинацию списков (/api/users, /api/questions).
+# Выражения должны совпадать с utils.pagination.sort_expression, иначе SQLite
+# не сможет использовать индекс для ORDER BY и условия курсора.
+Index('ix_users_sort_full_name', func.coalesce(User.full_name, text("''")))
+Index('ix_users_sort_created_at', func.coalesce(User.created_at, text("''")))
+Index('ix_questions_sort_created_at', func.coalesce(Question.created_at, text("''")))
+# Фильтр resolved=true/false с сортировкой по дате создания
+Index('ix_questions_resolved_sort_created_at', Question.is_resolved, func.coalesce(Question.created_at, text("''")))
+
+
 class DatabaseManager:
     """Менеджер базы данных."""
     
-    def __init__(self, database_url: str | None = None):
+    def __init__(self, database_url: str | None = None, pragmas=None,
+                 writer_pool_size: int | None = None, reader_pool_size: int | None = None):
         # По умолчанию размещаем БД в папке backend/users_courses.db (абсолютный путь)
         if not database_url:
             backend_dir = os.path.dirname(__file__)
             db_path = os.path.abspath(os.path.join(backend_dir, 'users_courses.db'))
             database_url = f"sqlite:///{db_path}"
-        self.engine = create_engine(database_url, echo=False)
+        self.database_url = database_url
+        self.pragmas = pragmas
+        self.writer_pool_size = writer_pool_size
+        self.reader_pool_size = reader_pool_size
+        from .slow_queries import SlowQueryLog
+        self.slow_queries = SlowQueryLog(self)
+        self.engine, self.read_engine = self._create_engines()
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        
+        self.ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.read_engine)
+
+        from .stats_counters import install_counter_events
+        install_counter_events(self.SessionLocal)
+
+    def _create_engines(self):
+        """Движки записи и чтения для database_url; к соединениям SQLite применяется профиль PRAGMA.
+
+        Для файлового SQLite читающий движок открывает тот же файл в режиме
+        ``mode=ro`` с ``PRAGMA query_only``: такие соединения не берут
+        блокировку записи, а в WAL не ждут пишущего. Пул пишущего движка
+        ограничивается ``writer_pool_size`` без переполнения — записи процесса
+        встают в очередь пула, а не соревнуются за блокировку SQLite. Для БД
+        в памяти и других СУБД оба движка совпадают. На оба движка ставится
+        замер медленных запросов ``slow_queries`` (см. slow_queries.py).
+        """
+        from .sqlite_pragmas import SqlitePragmaProfile, install_pragmas, read_only_url
+
+        profile = self.pragmas or SqlitePragmaProfile()
+        read_url = read_only_url(self.database_url)
+        if read_url is None:
+            engine = create_engine(self.database_url, echo=False)
+            install_pragmas(engine, profile)
+            self.slow_queries.install(engine)
+            return engine, engine
+
+        writer_options = {}
+        if self.writer_pool_size:
+            writer_options = {'pool_size': self.writer_pool_size, 'max_overflow': 0}
+        engine = create_engine(self.database_url, echo=False, **writer_options)
+        install_pragmas(engine, profile)
+
+        reader_options = {}
+        if self.reader_pool_size:
+            reader_options = {'pool_size': self.reader_pool_size}
+        read_engine = create_engine(read_url, echo=False, **reader_options)
+        install_pragmas(read_engine, profile.for_reader())
+        self.slow_queries.install(engine)
+        self.slow_queries.install(read_engine)
+        return engine, read_engine
+
+    def configure(self, database_url: str | None, pragmas=None,
+                  writer_pool_size: int | None = None, reader_pool_size: int | None = None) -> None:
+        """Переключить менеджер на другую БД (DATABASE_URL из конфигурации приложения).
+
+        Глобальный экземпляр импортируется многими модулями, поэтому движки
+        подменяются на месте, а не созданием нового менеджера. ``pragmas`` —
+        профиль SQLite (см. sqlite_pragmas.py); None — профиль по умолчанию.
+        """
+        database_url = database_url or self.database_url
+        settings = (database_url, pragmas, writer_pool_size, reader_pool_size)
+        if settings == (self.database_url, self.pragmas, self.writer_pool_size, self.reader_pool_size):
+            return
+        self.dispose()
+        self.database_url, self.pragmas, self.writer_pool_size, self.reader_pool_size = settings
+        self.engine, self.read_engine = self._create_engines()
+        self.SessionLocal.configure(bind=self.engine)
+        self.ReadSessionLocal.configure(bind=self.read_engine)
+
+    def dispose(self) -> None:
+        """Закрыть соединения обоих пулов."""
+        self.engine.dispose()
+        if self.read_engine is not self.engine:
+            self.read_engine.dispose()
+
     def _ensure_qa_schema(self):
         """Проверить и починить схему Q&A таблиц для SQLite.
         Если не хватает обязательных колонок, безопасно пересоздать таблицы.
@@ -379,12 +581,110 @@ class DatabaseManager:
                     except Exception:
                         pass
 
-    def create_tables(self):
-        """Создать все таблицы, предварительно проверив схему Q&A."""
+    def create_tables(self, run_backfills: bool = True):
+        """Создать все таблицы, предварительно проверив схему Q&A.
+
+        ``run_backfills=False`` — не выполнять пакетные миграции данных (их
+        выполняет ``flask backfill``); так поступает старт воркера.
+        """
         self._ensure_qa_schema()
         self._ensure_user_columns()
         Base.metadata.create_all(bind=self.engine)
-        self._merge_kerberos_users()
+        self._dedupe_lesson_progress()
+        self._dedupe_course_progress()
+        self._ensure_indexes()
+        if run_backfills:
+            self._merge_kerberos_users()
+        self._ensure_stats_counters()
+        self._ensure_search_index()
+
+    def _ensure_search_index(self):
+        """Создать FTS5-индекс вопросов и ответов и догрузить в него существующие строки."""
+        from .search_index import ensure_search_index
+
+        ensure_search_index(self.engine)
+
+    def _ensure_stats_counters(self):
+        """Заполнить таблицы счётчиков статистики, если они только что созданы."""
+        from .stats_counters import counters_are_empty, rebuild_counters
+
+        session = self.get_session()
+        try:
+            if counters_are_empty(session):
+                rebuild_counters(session)
+                session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _dedupe_lesson_progress(self):
+        """Удалить дубли user_lesson_progress перед созданием уникального индекса.
+
+        Из дублей остаётся пройденная запись (самая ранняя), иначе — самая ранняя.
+        """
+        with self.engine.begin() as conn:
+            has_unique = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type='index' AND name='uq_user_lesson_progress_user_lesson'"
+            )).first()
+            if has_unique:
+                return
+            conn.execute(text("""
+                DELETE FROM user_lesson_progress WHERE id NOT IN (
+                    SELECT coalesce(min(CASE WHEN is_completed THEN id END), min(id))
+                    FROM user_lesson_progress
+                    GROUP BY user_id, lesson_id
+                )
+            """))
+
+    def _dedupe_course_progress(self):
+        """Удалить дубли user_course_progress перед созданием уникального индекса.
+
+        Из дублей остаётся запись с наибольшим прогрессом; счётчики
+        статистики после удаления пересчитываются.
+        """
+        with self.engine.begin() as conn:
+            has_unique = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type='index' AND name='uq_user_course_progress_user_course'"
+            )).first()
+            if has_unique:
+                return
+            removed = conn.execute(text("""
+                DELETE FROM user_course_progress WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, row_number() OVER (
+                            PARTITION BY user_id, course_id
+                            ORDER BY coalesce(is_completed, 0) DESC, coalesce(lessons_completed, 0) DESC, id
+                        ) AS duplicate_rank
+                        FROM user_course_progress
+                    ) WHERE duplicate_rank > 1
+                )
+            """)).rowcount
+        if removed:
+            from .stats_counters import rebuild_counters
+
+            session = self.get_session()
+            try:
+                rebuild_counters(session)
+                session.commit()
+            finally:
+                session.close()
+
+    def _ensure_indexes(self):
+        """Создать индексы, добавленные в модели после создания таблиц.
+
+        create_all не трогает существующие таблицы, поэтому новые индексы
+        на уже развёрнутой БД досоздаются отдельно.
+        """
+        with self.engine.begin() as conn:
+            existing = {
+                row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type='index'"))
+            }
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    if index.name not in existing:
+                        index.create(bind=conn)
 
     def cleanup_legacy_and_kerberos(self):
         """Удалить устаревшие таблицы (например, mac_users)."""
@@ -396,9 +696,13 @@ class DatabaseManager:
                 pass
     
     def get_session(self):
-        """Получить сессию базы данных."""
+        """Получить сессию базы данных (пишущий движок)."""
         return self.SessionLocal()
 
+    def get_read_session(self):
+        """Получить сессию только для чтения: запись в ней завершится ошибкой SQLite."""
+        return self.ReadSessionLocal()
+
     def _ensure_user_columns(self):
         """Добавить недостающие колонки в таблицу users."""
         with self.engine.begin() as conn:
@@ -422,58 +726,21 @@ class DatabaseManager:
                 pass
 
     def _merge_kerberos_users(self):
-        """Перенести данные из legacy-таблицы kerberos_users в users и удалить её."""
-        with self.engine.begin() as conn:
-            legacy_exists = conn.execute(
-                text("SELECT name FROM sqlite_master WHERE type='table' AND name='kerberos_users'")
-            ).fetchone()
-        if not legacy_exists:
-            return
-
-        session = self.get_session()
-        try:
-            rows = session.execute(text("""
-                SELECT username, principal, realm, full_name, surname, fst_name, sec_name,
-                       department, position, email, role, is_active, last_login
-                FROM kerberos_users
-            """)).mappings().all()
-
-            for row in rows:
-                username = (row.get('username') or '').lower()
-                if not username:
-                    continue
-                user = session.query(User).filter(User.username == username).first()
-                if not user:
-                    user = User(username=username)
-                    session.add(user)
-
-                # Обновляем данными из legacy-таблицы, не затирая актуальные значения
-                user.principal = row.get('principal') or user.principal
-                user.realm = row.get('realm') or user.realm
-                user.full_name = row.get('full_name') or user.full_name
-                user.surname = row.get('surname') or user.surname
-                user.fst_name = row.get('fst_name') or user.fst_name
-                user.sec_name = row.get('sec_name') or user.sec_name
-                user.department = row.get('department') or user.department or 'Общий отдел'
-                user.position = row.get('position') or user.position
-                user.email = row.get('email') or user.email
-                user.role = row.get('role') or user.role or 'user'
-                if row.get('is_active') is not None:
-                    user.is_active = row.get('is_active')
-                user.last_login = row.get('last_login') or user.last_login
+        """Перенести данные из legacy-таблицы kerberos_users в users и удалить её.
 
-            session.commit()
-        except Exception:
-            session.rollback()
-            raise
-        finally:
-            session.close()
+        Перенос идёт пакетами с контрольной точкой (см. backfill.py). При
+        старте воркера не выполняется: его запускает
+        ``flask backfill merge-kerberos-users``, пока воркеры работают.
+        """
+        from .backfill import MERGE_KERBEROS_USERS, run_backfill
 
-        with self.engine.begin() as conn:
-            conn.execute(text("DROP TABLE IF EXISTS kerberos_users"))
+        run_backfill(self.engine, MERGE_KERBEROS_USERS)
     
-    def init_sample_data(self):
-        """Инициализировать базовые учебные данные без создания тестовых пользователей."""
+    def init_sample_data(self) -> bool:
+        """Инициализировать базовые учебные данные без создания тестовых пользователей.
+
+        Возвращает False, если данные не удалось записать.
+        """
         session = self.get_session()
         
         try:
@@ -560,10 +827,12 @@ class DatabaseManager:
                         session.add(Lesson(course_id=c.id, title=title, lesson_number=num))
             session.commit()
             print("✅ Базовые учебные данные обновлены (курсы и уроки).")
+            return True
             
         except Exception as e:
             session.rollback()
             print(f"❌ Ошибка при обновлении учебных данных: {e}")
+            return False
         finally:
             session.close()
 
@@ -0,0 +1,166 @@
+"""
+Обнаружение N+1 запросов (разработка и тесты).
+
+Каждое SQL-выражение запроса Flask сводится к «отпечатку»: пробелы
+схлопнуты, литералы и списки ``IN (?, ?, …)`` заменены на ``?``. Если один
+отпечаток за запрос выполнился больше ``N_PLUS_ONE_THRESHOLD`` раз,
+после ответа в лог пишется предупреждение: число повторов, выражение,
+атрибут модели, который его вызвал (для ленивой загрузки связи, например
+``Question.author``), и стек кода проекта на момент превышения порога. С
+``N_PLUS_ONE_RAISE`` вместо предупреждения выбрасывается
+``NPlusOneError`` — тест с регрессией падает.
+
+Исправление — план загрузки (``loaders.py``) или пакетный запрос
+(``serializers.py``). Где повторы намеренные (пакетный импорт), код
+оборачивается в ``allow_repeated_queries()``.
+"""
+
+import functools
+import logging
+import os
+import re
+import traceback
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STACK_DEPTH = 8
+
+_IN_LIST = re.compile(r"\bIN \((?:\?|, )+\)", re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+
+
+class NPlusOneError(RuntimeError):
+    """Одно выражение выполнено за запрос больше допустимого числа раз."""
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """Форма выражения без значений: одинакова для всех повторов N+1."""
+    normalized = " ".join(statement.split())
+    normalized = _STRING.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    return _IN_LIST.sub("IN (?)", normalized)
+
+
+def _project_stack() -> List[str]:
+    """Кадры стека из кода проекта (без библиотек и этого модуля), последние STACK_DEPTH."""
+    frames = []
+    for frame in traceback.extract_stack()[:-1]:
+        if frame.filename.startswith('<'):
+            continue  # <frozen runpy> и т.п.
+        filename = os.path.abspath(frame.filename)
+        if not filename.startswith(_PROJECT_ROOT) or 'site-packages' in filename or filename == __file__:
+            continue
+        frames.append(f"{os.path.relpath(filename, _PROJECT_ROOT)}:{frame.lineno} in {frame.name}")
+    return frames[-STACK_DEPTH:]
+
+
+@contextmanager
+def allow_repeated_queries():
+    """Не учитывать выражения внутри блока (намеренные повторы, например импорт пачками)."""
+    state = g.get('_n_plus_one') if has_request_context() else None
+    if state is None:
+        yield
+        return
+    state['paused'] += 1
+    try:
+        yield
+    finally:
+        state['paused'] -= 1
+
+
+# ----------------------- Слушатели -----------------------
+
+_listeners_installed = False
+
+
+def _mark_relationship_load(orm_execute_state):
+    """Ленивая/пакетная загрузка связи: запомнить атрибут модели в опциях выполнения."""
+    if not orm_execute_state.is_relationship_load or not has_request_context() or '_n_plus_one' not in g:
+        return
+    path = orm_execute_state.loader_strategy_path
+    prop = path.path[-1] if path is not None and path.path else None
+    if prop is not None and hasattr(prop, 'key'):
+        orm_execute_state.update_execution_options(n_plus_one_origin=f"{prop.parent.class_.__name__}.{prop.key}")
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or '_n_plus_one' not in g:
+        return
+    state = g._n_plus_one
+    if state['paused']:
+        return
+    key = fingerprint(statement)
+    entry = state['statements'].get(key)
+    if entry is None:
+        origin = context.execution_options.get('n_plus_one_origin') if context is not None else None
+        entry = state['statements'][key] = {'count': 0, 'origin': origin, 'stack': None}
+    entry['count'] += 1
+    if entry['count'] == state['threshold'] + 1:
+        entry['stack'] = _project_stack()
+
+
+def _install_listeners() -> None:
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Session, "do_orm_execute", _mark_relationship_load)
+    event.listen(Engine, "before_cursor_execute", _count_statement)
+    _listeners_installed = True
+
+
+# ----------------------- Подключение к приложению -----------------------
+
+def repeated_statements(statements: Dict[str, dict], threshold: int) -> List[dict]:
+    """Отпечатки, выполненные больше ``threshold`` раз, от частых к редким."""
+    found = [
+        {'statement': key, **entry}
+        for key, entry in statements.items() if entry['count'] > threshold
+    ]
+    return sorted(found, key=lambda item: item['count'], reverse=True)
+
+
+def format_report(route: str, found: List[dict]) -> str:
+    lines = [f"N+1 запросы в {route}:"]
+    for item in found:
+        lines.append(f"  {item['count']} раз: {item['statement']}")
+        lines.append(f"    источник: {item['origin'] or 'явный запрос в коде'}")
+        lines.extend(f"      {frame}" for frame in item['stack'] or ())
+    return "\n".join(lines)
+
+
+def init_n_plus_one_detector(app) -> Optional[int]:
+    """Считать отпечатки SQL-выражений каждого запроса (N_PLUS_ONE_DETECTION)."""
+    if not app.config.get('N_PLUS_ONE_DETECTION', False):
+        return None
+    threshold = int(app.config.get('N_PLUS_ONE_THRESHOLD', 5))
+    _install_listeners()
+
+    @app.before_request
+    def _start_n_plus_one_detection():
+        g._n_plus_one = {'threshold': threshold, 'statements': {}, 'paused': 0}
+
+    @app.after_request
+    def _report_n_plus_one(response):
+        state = g.pop('_n_plus_one', None)
+        if state is None:
+            return response
+        found = repeated_statements(state['statements'], threshold)
+        if found:
+            rule = request.url_rule.rule if request.url_rule else request.path
+            report = format_report(f"{request.method} {rule}", found)
+            if app.config.get('N_PLUS_ONE_RAISE', False):
+                raise NPlusOneError(report)
+            logger.warning(report)
+        return response
+
+    return threshold
@@ -0,0 +1,384 @@
+"""
+Профилирование отдельных запросов по требованию администратора.
+
+Запрос с заголовком ``X-Profile: 1`` (или параметром ``?_profile=1``) от
+пользователя с ролью ``admin`` выполняется под детерминированным
+профилировщиком (``sys.setprofile`` в потоке запроса). Собирается дерево
+вызовов по пути в стеке: число вызовов, полное и собственное время, а также
+SQL-выражения — для каждого узла сумма по поддереву и, отдельно, по
+ближайшей функции проекта, из которой выражение выполнено.
+
+Профиль сохраняется в ``PROFILER_DIR`` (хранятся последние
+``PROFILER_MAX_PROFILES``), ответ получает заголовок ``X-Profile-Id``.
+Просмотр — ``/admin/profiles``; скачать можно JSON с деревом и свёрнутые
+стеки (``.folded``) для flamegraph.pl / speedscope.
+
+Запросы без заголовка и параметра проверяются одним обращением к
+заголовкам и аргументам запроса.
+"""
+
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from flask import after_this_request, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Узлы дешевле этой доли запроса сворачиваются в «[прочее]» при сохранении
+MIN_NODE_FRACTION = 0.001
+OTHER_LABEL = "[прочее]"
+PROFILE_ID_CHARS = frozenset("0123456789abcdefghijklmnopqrstuvwxyz-_")
+
+
+def _short_path(filename: str) -> str:
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(_PROJECT_ROOT):
+        return os.path.relpath(filename, _PROJECT_ROOT)
+    return os.path.basename(filename)
+
+
+# Слушатели SQL-событий этих модулей не считаются «функцией проекта» для выражения
+_INSTRUMENTATION_FILES = frozenset(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('profiler.py', 'metrics.py', 'slow_queries.py', 'n_plus_one.py')
+)
+
+
+def _is_project_file(filename: str) -> bool:
+    return (filename.startswith(_PROJECT_ROOT) and 'site-packages' not in filename
+            and filename not in _INSTRUMENTATION_FILES)
+
+
+class CallNode:
+    """Узел дерева вызовов: функция на конкретном пути в стеке."""
+
+    __slots__ = ('label', 'project', 'calls', 'total', 'children', 'sql_count', 'sql_seconds', 'started')
+
+    def __init__(self, label: str, project: bool = False):
+        self.label = label
+        self.project = project
+        self.calls = 0
+        self.total = 0.0
+        self.children: Dict[str, 'CallNode'] = {}
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.started = 0.0
+
+    def child(self, label: str, project: bool) -> 'CallNode':
+        node = self.children.get(label)
+        if node is None:
+            node = self.children[label] = CallNode(label, project)
+        return node
+
+    def to_dict(self, min_seconds: float) -> Dict[str, object]:
+        """Узел с потомками; потомки дешевле ``min_seconds`` сворачиваются в один."""
+        children = sorted(self.children.values(), key=lambda node: node.total, reverse=True)
+        kept = [node.to_dict(min_seconds) for node in children if node.total >= min_seconds or node.sql_count]
+        dropped = [node for node in children if node.total < min_seconds and not node.sql_count]
+        if dropped:
+            kept.append({
+                'name': OTHER_LABEL, 'calls': sum(node.calls for node in dropped),
+                'total_ms': round(sum(node.total for node in dropped) * 1000, 3),
+                'self_ms': round(sum(node.total for node in dropped) * 1000, 3),
+                'sql_count': 0, 'sql_ms': 0.0, 'children': [],
+            })
+        children_total = sum(node.total for node in children)
+        return {
+            'name': self.label,
+            'calls': self.calls,
+            'total_ms': round(self.total * 1000, 3),
+            'self_ms': round(max(self.total - children_total, 0.0) * 1000, 3),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_seconds * 1000, 3),
+            'children': kept,
+        }
+
+
+class RequestProfiler:
+    """Дерево вызовов текущего потока между ``start`` и ``stop``."""
+
+    def __init__(self):
+        self.root = CallNode('<request>', project=True)
+        self._stack: List[CallNode] = [self.root]
+        self._labels: Dict[object, tuple] = {}
+        self.sql: Dict[str, Dict[str, object]] = {}
+        self._sql_started: List[float] = []
+
+    def start(self) -> None:
+        self.root.calls = 1
+        self.root.started = time.perf_counter()
+        sys.setprofile(self._callback)
+
+    def stop(self) -> None:
+        sys.setprofile(None)
+        now = time.perf_counter()
+        # Узлы, из которых не успели выйти (сам вызов setprofile)
+        while len(self._stack) > 1:
+            node = self._stack.pop()
+            node.total += now - node.started
+        self.root.total = now - self.root.started
+
+    def _label(self, key, code=None, func=None) -> tuple:
+        cached = self._labels.get(key)
+        if cached is None:
+            if code is not None:
+                cached = (f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})",
+                          _is_project_file(code.co_filename))
+            else:
+                module = getattr(func, '__module__', None) or type(getattr(func, '__self__', None)).__name__
+                cached = (f"{module}.{getattr(func, '__qualname__', repr(func))}", False)
+            self._labels[key] = cached
+        return cached
+
+    def _callback(self, frame, event_name, arg):
+        if event_name == 'call':
+            label, project = self._label(frame.f_code, code=frame.f_code)
+        elif event_name == 'c_call':
+            label, project = self._label(arg, func=arg)
+        else:  # return, c_return, c_exception
+            if len(self._stack) > 1:
+                node = self._stack.pop()
+                node.total += time.perf_counter() - node.started
+            return
+        node = self._stack[-1].child(label, project)
+        node.calls += 1
+        node.started = time.perf_counter()
+        self._stack.append(node)
+
+    # ----------------------- SQL -----------------------
+
+    def sql_started(self) -> None:
+        self._sql_started.append(time.perf_counter())
+
+    def sql_finished(self, statement: str) -> None:
+        if not self._sql_started:
+            return
+        elapsed = time.perf_counter() - self._sql_started.pop()
+        owner = self.root.label
+        for node in self._stack:
+            node.sql_count += 1
+            node.sql_seconds += elapsed
+            if node.project:
+                owner = node.label
+        entry = self.sql.setdefault(owner, {'frame': owner, 'count': 0, 'seconds': 0.0, 'statements': {}})
+        entry['count'] += 1
+        entry['seconds'] += elapsed
+        text = " ".join(statement.split())
+        entry['statements'][text] = entry['statements'].get(text, 0) + 1
+
+    def sql_by_frame(self) -> List[Dict[str, object]]:
+        """SQL по функциям проекта, из которых выполнены выражения, от дорогих к дешёвым."""
+        result = []
+        for entry in sorted(self.sql.values(), key=lambda item: item['seconds'], reverse=True):
+            statements = sorted(entry['statements'].items(), key=lambda item: item[1], reverse=True)
+            result.append({
+                'frame': entry['frame'],
+                'count': entry['count'],
+                'ms': round(entry['seconds'] * 1000, 3),
+                'statements': [{'statement': text, 'count': count} for text, count in statements],
+            })
+        return result
+
+
+def collapsed_stacks(tree: Dict[str, object]) -> Iterator[str]:
+    """Свёрнутые стеки ``a;b;c <мкс собственного времени>`` (формат flamegraph.pl)."""
+    def walk(node, prefix):
+        name = node['name'].replace(';', ',')
+        path = f"{prefix};{name}" if prefix else name
+        self_us = int(round(node['self_ms'] * 1000))
+        if self_us > 0:
+            yield f"{path} {self_us}"
+        for child in node['children']:
+            yield from walk(child, path)
+    yield from walk(tree, '')
+
+
+def tree_rows(tree: Dict[str, object]) -> Iterator[tuple]:
+    """Узлы дерева в порядке обхода с глубиной: (глубина, узел) — для вывода без рекурсии в шаблоне."""
+    stack = [(0, tree)]
+    while stack:
+        depth, node = stack.pop()
+        yield depth, node
+        stack.extend((depth + 1, child) for child in reversed(node['children']))
+
+
+# ----------------------- Хранилище -----------------------
+
+class ProfileStore:
+    """Последние ``max_profiles`` профилей в каталоге: ``<id>.json`` и краткое ``<id>.meta.json``."""
+
+    def __init__(self, directory: str, max_profiles: int = 50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_id(self) -> str:
+        return f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{next(self._ids)}"
+
+    def _path(self, profile_id: str, suffix: str) -> str:
+        if not profile_id or not set(profile_id) <= PROFILE_ID_CHARS:
+            raise KeyError(profile_id)
+        return os.path.join(self.directory, f"{profile_id}{suffix}")
+
+    def save(self, profile: Dict[str, object]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {key: value for key, value in profile.items() if key not in ('tree', 'sql_by_frame')}
+        for suffix, payload in (('.json', profile), ('.meta.json', meta)):
+            path = self._path(profile['id'], suffix)
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as handle:
+                json.dump(payload, handle, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+        self._prune()
+        return profile['id']
+
+    def _prune(self) -> None:
+        with self._lock:
+            metas = sorted(
+                (entry for entry in os.scandir(self.directory) if entry.name.endswith('.meta.json')),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            for entry in metas[:max(len(metas) - self.max_profiles, 0)]:
+                profile_id = entry.name[:-len('.meta.json')]
+                for suffix in ('.meta.json', '.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, profile_id + suffix))
+                    except OSError:
+                        pass
+
+    def list(self) -> List[Dict[str, object]]:
+        """Краткие сведения о профилях, от новых к старым."""
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.meta.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as handle:
+                    result.append(json.load(handle))
+            except (OSError, ValueError):
+                continue
+        return sorted(result, key=lambda meta: meta.get('created_at', ''), reverse=True)
+
+    def load(self, profile_id: str) -> Dict[str, object]:
+        """Профиль целиком; KeyError, если его нет (или уже вытеснен)."""
+        try:
+            with open(self._path(profile_id, '.json'), encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            raise KeyError(profile_id) from None
+
+
+# ----------------------- Подключение к приложению -----------------------
+
+_sql_listeners_installed = False
+
+
+def _current_profiler() -> Optional[RequestProfiler]:
+    if not has_request_context():
+        return None
+    return g.get('_profiler')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profiler = _current_profiler()
+    if profiler is not None:
+        profiler.sql_started()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profiler = _current_profiler()
+    if profiler is not None:
+        profiler.sql_finished(statement)
+
+
+def _install_sql_listeners() -> None:
+    global _sql_listeners_installed
+    if _sql_listeners_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _sql_listeners_installed = True
+
+
+def get_profile_store() -> Optional[ProfileStore]:
+    return current_app.extensions.get('profiler')
+
+
+def profiling_requested() -> bool:
+    """Запрошено ли профилирование: заголовок или параметр, и пользователь — администратор."""
+    config = current_app.config
+    flag = request.headers.get(config.get('PROFILER_HEADER', 'X-Profile'))
+    if flag is None:
+        flag = request.args.get(config.get('PROFILER_QUERY_PARAM', '_profile'))
+    if not flag or flag.lower() in ('0', 'false', 'no'):
+        return False
+    return (g.get('user_info', {}) or {}).get('role') == 'admin'
+
+
+def _profiled_dispatch(app, dispatch):
+    """Обёртка ``app.dispatch_request``: хуки before_request (и аутентификация) уже выполнены."""
+    store = app.extensions['profiler']
+
+    @functools.wraps(dispatch)
+    def wrapper():
+        if not profiling_requested():
+            return dispatch()
+        profiler = RequestProfiler()
+        g._profiler = profiler
+        profiler.start()
+        try:
+            rv = dispatch()
+            # Сборка ответа (jsonify, шаблоны) тоже попадает в профиль
+            response = app.make_response(rv)
+        finally:
+            profiler.stop()
+            g._profiler = None
+        profile_id = store.new_id()
+        user_info = g.get('user_info', {}) or {}
+        store.save({
+            'id': profile_id,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'route': request.url_rule.rule if request.url_rule else None,
+            'status': response.status_code,
+            'user': user_info.get('username'),
+            'pid': os.getpid(),
+            'duration_ms': round(profiler.root.total * 1000, 3),
+            'sql_count': profiler.root.sql_count,
+            'sql_ms': round(profiler.root.sql_seconds * 1000, 3),
+            'tree': profiler.root.to_dict(profiler.root.total * MIN_NODE_FRACTION),
+            'sql_by_frame': profiler.sql_by_frame(),
+        })
+
+        @after_this_request
+        def _add_profile_header(resp):
+            resp.headers['X-Profile-Id'] = profile_id
+            return resp
+
+        return response
+
+    return wrapper
+
+
+def init_profiler(app) -> Optional[ProfileStore]:
+    """Подключить профилирование по требованию (PROFILER_ENABLED)."""
+    if not app.config.get('PROFILER_ENABLED', True):
+        return None
+    store = ProfileStore(app.config.get('PROFILER_DIR'), app.config.get('PROFILER_MAX_PROFILES', 50))
+    app.extensions['profiler'] = store
+    _install_sql_listeners()
+    app.dispatch_request = _profiled_dispatch(app, app.dispatch_request)
+    return store
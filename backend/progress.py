@@ -0,0 +1,231 @@
+"""
+Учёт прохождения уроков и сводный прогресс по курсам.
+
+``complete_lesson`` отмечает урок пройденным и в той же транзакции
+инкрементально обновляет сводку ``user_course_progress`` (число пройденных
+уроков, признак и дату завершения курса) — без пересчёта всех уроков курса.
+Повторная отметка того же урока ничего не меняет.
+
+``reconcile_progress`` пересчитывает сводки целиком по ``user_lesson_progress``
+набором UPDATE/INSERT … SELECT; используется командой
+``flask progress-reconcile`` после ручных правок. ``recompute_rollups`` делает
+то же для перечисленных пар (пользователь, курс) — после пакетного импорта.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, column, exists, func, insert, or_, select, table, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import Course, Lesson, UserCourseProgress, UserLessonProgress
+from .stats_counters import rebuild_course_counters
+
+
+@dataclass
+class LessonCompletion:
+    """Результат отметки урока."""
+
+    lesson_id: int
+    course_id: int
+    newly_completed: bool
+    course_progress: UserCourseProgress
+    total_lessons: int
+
+    def to_dict(self) -> dict:
+        progress = self.course_progress
+        return {
+            'lesson_id': self.lesson_id,
+            'course_id': self.course_id,
+            'already_completed': not self.newly_completed,
+            'course_progress': {
+                'lessons_completed': progress.lessons_completed,
+                'total_lessons': self.total_lessons,
+                'progress_percentage': progress.get_progress_percentage(self.total_lessons),
+                'is_completed': progress.is_completed,
+                'started_at': progress.started_at.isoformat() if progress.started_at else None,
+                'completed_at': progress.completed_at.isoformat() if progress.completed_at else None,
+            },
+        }
+
+
+def complete_lesson(session: Session, user_id: int, lesson: Lesson, total_lessons: int) -> LessonCompletion:
+    """Отметить урок пройденным и обновить сводку по курсу (без commit).
+
+    Первым выполняется upsert по уникальному индексу (user_id, lesson_id):
+    он же берёт блокировку записи SQLite, поэтому сводка ниже читается и
+    изменяется без гонок с другими воркерами. Сводка меняется через ORM, и
+    счётчики статистики (stats_counters) обновляются в том же flush.
+    """
+    now = datetime.now()
+    stmt = sqlite_insert(UserLessonProgress).values(
+        user_id=user_id, lesson_id=lesson.id, is_completed=True, completed_at=now, created_at=now, updated_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserLessonProgress.user_id, UserLessonProgress.lesson_id],
+        set_={'is_completed': True, 'completed_at': now, 'updated_at': now},
+        # coalesce: у старых строк is_completed бывает NULL
+        where=func.coalesce(UserLessonProgress.is_completed, False) == False,  # noqa: E712
+    )
+    # rowcount = 0, если урок уже был пройден (условие WHERE не выполнено)
+    newly_completed = session.execute(stmt).rowcount == 1
+
+    progress = (
+        session.query(UserCourseProgress)
+        .filter(UserCourseProgress.user_id == user_id, UserCourseProgress.course_id == lesson.course_id)
+        .populate_existing()
+        .first()
+    )
+    if progress is None:
+        progress = UserCourseProgress(
+            user_id=user_id, course_id=lesson.course_id, lessons_completed=0, is_completed=False, started_at=now,
+        )
+        session.add(progress)
+
+    if newly_completed:
+        lessons_completed = (progress.lessons_completed or 0) + 1
+        if total_lessons:
+            lessons_completed = min(lessons_completed, total_lessons)
+        progress.lessons_completed = lessons_completed
+        if total_lessons and lessons_completed >= total_lessons and not progress.is_completed:
+            progress.is_completed = True
+            progress.completed_at = now
+    session.flush()
+
+    return LessonCompletion(
+        lesson_id=lesson.id,
+        course_id=lesson.course_id,
+        newly_completed=newly_completed,
+        course_progress=progress,
+        total_lessons=total_lessons,
+    )
+
+
+# ----------------------- Сверка -----------------------
+
+def _completed_lessons(user_id_column, course_id_column):
+    return (
+        select(func.count(UserLessonProgress.id))
+        .join(Lesson, Lesson.id == UserLessonProgress.lesson_id)
+        .where(
+            UserLessonProgress.user_id == user_id_column,
+            Lesson.course_id == course_id_column,
+            UserLessonProgress.is_completed == True,  # noqa: E712
+        )
+        .scalar_subquery()
+    )
+
+
+def reconcile_progress(session: Session, course_ids: Optional[Iterable[int]] = None) -> int:
+    """Пересчитать сводки прогресса по отметкам уроков (без commit).
+
+    Создаёт недостающие строки user_course_progress для пользователей с
+    пройденными уроками и исправляет число уроков, признак и дату
+    завершения у остальных. Возвращает число исправленных строк (созданные
+    строки тоже исправляются: они вставляются с нулевым прогрессом).
+    Счётчики статистики затронутых курсов пересчитываются.
+    """
+    if course_ids is None:
+        return _reconcile(session, lambda user_id, course_id: [], None)
+    course_ids = list(course_ids)
+    if not course_ids:
+        return 0
+    return _reconcile(session, lambda user_id, course_id: [course_id.in_(course_ids)], course_ids)
+
+
+def recompute_rollups(session: Session, pairs: Iterable[Tuple[int, int]]) -> int:
+    """Пересчитать сводки только для пар (user_id, course_id) — по одной на пару.
+
+    Пары складываются во временную таблицу соединения, и сверка идёт тем же
+    набором запросов, что и ``reconcile_progress``, с фильтром по ней.
+    """
+    pairs = {(int(user_id), int(course_id)) for user_id, course_id in pairs}
+    if not pairs:
+        return 0
+    session.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {_rollup_scope.name} "
+        "(user_id INTEGER NOT NULL, course_id INTEGER NOT NULL, PRIMARY KEY (user_id, course_id))"
+    ))
+    session.execute(_rollup_scope.delete())
+    session.execute(_rollup_scope.insert(), [{'user_id': u, 'course_id': c} for u, c in pairs])
+
+    def in_scope(user_id, course_id):
+        # IN по user_id позволяет SQLite искать по индексу (user_id, ...), а не сканировать таблицу
+        return [
+            user_id.in_(select(_rollup_scope.c.user_id)),
+            exists().where(and_(_rollup_scope.c.user_id == user_id, _rollup_scope.c.course_id == course_id)),
+        ]
+
+    try:
+        return _reconcile(session, in_scope, sorted({course_id for _, course_id in pairs}))
+    finally:
+        session.execute(_rollup_scope.delete())
+
+
+_rollup_scope = table('rollup_scope', column('user_id'), column('course_id'))
+
+
+def _reconcile(session: Session, scope: Callable, course_ids: Optional[List[int]]) -> int:
+    """Сверка сводок; ``scope(user_id, course_id)`` возвращает условия отбора строк."""
+    now = datetime.now()
+    missing = (
+        select(UserLessonProgress.user_id, Lesson.course_id, func.min(UserLessonProgress.completed_at))
+        .join(Lesson, Lesson.id == UserLessonProgress.lesson_id)
+        .where(
+            UserLessonProgress.is_completed == True,  # noqa: E712
+            ~exists().where(and_(
+                UserCourseProgress.user_id == UserLessonProgress.user_id,
+                UserCourseProgress.course_id == Lesson.course_id,
+            )),
+            *scope(UserLessonProgress.user_id, Lesson.course_id),
+        )
+        .group_by(UserLessonProgress.user_id, Lesson.course_id)
+    )
+    created = session.execute(
+        insert(UserCourseProgress).from_select(['user_id', 'course_id', 'started_at'], missing)
+    ).rowcount or 0
+
+    completed = _completed_lessons(UserCourseProgress.user_id, UserCourseProgress.course_id)
+    total = select(Course.total_lessons).where(Course.id == UserCourseProgress.course_id).scalar_subquery()
+    last_completed_at = (
+        select(func.max(UserLessonProgress.completed_at))
+        .join(Lesson, Lesson.id == UserLessonProgress.lesson_id)
+        .where(
+            UserLessonProgress.user_id == UserCourseProgress.user_id,
+            Lesson.course_id == UserCourseProgress.course_id,
+            UserLessonProgress.is_completed == True,  # noqa: E712
+        )
+        .scalar_subquery()
+    )
+    lessons_expected = case((total > 0, func.min(completed, total)), else_=completed)
+    done_expected = and_(total > 0, completed >= total)
+
+    stmt = (
+        update(UserCourseProgress)
+        .where(
+            or_(
+                func.coalesce(UserCourseProgress.lessons_completed, -1) != lessons_expected,
+                func.coalesce(UserCourseProgress.is_completed, False) != done_expected,
+                and_(done_expected, UserCourseProgress.completed_at.is_(None)),
+                and_(~done_expected, UserCourseProgress.completed_at.isnot(None)),
+            ),
+            *scope(UserCourseProgress.user_id, UserCourseProgress.course_id),
+        )
+        .values(
+            lessons_completed=lessons_expected,
+            is_completed=done_expected,
+            completed_at=case(
+                (done_expected, func.coalesce(UserCourseProgress.completed_at, last_completed_at, now)),
+                else_=None,
+            ),
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    fixed = session.execute(stmt).rowcount or 0
+
+    if created or fixed:
+        rebuild_course_counters(session, course_ids)
+    return fixed
@@ -0,0 +1,264 @@
+"""
+Выгрузка отчёта о прогрессе «пользователи × курсы» в CSV и XLSX.
+
+Строки читаются одним SELECT с ``yield_per`` (курсор на стороне БД) и сразу
+превращаются в байты ответа: ни результат запроса, ни файл целиком в памяти
+не собираются. Один запрос — один снимок данных SQLite, поэтому отчёт
+согласован, даже если во время выгрузки кто-то отмечает уроки.
+
+XLSX собирается вручную (zipfile + XML листа с inline-строками), без
+openpyxl: его write-only режим всё равно держит лист во временном файле,
+а здесь архив пишется потоком, по мере чтения строк.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from sqlalchemy import Integer, String, select, type_coerce
+from sqlalchemy.orm import Session
+
+from .models import Course, User, UserCourseProgress
+
+# Строк за одно чтение из курсора и в одном куске ответа
+FETCH_BATCH_SIZE = 2000
+
+# (заголовок, тип) — тип нужен XLSX, чтобы числа и флаги были не строками
+PROGRESS_COLUMNS = (
+    ('user_id', 'n'),
+    ('username', 's'),
+    ('full_name', 's'),
+    ('department', 's'),
+    ('course_id', 'n'),
+    ('course_title', 's'),
+    ('lessons_completed', 'n'),
+    ('total_lessons', 'n'),
+    ('progress_percentage', 'n'),
+    ('is_completed', 'b'),
+    ('started_at', 's'),
+    ('completed_at', 's'),
+)
+
+
+@dataclass
+class ProgressReportFilter:
+    """Фильтры отчёта; пустые значения — без ограничения."""
+
+    departments: List[str] = field(default_factory=list)
+    course_ids: List[int] = field(default_factory=list)
+
+
+def progress_report_query(filters: ProgressReportFilter):
+    """SELECT строк отчёта: по строке на пару пользователь/курс с прогрессом."""
+    stmt = (
+        select(
+            User.id, User.username, User.full_name, User.department,
+            Course.id, Course.title,
+            UserCourseProgress.lessons_completed, Course.total_lessons,
+            # Флаг и даты читаются как есть: разбор DateTime/Boolean на каждой
+            # из миллиона строк дороже самого чтения, а в отчёт идут строки
+            type_coerce(UserCourseProgress.is_completed, Integer),
+            type_coerce(UserCourseProgress.started_at, String),
+            type_coerce(UserCourseProgress.completed_at, String),
+        )
+        .join(UserCourseProgress, UserCourseProgress.user_id == User.id)
+        .join(Course, Course.id == UserCourseProgress.course_id)
+        .order_by(UserCourseProgress.user_id, UserCourseProgress.course_id)
+    )
+    if filters.departments:
+        stmt = stmt.where(User.department.in_(filters.departments))
+    if filters.course_ids:
+        stmt = stmt.where(UserCourseProgress.course_id.in_(filters.course_ids))
+    return stmt
+
+
+def _isoformat(value: Optional[str]) -> str:
+    # SQLite хранит DateTime строкой 'YYYY-MM-DD HH:MM:SS[.ffffff]'
+    return value.replace(' ', 'T', 1) if value else ''
+
+
+def iter_progress_rows(session: Session, filters: ProgressReportFilter,
+                       batch_size: int = FETCH_BATCH_SIZE) -> Iterator[List[Sequence[Any]]]:
+    """Пачки строк отчёта (в порядке PROGRESS_COLUMNS) из курсора БД."""
+    result = session.execute(progress_report_query(filters).execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        batch = []
+        for (user_id, username, full_name, department, course_id, course_title,
+             lessons_completed, total_lessons, is_completed, started_at, completed_at) in partition:
+            lessons_completed = lessons_completed or 0
+            percentage = round(lessons_completed / total_lessons * 100, 2) if total_lessons else 0
+            batch.append((
+                user_id, username, full_name or '', department or '', course_id, course_title,
+                lessons_completed, total_lessons or 0, percentage, bool(is_completed),
+                _isoformat(started_at), _isoformat(completed_at),
+            ))
+        yield batch
+
+
+# ----------------------- CSV -----------------------
+
+# Ячейка с таким началом в Excel считается формулой (CSV injection)
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value: Any) -> Any:
+    """Строку, которую Excel принял бы за формулу, экранировать апострофом."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(batches: Iterable[List[Sequence[Any]]]) -> Iterator[bytes]:
+    """CSV в UTF-8 с BOM (чтобы Excel распознал кириллицу), кусок на пачку строк.
+
+    ФИО и отдел приходят от пользователей и из AD, поэтому строковые ячейки
+    проходят через ``csv_cell``.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in PROGRESS_COLUMNS])
+    yield buffer.getvalue().encode('utf-8-sig')
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([csv_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+# ----------------------- XLSX -----------------------
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+# Управляющие символы, недопустимые в XML 1.0
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+# Строки отчёта идут по пользователю, поэтому ФИО, отдел и названия курсов
+# повторяются подряд — экранирование кэшируется
+@lru_cache(maxsize=4096)
+def _xml_text(value: Any) -> str:
+    return escape(_XML_ILLEGAL.sub('', str(value)))
+
+
+_CELL_TEMPLATES = {
+    'n': '<c><v>{}</v></c>',
+    'b': '<c t="b"><v>{:d}</v></c>',
+    's': '<c t="inlineStr"><is><t>{}</t></is></c>',
+}
+
+
+def _xlsx_row_renderer(kinds: Sequence[str]):
+    """Функция строки листа: ячейки по шаблону, экранируются только строки."""
+    template = '<row>' + ''.join(_CELL_TEMPLATES[kind] for kind in kinds) + '</row>'
+    text_positions = [i for i, kind in enumerate(kinds) if kind == 's']
+
+    def render(values: Sequence[Any]) -> str:
+        values = list(values)
+        for i in text_positions:
+            values[i] = _xml_text(values[i])
+        return template.format(*values)
+
+    return render
+
+
+class _ChunkSink(io.RawIOBase):
+    """Приёмник для ZipFile без seek: накапливает записанное до ``drain``."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def xlsx_chunks(batches: Iterable[List[Sequence[Any]]], sheet_name: str = 'Прогресс') -> Iterator[bytes]:
+    """XLSX-файл одним листом; архив отдаётся кусками по мере записи."""
+    sink = _ChunkSink()
+    render_row = _xlsx_row_renderer([kind for _, kind in PROGRESS_COLUMNS])
+    render_header = _xlsx_row_renderer(['s'] * len(PROGRESS_COLUMNS))
+    # Быстрое сжатие: XML листа и так ужимается в 10–15 раз
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(sheet=_xml_text(sheet_name)))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            header = render_header([name for name, _ in PROGRESS_COLUMNS])
+            sheet.write((_SHEET_HEAD + header).encode('utf-8'))
+            for batch in batches:
+                sheet.write(''.join(map(render_row, batch)).encode('utf-8'))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            sheet.write(_SHEET_TAIL.encode('utf-8'))
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', csv_chunks),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', xlsx_chunks),
+}
+
+
+def progress_report_chunks(session: Session, filters: ProgressReportFilter, fmt: str) -> Iterator[bytes]:
+    """Отчёт в формате ``fmt`` кусками байтов; по завершении закрывает сессию.
+
+    Сессия закрывается и при обрыве соединения клиентом (GeneratorExit).
+    """
+    _, render = EXPORT_FORMATS[fmt]
+    try:
+        yield from render(iter_progress_rows(session, filters))
+    finally:
+        session.close()
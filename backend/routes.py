@@ -1,7 +1,10 @@
+import json
 import os
 from typing import Dict, List, Tuple
 from flask import Flask, send_from_directory, abort, redirect, Response, render_template, jsonify
 
+from .tracing import traced
+
 
 def _page_map(base_path: str, allowed_dirs: List[str]) -> Dict[str, Tuple[str, str]]:
     """Map route name to (directory, index file)."""
@@ -14,6 +17,7 @@ def _page_map(base_path: str, allowed_dirs: List[str]) -> Dict[str, Tuple[str, s
     return mapping
 
 
+@traced('render.split_head_body')
 def _split_head_body(html: str) -> Dict[str, str]:
     """Extract <head> stylesheet hrefs and body inner HTML, then strip old header/footer.
     This preserves original visuals while avoiding duplicate header/footer.
@@ -82,6 +86,20 @@ def register_routes(app: Flask) -> None:
     def healthcheck():
         return {"status": "ok"}, 200
 
+    # Prometheus metrics (admin only), summed over all gunicorn workers
+    @app.get("/metrics")
+    def metrics():
+        from flask import g
+        from .metrics import get_registry
+
+        user_info = g.get('user_info', {}) or {}
+        if user_info.get('role') != 'admin':
+            abort(403)
+        registry = get_registry()
+        if registry is None:
+            abort(404)
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
     # Debug endpoint for Kerberos Authentication
     @app.get("/debug/kerberos")
     def debug_kerberos():
@@ -165,7 +183,7 @@ def register_routes(app: Flask) -> None:
         
         # Дополняем данными из БД (приоритет БД над контекстом)
         try:
-            session = db_manager.get_session()
+            session = db_manager.get_read_session()
             try:
                 user = session.query(User).filter(User.username == username.lower()).first()
                 if user:
@@ -203,13 +221,78 @@ def register_routes(app: Flask) -> None:
                 entries = lines[-500:]
 
         return render_template(
-            "backend/actions_log.html",
+            "backend/templates/actions_log.html",
             entries=reversed(entries),
             username=user_info.get('username'),
             full_name=user_info.get('full_name'),
             role=user_info.get('role'),
         )
 
+    # Профили запросов (admin only), см. profiler.py
+    def _profile_store():
+        from flask import g
+        from .profiler import get_profile_store
+
+        user_info = g.get('user_info', {}) or {}
+        if user_info.get('role') != 'admin':
+            abort(403)
+        store = get_profile_store()
+        if store is None:
+            abort(404)
+        return store, user_info
+
+    @app.get("/admin/profiles")
+    def view_profiles():
+        store, user_info = _profile_store()
+        return render_template(
+            "backend/templates/profiles.html",
+            profiles=store.list(),
+            header=app.config.get('PROFILER_HEADER', 'X-Profile'),
+            param=app.config.get('PROFILER_QUERY_PARAM', '_profile'),
+            username=user_info.get('username'),
+            full_name=user_info.get('full_name'),
+            role=user_info.get('role'),
+        )
+
+    @app.get("/admin/profiles/<profile_id>")
+    def view_profile(profile_id: str):
+        from .profiler import tree_rows
+
+        store, user_info = _profile_store()
+        try:
+            profile = store.load(profile_id)
+        except KeyError:
+            abort(404)
+        return render_template(
+            "backend/templates/profile.html",
+            profile=profile,
+            tree_rows=tree_rows(profile['tree']),
+            username=user_info.get('username'),
+            full_name=user_info.get('full_name'),
+            role=user_info.get('role'),
+        )
+
+    @app.get("/admin/profiles/<profile_id>/<fmt>")
+    def download_profile(profile_id: str, fmt: str):
+        from .profiler import collapsed_stacks
+
+        store, _ = _profile_store()
+        if fmt not in ('json', 'folded'):
+            abort(404)
+        try:
+            profile = store.load(profile_id)
+        except KeyError:
+            abort(404)
+        if fmt == 'json':
+            body, mimetype = json.dumps(profile, ensure_ascii=False, indent=1), "application/json"
+        else:
+            body, mimetype = "\n".join(collapsed_stacks(profile['tree'])) + "\n", "text/plain; charset=utf-8"
+        return Response(
+            body,
+            mimetype=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="profile_{profile_id}.{fmt}"'},
+        )
+
     # Serve uploaded files (Q&A attachments)
     @app.get("/uploads/<path:filename>")
     def serve_upload(filename: str):
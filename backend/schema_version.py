@@ -0,0 +1,177 @@
+"""
+Версия схемы БД и базовых данных: миграции один раз, а не в каждом воркере.
+
+Раньше ``init_api`` в каждом воркере gunicorn выполнял ``create_tables``
+(проверки схемы Q&A, ALTER TABLE, create_all, дедупликация, индексы,
+перенос legacy-таблиц), очистку устаревших таблиц и ``init_sample_data``
+с запросом на каждый урок. Теперь в таблице ``schema_meta`` хранятся
+отметки выполненных шагов:
+
+- ``schema`` — миграции схемы (``create_tables`` и очистка legacy-таблиц);
+- ``seed`` — базовые курсы и уроки (``init_sample_data``).
+
+Воркер при старте читает отметки одним SELECT. Если они отстают от версий
+кода, миграции выполняет тот, кто первым захватил файловую блокировку
+(``<БД>.migrate.lock``); остальные ждут её и перечитывают отметку. Вручную
+миграции запускаются командой ``flask db-upgrade``.
+
+Пакетные миграции данных (перенос kerberos_users, см. backfill.py) воркер
+при старте не выполняет — только предупреждает о них в журнале; их
+запускает ``flask backfill`` или ``flask db-upgrade``.
+
+При изменении моделей или шагов ``create_tables`` увеличьте SCHEMA_VERSION,
+при изменении базовых данных — SEED_VERSION.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from .sqlite_pragmas import sqlite_file_path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 2
+SEED_VERSION = 1
+
+_process_lock = threading.Lock()
+
+
+def required_versions(sample_data: bool) -> Dict[str, int]:
+    """Версии, которых должна достичь БД (``seed`` — только если нужны базовые данные)."""
+    versions = {'schema': SCHEMA_VERSION}
+    if sample_data:
+        versions['seed'] = SEED_VERSION
+    return versions
+
+
+def read_stamp(engine) -> Dict[str, int]:
+    """Отметки из schema_meta; пустой словарь, если таблицы (или файла БД) ещё нет."""
+    try:
+        with engine.connect() as conn:
+            return dict(conn.execute(text("SELECT key, version FROM schema_meta")).all())
+    except (OperationalError, ProgrammingError):
+        return {}
+
+
+def pending_steps(stamp: Dict[str, int], sample_data: bool) -> List[str]:
+    """Шаги, отметка которых отстаёт от версии кода."""
+    return [key for key, version in required_versions(sample_data).items() if stamp.get(key, 0) < version]
+
+
+def _write_stamp(engine, versions: Dict[str, int]) -> None:
+    with engine.begin() as conn:
+        for key, version in versions.items():
+            conn.execute(text("DELETE FROM schema_meta WHERE key = :key"), {'key': key})
+            conn.execute(
+                text("INSERT INTO schema_meta (key, version, updated_at) VALUES (:key, :version, CURRENT_TIMESTAMP)"),
+                {'key': key, 'version': version},
+            )
+
+
+@contextmanager
+def migration_lock(database_url: str):
+    """Межпроцессная блокировка миграций: файл ``<БД>.migrate.lock`` рядом с БД.
+
+    Для БД в памяти и других СУБД — только блокировка внутри процесса.
+    """
+    path = sqlite_file_path(database_url)
+    with _process_lock:
+        if path is None:
+            yield
+            return
+        with open(f"{path}.migrate.lock", 'a+b') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            else:
+                handle.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK сдаётся после 10 попыток — ждём дальше
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def upgrade_database(manager, sample_data: bool = True, force: bool = False,
+                     run_backfills: bool = True) -> List[str]:
+    """Выполнить отстающие шаги под блокировкой миграций и обновить отметки.
+
+    Отметка перечитывается после захвата блокировки: если миграции уже
+    выполнил другой воркер, ничего не делается. ``force`` — выполнить все
+    шаги независимо от отметок; ``run_backfills=False`` — не выполнять
+    пакетные миграции данных (см. backfill.py). Возвращает список
+    выполненных шагов.
+    """
+    with migration_lock(manager.database_url):
+        if force:
+            steps = list(required_versions(sample_data))
+        else:
+            steps = pending_steps(read_stamp(manager.engine), sample_data)
+        done = {}
+        if 'schema' in steps:
+            manager.create_tables(run_backfills=run_backfills)
+            manager.cleanup_legacy_and_kerberos()
+            done['schema'] = SCHEMA_VERSION
+        if 'seed' in steps and manager.init_sample_data():
+            done['seed'] = SEED_VERSION
+        if done:
+            _write_stamp(manager.engine, done)
+            logger.info("Миграции БД выполнены: %s", ", ".join(done))
+        return list(done)
+
+
+def ensure_schema(manager, sample_data: bool = True, auto_migrate: bool = True) -> List[str]:
+    """Проверка при старте воркера: один SELECT, если отметки актуальны.
+
+    При устаревших отметках миграции выполняются (``auto_migrate``) или
+    только записывается предупреждение — тогда их нужно запустить командой
+    ``flask db-upgrade``.
+    """
+    stamp = read_stamp(manager.read_engine)
+    if stamp.get('schema', 0) > SCHEMA_VERSION:
+        logger.warning("Схема БД (версия %s) новее кода (версия %s)", stamp['schema'], SCHEMA_VERSION)
+    steps = pending_steps(stamp, sample_data)
+    if not steps:
+        return []
+    if not auto_migrate:
+        logger.warning("Схема БД устарела (%s): выполните flask db-upgrade", ", ".join(steps))
+        return []
+    # Пакетные миграции данных идут долго: под блокировкой миграций их ждал бы
+    # каждый стартующий воркер. Воркер только ставит отметку схемы и
+    # предупреждает, перенос данных выполняет flask backfill
+    done = upgrade_database(manager, sample_data, run_backfills=False)
+    if 'schema' in done:
+        warn_pending_backfills(manager.engine)
+    return done
+
+
+def warn_pending_backfills(engine) -> List[str]:
+    """Записать предупреждение о невыполненных пакетных миграциях; их имена."""
+    from .backfill import backfill_status
+
+    pending = []
+    for status in backfill_status(engine):
+        if status['status'] in ('pending', 'running'):
+            logger.warning("Пакетная миграция %s не завершена (осталось строк: %s): выполните flask backfill %s",
+                           status['name'], status['rows_remaining'], status['name'])
+            pending.append(status['name'])
+    return pending
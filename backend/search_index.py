@@ -0,0 +1,227 @@
+"""
+Полнотекстовый поиск по вопросам и ответам (SQLite FTS5).
+
+Индекс ``qa_search`` хранит заголовок, описание и теги вопроса и склеенные
+тексты ответов; rowid строки индекса равен id вопроса. Индекс
+синхронизируется триггерами на ``questions`` и ``answers``.
+
+Токенизатор ``unicode61 remove_diacritics 2`` приводит регистр для любых
+алфавитов (в т.ч. кириллицы, в отличие от LIKE в SQLite) и снимает
+диакритику. Буква «ё» диакритикой не считается, поэтому она заменяется на «е»
+и при индексации, и в запросе.
+"""
+
+import html
+import logging
+import re
+from typing import Dict, Optional
+
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'qa_search'
+BACKFILL_BATCH_SIZE = 500
+MAX_QUERY_TOKENS = 8
+
+# Веса колонок для bm25: заголовок важнее описания, описание — тегов и ответов
+BM25_WEIGHTS = (10.0, 4.0, 6.0, 2.0)
+
+qa_search = table(FTS_TABLE, column('rowid'), column('title'), column('body'), column('tags'), column('answers'))
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Границы совпадения в snippet(): символы из области частного использования,
+# которые не меняет html.escape; после экранирования текста они становятся <mark>
+_MARK_START = '\ue000'
+_MARK_END = '\ue001'
+
+_availability: Dict[str, bool] = {}
+
+
+def _norm(expr: str) -> str:
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _answers_of(question_id_expr: str) -> str:
+    return (
+        f"coalesce((SELECT {_norm('group_concat(body, char(10))')} FROM answers "
+        f"WHERE question_id = {question_id_expr}), '')"
+    )
+
+
+_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, body, tags, answers,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_questions_ai AFTER INSERT ON questions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body, tags, answers)
+        VALUES (new.id, {_norm('new.title')}, {_norm('new.body')}, {_norm("coalesce(new.tags, '')")},
+                {_answers_of('new.id')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_questions_au AFTER UPDATE OF title, body, tags ON questions BEGIN
+        UPDATE {FTS_TABLE}
+        SET title = {_norm('new.title')}, body = {_norm('new.body')}, tags = {_norm("coalesce(new.tags, '')")}
+        WHERE rowid = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_questions_ad AFTER DELETE ON questions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_answers_ai AFTER INSERT ON answers BEGIN
+        UPDATE {FTS_TABLE} SET answers = {_answers_of('new.question_id')} WHERE rowid = new.question_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_answers_au AFTER UPDATE OF body, question_id ON answers BEGIN
+        UPDATE {FTS_TABLE} SET answers = {_answers_of('old.question_id')} WHERE rowid = old.question_id;
+        UPDATE {FTS_TABLE} SET answers = {_answers_of('new.question_id')} WHERE rowid = new.question_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_answers_ad AFTER DELETE ON answers BEGIN
+        UPDATE {FTS_TABLE} SET answers = {_answers_of('old.question_id')} WHERE rowid = old.question_id;
+    END
+    """,
+]
+
+_BACKFILL_SQL = f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, body, tags, answers)
+    SELECT q.id, {_norm('q.title')}, {_norm('q.body')}, {_norm("coalesce(q.tags, '')")}, {_answers_of('q.id')}
+    FROM questions q
+    WHERE q.id > :after_id AND q.id <= :upto_id
+      AND q.id NOT IN (SELECT rowid FROM {FTS_TABLE} WHERE rowid > :after_id AND rowid <= :upto_id)
+    ORDER BY q.id
+    LIMIT :batch_size
+"""
+
+
+def fts5_supported(engine: Engine) -> bool:
+    """Проверить, собран ли SQLite с модулем FTS5."""
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.connect() as conn:
+        try:
+            conn.execute(text("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)"))
+            conn.execute(text("DROP TABLE temp._fts5_probe"))
+            return True
+        except Exception:
+            return False
+
+
+def search_index_available(engine: Engine) -> bool:
+    """Есть ли в БД индекс qa_search (результат кэшируется на процесс)."""
+    key = str(engine.url)
+    if key not in _availability:
+        with engine.connect() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+            ).first()
+        _availability[key] = bool(exists)
+    return _availability[key]
+
+
+def ensure_search_index(engine: Engine, batch_size: int = BACKFILL_BATCH_SIZE) -> bool:
+    """Создать индекс и триггеры (если их нет) и догрузить в индекс существующие вопросы.
+
+    Триггеры создаются до заполнения, поэтому вопросы, появившиеся во время
+    заполнения, попадают в индекс сами. Заполнение идёт пачками по
+    ``batch_size`` вопросов, каждая в отдельной короткой транзакции, и
+    пропускает уже проиндексированные строки — прерванный процесс можно
+    просто запустить снова.
+    """
+    if not fts5_supported(engine):
+        logger.warning("SQLite собран без FTS5: поиск по вопросам работает через LIKE")
+        _availability[str(engine.url)] = False
+        return False
+
+    with engine.begin() as conn:
+        for statement in _DDL:
+            conn.execute(text(statement))
+        upto_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM questions")).scalar()
+
+    after_id, indexed = 0, 0
+    while after_id < upto_id:
+        with engine.begin() as conn:
+            batch_end = conn.execute(
+                text("SELECT max(id) FROM (SELECT id FROM questions WHERE id > :after_id ORDER BY id LIMIT :n)"),
+                {'after_id': after_id, 'n': batch_size},
+            ).scalar()
+            if batch_end is None:
+                break
+            batch_end = min(batch_end, upto_id)
+            result = conn.execute(
+                text(_BACKFILL_SQL),
+                {'after_id': after_id, 'upto_id': batch_end, 'batch_size': batch_size},
+            )
+            indexed += max(result.rowcount or 0, 0)
+        after_id = batch_end
+
+    if indexed:
+        logger.info("Индекс %s: проиндексировано вопросов: %s", FTS_TABLE, indexed)
+    _availability[str(engine.url)] = True
+    return True
+
+
+def drop_search_index(engine: Engine) -> None:
+    """Удалить индекс и триггеры (перед массовой загрузкой вопросов и ответов)."""
+    with engine.begin() as conn:
+        for source in ('questions', 'answers'):
+            for suffix in ('ai', 'au', 'ad'):
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{source}_{suffix}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+    _availability.pop(str(engine.url), None)
+
+
+def rebuild_search_index(engine: Engine, batch_size: int = BACKFILL_BATCH_SIZE) -> None:
+    """Пересоздать индекс с нуля (команда ``flask search-reindex``)."""
+    drop_search_index(engine)
+    ensure_search_index(engine, batch_size=batch_size)
+
+
+def build_match_query(search: str) -> Optional[str]:
+    """Превратить пользовательский ввод в безопасный MATCH-запрос.
+
+    Каждое слово ищется как префикс (``"слово"*``), слова объединяются по И.
+    Синтаксис FTS5 из ввода не пропускается: берутся только буквы и цифры.
+    """
+    normalized = (search or '').replace('ё', 'е').replace('Ё', 'Е')
+    tokens = _TOKEN_RE.findall(normalized)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def render_snippet(raw: Optional[str]) -> Optional[str]:
+    """HTML фрагмента из ``search_hits``: текст экранирован, совпадения — в ``<mark>``."""
+    if raw is None:
+        return None
+    return html.escape(raw).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def search_hits(match_query: str):
+    """Подзапрос (question_id, rank, snippet) по MATCH-запросу; rank — bm25, меньше — лучше.
+
+    ``snippet`` — сырой текст с маркерами совпадений; в ответ он идёт через ``render_snippet``.
+    """
+    fts = literal_column(FTS_TABLE)
+    return (
+        select(
+            qa_search.c.rowid.label('question_id'),
+            func.bm25(fts, *BM25_WEIGHTS).label('rank'),
+            func.snippet(fts, -1, _MARK_START, _MARK_END, '…', 16).label('snippet'),
+        )
+        .select_from(qa_search)
+        .where(fts.op('MATCH')(match_query))
+        .subquery('search_hits')
+    )
@@ -0,0 +1,55 @@
+"""
+Сериализация списков моделей без N+1 запросов.
+
+``User.to_dict`` по умолчанию считает счётчики прогресса через ленивую связь
+``course_progress`` — по запросу на каждого пользователя. Здесь счётчики для
+всей выборки считаются одним агрегирующим запросом с GROUP BY.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from .models import User, UserCourseProgress
+
+# До какого размера выборки агрегат ограничивается списком id.
+# Для больших выборок (полный список без пагинации) дешевле
+# один раз сгруппировать всю таблицу, чем передавать тысячи параметров.
+MAX_IDS_FILTER = 500
+
+ProgressCounters = Tuple[int, int, int]
+
+
+def user_progress_counters(session: Session, user_ids: Optional[Sequence[int]] = None) -> Dict[int, ProgressCounters]:
+    """Вернуть {user_id: (курсов начато, курсов завершено, уроков пройдено)}."""
+    stmt = (
+        select(
+            UserCourseProgress.user_id,
+            func.count(UserCourseProgress.id),
+            func.sum(case((UserCourseProgress.is_completed == True, 1), else_=0)),  # noqa: E712
+            func.coalesce(func.sum(UserCourseProgress.lessons_completed), 0),
+        )
+        .group_by(UserCourseProgress.user_id)
+    )
+    if user_ids is not None:
+        if not user_ids:
+            return {}
+        if len(user_ids) <= MAX_IDS_FILTER:
+            stmt = stmt.where(UserCourseProgress.user_id.in_(list(user_ids)))
+
+    return {
+        user_id: (int(enrolled or 0), int(completed or 0), int(lessons or 0))
+        for user_id, enrolled, completed, lessons in session.execute(stmt)
+    }
+
+
+def serialize_users(session: Session, users: Iterable[User]) -> List[dict]:
+    """Сериализовать пользователей, посчитав счётчики прогресса одним запросом."""
+    users = list(users)
+    counters = user_progress_counters(session, [user.id for user in users])
+    return [user.to_dict(progress_counters=counters.get(user.id, (0, 0, 0))) for user in users]
+
+
+def serialize_user(session: Session, user: User) -> dict:
+    return serialize_users(session, [user])[0]
@@ -10,6 +10,8 @@ import base64
 from typing import Dict, Any, Optional
 from flask import request, g, current_app
 
+from .tracing import traced
+
 
 class SimplifiedRealKerberosAuth:
     """Упрощенный класс для настоящей аутентификации через Kerberos"""
@@ -33,7 +35,8 @@ class SimplifiedRealKerberosAuth:
         self.kdc_port = app.config.get('KERBEROS_KDC_PORT', 88)
         
         # Регистрация обработчиков
-        app.before_request(self._authenticate_user)
+        from .metrics import timed_hook
+        app.before_request(timed_hook('auth')(traced('auth')(self._authenticate_user)))
         
         self.logger.info("Simplified Real Kerberos Authentication initialized")
     
@@ -168,12 +171,13 @@ class SimplifiedRealKerberosAuth:
             'hostname': self._get_hostname_by_ip(request.remote_addr)
         }
     
+    @traced('auth.role_lookup')
     def _determine_user_role(self, username: str) -> str:
         """Определение роли пользователя из БД"""
         try:
             from .models import db_manager, User
             
-            session = db_manager.get_session()
+            session = db_manager.get_read_session()
             try:
                 user = session.query(User).filter(User.username == username.lower()).first()
                 
@@ -207,6 +211,7 @@ class SimplifiedRealKerberosAuth:
             
             return 'user'
     
+    @traced('auth.reverse_dns')
     def _get_hostname_by_ip(self, ip_address: str) -> str:
         """Получение hostname по IP адресу"""
         try:
@@ -216,30 +221,35 @@ class SimplifiedRealKerberosAuth:
         except:
             return ip_address
     
+    @traced('auth.register_user')
     def _auto_register_user(self, username: str):
         """Автоматическая регистрация пользователя в БД"""
         try:
             from .models import db_manager, User
-            
+
+            # Проверка — на читающей сессии: пишущее соединение одно, и держать
+            # его на каждом запросе (включая GET) значит ждать всех писателей
+            read_session = db_manager.get_read_session()
+            try:
+                exists = read_session.query(User.id).filter(User.username == username.lower()).first() is not None
+            finally:
+                read_session.close()
+            if exists:
+                return
+
             session = db_manager.get_session()
             try:
-                existing_user = session.query(User).filter(User.username == username.lower()).first()
-                
-                if not existing_user:
-                    new_user = User(
+                if session.query(User.id).filter(User.username == username.lower()).first() is None:
+                    session.add(User(
                         username=username.lower(),
                         full_name=username,
                         department=self._get_user_department(username),
                         email=f"{username.lower()}@company.com",
                         role='user',
                         is_active=True
-                    )
-                    session.add(new_user)
+                    ))
+                    session.commit()
                     self.logger.info(f"✅ Новый пользователь зарегистрирован: {username}")
-                else:
-                    self.logger.info(f"ℹ️  Пользователь уже существует: {username}")
-                
-                session.commit()
                 
             except Exception as e:
                 session.rollback()
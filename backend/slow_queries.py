@@ -0,0 +1,267 @@
+"""
+Журнал медленных SQL-запросов.
+
+Слушатели ``before_cursor_execute`` / ``after_cursor_execute`` на движках
+``DatabaseManager`` замеряют каждое выражение. Выражения дольше
+``SLOW_QUERY_THRESHOLD_MS`` попадают в лог и в кольцевой буфер последних
+``SLOW_QUERY_LOG_SIZE`` образцов: текст, параметры (строки и двоичные
+данные заменены на тип и длину), маршрут запроса Flask и план
+``EXPLAIN QUERY PLAN``. План снимает фоновый поток через читающий движок,
+чтобы не задерживать сам запрос; для одинакового текста он берётся из кэша.
+
+Буфер смотрят администраторы: ``GET /api/admin/slow-queries`` — образцы и
+сводка по тексту выражения (много одинаковых выражений за один маршрут —
+признак цикла запросов).
+"""
+
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+PLAN_CACHE_SIZE = 256
+# Для executemany в образце сохраняются параметры первых строк
+EXECUTEMANY_SAMPLE_ROWS = 3
+
+
+def redact_parameters(parameters):
+    """Параметры без значений строк и двоичных данных: ``'<str:12>'``, ``'<bytes:1024>'``.
+
+    Числа, булевы значения и NULL остаются как есть — по ним видно, какие
+    идентификаторы запрашивались.
+    """
+    if isinstance(parameters, dict):
+        return {key: redact_parameters(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(value) for value in parameters]
+    if parameters is None or isinstance(parameters, (bool, int, float)):
+        return parameters
+    if isinstance(parameters, str):
+        return f"<str:{len(parameters)}>"
+    if isinstance(parameters, (bytes, bytearray, memoryview)):
+        return f"<bytes:{len(parameters)}>"
+    return f"<{type(parameters).__name__}>"
+
+
+def _current_route() -> Optional[str]:
+    if not has_request_context():
+        return None
+    rule = request.url_rule.rule if request.url_rule else request.path
+    return f"{request.method} {rule}"
+
+
+def _format_plan(rows) -> List[str]:
+    """Строки EXPLAIN QUERY PLAN (id, parent, notused, detail) с отступом по вложенности."""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _unused, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+@dataclass
+class SlowQuerySample:
+    """Один медленный SQL-запрос."""
+
+    id: int
+    at: str
+    duration_ms: float
+    statement: str
+    parameters: object
+    route: Optional[str]
+    executemany: int = 0
+    plan: Optional[List[str]] = None
+    plan_error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'id': self.id,
+            'at': self.at,
+            'duration_ms': round(self.duration_ms, 3),
+            'statement': self.statement,
+            'parameters': self.parameters,
+            'executemany': self.executemany,
+            'route': self.route,
+            'plan': self.plan,
+            'plan_error': self.plan_error,
+        }
+
+
+@dataclass
+class _PlanRequest:
+    sample: SlowQuerySample
+    statement: str
+    parameters: object = field(repr=False)
+
+
+class SlowQueryLog:
+    """Замер выражений движков ``manager`` и кольцевой буфер медленных.
+
+    План выполняется на ``manager.read_engine`` (соединение ``mode=ro``
+    не берёт блокировку записи), движок берётся из менеджера при каждом
+    запросе, поэтому ``DatabaseManager.configure`` поток не ломает.
+    """
+
+    def __init__(self, manager, threshold_ms: float = 0, capacity: int = 200, explain: bool = True):
+        self.manager = manager
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=max(capacity, 1))
+        self._ids = itertools.count(1)
+        self._plans: Dict[str, List[str]] = {}
+        self._queue: queue.Queue = queue.Queue(maxsize=max(capacity, 1))
+        self._thread: Optional[threading.Thread] = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.threshold_ms) and self.threshold_ms > 0
+
+    def configure(self, threshold_ms: float, capacity: int, explain: bool = True) -> None:
+        """Порог в миллисекундах (<= 0 — выключен), размер буфера, снимать ли планы."""
+        with self._lock:
+            self.threshold_ms = threshold_ms
+            self.explain = explain
+            self._plans.clear()  # могла смениться БД
+            if self._samples.maxlen != max(capacity, 1):
+                self._samples = deque(self._samples, maxlen=max(capacity, 1))
+
+    def install(self, engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    # ----------------------- Замер -----------------------
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('slow_query_started')
+        if not started:
+            return
+        duration_ms = (time.perf_counter() - started.pop()) * 1000
+        if self.enabled and duration_ms >= self.threshold_ms and not statement.lstrip().upper().startswith('EXPLAIN'):
+            self.record(statement, parameters, duration_ms, executemany, conn.dialect.name)
+
+    def record(self, statement: str, parameters, duration_ms: float,
+               executemany: bool = False, dialect: str = 'sqlite') -> SlowQuerySample:
+        rows = list(parameters or ()) if executemany else None
+        sample = SlowQuerySample(
+            id=next(self._ids),
+            at=datetime.now().isoformat(timespec='milliseconds'),
+            duration_ms=duration_ms,
+            statement=statement,
+            parameters=redact_parameters(rows[:EXECUTEMANY_SAMPLE_ROWS] if executemany else parameters),
+            route=_current_route(),
+            executemany=len(rows) if executemany else 0,
+        )
+        with self._lock:
+            self._samples.append(sample)
+        logger.warning(
+            "Медленный SQL-запрос %.1f мс [%s]: %s | параметры: %s",
+            duration_ms, sample.route or '-', " ".join(statement.split()), sample.parameters,
+        )
+        if self.explain and dialect == 'sqlite' and statement.lstrip().upper().startswith(EXPLAINABLE):
+            self._request_plan(sample, statement, rows[0] if rows else parameters)
+        return sample
+
+    # ----------------------- EXPLAIN QUERY PLAN -----------------------
+
+    def _request_plan(self, sample: SlowQuerySample, statement: str, parameters) -> None:
+        cached = self._plans.get(statement)
+        if cached is not None:
+            sample.plan = cached
+            return
+        try:
+            self._queue.put_nowait(_PlanRequest(sample, statement, parameters))
+        except queue.Full:
+            sample.plan_error = "очередь EXPLAIN переполнена"
+            return
+        self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+            self._thread.start()
+
+    def _after_fork(self) -> None:
+        """Поток не переживает fork (gunicorn --preload): очередь дочернего процесса начинается заново."""
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self._samples.maxlen)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                self.capture_plan(item)
+            except Exception as exc:
+                item.sample.plan_error = str(exc)
+                logger.debug("EXPLAIN QUERY PLAN не выполнен: %s", exc)
+            finally:
+                self._queue.task_done()
+
+    def capture_plan(self, item: _PlanRequest) -> List[str]:
+        plan = self._plans.get(item.statement)
+        if plan is None:
+            with self.manager.read_engine.connect() as conn:
+                rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {item.statement}", item.parameters or ()).all()
+            plan = _format_plan(rows)
+            if len(self._plans) >= PLAN_CACHE_SIZE:
+                self._plans.clear()
+            self._plans[item.statement] = plan
+            logger.warning("План медленного SQL-запроса #%s:\n%s", item.sample.id, "\n".join(plan))
+        item.sample.plan = plan
+        return plan
+
+    def wait(self) -> None:
+        """Дождаться планов из очереди (для тестов и бенчмарков)."""
+        self._queue.join()
+
+    # ----------------------- Просмотр -----------------------
+
+    def samples(self, limit: Optional[int] = None) -> List[SlowQuerySample]:
+        """Образцы от новых к старым."""
+        with self._lock:
+            samples = list(reversed(self._samples))
+        return samples[:limit] if limit else samples
+
+    def summary(self) -> List[Dict[str, object]]:
+        """Сводка буфера по тексту выражения: число, суммарное и максимальное время, маршруты."""
+        groups: Dict[str, Dict[str, object]] = {}
+        for sample in self.samples():
+            group = groups.setdefault(sample.statement, {
+                'statement': sample.statement, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'routes': set(),
+            })
+            group['count'] += 1
+            group['total_ms'] += sample.duration_ms
+            group['max_ms'] = max(group['max_ms'], sample.duration_ms)
+            if sample.route:
+                group['routes'].add(sample.route)
+        result = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+        for group in result:
+            group['total_ms'] = round(group['total_ms'], 3)
+            group['max_ms'] = round(group['max_ms'], 3)
+            group['routes'] = sorted(group['routes'])
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
@@ -0,0 +1,238 @@
+"""
+Профиль PRAGMA для SQLite и фоновый checkpoint журнала WAL.
+
+По умолчанию SQLite работает в режиме rollback-журнала: читатели блокируют
+фиксацию записи, а пишущие воркеры gunicorn получают «database is locked».
+``install_pragmas`` вешает на движок обработчик события ``connect``, который
+применяет профиль к каждому новому соединению пула:
+
+- ``journal_mode=WAL`` — читатели и писатель не мешают друг другу;
+- ``synchronous=NORMAL`` — в WAL безопасно (теряются лишь последние
+  транзакции при отключении питания, БД не портится), fsync только при
+  checkpoint;
+- ``busy_timeout`` — ожидание блокировки вместо немедленной ошибки;
+- ``mmap_size``, ``cache_size``, ``temp_store`` — чтение через mmap, кэш
+  страниц и временные B-деревья (сортировки) в памяти.
+
+В WAL изменения копируются в основной файл при checkpoint. Автоматический
+checkpoint (``wal_autocheckpoint``) выполняет фиксирующее соединение, и при
+постоянных читателях он не успевает дойти до конца журнала — WAL растёт.
+``WalCheckpointer`` раз в интервал делает PASSIVE checkpoint в фоновом
+потоке, а если файл журнала превысил порог — TRUNCATE (дожидается читателей
+в пределах busy_timeout и обрезает файл).
+
+WAL не работает на сетевых файловых системах: там профиль переключается на
+``SQLITE_JOURNAL_MODE=DELETE``.
+"""
+
+import logging
+import os
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Mapping, Optional
+from urllib.parse import quote
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SqlitePragmaProfile:
+    """Значения PRAGMA для каждого соединения; None — оставить как есть."""
+
+    journal_mode: Optional[str] = 'WAL'
+    synchronous: Optional[str] = 'NORMAL'
+    busy_timeout_ms: Optional[int] = 5000
+    mmap_size: Optional[int] = 256 * 1024 * 1024
+    cache_size_kib: Optional[int] = 20000
+    temp_store: Optional[str] = 'MEMORY'
+    wal_autocheckpoint: Optional[int] = 1000
+    query_only: bool = False
+
+    def for_reader(self) -> 'SqlitePragmaProfile':
+        """Профиль соединений только для чтения: без смены журнала, с query_only."""
+        return replace(self, journal_mode=None, wal_autocheckpoint=None, query_only=True)
+
+    @classmethod
+    def legacy(cls) -> 'SqlitePragmaProfile':
+        """Настройки SQLite по умолчанию (для сравнения в бенчмарках)."""
+        return cls(journal_mode=None, synchronous=None, busy_timeout_ms=None, mmap_size=None,
+                   cache_size_kib=None, temp_store=None, wal_autocheckpoint=None)
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> 'SqlitePragmaProfile':
+        """Профиль из ключей SQLITE_* конфигурации (отсутствующие — по умолчанию)."""
+        defaults = cls()
+        overrides = {}
+        for name, key, cast in _CONFIG_KEYS:
+            value = config.get(key)
+            if value is not None:
+                overrides[name] = cast(value) if value != '' else None
+        return replace(defaults, **overrides)
+
+    def statements(self):
+        """PRAGMA-выражения профиля в порядке применения."""
+        if self.journal_mode:
+            yield f"PRAGMA journal_mode={_identifier(self.journal_mode)}"
+        if self.synchronous:
+            yield f"PRAGMA synchronous={_identifier(self.synchronous)}"
+        if self.busy_timeout_ms is not None:
+            yield f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}"
+        if self.mmap_size is not None:
+            yield f"PRAGMA mmap_size={int(self.mmap_size)}"
+        if self.cache_size_kib is not None:
+            # Отрицательное значение — размер в КиБ, а не в страницах
+            yield f"PRAGMA cache_size={-int(self.cache_size_kib)}"
+        if self.temp_store:
+            yield f"PRAGMA temp_store={_identifier(self.temp_store)}"
+        if self.wal_autocheckpoint is not None:
+            yield f"PRAGMA wal_autocheckpoint={int(self.wal_autocheckpoint)}"
+        if self.query_only:
+            yield "PRAGMA query_only=1"
+
+
+_CONFIG_KEYS = (
+    ('journal_mode', 'SQLITE_JOURNAL_MODE', str),
+    ('synchronous', 'SQLITE_SYNCHRONOUS', str),
+    ('busy_timeout_ms', 'SQLITE_BUSY_TIMEOUT_MS', int),
+    ('mmap_size', 'SQLITE_MMAP_SIZE', int),
+    ('cache_size_kib', 'SQLITE_CACHE_SIZE_KIB', int),
+    ('temp_store', 'SQLITE_TEMP_STORE', str),
+    ('wal_autocheckpoint', 'SQLITE_WAL_AUTOCHECKPOINT', int),
+)
+
+
+def _identifier(value: str) -> str:
+    if not value.isalnum():
+        raise ValueError(f"Недопустимое значение PRAGMA: {value!r}")
+    return value.upper()
+
+
+def sqlite_file_path(database_url: str) -> Optional[str]:
+    """Путь к файлу БД для sqlite:///…; None для других СУБД и БД в памяти."""
+    url = make_url(database_url)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        return None
+    return url.database
+
+
+def read_only_url(database_url: str) -> Optional[str]:
+    """URL того же файла SQLite, открытого только на чтение (``mode=ro``)."""
+    path = sqlite_file_path(database_url)
+    if path is None:
+        return None
+    uri_path = quote(os.path.abspath(path).replace(os.sep, '/'))
+    if not uri_path.startswith('/'):
+        uri_path = '/' + uri_path  # диск Windows: file:/C:/…
+    url = make_url(database_url).set(database=f"file:{uri_path}?mode=ro", query={'uri': 'true'})
+    return url.render_as_string(hide_password=False)
+
+
+def install_pragmas(engine: Engine, profile: SqlitePragmaProfile) -> None:
+    """Применять профиль к каждому новому соединению движка (только файловый SQLite)."""
+    if sqlite_file_path(str(engine.url)) is None:
+        return
+    statements = list(profile.statements())
+    if not statements:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+                cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+# ----------------------- Checkpoint -----------------------
+
+class WalCheckpointer:
+    """Фоновый поток checkpoint'ов WAL для движка ``manager.engine``.
+
+    Движок берётся из менеджера на каждом шаге, поэтому переключение БД
+    через ``DatabaseManager.configure`` поток не ломает.
+    """
+
+    def __init__(self, manager, interval: float, truncate_bytes: int):
+        self.manager = manager
+        self.interval = interval
+        self.truncate_bytes = truncate_bytes
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_result = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sqlite-wal-checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def restart_after_fork(self) -> None:
+        """Потоки не переживают fork (gunicorn --preload): запустить заново в дочернем процессе."""
+        if self._thread is not None:
+            self._thread = None
+            self._stop = threading.Event()
+            self.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception:
+                logger.exception("Ошибка checkpoint журнала WAL")
+
+    def checkpoint(self):
+        """Один шаг политики: PASSIVE, а при большом WAL — TRUNCATE.
+
+        Возвращает строку ``(busy, log_pages, checkpointed_pages)`` от SQLite
+        или None, если БД не в файле.
+        """
+        engine = self.manager.engine
+        path = sqlite_file_path(str(engine.url))
+        if path is None:
+            return None
+        mode = 'PASSIVE'
+        try:
+            if os.path.getsize(f"{path}-wal") > self.truncate_bytes:
+                mode = 'TRUNCATE'
+        except OSError:
+            # Файла журнала нет: БД не в режиме WAL или ещё не было записей
+            return None
+        with engine.connect() as conn:
+            result = tuple(conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one())
+        busy, log_pages, checkpointed = result
+        if mode == 'TRUNCATE' and busy:
+            logger.warning("WAL не обрезан: журнал занят читателями (%s страниц)", log_pages)
+        logger.debug("wal_checkpoint(%s): %s", mode, result)
+        self.last_result = (mode, result)
+        return result
+
+
+_checkpointer: Optional[WalCheckpointer] = None
+
+
+def start_wal_checkpointer(manager, interval: float, truncate_bytes: int) -> Optional[WalCheckpointer]:
+    """Запустить фоновый checkpoint (один на процесс); interval <= 0 — выключен."""
+    global _checkpointer
+    if interval <= 0:
+        return None
+    if _checkpointer is None:
+        _checkpointer = WalCheckpointer(manager, interval, truncate_bytes)
+        os.register_at_fork(after_in_child=_checkpointer.restart_after_fork)
+    else:
+        _checkpointer.interval = interval
+        _checkpointer.truncate_bytes = truncate_bytes
+    _checkpointer.start()
+    return _checkpointer
@@ -0,0 +1,122 @@
+"""
+Агрегированная статистика для /api/statistics.
+
+``read_statistics`` читает материализованные счётчики (department_stats,
+course_stats — см. stats_counters.py). ``compute_statistics`` считает те же
+показатели фиксированным числом GROUP BY-запросов по сырым таблицам и служит
+эталоном для проверки счётчиков.
+"""
+
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from .models import Course, CourseStats, DepartmentStats, User, UserCourseProgress
+
+
+def _completion_rate(completed: int, enrolled: int) -> float:
+    return round((completed / enrolled * 100) if enrolled > 0 else 0, 2)
+
+
+def compute_statistics(session: Session) -> Dict[str, Any]:
+    """Собрать ответ /api/statistics тремя запросами."""
+    total_users, active_users = session.execute(
+        select(
+            func.count(User.id),
+            func.coalesce(func.sum(case((User.is_active == True, 1), else_=0)), 0),  # noqa: E712
+        )
+    ).one()
+
+    departments_stats: List[Dict[str, Any]] = [
+        {'department': department, 'users_count': users_count}
+        for department, users_count in session.execute(
+            select(User.department, func.count(User.id))
+            .where(User.department.isnot(None), User.department != '')
+            .group_by(User.department)
+            .order_by(User.department)
+        )
+    ]
+
+    course_rows = session.execute(
+        select(
+            Course.id,
+            Course.title,
+            Course.total_lessons,
+            func.count(UserCourseProgress.id),
+            func.coalesce(func.sum(case((UserCourseProgress.is_completed == True, 1), else_=0)), 0),  # noqa: E712
+        )
+        .outerjoin(UserCourseProgress, UserCourseProgress.course_id == Course.id)
+        .where(Course.is_active == True)  # noqa: E712
+        .group_by(Course.id)
+        .order_by(Course.id)
+    ).all()
+
+    courses_stats = [
+        {
+            'course_id': course_id,
+            'course_title': title,
+            'total_lessons': total_lessons,
+            'enrolled_users': enrolled,
+            'completed_users': completed,
+            'completion_rate': _completion_rate(completed, enrolled),
+        }
+        for course_id, title, total_lessons, enrolled, completed in course_rows
+    ]
+
+    return {
+        'overview': {
+            'total_users': total_users,
+            'active_users': active_users,
+            'total_courses': len(courses_stats),
+        },
+        'departments': departments_stats,
+        'courses': courses_stats,
+    }
+
+
+def read_statistics(session: Session) -> Dict[str, Any]:
+    """Собрать ответ /api/statistics из таблиц счётчиков (два запроса)."""
+    departments = session.execute(select(DepartmentStats).order_by(DepartmentStats.department)).scalars().all()
+
+    course_rows = session.execute(
+        select(Course.id, Course.title, Course.total_lessons, CourseStats.enrolled_users, CourseStats.completed_users)
+        .outerjoin(CourseStats, CourseStats.course_id == Course.id)
+        .where(Course.is_active == True)  # noqa: E712
+        .order_by(Course.id)
+    ).all()
+
+    courses_stats = []
+    for course_id, title, total_lessons, enrolled, completed in course_rows:
+        enrolled, completed = enrolled or 0, completed or 0
+        courses_stats.append({
+            'course_id': course_id,
+            'course_title': title,
+            'total_lessons': total_lessons,
+            'enrolled_users': enrolled,
+            'completed_users': completed,
+            'completion_rate': _completion_rate(completed, enrolled),
+        })
+
+    return {
+        'overview': {
+            'total_users': sum(d.users_count for d in departments),
+            'active_users': sum(d.active_users for d in departments),
+            'total_courses': len(courses_stats),
+        },
+        'departments': [
+            {'department': d.department, 'users_count': d.users_count}
+            for d in departments
+            if d.department and d.users_count > 0
+        ],
+        'courses': courses_stats,
+    }
+
+
+def course_stats_map(session: Session, course_ids: Iterable[int]) -> Dict[int, CourseStats]:
+    """Счётчики для набора курсов одним запросом: {course_id: CourseStats}."""
+    course_ids = list(set(course_ids))
+    if not course_ids:
+        return {}
+    rows = session.execute(select(CourseStats).where(CourseStats.course_id.in_(course_ids))).scalars()
+    return {row.course_id: row for row in rows}
@@ -0,0 +1,278 @@
+"""
+Инкрементально поддерживаемые счётчики статистики.
+
+Таблицы ``department_stats`` и ``course_stats`` обновляются в событии сессии
+``after_flush`` в той же транзакции, что и изменения ``users``,
+``user_course_progress`` и ``courses``. Поэтому /api/statistics читает готовые
+значения, а не пересчитывает их по сырым строкам.
+
+Изменения в обход ORM-сессии (Core UPDATE/INSERT, executemany, ручной SQL)
+счётчики не видят: после них нужно вызвать ``rebuild_counters`` (команда
+``flask stats-rebuild``) или точечно ``rebuild_course_counters`` /
+``rebuild_department_counters``.
+Расхождения показывает ``check_counters`` (``flask stats-check``).
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, event, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, attributes
+
+from .models import Course, CourseStats, DepartmentStats, User, UserCourseProgress
+
+# Атрибуты, от которых зависят счётчики. Для них включается active_history,
+# чтобы при изменении выгруженного (expired) объекта старое значение
+# подгружалось и попадало в историю атрибута.
+_TRACKED_ATTRIBUTES = (
+    User.department,
+    User.is_active,
+    UserCourseProgress.course_id,
+    UserCourseProgress.is_completed,
+    UserCourseProgress.lessons_completed,
+)
+
+_installed_targets = set()
+
+
+def _noop_set(target, value, oldvalue, initiator):
+    return value
+
+
+def install_counter_events(session_factory) -> None:
+    """Подключить поддержку счётчиков к фабрике сессий (идемпотентно)."""
+    if not _installed_targets:
+        for attribute in _TRACKED_ATTRIBUTES:
+            event.listen(attribute, 'set', _noop_set, active_history=True, retval=True)
+    if id(session_factory) in _installed_targets:
+        return
+    event.listen(session_factory, 'after_flush', _after_flush)
+    _installed_targets.add(id(session_factory))
+
+
+def _old_value(obj, name: str):
+    """Значение атрибута до текущего flush (для изменённых объектов)."""
+    history = attributes.get_history(obj, name)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, name)
+
+
+def _user_counts(department, is_active) -> Tuple[Optional[str], int, int]:
+    return department, 1, 1 if is_active else 0
+
+
+def _progress_counts(course_id, is_completed, lessons_completed) -> Tuple[Optional[int], int, int, int]:
+    return course_id, 1, 1 if is_completed else 0, lessons_completed or 0
+
+
+def _after_flush(session: Session, flush_context) -> None:
+    departments: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    courses: Dict[int, List[int]] = defaultdict(lambda: [0, 0, 0])
+    created_courses, deleted_courses = set(), set()
+
+    def add_user(counts, sign):
+        department, users, active = counts
+        if department is None:
+            return
+        departments[department][0] += sign * users
+        departments[department][1] += sign * active
+
+    def add_progress(counts, sign):
+        course_id, enrolled, completed, lessons = counts
+        if course_id is None:
+            return
+        totals = courses[course_id]
+        totals[0] += sign * enrolled
+        totals[1] += sign * completed
+        totals[2] += sign * lessons
+
+    for obj in session.new:
+        if isinstance(obj, User):
+            add_user(_user_counts(obj.department, obj.is_active), 1)
+        elif isinstance(obj, UserCourseProgress):
+            add_progress(_progress_counts(obj.course_id, obj.is_completed, obj.lessons_completed), 1)
+        elif isinstance(obj, Course):
+            created_courses.add(obj.id)
+
+    for obj in session.dirty:
+        if isinstance(obj, User) and session.is_modified(obj):
+            add_user(_user_counts(_old_value(obj, 'department'), _old_value(obj, 'is_active')), -1)
+            add_user(_user_counts(obj.department, obj.is_active), 1)
+        elif isinstance(obj, UserCourseProgress) and session.is_modified(obj):
+            add_progress(_progress_counts(_old_value(obj, 'course_id'), _old_value(obj, 'is_completed'),
+                                          _old_value(obj, 'lessons_completed')), -1)
+            add_progress(_progress_counts(obj.course_id, obj.is_completed, obj.lessons_completed), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            add_user(_user_counts(_old_value(obj, 'department'), _old_value(obj, 'is_active')), -1)
+        elif isinstance(obj, UserCourseProgress):
+            add_progress(_progress_counts(_old_value(obj, 'course_id'), _old_value(obj, 'is_completed'),
+                                          _old_value(obj, 'lessons_completed')), -1)
+        elif isinstance(obj, Course):
+            deleted_courses.add(obj.id)
+
+    if not (departments or courses or created_courses or deleted_courses):
+        return
+
+    connection = session.connection()
+    for department, (users, active) in departments.items():
+        if users or active:
+            _apply_department_delta(connection, department, users, active)
+    for course_id in created_courses:
+        courses.setdefault(course_id, [0, 0, 0])
+    for course_id, (enrolled, completed, lessons) in courses.items():
+        if course_id not in deleted_courses:
+            _apply_course_delta(connection, course_id, enrolled, completed, lessons)
+    if deleted_courses:
+        connection.execute(delete(CourseStats).where(CourseStats.course_id.in_(deleted_courses)))
+
+
+def _apply_department_delta(connection, department: str, users: int, active: int) -> None:
+    stmt = sqlite_insert(DepartmentStats).values(department=department, users_count=users, active_users=active)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DepartmentStats.department],
+        set_={
+            'users_count': DepartmentStats.users_count + stmt.excluded.users_count,
+            'active_users': DepartmentStats.active_users + stmt.excluded.active_users,
+        },
+    )
+    connection.execute(stmt)
+
+
+def _apply_course_delta(connection, course_id: int, enrolled: int, completed: int, lessons: int) -> None:
+    stmt = sqlite_insert(CourseStats).values(
+        course_id=course_id, enrolled_users=enrolled, completed_users=completed, lessons_completed_sum=lessons,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CourseStats.course_id],
+        set_={
+            'enrolled_users': CourseStats.enrolled_users + stmt.excluded.enrolled_users,
+            'completed_users': CourseStats.completed_users + stmt.excluded.completed_users,
+            'lessons_completed_sum': CourseStats.lessons_completed_sum + stmt.excluded.lessons_completed_sum,
+        },
+    )
+    connection.execute(stmt)
+
+
+# ----------------------- Пересборка и проверка -----------------------
+
+def _department_source(departments: Optional[Iterable[str]] = None):
+    stmt = (
+        select(
+            User.department,
+            func.count(User.id),
+            func.coalesce(func.sum(case((User.is_active == True, 1), else_=0)), 0),  # noqa: E712
+        )
+        .where(User.department.isnot(None))
+        .group_by(User.department)
+    )
+    if departments is not None:
+        stmt = stmt.where(User.department.in_(list(departments)))
+    return stmt
+
+
+def _course_source(course_ids: Optional[Iterable[int]] = None):
+    stmt = (
+        select(
+            Course.id,
+            func.count(UserCourseProgress.id),
+            func.coalesce(func.sum(case((UserCourseProgress.is_completed == True, 1), else_=0)), 0),  # noqa: E712
+            func.coalesce(func.sum(UserCourseProgress.lessons_completed), 0),
+        )
+        .outerjoin(UserCourseProgress, UserCourseProgress.course_id == Course.id)
+        .group_by(Course.id)
+    )
+    if course_ids is not None:
+        stmt = stmt.where(Course.id.in_(list(course_ids)))
+    return stmt
+
+
+def counters_are_empty(session: Session) -> bool:
+    has_departments = session.execute(select(DepartmentStats.department).limit(1)).first()
+    has_courses = session.execute(select(CourseStats.course_id).limit(1)).first()
+    return not has_departments and not has_courses
+
+
+def rebuild_counters(session: Session) -> None:
+    """Полностью пересчитать счётчики по сырым таблицам (в текущей транзакции)."""
+    rebuild_department_counters(session)
+    rebuild_course_counters(session)
+
+
+def rebuild_department_counters(session: Session, departments: Optional[Iterable[str]] = None) -> None:
+    """Пересчитать счётчики отделов (всех или перечисленных).
+
+    Используется после массовых изменений users в обход ORM.
+    """
+    if departments is not None:
+        departments = [department for department in departments if department is not None]
+        if not departments:
+            return
+        session.execute(delete(DepartmentStats).where(DepartmentStats.department.in_(departments)))
+    else:
+        session.execute(delete(DepartmentStats))
+    session.execute(
+        insert(DepartmentStats).from_select(
+            ['department', 'users_count', 'active_users'], _department_source(departments),
+        )
+    )
+
+
+def rebuild_course_counters(session: Session, course_ids: Optional[Iterable[int]] = None) -> None:
+    """Пересчитать счётчики курсов (всех или перечисленных).
+
+    Используется после массовых изменений прогресса в обход ORM.
+    """
+    if course_ids is not None:
+        course_ids = list(course_ids)
+        if not course_ids:
+            return
+        session.execute(delete(CourseStats).where(CourseStats.course_id.in_(course_ids)))
+    else:
+        session.execute(delete(CourseStats))
+    session.execute(
+        insert(CourseStats).from_select(
+            ['course_id', 'enrolled_users', 'completed_users', 'lessons_completed_sum'],
+            _course_source(course_ids),
+        )
+    )
+
+
+def check_counters(session: Session) -> List[str]:
+    """Сравнить счётчики с сырыми данными; вернуть список расхождений."""
+    problems: List[str] = []
+
+    expected_departments = {dept: (users, active) for dept, users, active in session.execute(_department_source())}
+    stored_departments = {
+        row.department: (row.users_count, row.active_users)
+        for row in session.execute(select(DepartmentStats)).scalars()
+    }
+    for department in sorted(set(expected_departments) | set(stored_departments)):
+        expected = expected_departments.get(department, (0, 0))
+        stored = stored_departments.get(department, (0, 0))
+        if expected != stored:
+            problems.append(f"отдел '{department}': ожидалось {expected}, в счётчиках {stored}")
+
+    expected_courses = {
+        course_id: (enrolled, completed, lessons)
+        for course_id, enrolled, completed, lessons in session.execute(_course_source())
+    }
+    stored_courses = {
+        row.course_id: (row.enrolled_users, row.completed_users, row.lessons_completed_sum)
+        for row in session.execute(select(CourseStats)).scalars()
+    }
+    for course_id in sorted(set(expected_courses) | set(stored_courses)):
+        if course_id not in stored_courses:
+            problems.append(f"курс {course_id}: нет строки в course_stats")
+        elif course_id not in expected_courses:
+            problems.append(f"курс {course_id}: строка в course_stats для несуществующего курса")
+        elif expected_courses[course_id] != stored_courses[course_id]:
+            problems.append(
+                f"курс {course_id}: ожидалось {expected_courses[course_id]}, в счётчиках {stored_courses[course_id]}"
+            )
+    return problems
@@ -0,0 +1,433 @@
+"""
+Генератор синтетических данных для нагрузочного тестирования.
+
+Заполняет БД детерминированно (одинаковый ``seed`` — одинаковые данные)
+объёмами из ``SyntheticVolumes``: пользователи по отделам с русскими ФИО,
+курсы, уроки с объёмным ``content``, прогресс по урокам и сводки по курсам,
+вопросы с ответами и вложениями (только строки в БД, без файлов).
+
+Загрузка рассчитана на миллионы строк:
+
+- строки генерируются потоком и вставляются ``executemany`` напрямую через
+  DB-API, минуя ORM;
+- вторичные индексы загружаемых таблиц, а также FTS-индекс вопросов с его
+  триггерами удаляются до загрузки и строятся один раз после неё;
+- на время загрузки соединение работает с ``synchronous=OFF``.
+
+Сводки ``user_course_progress`` согласованы с отметками уроков, счётчики
+статистики и поисковый индекс пересобираются в конце. Команда:
+``flask synthetic-data``.
+"""
+
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .models import Base
+
+logger = logging.getLogger(__name__)
+
+INSERT_CHUNK = 50_000
+
+# Таблицы в порядке загрузки (очистка — в обратном порядке)
+TABLES = (
+    'users', 'courses', 'lessons', 'user_course_progress', 'user_lesson_progress',
+    'questions', 'answers', 'question_attachments', 'answer_attachments',
+)
+
+# (мужская форма, женская форма)
+SURNAMES = [
+    ('Иванов', 'Иванова'), ('Смирнов', 'Смирнова'), ('Кузнецов', 'Кузнецова'), ('Попов', 'Попова'),
+    ('Васильев', 'Васильева'), ('Петров', 'Петрова'), ('Соколов', 'Соколова'), ('Михайлов', 'Михайлова'),
+    ('Новиков', 'Новикова'), ('Фёдоров', 'Фёдорова'), ('Морозов', 'Морозова'), ('Волков', 'Волкова'),
+    ('Алексеев', 'Алексеева'), ('Лебедев', 'Лебедева'), ('Семёнов', 'Семёнова'), ('Егоров', 'Егорова'),
+    ('Павлов', 'Павлова'), ('Козлов', 'Козлова'), ('Степанов', 'Степанова'), ('Николаев', 'Николаева'),
+    ('Орлов', 'Орлова'), ('Андреев', 'Андреева'), ('Макаров', 'Макарова'), ('Никитин', 'Никитина'),
+    ('Захаров', 'Захарова'), ('Зайцев', 'Зайцева'), ('Соловьёв', 'Соловьёва'), ('Борисов', 'Борисова'),
+    ('Яковлев', 'Яковлева'), ('Григорьев', 'Григорьева'), ('Романов', 'Романова'), ('Воробьёв', 'Воробьёва'),
+    ('Сергеев', 'Сергеева'), ('Кузьмин', 'Кузьмина'), ('Фролов', 'Фролова'), ('Александров', 'Александрова'),
+    ('Дмитриев', 'Дмитриева'), ('Королёв', 'Королёва'), ('Гусев', 'Гусева'), ('Киселёв', 'Киселёва'),
+    ('Ильин', 'Ильина'), ('Максимов', 'Максимова'), ('Поляков', 'Полякова'), ('Сорокин', 'Сорокина'),
+    ('Виноградов', 'Виноградова'), ('Ковалёв', 'Ковалёва'), ('Белов', 'Белова'), ('Медведев', 'Медведева'),
+    ('Антонов', 'Антонова'), ('Тарасов', 'Тарасова'), ('Жуков', 'Жукова'), ('Баранов', 'Баранова'),
+]
+MALE_NAMES = [
+    'Александр', 'Алексей', 'Андрей', 'Антон', 'Артём', 'Борис', 'Вадим', 'Василий', 'Виктор', 'Владимир',
+    'Дмитрий', 'Евгений', 'Егор', 'Иван', 'Игорь', 'Илья', 'Кирилл', 'Константин', 'Максим', 'Михаил',
+    'Никита', 'Николай', 'Олег', 'Павел', 'Роман', 'Сергей', 'Степан', 'Тимур', 'Фёдор', 'Юрий',
+]
+FEMALE_NAMES = [
+    'Александра', 'Алина', 'Анастасия', 'Анна', 'Валентина', 'Валерия', 'Вера', 'Виктория', 'Галина', 'Дарья',
+    'Евгения', 'Екатерина', 'Елена', 'Ирина', 'Ксения', 'Лариса', 'Людмила', 'Марина', 'Мария', 'Надежда',
+    'Наталья', 'Нина', 'Оксана', 'Ольга', 'Полина', 'Светлана', 'София', 'Татьяна', 'Юлия', 'Яна',
+]
+# (мужское отчество, женское отчество)
+PATRONYMICS = [
+    ('Александрович', 'Александровна'), ('Алексеевич', 'Алексеевна'), ('Андреевич', 'Андреевна'),
+    ('Борисович', 'Борисовна'), ('Васильевич', 'Васильевна'), ('Викторович', 'Викторовна'),
+    ('Владимирович', 'Владимировна'), ('Дмитриевич', 'Дмитриевна'), ('Евгеньевич', 'Евгеньевна'),
+    ('Иванович', 'Ивановна'), ('Игоревич', 'Игоревна'), ('Михайлович', 'Михайловна'),
+    ('Николаевич', 'Николаевна'), ('Олегович', 'Олеговна'), ('Павлович', 'Павловна'),
+    ('Петрович', 'Петровна'), ('Сергеевич', 'Сергеевна'), ('Юрьевич', 'Юрьевна'),
+]
+DEPARTMENTS = [
+    'Бухгалтерия', 'Отдел кадров', 'Отдел продаж', 'Отдел закупок', 'Юридический отдел',
+    'Служба информационной безопасности', 'Отдел информационных технологий', 'Отдел маркетинга',
+    'Финансовый отдел', 'Логистика', 'Служба качества', 'Отдел обучения', 'Канцелярия',
+    'Отдел по работе с клиентами', 'Производственный отдел', 'Планово-экономический отдел',
+    'Административно-хозяйственный отдел', 'Отдел аналитики', 'Отдел разработки', 'Служба поддержки',
+]
+POSITIONS = [
+    'Специалист', 'Ведущий специалист', 'Главный специалист', 'Инженер', 'Ведущий инженер',
+    'Аналитик', 'Менеджер', 'Старший менеджер', 'Руководитель группы', 'Начальник отдела',
+    'Бухгалтер', 'Экономист', 'Юрисконсульт', 'Оператор', 'Администратор',
+]
+COURSE_TOPICS = [
+    'Основы информационной безопасности', 'Работа с корпоративными системами', 'Управление проектами',
+    'Клиентский сервис', 'Деловая переписка', 'Охрана труда', 'Противодействие коррупции',
+    'Защита персональных данных', 'Эффективные переговоры', 'Тайм-менеджмент', 'Финансовая грамотность',
+    'Работа с электронным документооборотом', 'Основы бережливого производства', 'Наставничество',
+]
+LESSON_TOPICS = [
+    'Введение', 'Основные понятия', 'Нормативная база', 'Практические примеры', 'Типичные ошибки',
+    'Инструменты', 'Разбор кейсов', 'Взаимодействие с коллегами', 'Контроль и отчётность', 'Итоговый тест',
+]
+QUESTION_TEMPLATES = [
+    'Как пройти урок «{topic}» курса «{course}»?',
+    'Не засчитывается урок «{topic}»',
+    'Где найти материалы к курсу «{course}»?',
+    'Ошибка при открытии урока «{topic}»',
+    'Можно ли пройти курс «{course}» повторно?',
+    'Вопрос по теме «{topic}»',
+]
+ANSWER_TEXTS = [
+    'Обновите страницу и попробуйте ещё раз — прогресс сохраняется автоматически.',
+    'Материалы доступны в разделе курса, ссылка в описании первого урока.',
+    'Проблема известна, исправление выйдет на этой неделе.',
+    'Уточните, пожалуйста, в каком браузере возникает ошибка.',
+    'Повторное прохождение возможно, прогресс при этом не сбрасывается.',
+    'Спасибо, помогло!',
+]
+ATTACHMENTS = [
+    ('скриншот.png', 'image/png'), ('ошибка.jpg', 'image/jpeg'), ('отчёт.pdf', 'application/pdf'),
+    ('инструкция.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    ('данные.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+]
+LOREM = (
+    'В этом уроке рассматриваются правила работы с корпоративными ресурсами, порядок согласования '
+    'документов и ответственность сотрудников. Разобраны типовые ситуации, приведены примеры из '
+    'практики и даны рекомендации по предотвращению нарушений. '
+)
+
+_TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y',
+    'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+
+
+@dataclass(frozen=True)
+class SyntheticVolumes:
+    """Объёмы данных; по умолчанию — около 5 млн отметок уроков."""
+
+    users: int = 50_000
+    departments: int = 40
+    courses: int = 200
+    lessons_per_course: int = 25
+    courses_per_user: int = 8
+    # Средняя доля пройденных уроков в начатом курсе
+    completion: float = 0.5
+    questions: int = 20_000
+    answers_per_question: int = 3
+    attachment_ratio: float = 0.1
+    lesson_content_bytes: int = 8_000
+
+
+def transliterate(value: str) -> str:
+    return value.lower().translate(_TRANSLIT)
+
+
+def _department_names(count: int) -> List[str]:
+    names = []
+    for i in range(count):
+        base = DEPARTMENTS[i % len(DEPARTMENTS)]
+        names.append(base if i < len(DEPARTMENTS) else f"{base} №{i // len(DEPARTMENTS) + 1}")
+    return names
+
+
+def _timestamps(rng: random.Random, count: int = 4096, days: int = 365) -> List[str]:
+    """Пул меток времени за последний ``days`` день: строка на каждую строку таблицы — слишком дорого."""
+    now = datetime(2026, 1, 1)
+    return sorted(
+        (now - timedelta(seconds=rng.randrange(days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+        for _ in range(count)
+    )
+
+
+class _Generator:
+    def __init__(self, volumes: SyntheticVolumes, seed: int):
+        self.v = volumes
+        self.rng = random.Random(seed)
+        self.stamps = _timestamps(self.rng)
+        self.departments = _department_names(volumes.departments)
+        # (курс, число пройденных уроков) для каждого пользователя; id пользователя = индекс + 1
+        self.enrollments: List[List[Tuple[int, int]]] = []
+        self.answer_count = 0
+
+    def stamp(self, key: int) -> str:
+        return self.stamps[key % len(self.stamps)]
+
+    def users(self) -> Iterator[tuple]:
+        rng, v = self.rng, self.v
+        for user_id in range(1, v.users + 1):
+            female = rng.random() < 0.5
+            surname = rng.choice(SURNAMES)[female]
+            first = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+            patronymic = rng.choice(PATRONYMICS)[female]
+            username = f"{transliterate(surname)}.{transliterate(first)[0]}{user_id}"
+            created = self.stamp(user_id)
+            yield (
+                user_id, username, f"{surname} {first} {patronymic}", surname, first, patronymic,
+                f"{username}@CORP.LOCAL", 'CORP.LOCAL', self.departments[rng.randrange(v.departments)],
+                rng.choice(POSITIONS), f"{username}@company.com", 'admin' if user_id == 1 else 'user',
+                rng.random() >= 0.03, created, created,
+            )
+
+    def courses(self) -> Iterator[tuple]:
+        v = self.v
+        for course_id in range(1, v.courses + 1):
+            topic = COURSE_TOPICS[(course_id - 1) % len(COURSE_TOPICS)]
+            part = (course_id - 1) // len(COURSE_TOPICS) + 1
+            title = topic if part == 1 else f"{topic}. Часть {part}"
+            yield (
+                course_id, title, f"Курс «{title}» для сотрудников всех подразделений", v.lessons_per_course,
+                course_id % 20 != 0, self.stamp(course_id), self.stamp(course_id),
+            )
+
+    def lessons(self) -> Iterator[tuple]:
+        v = self.v
+        repeats = v.lesson_content_bytes // len(LOREM.encode()) + 1
+        # Несколько вариантов текста: одинаковый content у всех уроков сжимался бы нереалистично
+        contents = [
+            ''.join(f"{i + 1}. {LOREM}" for i in range(variant, variant + repeats))
+            for variant in range(16)
+        ]
+        lesson_id = 0
+        for course_id in range(1, v.courses + 1):
+            for number in range(1, v.lessons_per_course + 1):
+                lesson_id += 1
+                topic = LESSON_TOPICS[(number - 1) % len(LESSON_TOPICS)]
+                yield (
+                    lesson_id, course_id, f"{number}. {topic}", f"Урок {number} курса {course_id}", number,
+                    contents[lesson_id % len(contents)], True, self.stamp(lesson_id), self.stamp(lesson_id),
+                )
+
+    def plan_enrollments(self) -> None:
+        rng, v = self.rng, self.v
+        per_user = min(v.courses_per_user, v.courses)
+        spread = 2 * v.completion * v.lessons_per_course + 1
+        for _ in range(v.users):
+            courses = sorted(rng.sample(range(1, v.courses + 1), per_user))
+            self.enrollments.append([(c, min(v.lessons_per_course, int(rng.random() * spread))) for c in courses])
+
+    def course_progress(self) -> Iterator[tuple]:
+        total = self.v.lessons_per_course
+        for user_id, courses in enumerate(self.enrollments, start=1):
+            for course_id, done in courses:
+                started = self.stamp(user_id + course_id)
+                finished = self.stamp(user_id + course_id + 1) if done == total else None
+                yield (user_id, course_id, done, done == total, started, finished, started)
+
+    def lesson_progress(self) -> Iterator[tuple]:
+        total = self.v.lessons_per_course
+        stamps, size = self.stamps, len(self.stamps)
+        for user_id, courses in enumerate(self.enrollments, start=1):
+            for course_id, done in courses:
+                first_lesson = (course_id - 1) * total
+                for lesson_id in range(first_lesson + 1, first_lesson + done + 1):
+                    stamp = stamps[(user_id + lesson_id) % size]
+                    yield (user_id, lesson_id, True, stamp, stamp, stamp)
+
+    def questions(self) -> Iterator[tuple]:
+        rng, v = self.rng, self.v
+        for question_id in range(1, v.questions + 1):
+            course_id = rng.randint(1, v.courses)
+            course = COURSE_TOPICS[(course_id - 1) % len(COURSE_TOPICS)]
+            topic = rng.choice(LESSON_TOPICS)
+            title = rng.choice(QUESTION_TEMPLATES).format(course=course, topic=topic)
+            created = self.stamp(question_id * 7)
+            yield (
+                question_id, rng.randint(1, v.users), title,
+                f"{title}\n\nПодробности: курс №{course_id}, урок «{topic}». {LOREM}",
+                f"курс-{course_id},{transliterate(topic)}", rng.random() < 0.4, created, created,
+            )
+
+    def answers(self) -> Iterator[tuple]:
+        rng, v = self.rng, self.v
+        answer_id = 0
+        for question_id in range(1, v.questions + 1):
+            for _ in range(int(rng.random() * (2 * v.answers_per_question + 1))):
+                answer_id += 1
+                stamp = self.stamp(question_id * 7 + answer_id)
+                yield answer_id, question_id, rng.randint(1, v.users), rng.choice(ANSWER_TEXTS), stamp, stamp
+        self.answer_count = answer_id
+
+    def attachments(self, parents: int, prefix: str) -> Iterator[tuple]:
+        rng = self.rng
+        for parent_id in range(1, parents + 1):
+            if rng.random() < self.v.attachment_ratio:
+                original, mime = rng.choice(ATTACHMENTS)
+                extension = original.rsplit('.', 1)[1]
+                stored = f"{prefix}{parent_id}_{rng.getrandbits(64):016x}.{extension}"
+                yield parent_id, stored, original, mime, rng.randint(10_000, 5_000_000), self.stamp(parent_id)
+
+
+_INSERTS = {
+    'users': "INSERT INTO users (id, username, full_name, surname, fst_name, sec_name, principal, realm, "
+             "department, position, email, role, is_active, created_at, updated_at) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'courses': "INSERT INTO courses (id, title, description, total_lessons, is_active, created_at, updated_at) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?)",
+    'lessons': "INSERT INTO lessons (id, course_id, title, description, lesson_number, content, is_active, "
+               "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'user_course_progress': "INSERT INTO user_course_progress (user_id, course_id, lessons_completed, is_completed, "
+                            "started_at, completed_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    'user_lesson_progress': "INSERT INTO user_lesson_progress (user_id, lesson_id, is_completed, completed_at, "
+                            "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+    'questions': "INSERT INTO questions (id, author_id, title, body, tags, is_resolved, created_at, updated_at) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    'answers': "INSERT INTO answers (id, question_id, author_id, body, created_at, updated_at) "
+               "VALUES (?, ?, ?, ?, ?, ?)",
+    'question_attachments': "INSERT INTO question_attachments (question_id, stored_filename, original_filename, "
+                            "mime_type, size_bytes, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+    'answer_attachments': "INSERT INTO answer_attachments (answer_id, stored_filename, original_filename, "
+                          "mime_type, size_bytes, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+}
+
+
+def _insert(cursor, table: str, rows: Iterable[tuple]) -> int:
+    """executemany кусками: генератор не материализуется целиком."""
+    rows = iter(rows)
+    inserted = 0
+    while True:
+        chunk = list(islice(rows, INSERT_CHUNK))
+        if not chunk:
+            return inserted
+        cursor.executemany(_INSERTS[table], chunk)
+        inserted += len(chunk)
+
+
+def _load_tables(engine, generator: _Generator, volumes: SyntheticVolumes, counts: Dict[str, int],
+                 progress: Optional[Callable[[str, int, float], None]]) -> None:
+    """Вставить строки всех таблиц через одно сырое соединение с ``synchronous=OFF``."""
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        synchronous = cursor.execute("PRAGMA synchronous").fetchone()[0]
+        cursor.execute("PRAGMA synchronous=OFF")
+        try:
+            steps = [
+                ('users', generator.users),
+                ('courses', generator.courses),
+                ('lessons', generator.lessons),
+                ('user_course_progress', generator.course_progress),
+                ('user_lesson_progress', generator.lesson_progress),
+                ('questions', generator.questions),
+                ('answers', generator.answers),
+                ('question_attachments', lambda: generator.attachments(volumes.questions, 'q')),
+                ('answer_attachments', lambda: generator.attachments(generator.answer_count, 'a')),
+            ]
+            for table, rows in steps:
+                started = time.perf_counter()
+                counts[table] = _insert(cursor, table, rows())
+                raw.commit()
+                if progress:
+                    progress(table, counts[table], time.perf_counter() - started)
+        except BaseException:
+            raw.rollback()
+            raise
+        finally:
+            # Соединение вернётся в пул — нельзя оставлять его с synchronous=OFF
+            cursor.execute(f"PRAGMA synchronous={int(synchronous)}")
+            cursor.close()
+    finally:
+        raw.close()
+
+
+def generate_dataset(
+    manager,
+    volumes: SyntheticVolumes = SyntheticVolumes(),
+    seed: int = 42,
+    replace: bool = False,
+    progress: Optional[Callable[[str, int, float], None]] = None,
+) -> Dict[str, int]:
+    """Заполнить БД ``manager`` синтетическими данными; вернуть число строк по таблицам.
+
+    Без ``replace`` таблицы должны быть пусты; с ``replace`` их содержимое
+    удаляется. ``progress(таблица, строк, секунд)`` вызывается после каждой таблицы.
+    """
+    from .search_index import drop_search_index, ensure_search_index
+    from .stats_counters import rebuild_counters
+
+    engine = manager.engine
+    with engine.connect() as conn:
+        occupied = [t for t in TABLES if conn.execute(text(f"SELECT 1 FROM {t} LIMIT 1")).first()]
+    if occupied and not replace:
+        raise ValueError(f"Таблицы не пусты: {', '.join(occupied)}")
+
+    drop_search_index(engine)
+    tables = [Base.metadata.tables[name] for name in TABLES]
+    indexes = [index for table in tables for index in table.indexes]
+    with engine.begin() as conn:
+        for index in indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        for name in reversed(TABLES):
+            conn.execute(text(f"DELETE FROM {name}"))
+
+    generator = _Generator(volumes, seed)
+    generator.plan_enrollments()
+    counts = {}
+
+    def restore_indexes():
+        with engine.begin() as conn:
+            for index in indexes:
+                index.create(bind=conn)
+        ensure_search_index(engine)
+
+    # Индексы (в том числе уникальные) и поисковый индекс восстанавливаются и
+    # после неудачной загрузки, иначе БД осталась бы без ограничений и поиска.
+    # Ошибка восстановления в этом случае только пишется в журнал, чтобы не
+    # заменить собой исходную ошибку загрузки
+    try:
+        _load_tables(engine, generator, volumes, counts, progress)
+    except BaseException:
+        try:
+            restore_indexes()
+        except Exception:
+            logger.exception("Не удалось восстановить индексы после неудачной загрузки")
+        raise
+    started = time.perf_counter()
+    restore_indexes()
+    if progress:
+        progress('индексы и поисковый индекс', len(indexes), time.perf_counter() - started)
+
+    started = time.perf_counter()
+    session = manager.get_session()
+    try:
+        rebuild_counters(session)
+        session.commit()
+    finally:
+        session.close()
+    with engine.connect() as conn:
+        # Загрузка целиком прошла через журнал WAL — переносим её в файл БД и обрезаем журнал
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    if progress:
+        progress('счётчики', volumes.courses, time.perf_counter() - started)
+    return counts
@@ -0,0 +1,393 @@
+"""
+Трассировка запросов: спаны с таймлайном одного запроса.
+
+Запрос попадает в выборку с вероятностью ``TRACING_SAMPLE_RATE``. С
+``TRACING_FOLLOW_TRACEPARENT`` (по умолчанию выключен: заголовок может
+прислать любой клиент и так включить трассировку каждого своего запроса)
+в выборку попадает и запрос с входящим W3C ``traceparent``, помеченным как
+sampled, — тогда сохраняются его trace id и родительский спан. Для запроса
+в выборке:
+
+- корневой спан ``<METHOD> <маршрут>`` охватывает все хуки и обработчик;
+- ``span()`` / ``@traced()`` добавляют дочерние спаны: аутентификация и её
+  шаги (регистрация в БД, роль, обратный DNS, данные AD), разбор страницы
+  ``_split_head_body``, загрузка файлов, запись журнала действий;
+- каждое SQL-выражение — спан ``db.query``, шаблон Jinja — ``render_template``.
+
+Trace id хранится в ``g.trace_id`` и возвращается в заголовке ``traceparent``.
+Законченная трасса дописывается одной строкой в ``TRACING_FILE`` в формате
+OTLP/JSON (``{"resourceSpans": [...]}``, как у file exporter'а
+OpenTelemetry Collector), поэтому файл читают otlpjsonfile receiver и
+другие инструменты OTLP. Файл ротируется по ``TRACING_FILE_MAX_BYTES``
+с ``TRACING_FILE_BACKUP_COUNT`` старыми копиями. Запросы вне выборки платят проверкой ``g``.
+"""
+
+import functools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "learning-site"
+SCOPE_NAME = "backend.tracing"
+MAX_STATEMENT_LENGTH = 2000
+
+# Значения SpanKind и StatusCode из спецификации OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+def _attribute(key: str, value) -> Dict[str, object]:
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}  # int64 в OTLP/JSON — строкой
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+class Span:
+    """Спан в терминах OTLP; время — наносекунды Unix."""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start', 'end', 'attributes', 'status')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], kind: int, attributes: Dict[str, object]):
+        self.trace = trace
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end: Optional[int] = None
+        self.attributes = dict(attributes)
+        self.status: Dict[str, object] = {'code': STATUS_UNSET}
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, exc: BaseException) -> None:
+        self.status = {'code': STATUS_ERROR, 'message': f"{type(exc).__name__}: {exc}"}
+
+    def finish(self) -> None:
+        if self.end is None:
+            self.end = time.time_ns()
+            self.trace.finished.append(self)
+
+    def to_otlp(self) -> Dict[str, object]:
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end or self.start),
+            'attributes': [_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+            'status': self.status,
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class Trace:
+    """Спаны одного запроса и стек открытых (текущий — последний)."""
+
+    def __init__(self, trace_id: str, parent_id: Optional[str] = None):
+        self.trace_id = trace_id
+        self.remote_parent_id = parent_id
+        self.stack: List[Span] = []
+        self.finished: List[Span] = []
+
+    def start_span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Span:
+        parent_id = self.stack[-1].span_id if self.stack else self.remote_parent_id
+        span = Span(self, name, parent_id, kind, attributes)
+        self.stack.append(span)
+        return span
+
+    def end_span(self, span: Span) -> None:
+        # Спан мог закрыться не по порядку (ошибка SQL) — снимаем его и всё, что выше
+        if span in self.stack:
+            while self.stack:
+                top = self.stack.pop()
+                top.finish()
+                if top is span:
+                    break
+        else:
+            span.finish()
+
+    def to_otlp(self) -> Dict[str, object]:
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                _attribute('service.name', SERVICE_NAME),
+                _attribute('process.pid', os.getpid()),
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': SCOPE_NAME},
+                'spans': [span.to_otlp() for span in sorted(self.finished, key=lambda s: s.start)],
+            }],
+        }]}
+
+
+def current_trace() -> Optional[Trace]:
+    """Трасса текущего запроса или None (вне запроса или запрос не в выборке)."""
+    if not has_request_context():
+        return None
+    return g.get('_trace')
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Дочерний спан текущего; вне выборки ничего не делает. Отдаёт Span или None."""
+    trace = current_trace()
+    if trace is None:
+        yield None
+        return
+    current = trace.start_span(name, **attributes)
+    try:
+        yield current
+    except BaseException as exc:
+        current.set_error(exc)
+        raise
+    finally:
+        trace.end_span(current)
+
+
+def traced(name: str):
+    """Декоратор: вызов функции — спан ``name``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_trace() is None:
+                return func(*args, **kwargs)
+            with span(name, **{'code.function': func.__qualname__}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ----------------------- Экспорт -----------------------
+
+class JsonlExporter:
+    """Трасса — одна строка OTLP/JSON в конце файла (O_APPEND: строки воркеров не перемешиваются).
+
+    Как у журнала приложения, файл ротируется: строка, с которой он превысил
+    бы ``max_bytes``, пишется уже в новый файл, старые становятся
+    ``<файл>.1`` … ``<файл>.<backup_count>``. Ротацию между воркерами
+    упорядочивает файловая блокировка ``<файл>.lock``.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0, backup_count: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        line = (json.dumps(trace.to_otlp(), ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            if self.max_bytes > 0:
+                with _file_lock(f"{self.path}.lock"):
+                    self._rotate_if_needed(len(line))
+                    self._append(line)
+            else:
+                self._append(line)
+
+    def _append(self, line: bytes) -> None:
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def _rotate_if_needed(self, incoming: int) -> None:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size == 0 or size + incoming <= self.max_bytes:
+            return
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+@contextmanager
+def _file_lock(path: str):
+    if fcntl is None:  # Windows: gunicorn там не работает, процесс один
+        yield
+        return
+    with open(path, 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+# ----------------------- SQL и шаблоны -----------------------
+
+_listeners_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace()
+    if trace is None:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    query_span = trace.start_span(
+        'db.query', SPAN_KIND_CLIENT,
+        **{'db.system': conn.dialect.name, 'db.operation': operation,
+           'db.statement': statement[:MAX_STATEMENT_LENGTH]},
+    )
+    conn.info.setdefault('trace_spans', []).append(query_span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('trace_spans')
+    if spans:
+        query_span = spans.pop()
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            query_span.set_attribute('db.rows_affected', cursor.rowcount)
+        query_span.trace.end_span(query_span)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    spans = conn.info.get('trace_spans') if conn is not None else None
+    if spans:
+        query_span = spans.pop()
+        query_span.set_error(exception_context.original_exception)
+        query_span.trace.end_span(query_span)
+
+
+def _before_render(sender, template, context, **extra):
+    trace = current_trace()
+    if trace is not None:
+        trace.start_span('render_template', **{'template.name': template.name})
+
+
+def _after_render(sender, template, context, **extra):
+    trace = current_trace()
+    if trace is not None and trace.stack and trace.stack[-1].name == 'render_template':
+        trace.end_span(trace.stack[-1])
+
+
+def _install_listeners() -> None:
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _listeners_installed = True
+
+
+# ----------------------- Подключение к приложению -----------------------
+
+def _sample(rate: float, follow_parent: bool):
+    """(trace_id, parent_span_id) из ``traceparent`` или новый trace id по выборке; None — не трассировать."""
+    if follow_parent:
+        match = _TRACEPARENT.match(request.headers.get('traceparent', '').strip().lower())
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            if int(flags, 16) & 1 and trace_id != '0' * 32:
+                return trace_id, parent_id
+    if random.random() < rate:
+        return _new_id(16), None
+    return None
+
+
+def init_tracing(app) -> Optional[JsonlExporter]:
+    """Подключить трассировку; вызывается первой, чтобы корневой спан охватывал остальные хуки."""
+    rate = float(app.config.get('TRACING_SAMPLE_RATE', 0.0))
+    path = app.config.get('TRACING_FILE')
+    if rate <= 0 or not path:
+        return None
+    follow_parent = app.config.get('TRACING_FOLLOW_TRACEPARENT', False)
+    exporter = JsonlExporter(
+        path,
+        max_bytes=app.config.get('TRACING_FILE_MAX_BYTES', 0),
+        backup_count=app.config.get('TRACING_FILE_BACKUP_COUNT', 0),
+    )
+    app.extensions['tracing'] = exporter
+    _install_listeners()
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def _start_trace():
+        ids = _sample(rate, follow_parent)
+        if ids is None:
+            g._trace = None
+            return
+        trace = Trace(*ids)
+        g._trace = trace
+        g.trace_id = trace.trace_id
+        rule = request.url_rule.rule if request.url_rule else None
+        trace.start_span(
+            f"{request.method} {rule or request.path}", SPAN_KIND_SERVER,
+            **{'http.method': request.method, 'http.route': rule,
+               'http.target': request.full_path.rstrip('?'),
+               'http.user_agent': request.user_agent.string or None},
+        )
+
+    @app.after_request
+    def _tag_trace(response):
+        trace = g.get('_trace')
+        if trace is not None and trace.stack:
+            root = trace.stack[0]
+            root.set_attribute('http.status_code', response.status_code)
+            response.headers['traceparent'] = f"00-{trace.trace_id}-{root.span_id}-01"
+        return response
+
+    @app.teardown_request
+    def _finish_trace(exc):
+        trace = g.pop('_trace', None)
+        if trace is None or not trace.stack:
+            return
+        root = trace.stack[0]
+        user_info = g.get('user_info') or {}
+        root.set_attribute('enduser.id', user_info.get('username'))
+        if exc is not None:
+            root.set_error(exc)
+        trace.end_span(root)
+        try:
+            exporter.export(trace)
+        except OSError as error:
+            logger.warning("Не удалось записать трассу %s: %s", trace.trace_id, error)
+
+    return exporter
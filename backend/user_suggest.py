@@ -0,0 +1,396 @@
+"""
+In-memory индекс для подсказок пользователей (/api/users/suggest).
+
+Каждый воркер держит в памяти токены логина, ФИО и отдела, приведённые к
+``casefold`` с заменой «ё» на «е». Для каждой пары (токен, вес поля)
+хранится список пользователей, упорядоченный по статическому рангу
+(активные, короткое ФИО, меньший id), а сами пары отсортированы по токену:
+все токены с данным префиксом — непрерывный диапазон, который находится
+двоичным поиском.
+
+Top-k собирается без обхода всех совпадений: кандидаты самого
+избирательного слова запроса читаются по убыванию оценки, и чтение
+останавливается, как только непрочитанные уже не могут попасть в первые k.
+
+Индекс обновляется инкрементально: раз в ``refresh_interval`` секунд
+догружаются пользователи с ``updated_at`` не раньше последней отметки
+(watermark). Удаления по watermark не видны, поэтому раз в
+``full_rebuild_interval`` секунд индекс пересобирается целиком.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+from itertools import chain, islice
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .models import User
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_PREFIX_END = '￿'
+
+# Вес поля при ранжировании: совпадение по фамилии и логину важнее, чем по отделу
+FIELD_WEIGHTS = {
+    'surname': 6,
+    'username': 5,
+    'fst_name': 4,
+    'full_name': 4,
+    'sec_name': 2,
+    'department': 1,
+}
+EXACT_MATCH_BONUS = 3
+MAX_QUERY_TOKENS = 5
+WATERMARK_OVERLAP = timedelta(seconds=1)
+# Класс из стольких списков сливается лениво, из большего числа — сортируется целиком
+MERGE_MAX_LISTS = 32
+STREAM_BATCH_MAX = 1024
+
+GroupKey = Tuple[str, int]
+
+# Код пользователя — ранг и id в одном int: неактивные после активных, затем
+# по длине ФИО, затем по id. Списки кодов сортируются и сливаются без key=.
+_ID_BITS = 40
+_LENGTH_BITS = 16
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+def user_code(entry: 'SuggestEntry') -> int:
+    length = min(len(entry.full_name), (1 << _LENGTH_BITS) - 1)
+    return (int(not entry.is_active) << (_ID_BITS + _LENGTH_BITS)) | (length << _ID_BITS) | entry.id
+
+
+def normalize(value: Optional[str]) -> str:
+    return (value or '').casefold().replace('ё', 'е')
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(normalize(value))
+
+
+@dataclass(frozen=True)
+class SuggestEntry:
+    id: int
+    username: str
+    full_name: str
+    department: str
+    position: str
+    is_active: bool
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'username': self.username,
+            'full_name': self.full_name,
+            'department': self.department,
+            'position': self.position,
+            'is_active': self.is_active,
+        }
+
+
+def _parse_row(row) -> Tuple[SuggestEntry, Dict[str, int]]:
+    """Запись для выдачи и токены пользователя с наибольшим весом поля."""
+    full_name = row.full_name or ' '.join(p for p in (row.surname, row.fst_name, row.sec_name) if p)
+    entry = SuggestEntry(
+        id=row.id,
+        username=row.username,
+        full_name=full_name,
+        department=row.department or '',
+        position=row.position or '',
+        is_active=bool(row.is_active),
+    )
+    tokens: Dict[str, int] = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(getattr(row, field)):
+            if tokens.get(token, 0) < weight:
+                tokens[token] = weight
+    return entry, tokens
+
+
+class _Snapshot:
+    """Неизменяемое состояние индекса; при обновлении подменяется целиком,
+    поэтому поиск в других потоках воркера идёт без блокировок."""
+
+    __slots__ = ('entries', 'codes', 'user_tokens', 'signatures', 'groups', 'keys')
+
+    def __init__(
+        self,
+        entries: Dict[int, SuggestEntry],
+        codes: Dict[int, int],
+        user_tokens: Dict[int, Dict[str, int]],
+        signatures: Dict[int, str],
+        groups: Dict[GroupKey, List[int]],
+        keys: Optional[List[GroupKey]] = None,
+    ):
+        self.entries = entries          # id -> запись для выдачи
+        self.codes = codes              # id -> код
+        self.user_tokens = user_tokens  # код -> {токен: вес}
+        # код -> "\0токен1\0токен2…": «есть токен с префиксом» — один поиск подстроки
+        self.signatures = signatures
+        self.groups = groups            # (токен, вес) -> отсортированные коды
+        self.keys = keys if keys is not None else sorted(groups)
+
+    def classes(self, token: str) -> Dict[int, List[List[int]]]:
+        """Списки кодов пользователей с токеном на ``token``, сгруппированные по оценке."""
+        keys = self.keys
+        start = bisect.bisect_left(keys, (token,))
+        end = bisect.bisect_left(keys, (token + _PREFIX_END,), start)
+        classes: Dict[int, List[List[int]]] = defaultdict(list)
+        for i in range(start, end):
+            key = keys[i]
+            classes[key[1] + (EXACT_MATCH_BONUS if key[0] == token else 0)].append(self.groups[key])
+        return classes
+
+    def stream(self, classes: Dict[int, List[List[int]]], first_batch: int) -> Iterator[Tuple[int, List[int]]]:
+        """Пачки (оценка, [код…]) по убыванию оценки; внутри оценки — по рангу.
+
+        Пачки растут от ``first_batch`` вдвое до STREAM_BATCH_MAX, чтобы
+        короткий запрос не сливал весь класс целиком.
+        """
+        seen = set()
+        for score in sorted(classes, reverse=True):
+            lists = classes[score]
+            if len(lists) == 1:
+                codes = iter(lists[0])
+            elif len(lists) <= MERGE_MAX_LISTS:
+                codes = heapq.merge(*lists)
+            else:
+                codes = iter(sorted(chain.from_iterable(lists)))
+            size = first_batch
+            while True:
+                chunk = list(islice(codes, size))
+                if not chunk:
+                    break
+                batch = [code for code in chunk if code not in seen]
+                seen.update(batch)
+                if batch:
+                    yield score, batch
+                size = min(size * 2, STREAM_BATCH_MAX)
+
+    def score(self, code: int, query_tokens: Sequence[str]) -> int:
+        """Суммарная оценка пользователя по словам; 0 — если какое-то слово не совпало."""
+        tokens = self.user_tokens[code]
+        total = 0
+        for query_token in query_tokens:
+            best = 0
+            for token, weight in tokens.items():
+                if token.startswith(query_token):
+                    if token == query_token:
+                        weight += EXACT_MATCH_BONUS
+                    if weight > best:
+                        best = weight
+            if not best:
+                return 0
+            total += best
+        return total
+
+
+def _signature(tokens: Dict[str, int]) -> str:
+    return ''.join('\0' + token for token in tokens)
+
+
+def _build_groups(user_tokens: Dict[int, Dict[str, int]]) -> Dict[GroupKey, List[int]]:
+    groups: Dict[GroupKey, List[int]] = defaultdict(list)
+    for code in sorted(user_tokens):
+        for key in user_tokens[code].items():
+            groups[key].append(code)
+    return dict(groups)
+
+
+def _user_rows_query():
+    return select(
+        User.id, User.username, User.full_name, User.surname, User.fst_name, User.sec_name,
+        User.department, User.position, User.is_active, User.updated_at,
+    )
+
+
+class UserSuggestIndex:
+    """Префиксный индекс пользователей одного воркера."""
+
+    def __init__(self, refresh_interval: float = 5.0, full_rebuild_interval: float = 600.0):
+        self.refresh_interval = refresh_interval
+        self.full_rebuild_interval = full_rebuild_interval
+        self._snapshot = _Snapshot({}, {}, {}, {}, {})
+        self._watermark: Optional[datetime] = None
+        self._last_refresh = 0.0
+        self._last_full_rebuild = 0.0
+        self._source: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def configure(self, refresh_interval: float, full_rebuild_interval: float) -> None:
+        """Интервалы обновления и полной пересборки (вызывается один раз в init_api)."""
+        with self._lock:
+            self.refresh_interval = refresh_interval
+            self.full_rebuild_interval = full_rebuild_interval
+
+    def __len__(self) -> int:
+        return len(self._snapshot.entries)
+
+    # ----------------------- загрузка -----------------------
+
+    def load(self, rows: Iterable) -> None:
+        """Построить индекс заново по строкам пользователей."""
+        entries: Dict[int, SuggestEntry] = {}
+        codes: Dict[int, int] = {}
+        user_tokens: Dict[int, Dict[str, int]] = {}
+        for row in rows:
+            entry, tokens = _parse_row(row)
+            code = user_code(entry)
+            entries[entry.id] = entry
+            codes[entry.id] = code
+            user_tokens[code] = tokens
+        signatures = {code: _signature(tokens) for code, tokens in user_tokens.items()}
+        self._snapshot = _Snapshot(entries, codes, user_tokens, signatures, _build_groups(user_tokens))
+
+    def apply_changes(self, rows: Sequence) -> None:
+        """Заменить в индексе записи изменившихся пользователей.
+
+        Пересобираются только списки затронутых токенов; остальные списки
+        новый снимок разделяет со старым.
+        """
+        if not rows:
+            return
+        current = self._snapshot
+        entries = dict(current.entries)
+        codes = dict(current.codes)
+        user_tokens = dict(current.user_tokens)
+        signatures = dict(current.signatures)
+
+        removed = set()
+        affected = set()
+        added: Dict[GroupKey, List[int]] = defaultdict(list)
+        for row in rows:
+            entry, tokens = _parse_row(row)
+            old_code = codes.get(entry.id)
+            if old_code is not None:
+                removed.add(old_code)
+                affected.update(user_tokens.pop(old_code).items())
+                signatures.pop(old_code)
+            code = user_code(entry)
+            entries[entry.id] = entry
+            codes[entry.id] = code
+            user_tokens[code] = tokens
+            signatures[code] = _signature(tokens)
+            for key in tokens.items():
+                added[key].append(code)
+        affected.update(added)
+
+        groups = dict(current.groups)
+        keys_changed = False
+        for key in affected:
+            group = [code for code in current.groups.get(key, ()) if code not in removed] + added.get(key, [])
+            if group:
+                group.sort()
+                keys_changed |= key not in groups
+                groups[key] = group
+            else:
+                groups.pop(key, None)
+                keys_changed = True
+        keys = sorted(groups) if keys_changed else current.keys
+        self._snapshot = _Snapshot(entries, codes, user_tokens, signatures, groups, keys)
+
+    def refresh(self, session: Session, force_full: bool = False) -> None:
+        """Догрузить изменения из БД (или пересобрать индекс целиком)."""
+        now = time.monotonic()
+        with self._lock:
+            full = force_full or self._watermark is None or now - self._last_full_rebuild >= self.full_rebuild_interval
+            if full:
+                rows = session.execute(_user_rows_query()).all()
+                self.load(rows)
+                self._last_full_rebuild = now
+            else:
+                # func.now() пишет updated_at с точностью до секунды и без
+                # микросекунд, а параметр SQLAlchemy сравнивается как строка
+                # с ними, поэтому окно отступает на секунду назад: строки на
+                # границе перечитываются, но не теряются
+                since = self._watermark - WATERMARK_OVERLAP
+                rows = session.execute(_user_rows_query().where(User.updated_at >= since)).all()
+                self.apply_changes(rows)
+            stamps = [row.updated_at for row in rows if row.updated_at is not None]
+            if stamps:
+                self._watermark = max(stamps + ([self._watermark] if self._watermark and not full else []))
+            elif full:
+                self._watermark = session.execute(select(func.max(User.updated_at))).scalar() or (
+                    datetime.min + WATERMARK_OVERLAP
+                )
+            self._last_refresh = now
+
+    def maybe_refresh(self, session_factory, source: Optional[str] = None) -> None:
+        """Обновить индекс, если с прошлого обновления прошло refresh_interval секунд.
+
+        ``source`` — адрес БД; при его смене индекс пересобирается целиком.
+        """
+        same_source = source == self._source
+        if same_source and self._watermark is not None:
+            if time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+            if self._lock.locked():
+                # Индекс уже обновляет другой поток — отвечаем по текущему снимку
+                return
+        session = session_factory()
+        try:
+            self.refresh(session, force_full=not same_source)
+            self._source = source
+        finally:
+            session.close()
+
+    # ----------------------- поиск -----------------------
+
+    def search(self, query: str, limit: int = 10) -> List[SuggestEntry]:
+        """Вернуть до ``limit`` пользователей, у которых каждое слово запроса
+        является префиксом какого-либо их токена, по убыванию оценки.
+
+        Кандидаты читаются по самому избирательному слову в порядке убывания
+        его оценки; остальные слова проверяются по сигнатуре пользователя.
+        Чтение останавливается, когда даже максимальная оценка остальных слов
+        не выводит следующего кандидата в первые ``limit``.
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+        if not query_tokens or limit <= 0:
+            return []
+        snapshot = self._snapshot
+
+        token_classes = [snapshot.classes(token) for token in query_tokens]
+        if not all(token_classes):
+            return []
+        driver = 0
+        if len(query_tokens) > 1:
+            sizes = [sum(len(group) for lists in classes.values() for group in lists) for classes in token_classes]
+            driver = sizes.index(min(sizes))
+        others = [token for i, token in enumerate(query_tokens) if i != driver]
+        others_bound = sum(max(classes) for i, classes in enumerate(token_classes) if i != driver)
+        needles = ['\0' + token for token in others]
+        signatures = snapshot.signatures
+
+        top: List[Tuple[int, int]] = []  # (-оценка, код), не длиннее limit
+        for score, batch in snapshot.stream(token_classes[driver], first_batch=max(limit, 16)):
+            if len(top) == limit:
+                # Следующие кандидаты набирают не больше potential, а при
+                # равенстве побеждают только с рангом лучше худшего в top
+                potential, (worst_score, worst_code) = score + others_bound, top[-1]
+                if potential < -worst_score:
+                    break
+                if potential == -worst_score:
+                    batch = [code for code in batch if code < worst_code]
+                    if not batch:
+                        break
+            if needles:
+                for needle in needles:
+                    batch = [code for code in batch if needle in signatures[code]]
+                scored = [(-score - snapshot.score(code, others), code) for code in batch]
+            else:
+                scored = [(-score, code) for code in batch]
+            top = heapq.nsmallest(limit, chain(top, scored))
+
+        return [snapshot.entries[code & _ID_MASK] for _, code in top]
+
+
+# Индекс текущего воркера
+suggest_index = UserSuggestIndex()
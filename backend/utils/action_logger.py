@@ -8,6 +8,9 @@ from typing import Callable, Iterable
 
 from flask import current_app, g, request
 
+from ..metrics import timed_hook
+from ..tracing import span
+
 
 def _ensure_log_path(log_path: str) -> None:
     os.makedirs(os.path.dirname(log_path), exist_ok=True)
@@ -35,14 +38,16 @@ def init_action_logger(app) -> None:
         role = user_info.get("role") or "роль не определена"
         ip_address = request.headers.get("X-Forwarded-For", request.remote_addr) if request else "-"
         entry = f"{timestamp} | пользователь: {username} ({role}) | IP: {ip_address} | действие: {description}"
-        with open(log_path, "a", encoding="utf-8") as log_file:
-            log_file.write(entry + "\n")
+        with span("action_log.write"):
+            with open(log_path, "a", encoding="utf-8") as log_file:
+                log_file.write(entry + "\n")
 
     app.extensions["action_logger_writer"] = _write_entry
 
     skip_prefixes: Iterable[str] = app.config.get("ACTION_LOG_SKIP_PATHS", ())
 
     @app.after_request
+    @timed_hook("action_log")
     def _log_request(response):
         try:
             path = request.path
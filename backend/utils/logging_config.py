@@ -5,8 +5,9 @@ from pathlib import Path
 
 def configure_logging(app) -> None:
     """Configure basic logging for the application."""
-    log_dir = Path(app.config.get("PROJECT_ROOT", Path.cwd())) / "backend" / "logs"
-    log_file = log_dir / "app.log"
+    default_file = Path(app.config.get("PROJECT_ROOT", Path.cwd())) / "backend" / "logs" / "app.log"
+    log_file = Path(app.config.get("LOG_FILE") or default_file)
+    log_dir = log_file.parent
     
     # Configure root logger
     root_logger = logging.getLogger()
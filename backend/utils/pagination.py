@@ -0,0 +1,179 @@
+"""Keyset (cursor) pagination helpers for list endpoints.
+
+Курсор — непрозрачная строка (base64 от JSON), в которой хранится значение
+ключа сортировки и id последней отданной строки. Следующая страница
+выбирается условием ``(key, id) > (last_key, last_id)`` по индексу, поэтому
+стоимость запроса не зависит от номера страницы (в отличие от OFFSET).
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, List, Mapping, Optional
+
+from sqlalchemy import String, and_, func, literal_column, or_, select
+from sqlalchemy.orm import Query
+
+
+class CursorError(ValueError):
+    """Курсор повреждён или не соответствует параметрам запроса."""
+
+
+def sort_expression(column, nullable: bool = True):
+    """Выражение сортировки, пригодное для keyset-сравнения.
+
+    NULL ломает сравнение кортежей, поэтому nullable-колонки оборачиваются
+    в ``coalesce(col, '')``. Пустая строка передаётся литералом, а не
+    параметром, чтобы выражение совпадало с выражением индекса. Тип
+    приводится к строке: SQLite хранит даты строками, и сравнение должно
+    идти по сырому значению без преобразования в datetime.
+    """
+    if not nullable:
+        return column
+    return func.coalesce(column, literal_column("''"), type_=String)
+
+
+@dataclass
+class PageRequest:
+    """Параметры страницы, разобранные из query string."""
+
+    sort: str
+    descending: bool
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+    include_total: Optional[str] = None
+
+    @property
+    def paginated(self) -> bool:
+        return self.limit is not None or self.cursor is not None
+
+
+@dataclass
+class Page:
+    """Результат выборки одной страницы."""
+
+    items: List[Any]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    total: Optional[int] = None
+
+
+def encode_cursor(sort: str, descending: bool, key: Any, row_id: int) -> str:
+    payload = json.dumps([sort, 1 if descending else 0, key, row_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, descending: bool) -> tuple[Any, int]:
+    """Вернуть (key, id) из курсора, проверив, что он выдан для той же сортировки."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii"))
+        c_sort, c_desc, key, row_id = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as exc:
+        raise CursorError("Некорректный курсор") from exc
+    if c_sort != sort or bool(c_desc) != descending or not isinstance(row_id, int):
+        raise CursorError("Курсор выдан для другой сортировки")
+    # Ключ идёт в сравнение с колонкой: список или объект из подделанного курсора
+    # дошёл бы до SQLAlchemy и дал 500
+    if key is not None and not isinstance(key, (str, int, float)):
+        raise CursorError("Некорректный курсор")
+    return key, row_id
+
+
+def parse_page_request(args: Mapping[str, str], sort_options: Mapping[str, Any], default_sort: str,
+                       default_desc: bool = False, default_limit: int = 50,
+                       max_limit: int = 500) -> PageRequest:
+    """Разобрать ``sort``, ``order``, ``limit``, ``cursor`` и ``include_total``.
+
+    Пагинация включается явно: без ``limit`` и ``cursor`` эндпоинт ведёт себя
+    как раньше и отдаёт всю выборку.
+    """
+    sort = args.get("sort") or default_sort
+    if sort not in sort_options:
+        raise CursorError(f"Недопустимое поле сортировки: {sort}")
+
+    order = (args.get("order") or "").lower()
+    if order not in ("", "asc", "desc"):
+        raise CursorError(f"Недопустимый порядок сортировки: {order}")
+    descending = default_desc if not order else order == "desc"
+
+    limit: Optional[int] = None
+    raw_limit = args.get("limit")
+    if raw_limit:
+        try:
+            limit = int(raw_limit)
+        except ValueError as exc:
+            raise CursorError("limit должен быть целым числом") from exc
+        if limit < 1:
+            raise CursorError("limit должен быть положительным")
+    cursor = args.get("cursor") or None
+    if cursor and limit is None:
+        limit = default_limit
+    if limit is not None:
+        limit = min(limit, max_limit)
+
+    include_total = (args.get("include_total") or "").lower() or None
+    if include_total in ("false", "0"):
+        include_total = None
+    elif include_total not in (None, "estimate"):
+        include_total = "exact"
+
+    return PageRequest(sort=sort, descending=descending, limit=limit,
+                       cursor=cursor, include_total=include_total)
+
+
+def paginate(query: Query, page_request: PageRequest, sort_options: Mapping[str, Any], id_column) -> Page:
+    """Применить keyset-сортировку и курсор к ORM-запросу.
+
+    ``sort_options`` отображает имя сортировки в SQL-выражение; ``id_column``
+    служит вторым ключом, делая порядок строгим.
+    """
+    key_expr = sort_options[page_request.sort]
+    desc = page_request.descending
+
+    if page_request.cursor:
+        last_key, last_id = decode_cursor(page_request.cursor, page_request.sort, desc)
+        if desc:
+            query = query.filter(or_(key_expr < last_key, and_(key_expr == last_key, id_column < last_id)))
+        else:
+            query = query.filter(or_(key_expr > last_key, and_(key_expr == last_key, id_column > last_id)))
+
+    if desc:
+        query = query.order_by(key_expr.desc(), id_column.desc())
+    else:
+        query = query.order_by(key_expr.asc(), id_column.asc())
+
+    if page_request.limit is None:
+        return Page(items=query.all())
+
+    # Если запрос выбирает несколько колонок (например, сущность и сниппет
+    # поиска), элементом страницы остаётся кортеж этих колонок.
+    width = len(query.column_descriptions)
+    rows = query.add_columns(key_expr.label("_page_key")).limit(page_request.limit + 1).all()
+    has_more = len(rows) > page_request.limit
+    rows = rows[:page_request.limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(page_request.sort, desc, last[-1], getattr(last[0], id_column.key))
+    items = [row[0] if width == 1 else tuple(row[:width]) for row in rows]
+    return Page(items=items, next_cursor=next_cursor, has_more=has_more)
+
+
+def count_total(query: Query, mode: Optional[str], id_column, filtered: bool) -> Optional[int]:
+    """Посчитать общее число строк, если клиент явно попросил.
+
+    ``estimate`` для запроса без фильтров берёт ``max(id)`` — O(1) по
+    первичному ключу (верхняя оценка, удалённые строки не вычитаются).
+    Во всех остальных случаях выполняется точный ``COUNT(*)``.
+    """
+    if mode is None:
+        return None
+    session = query.session
+    if mode == "estimate" and not filtered:
+        return session.execute(select(func.max(id_column))).scalar() or 0
+    return query.order_by(None).count()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк эндпоинтов: все маршруты backend/api.py и backend/routes.py через
+тестовый клиент Flask на синтетических наборах small, medium и large
+(backend/synthetic_data.py).
+
+Для каждого сценария из CASES записываются перцентили задержки
+(p50/p95/p99), число SQL-запросов на запрос и размер ответа в байтах.
+Результат сравнивается с базовой линией benchmarks/baselines/endpoints.json;
+при регрессии сверх допуска бенчмарк завершается с кодом 1. Маршрут без
+сценария (и без причины в SKIPPED) — ошибка: новый эндпоинт нужно добавить
+в CASES.
+
+Задержка зависит от машины и шумит между запусками, поэтому допуски по ней
+по умолчанию широкие (рост p50 вдвое, p95 втрое) — они ловят изменения
+порядка величины; на тихой машине их можно сузить. Число запросов и размер
+ответа от машины не зависят и сравниваются строго. После намеренных
+изменений базовая линия обновляется флагом --update-baseline.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_endpoints --dataset small --dataset medium
+    python -m benchmarks.bench_endpoints --dataset large --requests 10 --update-baseline
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend.synthetic_data import SyntheticVolumes
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'endpoints.json')
+UPLOADS_DIR = os.path.join(ROOT, 'backend', 'uploads')
+
+DATASETS = {
+    'small': SyntheticVolumes(users=500, departments=10, courses=20, questions=200),
+    'medium': SyntheticVolumes(users=5_000, departments=20, courses=60, questions=2_000),
+    'large': SyntheticVolumes(),
+}
+
+# Эндпоинты, которые не измеряются, и причина
+SKIPPED = {
+    'static': "в проекте нет backend/static, статика отдаётся маршрутами страниц",
+    'trigger_error': "служебный маршрут тестов, всегда отвечает ошибкой",
+    'serve_asset': "недостижим: те же URL раньше перехватывает /<legacy_dir>/<path> (serve_legacy_asset)",
+}
+
+
+@dataclass(frozen=True)
+class Case:
+    """Сценарий: запрос к эндпоинту; ``path`` — шаблон с полями контекста набора и ``{i}``."""
+
+    name: str
+    endpoint: str
+    path: str
+    method: str = 'GET'
+    role: str = 'user'
+    status: int = 200
+    # (контекст, номер запроса) -> аргументы client.open (json=, data=, content_type=)
+    body: Optional[Callable[[Dict[str, object], int], Dict[str, object]]] = None
+
+
+def _ingest_body(ctx, i):
+    lines = [
+        json.dumps({'user': ctx['username'], 'lesson': lesson, 'verb': 'completed',
+                    'timestamp': '2024-03-01T10:00:00Z'})
+        for lesson in ctx['course_lessons']
+    ]
+    return {'data': '\n'.join(lines).encode('utf-8'), 'content_type': 'application/x-ndjson'}
+
+
+def _upload_body(ctx, i):
+    return {'data': {'file': (io.BytesIO(b'x' * 1024), 'bench.txt')}, 'content_type': 'multipart/form-data'}
+
+
+# Сначала читающие сценарии, затем изменяющие — чтение идёт по исходному набору
+CASES = [
+    Case('users', 'api.get_users', '/api/users?limit=50'),
+    Case('users-filtered', 'api.get_users', '/api/users?limit=50&department={department}&include_total=true'),
+    Case('users-suggest', 'api.suggest_users', '/api/users/suggest?q={surname}'),
+    Case('user', 'api.get_user', '/api/users/{user_id}'),
+    Case('user-progress', 'api.get_user_progress', '/api/users/{user_id}/progress'),
+    Case('current-user', 'api.get_current_user_info', '/api/current-user'),
+    Case('check-registration', 'api.check_user_registration', '/api/users/check-registration?username={username}'),
+    Case('courses', 'api.get_courses', '/api/courses'),
+    Case('course', 'api.get_course', '/api/courses/{course_id}'),
+    Case('course-users', 'api.get_course_users', '/api/courses/{course_id}/users'),
+    Case('departments', 'api.get_departments', '/api/departments'),
+    Case('statistics', 'api.get_statistics', '/api/statistics'),
+    Case('questions', 'api.list_questions', '/api/questions?limit=20'),
+    Case('questions-search', 'api.list_questions', '/api/questions?limit=20&search={search}'),
+    Case('question', 'api.get_question', '/api/questions/{question_id}'),
+    Case('answers', 'api.list_answers', '/api/questions/{question_id}/answers'),
+    Case('report-csv', 'api.export_progress_report', '/api/reports/progress.csv?department={department}',
+         role='admin'),
+    Case('report-xlsx', 'api.export_progress_report', '/api/reports/progress.xlsx?department={department}',
+         role='admin'),
+    Case('slow-queries', 'api.slow_queries', '/api/admin/slow-queries', role='admin'),
+    Case('memory', 'api.memory_status', '/api/admin/memory', role='admin'),
+    Case('memory-objects', 'api.memory_objects', '/api/admin/memory/objects', role='admin'),
+    # tracemalloc не включается: он замедлил бы все остальные сценарии
+    Case('memory-tracemalloc', 'api.memory_tracemalloc', '/api/admin/memory/tracemalloc', method='POST',
+         role='admin', body=lambda ctx, i: {'json': {'action': 'stop'}}),
+    Case('memory-snapshot', 'api.memory_snapshot', '/api/admin/memory/snapshots', method='POST',
+         role='admin', status=409),
+    Case('memory-diff', 'api.memory_diff', '/api/admin/memory/diff?from=1&to=2', role='admin', status=404),
+    Case('healthz', 'healthcheck', '/healthz'),
+    Case('metrics', 'metrics', '/metrics', role='admin'),
+    Case('debug-kerberos', 'debug_kerberos', '/debug/kerberos'),
+    Case('user-info-test', 'user_info_test', '/user/info-test'),
+    Case('actions-log', 'view_actions_log', '/actions', role='admin'),
+    Case('profiles', 'view_profiles', '/admin/profiles', role='admin'),
+    Case('profile', 'view_profile', '/admin/profiles/missing', role='admin', status=404),
+    Case('profile-download', 'download_profile', '/admin/profiles/missing/folded', role='admin', status=404),
+    Case('root', 'root_redirect', '/', status=302),
+    Case('page', 'serve_page', '/main'),
+    Case('page-admin', 'serve_page', '/main', role='admin'),
+    Case('legacy-page', 'serve_legacy_index', '/main-pg/'),
+    Case('legacy-asset', 'serve_legacy_asset', '/main-pg/style.css'),
+    Case('template', 'serve_template', '/templates/css/header-footer.css'),
+    Case('backend-template', 'serve_backend_template', '/backend/templates/actions_log.html'),
+    Case('upload', 'serve_upload', '/uploads/{upload}'),
+    Case('complete-lesson', 'api.complete_lesson', '/api/lessons/{lesson_id}/complete', method='POST'),
+    Case('create-question', 'api.create_question', '/api/questions', method='POST', status=201,
+         body=lambda ctx, i: {'json': {'title': f"Вопрос бенчмарка {i:05d}", 'body': "Текст вопроса"}}),
+    Case('create-answer', 'api.create_answer', '/api/questions/{question_id}/answers', method='POST', role='admin',
+         status=201,
+         body=lambda ctx, i: {'json': {'body': f"Ответ бенчмарка {i:05d}"}}),
+    Case('question-attachment', 'api.upload_question_attachment', '/api/questions/{question_id}/attachments',
+         method='POST', status=201, body=_upload_body),
+    Case('answer-attachment', 'api.upload_answer_attachment', '/api/answers/{answer_id}/attachments',
+         method='POST', status=201, body=_upload_body),
+    Case('register-user', 'api.register_user', '/api/users/register', method='POST', status=201,
+         body=lambda ctx, i: {'json': {'username': f"bench.user{i:05d}"}}),
+    Case('update-role', 'api.update_user_role', '/api/users/{other_user_id}/role', method='PUT', role='admin',
+         body=lambda ctx, i: {'json': {'role': 'admin' if i % 2 else 'user'}}),
+    Case('ingest-progress', 'api.ingest_progress', '/api/progress/ingest', method='POST', role='admin',
+         body=_ingest_body),
+]
+
+
+def check_coverage(app, cases=CASES, skipped=SKIPPED) -> List[str]:
+    """Ошибки покрытия: эндпоинты без сценария и сценарии, попадающие не в свой эндпоинт."""
+    from werkzeug.exceptions import HTTPException
+
+    errors = []
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    for endpoint in sorted(endpoints - {case.endpoint for case in cases} - set(skipped)):
+        errors.append(f"эндпоинт {endpoint} не покрыт сценарием (добавьте его в CASES или SKIPPED)")
+    adapter = app.url_map.bind('localhost')
+    for case in cases:
+        path = re.sub(r'\{\w+\}', '1', case.path.split('?', 1)[0])
+        try:
+            endpoint, _ = adapter.match(path, method=case.method)
+        except HTTPException:
+            endpoint = None
+        if endpoint != case.endpoint:
+            errors.append(f"сценарий {case.name}: {case.method} {case.path} ведёт в {endpoint}, а не в {case.endpoint}")
+    return errors
+
+
+def app_config(path, log_dir):
+    from backend.config import ProductionConfig
+
+    config = {key: getattr(ProductionConfig, key) for key in dir(ProductionConfig) if key.isupper()}
+    config.update(
+        DATABASE_URL=f"sqlite:///{path}",
+        LOG_FILE=os.path.join(log_dir, 'app.log'),
+        USER_ACTION_LOG=os.path.join(log_dir, 'user_actions.log'),
+        METRICS_DIR=os.path.join(log_dir, 'metrics'),
+        PROFILER_DIR=os.path.join(log_dir, 'profiles'),
+        TRACING_FILE=os.path.join(log_dir, 'traces.jsonl'),
+        DATABASE_INIT_SAMPLE_DATA=False,
+        KERBEROS_AUTH_ENABLED=False,
+        KERBEROS_AUTH_DEBUG=True,
+        SQLITE_CHECKPOINT_INTERVAL_SECONDS=0,
+    )
+    return config
+
+
+def build_app(path, log_dir, volumes, seed):
+    """Приложение на новой БД с синтетическим набором; вход — из ``app.config['BENCH_USER_INFO']``."""
+    from flask import g
+
+    from backend import create_app
+    from backend.models import db_manager
+    from backend.synthetic_data import generate_dataset
+
+    app = create_app(app_config(path, log_dir))
+    generate_dataset(db_manager, volumes, seed=seed)
+
+    @app.before_request
+    def _bench_auth():
+        g.user_info = app.config['BENCH_USER_INFO']
+
+    return app
+
+
+def dataset_context(volumes, upload) -> Dict[str, object]:
+    """Идентификаторы и строки для шаблонов путей (одни и те же при одном seed)."""
+    from backend.models import Answer, Lesson, User, db_manager
+
+    session = db_manager.get_read_session()
+    try:
+        admin, user, other = (session.get(User, user_id) for user_id in (1, 7, 8))
+        course_id = min(3, volumes.courses)
+        lessons = [lesson_id for lesson_id, in session.query(Lesson.id).filter(Lesson.course_id == course_id)
+                   .order_by(Lesson.id)]
+        answer = session.query(Answer).order_by(Answer.id).first()
+        return {
+            'admin': admin.username,
+            'username': user.username,
+            'user_id': user.id,
+            'other_user_id': other.id,
+            'surname': user.surname,
+            'department': user.department,
+            'course_id': course_id,
+            'lesson_id': lessons[0],
+            'course_lessons': lessons,
+            'question_id': answer.question_id,
+            'answer_id': answer.id,
+            'search': answer.question.title.split()[0],
+            'upload': upload,
+        }
+    finally:
+        session.close()
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_case(app, ctx, case, requests, warmup, queries) -> Dict[str, object]:
+    """Прогнать сценарий: ``warmup`` запросов без замера, затем ``requests`` замеров."""
+    client = app.test_client()
+    username = ctx['admin'] if case.role == 'admin' else ctx['username']
+    app.config['BENCH_USER_INFO'] = {'username': username, 'role': case.role, 'auth_method': 'benchmark'}
+    path = case.path.format(**ctx)
+
+    latencies, counts, sizes = [], [], []
+    for i in range(warmup + requests):
+        kwargs = case.body(ctx, i) if case.body else {}
+        queries.clear()
+        # Полная сборка мусора вне замера: иначе она случайно попадает в чужой запрос
+        gc.collect()
+        started = time.perf_counter()
+        response = client.open(path, method=case.method, **kwargs)
+        data = response.get_data()
+        elapsed = time.perf_counter() - started
+        response.close()
+        if response.status_code != case.status:
+            raise RuntimeError(f"{case.name}: {case.method} {path} вернул {response.status_code} "
+                               f"вместо {case.status}: {data[:200]!r}")
+        if i >= warmup:
+            latencies.append(elapsed * 1000)
+            counts.append(len(queries))
+            sizes.append(len(data))
+    return {
+        'p50_ms': round(percentile(latencies, 0.5), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'queries': int(statistics.median(counts)),
+        'bytes': int(statistics.median(sizes)),
+    }
+
+
+def run_dataset(name, requests, warmup, seed, progress=print) -> Dict[str, Dict[str, object]]:
+    from sqlalchemy import event
+
+    from backend.models import db_manager
+
+    volumes = DATASETS[name]
+    created_uploads_dir = not os.path.isdir(UPLOADS_DIR)
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    existing_uploads = set(os.listdir(UPLOADS_DIR))
+    upload = 'bench-endpoints.txt'
+    with open(os.path.join(UPLOADS_DIR, upload), 'wb') as handle:
+        handle.write(b'x' * 1024)
+
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            started = time.perf_counter()
+            app = build_app(os.path.join(tmp, f'{name}.db'), tmp, volumes, seed)
+            progress(f"  набор {name}: {volumes.users} пользователей, {volumes.courses} курсов, "
+                     f"{volumes.questions} вопросов — подготовлен за {time.perf_counter() - started:.1f} с")
+            errors = check_coverage(app)
+            if errors:
+                raise RuntimeError("\n".join(errors))
+
+            queries = []
+            engines = {db_manager.engine, db_manager.read_engine}
+
+            def _count(*args):
+                queries.append(args[2])
+
+            for engine in engines:
+                event.listen(engine, "before_cursor_execute", _count)
+            try:
+                ctx = dataset_context(volumes, upload)
+                for case in CASES:
+                    results[case.name] = run_case(app, ctx, case, requests, warmup, queries)
+            finally:
+                for engine in engines:
+                    event.remove(engine, "before_cursor_execute", _count)
+                db_manager.dispose()
+    finally:
+        for filename in set(os.listdir(UPLOADS_DIR)) - existing_uploads:
+            os.remove(os.path.join(UPLOADS_DIR, filename))
+        if created_uploads_dir:
+            os.rmdir(UPLOADS_DIR)
+    return results
+
+
+def compare(baseline, results, latency_tolerance=1.0, tail_tolerance=2.0, latency_floor_ms=5.0,
+            queries_tolerance=0, bytes_tolerance=0.05) -> List[str]:
+    """Регрессии ``results`` относительно ``baseline`` (оба — {сценарий: метрики}).
+
+    Задержка — регрессия, если p50 выросла больше чем на ``latency_tolerance``
+    (p95, более шумная, — на ``tail_tolerance``) и при этом больше чем на
+    ``latency_floor_ms``; запросы — больше чем на ``queries_tolerance``; размер
+    ответа — больше чем на ``bytes_tolerance``.
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, tolerance in (('p50_ms', latency_tolerance), ('p95_ms', tail_tolerance)):
+            limit = max(base[metric] * (1 + tolerance), base[metric] + latency_floor_ms)
+            if current[metric] > limit:
+                regressions.append(f"{name}: {metric} {current[metric]:.1f} > {base[metric]:.1f} (допуск {limit:.1f})")
+        if current['queries'] > base['queries'] + queries_tolerance:
+            regressions.append(f"{name}: запросов {current['queries']} > {base['queries']}")
+        if current['bytes'] > base['bytes'] * (1 + bytes_tolerance):
+            regressions.append(f"{name}: байт {current['bytes']} > {base['bytes']}")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {'datasets': {}}
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def save_baseline(path, baseline):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(baseline, handle, ensure_ascii=False, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def print_results(name, results, baseline):
+    print(f"  {'сценарий':<22} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'запросов':>9} {'байт':>10}  база p50")
+    for case_name, row in results.items():
+        base = baseline.get(case_name)
+        base_p50 = f"{base['p50_ms']:.1f}" if base else "—"
+        print(f"  {case_name:<22} {row['p50_ms']:9.1f} {row['p95_ms']:9.1f} {row['p99_ms']:9.1f} "
+              f"{row['queries']:9d} {row['bytes']:10d}  {base_p50}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", action='append', choices=list(DATASETS),
+                        help="набор данных (можно повторять; по умолчанию small и medium)")
+    parser.add_argument("--requests", type=int, default=20, help="замеров на сценарий")
+    parser.add_argument("--warmup", type=int, default=2, help="запросов без замера перед замерами")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action='store_true', help="записать результаты в базовую линию")
+    parser.add_argument("--latency-tolerance", type=float, default=1.0, help="допустимый рост p50 (доля)")
+    parser.add_argument("--tail-tolerance", type=float, default=2.0, help="допустимый рост p95 (доля)")
+    parser.add_argument("--latency-floor-ms", type=float, default=5.0,
+                        help="рост задержки меньше этого порога не считается регрессией")
+    parser.add_argument("--queries-tolerance", type=int, default=0, help="допустимый рост числа запросов")
+    parser.add_argument("--bytes-tolerance", type=float, default=0.05, help="допустимый рост размера ответа (доля)")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    regressions = []
+    print(f"🚀 Эндпоинты: {len(CASES)} сценариев, {args.requests} замеров на сценарий")
+    for name in args.dataset or ['small', 'medium']:
+        results = run_dataset(name, args.requests, args.warmup, args.seed)
+        dataset_baseline = baseline['datasets'].get(name, {})
+        print_results(name, results, dataset_baseline)
+        if args.update_baseline:
+            baseline['datasets'][name] = results
+            continue
+        if not dataset_baseline:
+            print(f"  ⚠️ Для набора {name} нет базовой линии — сравнение пропущено")
+        for regression in compare(dataset_baseline, results, args.latency_tolerance, args.tail_tolerance,
+                                  args.latency_floor_ms, args.queries_tolerance, args.bytes_tolerance):
+            regressions.append(f"{name}/{regression}")
+
+    if args.update_baseline:
+        baseline['environment'] = {'python': platform.python_version(), 'machine': platform.machine(),
+                                   'requests': args.requests}
+        save_baseline(args.baseline, baseline)
+        print(f"💾 Базовая линия обновлена: {os.path.relpath(args.baseline, ROOT)}")
+        return
+    if regressions:
+        print(f"❌ Регрессии ({len(regressions)}):")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации JSON (backend/json_provider.py): ответы /api/users и
+/api/questions без пагинации на синтетическом наборе (по умолчанию по 10 000
+строк).
+
+Для каждого эндпоинта один раз перехватывается объект, который обработчик
+передаёт в ``jsonify``, и кодируется провайдерами:
+
+- ``flask`` — стандартный ``DefaultJSONProvider`` (как было до провайдера);
+- ``stdlib`` — ``FastJSONProvider`` на переиспользуемом кодировщике json;
+- ``orjson`` — ``FastJSONProvider`` на orjson (если установлен).
+
+Печатаются медиана времени ``response()``, пик памяти и число выделенных
+блоков по tracemalloc, размер тела и медиана полного запроса через тестовый
+клиент.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_json --rows 10000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend.synthetic_data import SyntheticVolumes
+
+ENDPOINTS = {
+    'users': '/api/users',
+    'questions': '/api/questions',
+}
+
+
+def providers(app):
+    """{имя: провайдер}; orjson — только если установлен."""
+    from flask.json.provider import DefaultJSONProvider
+
+    from backend.json_provider import FastJSONProvider, orjson
+
+    result = {'flask': DefaultJSONProvider(app)}
+    stdlib = FastJSONProvider(app)
+    stdlib.backend = 'json'
+    result['stdlib'] = stdlib
+    if orjson is not None:
+        result['orjson'] = FastJSONProvider(app)
+    return result
+
+
+def capture_payload(app, path):
+    """Объект, который обработчик отдаёт в jsonify."""
+    original = app.json
+    captured = []
+
+    class Capturing(type(original)):
+        def response(self, *args, **kwargs):
+            captured.append(self._prepare_response_obj(args, kwargs))
+            return super().response(*args, **kwargs)
+
+    app.json = Capturing(app)
+    try:
+        response = app.test_client().get(path)
+        assert response.status_code == 200, response.status_code
+    finally:
+        app.json = original
+    return captured[-1]
+
+
+def measure_encode(app, provider, payload, repeat):
+    """(медиана мс, пик КиБ, выделено блоков, байт тела)."""
+    with app.app_context():
+        body = provider.response(payload).get_data()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            provider.response(payload)
+            timings.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            snapshot_before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            response = provider.response(payload)
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot_after = tracemalloc.take_snapshot()
+            del response
+        finally:
+            tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in snapshot_after.compare_to(snapshot_before, 'filename')
+                 if stat.count_diff > 0)
+    return statistics.median(timings) * 1000, (peak - before) / 1024, blocks, len(body)
+
+
+def measure_requests(app, candidates, path, repeat):
+    """{провайдер: медиана мс полного запроса}; провайдеры чередуются, чтобы уравнять фон."""
+    original = app.json
+    client = app.test_client()
+    timings = {name: [] for name in candidates}
+    try:
+        for _ in range(repeat):
+            for name, provider in candidates.items():
+                app.json = provider
+                started = time.perf_counter()
+                response = client.get(path)
+                timings[name].append(time.perf_counter() - started)
+                assert response.status_code == 200, response.status_code
+    finally:
+        app.json = original
+    return {name: statistics.median(values) * 1000 for name, values in timings.items()}
+
+
+def main():
+    from benchmarks.bench_endpoints import build_app
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="пользователей и вопросов в наборе")
+    parser.add_argument("--repeat", type=int, default=10, help="замеров кодирования на провайдер")
+    parser.add_argument("--requests", type=int, default=5, help="полных запросов на провайдер")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    volumes = SyntheticVolumes(users=args.rows, departments=20, courses=20, questions=args.rows,
+                               answers_per_question=1, lesson_content_bytes=200)
+    from backend.models import db_manager
+
+    with tempfile.TemporaryDirectory(prefix="bench-json-") as tmp:
+        started = time.perf_counter()
+        app = build_app(os.path.join(tmp, 'bench.db'), tmp, volumes, args.seed)
+        app.config['BENCH_USER_INFO'] = {'username': 'user1', 'role': 'admin', 'authenticated': True}
+        print(f"🧾 JSON: {args.rows} пользователей и вопросов, набор за {time.perf_counter() - started:.1f} с")
+        try:
+            candidates = providers(app)
+            if 'orjson' not in candidates:
+                print("  orjson не установлен — сравниваются flask и stdlib")
+            for name, path in ENDPOINTS.items():
+                payload = capture_payload(app, path)
+                print(f"\n  {path}")
+                print(f"  {'провайдер':<9} {'кодир., мс':>11} {'пик, КиБ':>10} {'блоков':>8} {'байт':>10} {'запрос, мс':>11}")
+                request_ms = measure_requests(app, candidates, path, args.requests)
+                for provider_name, provider in candidates.items():
+                    encode_ms, peak_kib, blocks, size = measure_encode(app, provider, payload, args.repeat)
+                    print(f"  {provider_name:<9} {encode_ms:11.1f} {peak_kib:10.0f} {blocks:8d} {size:10d} "
+                          f"{request_ms[provider_name]:11.1f}")
+        finally:
+            db_manager.dispose()
+
+
+if __name__ == "__main__":
+    main()
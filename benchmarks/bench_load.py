@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест: настоящий gunicorn с конфигурацией из Dockerfile (воркеры,
+gthread, потоки) на временной БД с синтетическим набором.
+
+Виртуальные пользователи работают по замкнутому циклу: каждый выполняет
+сценарий, ждёт ответы и сразу (или после --think-time) берёт следующий.
+Смесь сценариев (--mix):
+
+- page — загрузка страницы со всеми её CSS и картинками;
+- dashboard — страница users-info и её вызовы API (текущий пользователь,
+  статистика, отделы, список, прогресс, подсказки);
+- questions — лента вопросов, вопрос и ответы;
+- post — новый вопрос и загрузка вложения к нему.
+
+Каждый сценарий идёт от имени случайного пользователя с поддельным
+заголовком ``Authorization: Negotiate`` (упрощённая проверка Kerberos
+извлекает из токена ``логин@REALM``); доля --new-user-ratio — новые логины,
+которые регистрируются автоматически. Отчёт: пропускная способность,
+p50/p95/p99 и доля ошибок по маршрутам — по нему подбираются --workers и
+--threads.
+
+Клиент — потоки в одном процессе на той же машине: на малом числе ядер он
+отнимает процессор у воркеров, сравнивайте конфигурации при одинаковом
+--clients.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_load --dataset medium --clients 32 --duration 60
+    python -m benchmarks.bench_load --workers 5 --threads 4 --json load.json
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_endpoints import DATASETS, UPLOADS_DIR
+
+DEFAULT_MIX = "page=40,dashboard=30,questions=20,post=10"
+PAGES = ['/main', '/questions', '/all-courses', '/all-lessons', '/lessons-content', '/users-info']
+REALM = 'EXAMPLE.COM'
+ASSET_RE = re.compile(r'(?:href|src)="(/[^"#?]+\.(?:css|js|svg|png|jpe?g|gif|ico|woff2?))"')
+
+
+def dockerfile_gunicorn_args(port: int) -> List[str]:
+    """Аргументы gunicorn из CMD Dockerfile с адресом ``127.0.0.1:port``."""
+    with open(os.path.join(ROOT, 'Dockerfile'), encoding='utf-8') as handle:
+        cmd = next(json.loads(line[len('CMD'):]) for line in handle if line.startswith('CMD'))
+    args = cmd[1:]
+    for flag in ('-b', '--bind'):
+        if flag in args:
+            args[args.index(flag) + 1] = f"127.0.0.1:{port}"
+    return args
+
+
+def override_arg(args: List[str], flags, value) -> List[str]:
+    for flag in flags:
+        if flag in args:
+            args[args.index(flag) + 1] = str(value)
+            return args
+    return args + [flags[0], str(value)]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def negotiate_header(username: str) -> str:
+    token = base64.b64encode(f"{username}@{REALM}".encode()).decode()
+    return f"Negotiate {token}"
+
+
+def prepare_database(path, volumes, seed, distinct_users) -> Dict[str, object]:
+    """БД с отметкой схемы (воркеры не мигрируют) и синтетическим набором; вернуть пул логинов и id."""
+    from backend.models import DatabaseManager, Question, User
+    from backend.schema_version import upgrade_database
+    from backend.synthetic_data import generate_dataset
+
+    manager = DatabaseManager(f"sqlite:///{path}")
+    upgrade_database(manager, sample_data=False)
+    generate_dataset(manager, volumes, seed=seed)
+    session = manager.get_session()
+    try:
+        usernames = [name for name, in session.query(User.username).order_by(User.id).limit(distinct_users)]
+        user_ids = [user_id for user_id, in session.query(User.id).order_by(User.id).limit(distinct_users)]
+        question_ids = [qid for qid, in session.query(Question.id)]
+        surnames = sorted({surname for surname, in session.query(User.surname).limit(1000) if surname})
+    finally:
+        session.close()
+        manager.dispose()
+    return {'usernames': usernames, 'user_ids': user_ids, 'question_ids': question_ids, 'surnames': surnames}
+
+
+class Recorder:
+    """Замеры по маршрутам; до ``start_at`` (прогрев) запросы не учитываются."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_at = float('inf')
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def add(self, label, status, elapsed, finished):
+        if finished < self.start_at:
+            return
+        with self.lock:
+            self.latencies[label].append(elapsed)
+            self.statuses[label][status] += 1
+
+
+class Client:
+    """HTTP/1.1 keep-alive соединение виртуального пользователя."""
+
+    def __init__(self, port, recorder):
+        self.port = port
+        self.recorder = recorder
+        self.conn = None
+        self.auth = None
+
+    def request(self, label, method, path, body=None, headers=None):
+        headers = {'Authorization': self.auth, **(headers or {})}
+        started = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            self.conn.request(method, quote(path, safe="/?&=%"), body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+            status = response.status
+            if response.will_close:
+                self.close()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            data, status = b'', 0
+        finished = time.perf_counter()
+        self.recorder.add(label, status, finished - started, finished)
+        return status, data
+
+    def get(self, label, path):
+        return self.request(label, 'GET', path)
+
+    def post_json(self, label, path, payload):
+        return self.request(label, 'POST', path, json.dumps(payload).encode('utf-8'),
+                            {'Content-Type': 'application/json'})
+
+    def post_file(self, label, path, filename, content):
+        boundary = f"bench{random.getrandbits(64):016x}"
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode('utf-8') + content + f"\r\n--{boundary}--\r\n".encode('utf-8')
+        return self.request(label, 'POST', path, body, {'Content-Type': f"multipart/form-data; boundary={boundary}"})
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def _asset_label(asset):
+    return f"GET asset *{os.path.splitext(asset)[1]}"
+
+
+def scenario_page(client, ctx, rng):
+    page = rng.choice(PAGES)
+    client.get(f"GET {page}", page)
+    for asset in ctx['assets'][page]:
+        client.get(_asset_label(asset), asset)
+
+
+def scenario_dashboard(client, ctx, rng):
+    client.get("GET /users-info", '/users-info')
+    for asset in ctx['assets']['/users-info']:
+        client.get(_asset_label(asset), asset)
+    client.get("GET /api/current-user", '/api/current-user')
+    client.get("GET /api/statistics", '/api/statistics')
+    client.get("GET /api/departments", '/api/departments')
+    client.get("GET /api/users", '/api/users?limit=50&sort=full_name&')
+    client.get("GET /api/users/<id>/progress", f"/api/users/{rng.choice(ctx['user_ids'])}/progress")
+    prefix = rng.choice(ctx['surnames'])[:rng.randint(2, 5)]
+    client.get("GET /api/users/suggest", f"/api/users/suggest?q={prefix}")
+
+
+def scenario_questions(client, ctx, rng):
+    client.get("GET /api/questions", '/api/questions?limit=20')
+    qid = rng.choice(ctx['question_ids'])
+    client.get("GET /api/questions/<id>", f"/api/questions/{qid}")
+    client.get("GET /api/questions/<id>/answers", f"/api/questions/{qid}/answers")
+
+
+def scenario_post(client, ctx, rng):
+    status, data = client.post_json("POST /api/questions", '/api/questions', {
+        'title': f"Вопрос под нагрузкой {rng.getrandbits(32):08x}",
+        'body': "Не открывается урок, что делать?",
+    })
+    if status == 201:
+        qid = json.loads(data)['question']['id']
+        client.post_file("POST /api/questions/<id>/attachments", f"/api/questions/{qid}/attachments",
+                         'screenshot.png', rng.randbytes(rng.randint(10_000, 200_000)))
+
+
+SCENARIOS = {
+    'page': scenario_page,
+    'dashboard': scenario_dashboard,
+    'questions': scenario_questions,
+    'post': scenario_post,
+}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"неизвестный сценарий: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def discover_assets(port) -> Dict[str, List[str]]:
+    """CSS и картинки каждой страницы — их браузер запрашивает вслед за HTML."""
+    client = Client(port, Recorder())
+    client.auth = negotiate_header('loadtest.probe')
+    assets = {}
+    for page in PAGES:
+        status, html = client.get(page, page)
+        if status != 200:
+            raise RuntimeError(f"{page} вернул {status}")
+        assets[page] = sorted(set(ASSET_RE.findall(html.decode('utf-8'))))
+    client.close()
+    return assets
+
+
+def virtual_user(index, port, ctx, mix, args, recorder, deadline):
+    rng = random.Random(args.seed * 1000 + index)
+    client = Client(port, recorder)
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        if rng.random() < args.new_user_ratio:
+            username = f"loadtest.user{index}.{rng.getrandbits(32):08x}"
+        else:
+            username = rng.choice(ctx['usernames'])
+        client.auth = negotiate_header(username)
+        SCENARIOS[rng.choices(names, weights)[0]](client, ctx, rng)
+        if args.think_time:
+            time.sleep(rng.expovariate(1 / args.think_time))
+    client.close()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def build_report(recorder, duration) -> Dict[str, object]:
+    routes = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        statuses = recorder.statuses[label]
+        errors = sum(count for status, count in statuses.items() if status == 0 or status >= 400)
+        routes[label] = {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / duration, 2),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'error_rate': round(errors / len(latencies), 4),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        }
+    total = sum(route['requests'] for route in routes.values())
+    all_latencies = [value for latencies in recorder.latencies.values() for value in latencies]
+    errors = sum(route['error_rate'] * route['requests'] for route in routes.values())
+    return {
+        'duration_s': duration,
+        'requests': total,
+        'rps': round(total / duration, 1),
+        'p50_ms': round(percentile(all_latencies, 0.5) * 1000, 1) if all_latencies else None,
+        'p99_ms': round(percentile(all_latencies, 0.99) * 1000, 1) if all_latencies else None,
+        'error_rate': round(errors / total, 4) if total else None,
+        'routes': routes,
+    }
+
+
+def print_report(report):
+    print(f"  {'маршрут':<38} {'запросов':>8} {'в сек':>7} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} {'ошибки':>7}")
+    for label, route in report['routes'].items():
+        print(f"  {label:<38} {route['requests']:8d} {route['rps']:7.1f} {route['p50_ms']:8.1f} "
+              f"{route['p95_ms']:8.1f} {route['p99_ms']:8.1f} {route['error_rate'] * 100:6.1f}%")
+    print(f"📊 Итого: {report['requests']} запросов, {report['rps']} в секунду, p50 {report['p50_ms']} мс, "
+          f"p99 {report['p99_ms']} мс, ошибок {(report['error_rate'] or 0) * 100:.2f}%")
+
+
+def wait_until_ready(port, process, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn завершился с кодом {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/healthz')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn не ответил на /healthz")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", choices=list(DATASETS), default='medium')
+    parser.add_argument("--clients", type=int, default=32, help="виртуальных пользователей")
+    parser.add_argument("--duration", type=float, default=30, help="длительность замера, с")
+    parser.add_argument("--warmup", type=float, default=5, help="прогрев без замеров, с")
+    parser.add_argument("--think-time", type=float, default=0.0, help="средняя пауза между сценариями, с")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--distinct-users", type=int, default=2000, help="разных логинов в Negotiate-токенах")
+    parser.add_argument("--new-user-ratio", type=float, default=0.02, help="доля сценариев от новых логинов")
+    parser.add_argument("--workers", type=int, help="вместо значения из Dockerfile")
+    parser.add_argument("--threads", type=int, help="вместо значения из Dockerfile")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="записать отчёт в JSON")
+    args = parser.parse_args()
+
+    port = free_port()
+    gunicorn_args = dockerfile_gunicorn_args(port)
+    if args.workers:
+        gunicorn_args = override_arg(gunicorn_args, ('-w', '--workers'), args.workers)
+    if args.threads:
+        gunicorn_args = override_arg(gunicorn_args, ('--threads',), args.threads)
+
+    created_uploads_dir = not os.path.isdir(UPLOADS_DIR)
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    existing_uploads = set(os.listdir(UPLOADS_DIR))
+    process: Optional[subprocess.Popen] = None
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'load.db')
+            ctx = prepare_database(path, DATASETS[args.dataset], args.seed, args.distinct_users)
+            env = dict(
+                os.environ,
+                FLASK_ENV='production',
+                DATABASE_URL=f"sqlite:///{path}",
+                DATABASE_INIT_SAMPLE_DATA='false',
+                LOG_FILE=os.path.join(tmp, 'app.log'),
+                USER_ACTION_LOG=os.path.join(tmp, 'user_actions.log'),
+                METRICS_DIR=os.path.join(tmp, 'metrics'),
+                PROFILER_DIR=os.path.join(tmp, 'profiles'),
+                TRACING_FILE=os.path.join(tmp, 'traces.jsonl'),
+                KERBEROS_AUTH_ENABLED='true',
+                KERBEROS_REALM=REALM,
+                LOG_LEVEL='WARNING',
+            )
+            print(f"🚀 gunicorn {' '.join(gunicorn_args)} | набор {args.dataset} | {args.clients} клиентов, "
+                  f"{args.duration:.0f} с")
+            with open(os.path.join(tmp, 'gunicorn.log'), 'wb') as log:
+                process = subprocess.Popen(
+                    [sys.executable, '-m', 'gunicorn', *gunicorn_args, 'backend.wsgi:application'],
+                    cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+                )
+                wait_until_ready(port, process)
+                ctx['assets'] = discover_assets(port)
+
+                recorder = Recorder()
+                started = time.perf_counter()
+                recorder.start_at = started + args.warmup
+                deadline = recorder.start_at + args.duration
+                threads = [
+                    threading.Thread(target=virtual_user, daemon=True,
+                                     args=(index, port, ctx, args.mix, args, recorder, deadline))
+                    for index in range(args.clients)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                duration = time.perf_counter() - recorder.start_at
+
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=30)
+
+            report = build_report(recorder, duration)
+            report['gunicorn'] = gunicorn_args
+            report['clients'] = args.clients
+            report['dataset'] = args.dataset
+            print_report(report)
+            if args.json:
+                with open(args.json, 'w', encoding='utf-8') as handle:
+                    json.dump(report, handle, ensure_ascii=False, indent=2)
+                print(f"💾 Отчёт записан: {args.json}")
+    finally:
+        if process is not None and process.poll() is None:
+            process.kill()
+        for filename in set(os.listdir(UPLOADS_DIR)) - existing_uploads:
+            os.remove(os.path.join(UPLOADS_DIR, filename))
+        if created_uploads_dir:
+            os.rmdir(UPLOADS_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк выгрузки отчёта о прогрессе (backend/reports.py): время и пик
+памяти процесса (RSS) при потоковой генерации CSV и XLSX на синтетической БД
+(по умолчанию 20 000 пользователей × 50 курсов = 1 млн строк).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_progress_export --users 20000 --courses 50
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.models import DatabaseManager
+from backend.reports import ProgressReportFilter, progress_report_chunks
+
+
+def seed(manager, users, courses, rng):
+    conn = manager.engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO courses (id, title, total_lessons, is_active) VALUES (?, ?, ?, 1)",
+            [(c, f"Курс {c}", 10) for c in range(1, courses + 1)],
+        )
+        cur.executemany(
+            "INSERT INTO users (id, username, full_name, department, role, is_active) VALUES (?, ?, ?, ?, 'user', 1)",
+            [(u, f"user{u}", f"Сотрудник {u}", f"Отдел {u % 40}") for u in range(1, users + 1)],
+        )
+        cur.executemany(
+            "INSERT INTO user_course_progress (user_id, course_id, lessons_completed, is_completed, started_at) "
+            "VALUES (?, ?, ?, ?, '2024-01-01 10:00:00')",
+            ((u, c, done, done == 10) for u in range(1, users + 1) for c in range(1, courses + 1)
+             for done in (rng.randint(0, 10),)),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def export(manager, fmt, filters):
+    size = chunks = 0
+    started = time.perf_counter()
+    for chunk in progress_report_chunks(manager.get_session(), filters, fmt):
+        size += len(chunk)
+        chunks += 1
+    elapsed = time.perf_counter() - started
+    # ru_maxrss — в КБ (Linux); пик за всё время процесса, включая заполнение БД
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return elapsed, size, chunks, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DatabaseManager(f"sqlite:///{os.path.join(tmp, 'export.db')}")
+        manager.create_tables()
+        seed(manager, args.users, args.courses, random.Random(args.seed))
+        print(f"📤 Выгрузка прогресса: {args.users} пользователей × {args.courses} курсов")
+        for label, filters in (("все", ProgressReportFilter()),
+                               ("1 отдел", ProgressReportFilter(departments=["Отдел 7"]))):
+            for fmt in ("csv", "xlsx"):
+                elapsed, size, chunks, peak = export(manager, fmt, filters)
+                print(f"  {label:<8} | {fmt:<4} | {elapsed:6.2f} с | {size / 2 ** 20:7.1f} МБ "
+                      f"| кусков: {chunks:>4} | пик RSS: {peak / 2 ** 20:5.1f} МБ")
+        manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конкурентного доступа к SQLite: несколько процессов (как воркеры
+gunicorn) по несколько потоков выполняют смесь чтений (прогресс
+пользователя, счётчики статистики, изредка — тяжёлый агрегат по сырым
+таблицам, как при выгрузке отчёта) и записей (отметка урока с обновлением сводки)
+на одной БД. Сравниваются настройки SQLite по умолчанию (rollback-журнал),
+профиль из backend/sqlite_pragmas.py (WAL, busy_timeout и т.д.) и тот же
+профиль с разделением соединений, как в API: чтения через движок только для
+чтения, записи — через пишущий пул из одного соединения на процесс.
+Выводятся число ошибок «database is locked», пропускная способность, p50/p99.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_sqlite_concurrency --processes 3 --threads 8 --seconds 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+
+from backend.models import DatabaseManager, UserCourseProgress
+from backend.progress import complete_lesson
+from backend.sqlite_pragmas import SqlitePragmaProfile
+from backend.statistics import compute_statistics, read_statistics
+
+# метка -> (профиль, читать через движок только для чтения)
+SCENARIOS = {
+    "по умолчанию": (SqlitePragmaProfile.legacy(), False),
+    "профиль WAL": (SqlitePragmaProfile(), False),
+    "WAL + чтение/запись": (SqlitePragmaProfile(), True),
+}
+
+
+def seed(path, users, courses, lessons_per_course):
+    manager = DatabaseManager(f"sqlite:///{path}", SqlitePragmaProfile.legacy())
+    manager.create_tables()
+    conn = manager.engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO users (id, username, full_name, department, role, is_active) VALUES (?, ?, ?, ?, 'user', 1)",
+            [(u, f"user{u}", f"Сотрудник {u}", f"Отдел {u % 20}") for u in range(1, users + 1)],
+        )
+        cur.executemany(
+            "INSERT INTO courses (id, title, total_lessons, is_active) VALUES (?, ?, ?, 1)",
+            [(c, f"Курс {c}", lessons_per_course) for c in range(1, courses + 1)],
+        )
+        cur.executemany(
+            "INSERT INTO lessons (id, course_id, title, lesson_number, is_active) VALUES (?, ?, ?, ?, 1)",
+            [((c - 1) * lessons_per_course + n, c, f"Урок {n}", n)
+             for c in range(1, courses + 1) for n in range(1, lessons_per_course + 1)],
+        )
+        # Половина пользователей уже записана на первые курсы — есть что агрегировать
+        cur.executemany(
+            "INSERT INTO user_course_progress (user_id, course_id, lessons_completed, is_completed) VALUES (?, ?, 0, 0)",
+            [(u, c) for u in range(1, users + 1, 2) for c in range(1, courses // 2 + 1)],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    manager.engine.dispose()
+
+
+def worker(path, profile, routed, threads, seconds, write_ratio, heavy_ratio, users, courses, lessons_per_course,
+           seed_value, results):
+    if routed:
+        manager = DatabaseManager(f"sqlite:///{path}", profile, writer_pool_size=1, reader_pool_size=threads)
+    else:
+        manager = DatabaseManager(f"sqlite:///{path}", profile)
+    deadline = time.monotonic() + seconds
+    lock = threading.Lock()
+    stats = {'read': [], 'write': [], 'locked': 0, 'other_errors': 0}
+
+    def loop(thread_no):
+        rng = random.Random(seed_value * 1000 + thread_no)
+        while time.monotonic() < deadline:
+            dice = rng.random()
+            is_write = dice < write_ratio
+            session = manager.get_session() if is_write or not routed else manager.get_read_session()
+            started = time.perf_counter()
+            try:
+                if is_write:
+                    course_id = rng.randint(1, courses)
+                    lesson_no = rng.randint(1, lessons_per_course)
+                    lesson = SimpleNamespace(id=(course_id - 1) * lessons_per_course + lesson_no, course_id=course_id)
+                    complete_lesson(session, rng.randint(1, users), lesson, lessons_per_course)
+                    session.commit()
+                elif dice < write_ratio + heavy_ratio:
+                    compute_statistics(session)
+                else:
+                    session.query(UserCourseProgress).filter(
+                        UserCourseProgress.user_id == rng.randint(1, users)
+                    ).all()
+                    read_statistics(session)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    stats['write' if is_write else 'read'].append(elapsed)
+            except OperationalError as exc:
+                session.rollback()
+                with lock:
+                    if 'locked' in str(exc) or 'busy' in str(exc):
+                        stats['locked'] += 1
+                    else:
+                        stats['other_errors'] += 1
+            finally:
+                session.close()
+
+    pool = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    manager.dispose()
+    results.put(stats)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run(profile, routed, args, tmp, label):
+    path = os.path.join(tmp, f"concurrency_{abs(hash(label))}.db")
+    seed(path, args.users, args.courses, args.lessons)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(
+            path, profile, routed, args.threads, args.seconds, args.write_ratio, args.heavy_read_ratio,
+            args.users, args.courses, args.lessons, args.seed + p, results,
+        ))
+        for p in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    merged = {'read': [], 'write': [], 'locked': 0, 'other_errors': 0}
+    for _ in processes:
+        stats = results.get()
+        merged['read'] += stats['read']
+        merged['write'] += stats['write']
+        merged['locked'] += stats['locked']
+        merged['other_errors'] += stats['other_errors']
+    for process in processes:
+        process.join()
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--heavy-read-ratio", type=float, default=0.05, help="доля агрегатов по сырым таблицам")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--lessons", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"🔒 Конкурентный доступ к SQLite: {args.processes} процесса × {args.threads} потоков, "
+          f"{args.seconds:.0f} с, доля записей {args.write_ratio:.0%}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, (profile, routed) in SCENARIOS.items():
+            stats = run(profile, routed, args, tmp, label)
+            ops = len(stats['read']) + len(stats['write'])
+            print(f"  {label:<19} | операций/с: {ops / args.seconds:7.0f} | «locked»: {stats['locked']:>5} "
+                  f"| прочие ошибки: {stats['other_errors']:>3}")
+            for kind in ('read', 'write'):
+                values = stats[kind]
+                name = "чтение" if kind == 'read' else "запись"
+                print(f"      {name:<7} n={len(values):>6} | p50: {percentile(values, 0.5) * 1000:7.1f} мс "
+                      f"| p99: {percentile(values, 0.99) * 1000:7.1f} мс "
+                      f"| max: {max(values, default=0) * 1000:7.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
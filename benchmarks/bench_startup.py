@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк старта воркера: импорт backend и create_app на уже развёрнутой БД.
+
+Каждый замер выполняется в отдельном процессе (как новый воркер gunicorn):
+время импорта, время create_app и число SQL-запросов при старте.
+Сравниваются старт с актуальной отметкой версии схемы (один SELECT
+schema_meta) и прежнее поведение — полные миграции и наполнение базовыми
+данными в каждом воркере (отметка сбрасывается перед каждым замером).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_startup --users 20000 --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def app_config(path, log_dir):
+    from backend.config import ProductionConfig
+
+    config = {key: getattr(ProductionConfig, key) for key in dir(ProductionConfig) if key.isupper()}
+    config.update(
+        DATABASE_URL=f"sqlite:///{path}",
+        LOG_FILE=os.path.join(log_dir, 'app.log'),
+        USER_ACTION_LOG=os.path.join(log_dir, 'user_actions.log'),
+        METRICS_DIR=os.path.join(log_dir, 'metrics'),
+        PROFILER_DIR=os.path.join(log_dir, 'profiles'),
+        TRACING_FILE=os.path.join(log_dir, 'traces.jsonl'),
+        DATABASE_INIT_SAMPLE_DATA=True,
+        KERBEROS_AUTH_ENABLED=False,
+        SQLITE_CHECKPOINT_INTERVAL_SECONDS=0,
+    )
+    return config
+
+
+def seed(path, users):
+    from backend.models import DatabaseManager
+    from backend.schema_version import upgrade_database
+
+    manager = DatabaseManager(f"sqlite:///{path}")
+    manager.create_tables()
+    conn = manager.engine.raw_connection()
+    try:
+        conn.cursor().executemany(
+            "INSERT INTO users (id, username, full_name, department, role, is_active) VALUES (?, ?, ?, ?, 'user', 1)",
+            [(u, f"user{u}", f"Сотрудник {u}", f"Отдел {u % 40}") for u in range(1, users + 1)],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    upgrade_database(manager, sample_data=True, force=True)
+    manager.dispose()
+
+
+def child(path, mode, log_dir):
+    """Один старт воркера; результат — JSON в stdout."""
+    started = time.perf_counter()
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from backend import create_app
+    imported = time.perf_counter()
+
+    if mode == 'legacy':
+        import sqlite3
+
+        with sqlite3.connect(path) as conn:
+            conn.execute("DELETE FROM schema_meta")
+
+    queries = []
+    event.listen(Engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    booted = time.perf_counter()
+    create_app(app_config(path, log_dir))
+    finished = time.perf_counter()
+    print(json.dumps({'import': imported - started, 'create_app': finished - booted, 'queries': len(queries)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", choices=('stamped', 'legacy'), help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--log-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.db, args.child, args.log_dir)
+        return
+
+    print(f"🚀 Старт воркера: {args.users} пользователей, {args.runs} запусков на режим")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'startup.db')
+        seed(path, args.users)
+        for mode, label in (('legacy', "миграции в каждом воркере"), ('stamped', "отметка версии")):
+            runs = []
+            for _ in range(args.runs):
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_startup', '--child', mode, '--db', path, '--log-dir', tmp],
+                    cwd=ROOT, check=True, capture_output=True, text=True,
+                ).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            print(f"  {label:<26} | импорт: {statistics.median(r['import'] for r in runs) * 1000:7.1f} мс "
+                  f"| create_app: {statistics.median(r['create_app'] for r in runs) * 1000:7.1f} мс "
+                  f"| запросов: {runs[-1]['queries']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк /api/statistics: число SQL-запросов и время ответа
+на синтетической БД (по умолчанию 10 000 пользователей и 50 курсов).
+
+Сравнивает прежнюю реализацию (COUNT на отдел и ленивая загрузка
+прогресса на курс) с агрегатными запросами из backend/statistics.py.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_statistics --users 10000 --courses 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.models import Course, DatabaseManager, User
+from backend.statistics import compute_statistics
+
+
+def legacy_statistics(session):
+    """Реализация /api/statistics до перехода на GROUP BY (для сравнения)."""
+    total_users = session.query(User).count()
+    active_users = session.query(User).filter(User.is_active == True).count()
+    total_courses = session.query(Course).filter(Course.is_active == True).count()
+    departments_stats = []
+    for dept in session.query(User.department).distinct().all():
+        if dept[0]:
+            departments_stats.append({
+                'department': dept[0],
+                'users_count': session.query(User).filter(User.department == dept[0]).count(),
+            })
+    courses_stats = []
+    for course in session.query(Course).filter(Course.is_active == True).all():
+        enrolled = len(course.user_progress)
+        completed = len([p for p in course.user_progress if p.is_completed])
+        courses_stats.append({'course_id': course.id, 'enrolled_users': enrolled, 'completed_users': completed})
+    return {
+        'overview': {'total_users': total_users, 'active_users': active_users, 'total_courses': total_courses},
+        'departments': departments_stats,
+        'courses': courses_stats,
+    }
+
+
+def seed(manager, users, courses, departments, enrollments_per_user, rng):
+    conn = manager.engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO courses (id, title, total_lessons, is_active) VALUES (?, ?, ?, 1)",
+            [(c, f"Курс {c}", 10) for c in range(1, courses + 1)],
+        )
+        cur.executemany(
+            "INSERT INTO users (id, username, full_name, department, role, is_active) VALUES (?, ?, ?, ?, 'user', ?)",
+            [(u, f"user{u}", f"Сотрудник {u}", f"Отдел {u % departments}", 1 if u % 10 else 0)
+             for u in range(1, users + 1)],
+        )
+        rows = []
+        for u in range(1, users + 1):
+            for c in rng.sample(range(1, courses + 1), enrollments_per_user):
+                done = rng.randint(0, 10)
+                rows.append((u, c, done, 1 if done == 10 else 0))
+        cur.executemany(
+            "INSERT INTO user_course_progress (user_id, course_id, lessons_completed, is_completed) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def measure(manager, func, repeat):
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(manager.engine, "before_cursor_execute", _count)
+    timings = []
+    try:
+        for _ in range(repeat):
+            statements.clear()
+            session = manager.get_session()
+            started = time.perf_counter()
+            try:
+                func(session)
+            finally:
+                session.close()
+            timings.append(time.perf_counter() - started)
+    finally:
+        event.remove(manager.engine, "before_cursor_execute", _count)
+    return len(statements), min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--departments", type=int, default=40)
+    parser.add_argument("--enrollments", type=int, default=5, help="курсов на пользователя")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"📊 Бенчмарк /api/statistics: {args.users} пользователей, {args.courses} курсов, "
+              f"{args.departments} отделов")
+        for scale in (10, 1):
+            users = max(args.users // scale, 1)
+            manager = DatabaseManager(f"sqlite:///{os.path.join(tmp, f'stats_{users}.db')}")
+            manager.create_tables()
+            seed(manager, users, args.courses, args.departments, min(args.enrollments, args.courses),
+                 random.Random(args.seed))
+            for name, func in (("до (циклы)", legacy_statistics), ("после (GROUP BY)", compute_statistics)):
+                queries, best = measure(manager, func, args.repeat)
+                print(f"  {users:>7} польз. | {name:<17} | запросов: {queries:>4} | время: {best * 1000:8.1f} мс")
+            manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
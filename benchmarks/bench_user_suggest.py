@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подсказок пользователей (backend/user_suggest.py): время
+построения in-memory индекса и время ответа на типичные префиксы
+на синтетическом наборе (по умолчанию 50 000 пользователей).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_user_suggest --users 50000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.user_suggest import UserSuggestIndex
+
+# Фамилии — основа + суффикс; частоты по закону Ципфа (самая частая ~3%)
+SURNAME_STEMS = ["Иван", "Смирн", "Кузнец", "Поп", "Васил", "Петр", "Сокол", "Михайл", "Новик", "Фёдор",
+                 "Мороз", "Волк", "Алексе", "Лебед", "Семён", "Егор", "Павл", "Козл", "Степан", "Никола",
+                 "Орл", "Андре", "Макар", "Никит", "Захар", "Зайц", "Солов", "Борис", "Яковл", "Григор",
+                 "Роман", "Воробь", "Серге", "Кузьм", "Фрол", "Александр", "Дмитри", "Корол", "Гусе", "Кисел"]
+SURNAME_SUFFIXES = ["ов", "ев", "ин", "енко", "ский", "цев", "ович", "ук"]
+FIRST_NAMES = ["Александр", "Алексей", "Андрей", "Антон", "Артём", "Борис", "Вадим", "Виктор", "Владимир",
+               "Галина", "Дмитрий", "Евгений", "Екатерина", "Елена", "Иван", "Игорь", "Ирина", "Константин",
+               "Максим", "Марина", "Михаил", "Наталья", "Никита", "Николай", "Ольга", "Павел", "Пётр",
+               "Роман", "Светлана", "Сергей", "Татьяна", "Фёдор", "Юлия", "Юрий", "Яна"]
+PATRONYMICS = ["Александрович", "Алексеевич", "Андреевич", "Борисович", "Викторович", "Владимирович",
+               "Дмитриевич", "Евгеньевич", "Иванович", "Игоревич", "Михайлович", "Николаевич",
+               "Павлович", "Петрович", "Сергеевич", "Юрьевич"]
+DEPARTMENTS = ["Бухгалтерия", "ИТ", "Отдел кадров", "Юридический отдел", "Продажи", "Логистика",
+               "Закупки", "Маркетинг", "Служба безопасности", "Аналитика"]
+QUERIES = ["и", "ив", "иван", "иванов ал", "семен", "фёдоров пётр", "бух", "user12", "кузнецов с", "zzz"]
+
+Row = namedtuple("Row", "id username full_name surname fst_name sec_name department position is_active updated_at")
+
+
+def make_rows(users, rng):
+    surnames = [stem + suffix for stem in SURNAME_STEMS for suffix in SURNAME_SUFFIXES]
+    weights = [1 / (rank + 10) for rank in range(len(surnames))]
+    rows = []
+    for u in range(1, users + 1):
+        surname = rng.choices(surnames, weights)[0]
+        first, middle = rng.choice(FIRST_NAMES), rng.choice(PATRONYMICS)
+        rows.append(Row(u, f"user{u}", f"{surname} {first} {middle}", surname, first, middle,
+                        f"{rng.choice(DEPARTMENTS)} {u % 40}", "Специалист", u % 10 != 0, None))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = make_rows(args.users, random.Random(args.seed))
+    index = UserSuggestIndex()
+    started = time.perf_counter()
+    index.load(rows)
+    print(f"🔎 Индекс подсказок: {args.users} пользователей, построение {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    started = time.perf_counter()
+    index.apply_changes(rows[:100])
+    print(f"  инкрементальное обновление 100 строк: {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            found = index.search(query, args.limit)
+            timings.append(time.perf_counter() - started)
+        print(f"  {query!r:<18} | найдено: {len(found):>2} | медиана: {statistics.median(timings) * 1000:7.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Общие фикстуры pytest: приложение на временной SQLite-БД и счётчик SQL-запросов.
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from flask import g
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# create_app("development") из старых тестов (test_auth, test_database) берёт
+# пути из окружения: БД, журналы, метрики, профили и трассы — во временной
+# папке, а не в backend/ репозитория
+_RUNTIME_DIR = tempfile.mkdtemp(prefix="pytest-runtime-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_RUNTIME_DIR, 'users_courses.db')}")
+os.environ.setdefault("LOG_FILE", os.path.join(_RUNTIME_DIR, "app.log"))
+os.environ.setdefault("USER_ACTION_LOG", os.path.join(_RUNTIME_DIR, "user_actions.log"))
+os.environ.setdefault("METRICS_DIR", os.path.join(_RUNTIME_DIR, "metrics"))
+os.environ.setdefault("PROFILER_DIR", os.path.join(_RUNTIME_DIR, "profiles"))
+os.environ.setdefault("TRACING_FILE", os.path.join(_RUNTIME_DIR, "traces.jsonl"))
+
+from backend import create_app
+from backend.config import TestingConfig
+from backend.models import db_manager
+
+
+def make_test_config(tmp_path, **overrides):
+    """Конфигурация TestingConfig с отдельной БД, журналами и файлами наблюдаемости во временной папке."""
+    config = {key: getattr(TestingConfig, key) for key in dir(TestingConfig) if key.isupper()}
+    config.update(
+        DATABASE_URL=f"sqlite:///{tmp_path / 'test.db'}",
+        USER_ACTION_LOG=str(tmp_path / 'user_actions.log'),
+        LOG_FILE=str(tmp_path / 'app.log'),
+        DATABASE_INIT_SAMPLE_DATA=False,
+        KERBEROS_AUTH_ENABLED=False,
+        METRICS_DIR=str(tmp_path / 'metrics'),
+        PROFILER_DIR=str(tmp_path / 'profiles'),
+        TRACING_FILE=str(tmp_path / 'traces.jsonl'),
+    )
+    config.update(overrides)
+    return config
+
+
+@pytest.fixture
+def app(tmp_path):
+    application = create_app(make_test_config(tmp_path))
+
+    @application.before_request
+    def _test_auth():
+        if application.config.get('TEST_USER_INFO'):
+            g.user_info = application.config['TEST_USER_INFO']
+
+    yield application
+    db_manager.dispose()
+
+
+def login_as(app, username, role='user'):
+    """Выполнять следующие запросы от имени ``username`` (Kerberos в тестах отключён)."""
+    app.config['TEST_USER_INFO'] = {'username': username, 'role': role, 'auth_method': 'test'}
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def db_session(app):
+    session = db_manager.get_session()
+    yield session
+    session.close()
+
+
+class QueryCounter:
+    """Список SQL-выражений (и их параметров), выполненных внутри блока ``count_queries``."""
+
+    def __init__(self):
+        self.statements = []
+        self.parameters = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Считать запросы движка ``engine``; по умолчанию — пишущего и читающего движков db_manager."""
+    if engine is not None:
+        engines = [engine]
+    else:
+        engines = [db_manager.engine]
+        if db_manager.read_engine is not db_manager.engine:
+            engines.append(db_manager.read_engine)
+    counter = QueryCounter()
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+        counter.parameters.append(parameters[0] if executemany and parameters else parameters)
+
+    for target in engines:
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", _before_cursor_execute)
@@ -0,0 +1,108 @@
+"""
+Тесты пакетных миграций данных: перенос kerberos_users, продолжение после
+сбоя с контрольной точки и пробный прогон.
+"""
+
+from dataclasses import replace
+
+import pytest
+from sqlalchemy import text
+
+from backend.backfill import MERGE_KERBEROS_USERS, backfill_status, run_backfill
+from backend.models import BackfillCheckpoint, User, db_manager
+from backend.stats_counters import check_counters
+
+
+def _create_legacy_table(session, rows):
+    session.execute(text("""
+        CREATE TABLE kerberos_users (
+            id INTEGER PRIMARY KEY, username VARCHAR(100), principal VARCHAR(200), realm VARCHAR(100),
+            full_name VARCHAR(200), surname VARCHAR(100), fst_name VARCHAR(100), sec_name VARCHAR(100),
+            department VARCHAR(100), position VARCHAR(100), email VARCHAR(200), role VARCHAR(20),
+            is_active BOOLEAN, last_login DATETIME
+        )
+    """))
+    for row in rows:
+        values = {'principal': None, 'full_name': None, 'department': None, 'role': None, 'is_active': None, **row}
+        session.execute(text(
+            "INSERT INTO kerberos_users (username, principal, full_name, department, role, is_active) "
+            "VALUES (:username, :principal, :full_name, :department, :role, :is_active)"
+        ), values)
+    session.commit()
+
+
+LEGACY_ROWS = [
+    {'username': 'Ivanov', 'principal': 'ivanov@CORP', 'full_name': 'Иванов И.', 'department': 'Продажи'},
+    {'username': 'petrov', 'full_name': '', 'department': '', 'role': 'admin', 'is_active': False},
+    {'username': '', 'full_name': 'Без имени'},
+    {'username': 'sidorov', 'department': 'ИТ'},
+    {'username': 'IVANOV', 'department': 'Маркетинг'},
+]
+
+
+def test_merge_kerberos_users_in_batches(app, db_session):
+    db_session.add(User(username='petrov', full_name='Петров П.', department='Бухгалтерия'))
+    db_session.commit()
+    _create_legacy_table(db_session, LEGACY_ROWS)
+
+    reports = []
+    report = run_backfill(db_manager.engine, MERGE_KERBEROS_USERS, batch_size=2, sleep_seconds=0,
+                          progress=lambda r: reports.append(r.rows_remaining))
+    assert report.done and report.batches == 3 and report.rows_processed == 5
+    assert reports == [3, 1, 0]
+
+    users = {user.username: user for user in db_session.query(User)}
+    assert set(users) == {'ivanov', 'petrov', 'sidorov'}
+    # Последняя строка с тем же именем перекрывает предыдущую, пустые значения не затирают
+    assert users['ivanov'].department == 'Маркетинг' and users['ivanov'].principal == 'ivanov@CORP'
+    assert users['petrov'].full_name == 'Петров П.' and users['petrov'].department == 'Бухгалтерия'
+    assert users['petrov'].role == 'admin' and users['petrov'].is_active is False
+    assert users['sidorov'].department == 'ИТ' and users['sidorov'].role == 'user'
+
+    assert not db_session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'kerberos_users'")).first()
+    assert db_session.get(BackfillCheckpoint, 'merge-kerberos-users').status == 'done'
+    assert check_counters(db_session) == []
+
+
+def test_interrupted_backfill_resumes_from_checkpoint(app, db_session):
+    _create_legacy_table(db_session, [{'username': f'user{i}', 'department': 'ИТ'} for i in range(10)])
+
+    calls = []
+
+    def failing_apply(conn, low, high):
+        calls.append((low, high))
+        if len(calls) == 3:
+            raise RuntimeError("сбой посреди миграции")
+        return MERGE_KERBEROS_USERS.apply(conn, low, high)
+
+    with pytest.raises(RuntimeError):
+        run_backfill(db_manager.engine, replace(MERGE_KERBEROS_USERS, apply=failing_apply), batch_size=3,
+                     sleep_seconds=0)
+    checkpoint = db_session.get(BackfillCheckpoint, 'merge-kerberos-users')
+    assert (checkpoint.last_key, checkpoint.rows_processed, checkpoint.status) == (6, 6, 'running')
+    assert db_session.query(User).count() == 6
+    # Счётчики отделов пересчитываются в каждом пакете, а не только в finalize
+    assert check_counters(db_session) == []
+
+    status, = backfill_status(db_manager.engine)
+    assert status['status'] == 'running' and status['rows_remaining'] == 4
+    db_session.rollback()
+
+    report = run_backfill(db_manager.engine, MERGE_KERBEROS_USERS, batch_size=3, sleep_seconds=0)
+    assert report.batches == 2 and report.rows_processed == 10
+    assert db_session.query(User).count() == 10
+
+
+def test_dry_run_changes_nothing(app, db_session):
+    _create_legacy_table(db_session, LEGACY_ROWS)
+
+    result = app.test_cli_runner().invoke(args=['backfill', 'merge-kerberos-users', '--dry-run', '--sleep', '0'])
+    assert result.exit_code == 0, result.output
+    assert "пробный прогон" in result.output and "изменено 3" in result.output
+
+    assert db_session.query(User).count() == 0
+    assert db_session.get(BackfillCheckpoint, 'merge-kerberos-users') is None
+    assert db_session.execute(text("SELECT count(*) FROM kerberos_users")).scalar() == 5
+
+    result = app.test_cli_runner().invoke(args=['backfill'])
+    assert "merge-kerberos-users" in result.output and "pending" in result.output
@@ -0,0 +1,34 @@
+"""
+Тесты бенчмарка эндпоинтов: каждый маршрут покрыт сценарием, сравнение с
+базовой линией находит регрессии.
+"""
+
+from benchmarks.bench_endpoints import CASES, Case, check_coverage, compare
+
+
+def test_every_route_has_benchmark_case(app):
+    assert check_coverage(app) == []
+
+
+def test_coverage_reports_missing_and_misrouted_cases(app):
+    cases = [case for case in CASES if case.endpoint != 'api.get_departments']
+    cases.append(Case('wrong', 'api.get_course', '/api/courses'))
+    errors = check_coverage(app, cases)
+    assert any('api.get_departments не покрыт' in error for error in errors)
+    assert any('сценарий wrong' in error and 'api.get_courses' in error for error in errors)
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    base = {'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'queries': 3, 'bytes': 1000}
+    baseline = {'same': base, 'slow': base, 'noisy': base, 'chatty': base, 'fat': base}
+    results = {
+        'same': base,
+        'slow': {**base, 'p50_ms': 13.0},
+        'noisy': {**base, 'p95_ms': 21.5},
+        'chatty': {**base, 'queries': 4},
+        'fat': {**base, 'bytes': 1100},
+        'new': base,
+    }
+    regressions = compare(baseline, results, latency_tolerance=0.25, latency_floor_ms=2.0)
+    assert [r.split(':')[0] for r in regressions] == ['slow', 'chatty', 'fat']
+    assert compare(baseline, results, latency_tolerance=0.5, queries_tolerance=1, bytes_tolerance=0.2) == []
@@ -0,0 +1,36 @@
+"""
+Тесты нагрузочного стенда: параметры gunicorn из Dockerfile и поддельные
+Negotiate-токены, которые принимает упрощённая проверка Kerberos.
+"""
+
+from backend import create_app
+from backend.models import User, db_manager
+from benchmarks.bench_load import dockerfile_gunicorn_args, negotiate_header, override_arg
+from conftest import make_test_config
+
+
+def test_gunicorn_args_follow_dockerfile():
+    args = dockerfile_gunicorn_args(8123)
+    assert args[args.index('-b') + 1] == '127.0.0.1:8123'
+    assert args[args.index('-k') + 1] == 'gthread'
+    assert override_arg(list(args), ('-w', '--workers'), 5)[args.index('-w') + 1] == '5'
+    assert override_arg(['-w', '3'], ('--threads',), 4) == ['-w', '3', '--threads', '4']
+
+
+def test_negotiate_stub_authenticates_and_registers_user(tmp_path):
+    app = create_app(make_test_config(tmp_path, KERBEROS_AUTH_ENABLED=True))
+    try:
+        response = app.test_client().get(
+            '/user/info-test', headers={'Authorization': negotiate_header('loadtest.user7')}
+        )
+        assert response.status_code == 200
+        assert response.get_json()['username'] == 'loadtest.user7'
+        assert response.get_json()['auth_method'] == 'kerberos'
+
+        session = db_manager.get_session()
+        try:
+            assert session.query(User).filter(User.username == 'loadtest.user7').count() == 1
+        finally:
+            session.close()
+    finally:
+        db_manager.dispose()
@@ -0,0 +1,154 @@
+"""
+Тесты пакетного импорта отметок уроков (JSONL / xAPI-statements).
+"""
+
+import gzip
+import io
+import json
+
+from backend.ingestion import ingest_progress, iter_lines
+from backend.models import Course, CourseStats, Lesson, User, UserCourseProgress, UserLessonProgress, db_manager
+from backend.stats_counters import check_counters
+from conftest import count_queries, login_as
+
+
+def _seed(session):
+    users = [User(username="ivanov", email="ivanov@example.com", department="IT"),
+             User(username="petrov", department="HR")]
+    course = Course(title="Курс", total_lessons=2)
+    session.add_all([*users, course])
+    session.flush()
+    session.add_all(Lesson(course_id=course.id, title=f"Урок {i}", lesson_number=i) for i in (1, 2))
+    session.commit()
+    lesson_ids = [lesson.id for lesson in session.query(Lesson).order_by(Lesson.lesson_number)]
+    return [user.id for user in users], course.id, lesson_ids
+
+
+def _jsonl(*records):
+    return io.BytesIO(b''.join(json.dumps(record).encode() + b'\n' for record in records))
+
+
+def _xapi(actor, lesson_id, verb="completed", timestamp="2024-03-01T10:00:00Z"):
+    return {
+        'actor': actor,
+        'verb': {'id': f"http://adlnet.gov/expapi/verbs/{verb}"},
+        'object': {'id': f"https://lms.example/lessons/{lesson_id}"},
+        'timestamp': timestamp,
+    }
+
+
+def test_iter_lines_splits_across_chunks():
+    data = b'{"a": 1}\n{"b": 22}\n\n{"c": 333}'
+    assert list(iter_lines(io.BytesIO(data), chunk_size=3)) == [b'{"a": 1}', b'{"b": 22}', b'', b'{"c": 333}']
+
+
+def test_ingest_upserts_lessons_and_updates_rollups(db_session):
+    (ivanov, petrov), course_id, (first, second) = _seed(db_session)
+    stream = _jsonl(
+        {'user': 'Ivanov', 'lesson': first, 'verb': 'completed', 'timestamp': '2024-03-01T10:00:00'},
+        _xapi({'account': {'name': 'ivanov'}}, second, timestamp='2024-03-02T10:00:00'),
+        # Повтор с более ранней датой: строка одна, дата — самая ранняя
+        [_xapi({'mbox': 'mailto:ivanov@example.com'}, first, verb='passed', timestamp='2024-02-01T10:00:00')],
+        _xapi({'account': {'name': 'petrov'}}, first),
+        _xapi({'account': {'name': 'petrov'}}, second, verb='attempted'),
+        _xapi({'account': {'name': 'nobody'}}, first),
+        _xapi({'account': {'name': 'petrov'}}, 99999),
+    )
+    stream = io.BytesIO(stream.getvalue() + b'{not json}\n')
+
+    report = ingest_progress(db_session, stream, batch_size=2)
+
+    assert report.lines == 8
+    assert report.skipped_verbs == 1
+    assert report.unknown_users == 1
+    assert report.unknown_lessons == 1
+    assert report.invalid == 1 and report.errors[0].startswith("строка 8")
+
+    rows = {(row.user_id, row.lesson_id): row for row in db_session.query(UserLessonProgress)}
+    assert set(rows) == {(ivanov, first), (ivanov, second), (petrov, first)}
+    assert rows[(ivanov, first)].completed_at.month == 2
+
+    progress = {row.user_id: row for row in db_session.query(UserCourseProgress)}
+    assert progress[ivanov].lessons_completed == 2 and progress[ivanov].is_completed
+    assert progress[petrov].lessons_completed == 1 and not progress[petrov].is_completed
+    assert db_session.get(CourseStats, course_id).completed_users == 1
+    assert check_counters(db_session) == []
+
+    # Повторный импорт того же потока ничего не меняет
+    again = ingest_progress(db_session, _jsonl(_xapi({'account': {'name': 'petrov'}}, first)))
+    assert again.rollups_updated == 0
+    assert db_session.query(UserLessonProgress).count() == 3
+
+
+def test_ingest_query_count_does_not_depend_on_statement_count(db_session):
+    (ivanov, petrov), _, (first, second) = _seed(db_session)
+
+    def run(repeats):
+        db_session.query(UserCourseProgress).delete()
+        db_session.query(UserLessonProgress).delete()
+        db_session.commit()
+        records = [_xapi({'account': {'name': name}}, lesson)
+                   for _ in range(repeats) for name in ('ivanov', 'petrov') for lesson in (first, second)]
+        with count_queries() as counter:
+            ingest_progress(db_session, _jsonl(*records))
+        return counter.count
+
+    assert run(1) == run(50)
+
+
+def test_ingest_endpoint_requires_admin_and_accepts_gzip(app, client, db_session):
+    _, _, (first, _) = _seed(db_session)
+    body = gzip.compress(_jsonl(_xapi({'account': {'name': 'ivanov'}}, first)).getvalue())
+    headers = {'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'}
+
+    login_as(app, "petrov")
+    assert client.post('/api/progress/ingest', data=body, headers=headers).status_code == 403
+
+    login_as(app, "admin", role="admin")
+    response = client.post('/api/progress/ingest', data=body, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['completions'] == 1
+    assert db_session.query(UserLessonProgress).count() == 1
+
+
+def test_progress_ingest_command(app, db_session, tmp_path):
+    _, _, (first, second) = _seed(db_session)
+    path = tmp_path / "progress.jsonl"
+    path.write_bytes(_jsonl(*(_xapi({'account': {'name': 'ivanov'}}, lesson) for lesson in (first, second))).getvalue())
+
+    result = app.test_cli_runner().invoke(args=['progress-ingest', str(path), '--batch-size', '1'])
+    assert result.exit_code == 0, result.output
+    assert "отметок 2" in result.output
+    assert db_session.query(UserCourseProgress).one().is_completed
+
+
+def test_writer_connection_is_free_while_reading_stream(db_session):
+    (ivanov, _), _, (first, second) = _seed(db_session)
+    db_session.close()
+
+    pool = db_manager.engine.pool
+    baseline = pool.checkedout()
+    data = _jsonl({'user': 'ivanov', 'lesson': first, 'verb': 'completed'},
+                  {'user': 'ivanov', 'lesson': second, 'verb': 'completed'}).getvalue()
+    checked_out = []
+
+    class SlowUpload(io.RawIOBase):
+        """Поток, который отдаёт по строке и запоминает занятые соединения при каждом чтении."""
+
+        def __init__(self):
+            self.lines = data.splitlines(keepends=True)
+
+        def readable(self):
+            return True
+
+        def read(self, size=-1):
+            checked_out.append(pool.checkedout())
+            return self.lines.pop(0) if self.lines else b''
+
+    session = db_manager.get_session()
+    try:
+        report = ingest_progress(session, SlowUpload(), batch_size=1)
+    finally:
+        session.close()
+    assert report.completions == 2
+    assert checked_out and set(checked_out) == {baseline}
@@ -0,0 +1,92 @@
+"""
+Тесты JSON-провайдера: даты, Decimal, модели и строки SQLAlchemy,
+компактный ответ без экранирования кириллицы и одинаковый результат
+orjson и stdlib.
+"""
+
+import decimal
+import json
+import uuid
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select
+
+from backend.json_provider import FastJSONProvider, orjson
+from backend.models import Question, User
+
+
+def _backends(app):
+    names = ['json'] + (['orjson'] if orjson is not None else [])
+    for name in names:
+        provider = FastJSONProvider(app)
+        provider.backend = name
+        yield provider
+
+
+def test_encodes_datetimes_decimals_uuids_and_model_rows(app, db_session):
+    user = User(username='ivanov', full_name='Иванов Иван', department='ИТ')
+    db_session.add(user)
+    db_session.commit()
+    row = db_session.execute(select(User.id, User.username)).first()
+    payload = {
+        'at': datetime(2024, 5, 1, 12, 30, 15, 250),
+        'day': date(2024, 5, 1),
+        'amount': decimal.Decimal('12.3400'),
+        'uid': uuid.UUID(int=1),
+        'user': user,
+        'row': row,
+    }
+
+    for provider in _backends(app):
+        data = json.loads(provider.dumps(payload))
+        assert data['at'] == '2024-05-01T12:30:15.000250'
+        assert data['day'] == '2024-05-01'
+        assert data['amount'] == '12.3400'
+        assert data['uid'] == '00000000-0000-0000-0000-000000000001'
+        assert data['user']['username'] == 'ivanov' and data['user']['department'] == 'ИТ'
+        assert data['row'] == {'id': user.id, 'username': 'ivanov'}
+        with pytest.raises(TypeError):
+            provider.dumps({'bad': object()})
+
+
+def test_api_response_is_compact_utf8(app, client, db_session):
+    author = User(username='author', department='ИТ')
+    db_session.add(author)
+    db_session.commit()
+    db_session.add(Question(author_id=author.id, title='Не работает VPN', body='Ошибка подключения'))
+    db_session.commit()
+
+    app.json.compact = True
+    response = client.get('/api/questions')
+    assert response.status_code == 200
+    body = response.get_data()
+    assert 'Не работает VPN'.encode('utf-8') in body
+    assert b'\\u' not in body and b'": ' not in body and body.endswith(b'}\n')
+    assert response.get_json()['questions'][0]['title'] == 'Не работает VPN'
+
+
+def test_pretty_output_follows_json_compact_and_debug(app):
+    payload = {'b': 1, 'a': [1, 2]}
+    with app.test_request_context():
+        app.json.compact = None
+        assert app.debug and b'\n  "b": 1' in app.json.response(payload).get_data()
+        app.json.compact = True
+        assert app.json.response(payload).get_data() == b'{"b":1,"a":[1,2]}\n'
+        app.json.compact = False
+        assert b'\n  "a": [' in app.json.response(payload).get_data()
+
+
+def test_backends_agree_on_real_payload(app, db_session):
+    if orjson is None:
+        pytest.skip("orjson не установлен")
+    author = User(username='author', department='ИТ')
+    db_session.add(author)
+    db_session.commit()
+    db_session.add(Question(author_id=author.id, title='Вопрос', body='Текст', tags='vpn, сеть'))
+    db_session.commit()
+    payload = {'questions': [q.to_dict() for q in db_session.query(Question)], 'total': 1}
+
+    stdlib, fast = _backends(app)
+    assert stdlib.dumps(payload) == fast.dumps(payload)
+    assert stdlib.loads(fast.dumps(payload)) == fast.loads(stdlib.dumps(payload)) == payload
@@ -0,0 +1,78 @@
+"""
+Тесты планов загрузки Q&A: число SQL-запросов эндпоинтов не зависит от
+количества вопросов, ответов и вложений.
+"""
+
+from itertools import count
+
+from conftest import count_queries
+from backend.models import Answer, AnswerAttachment, Question, QuestionAttachment, User
+
+
+def _attachment(model, **fk):
+    return model(stored_filename="f.bin", original_filename="f.bin", mime_type="application/octet-stream",
+                 size_bytes=1, **fk)
+
+
+_seq = count()
+
+
+def _seed(session, answers, attachments):
+    n = next(_seq)
+    author = User(username=f"author{n}", full_name="Автор", department="IT")
+    admin = User(username=f"admin{n}", full_name="Администратор", department="IT", role="admin")
+    session.add_all([author, admin])
+    session.flush()
+    question = Question(author_id=author.id, title=f"Вопрос {answers}", body="Текст")
+    session.add(question)
+    session.flush()
+    session.add_all(_attachment(QuestionAttachment, question_id=question.id) for _ in range(attachments))
+    for i in range(answers):
+        # Ответы попеременно от разных авторов, чтобы авторы не брались из identity map
+        answer = Answer(question_id=question.id, author_id=(admin if i % 2 else author).id, body=f"Ответ {i}")
+        session.add(answer)
+        session.flush()
+        session.add_all(_attachment(AnswerAttachment, answer_id=answer.id) for _ in range(attachments))
+    session.commit()
+    return question.id
+
+
+def _get(client, url):
+    with count_queries() as counter:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_json()
+    return counter.count, response.get_json()
+
+
+def test_question_detail_query_count_is_bounded(client, db_session):
+    small_id = _seed(db_session, answers=1, attachments=1)
+    large_id = _seed(db_session, answers=12, attachments=3)
+
+    small, _ = _get(client, f'/api/questions/{small_id}')
+    large, data = _get(client, f'/api/questions/{large_id}')
+    assert small == large <= 5
+    assert len(data['answers']) == 12
+    assert all(len(answer['attachments']) == 3 for answer in data['answers'])
+    assert {answer['author_full_name'] for answer in data['answers']} == {"Автор", "Администратор"}
+
+
+def test_answers_list_query_count_is_bounded(client, db_session):
+    small_id = _seed(db_session, answers=1, attachments=0)
+    large_id = _seed(db_session, answers=15, attachments=2)
+
+    small, _ = _get(client, f'/api/questions/{small_id}/answers')
+    large, data = _get(client, f'/api/questions/{large_id}/answers')
+    assert small == large <= 3
+    assert [answer['body'] for answer in data['answers']] == [f"Ответ {i}" for i in range(15)]
+
+
+def test_questions_list_query_count_is_bounded(client, db_session):
+    for n in range(3):
+        _seed(db_session, answers=n, attachments=1)
+    small, _ = _get(client, '/api/questions?limit=2')
+    for n in range(3, 20):
+        _seed(db_session, answers=1, attachments=0)
+    large, data = _get(client, '/api/questions?limit=20')
+    assert small == large
+    assert len(data['questions']) == 20
+    assert all(question['author_full_name'] == "Автор" for question in data['questions'])
@@ -0,0 +1,108 @@
+"""
+Тесты инструментов памяти: доступ только для администраторов, разница
+снимков tracemalloc по строкам, подсчёт объектов ORM и перезапуск воркера
+по потолку RSS.
+"""
+
+import os
+import signal
+import tracemalloc
+
+import pytest
+
+from conftest import login_as
+from backend.memory import MemoryMonitor
+from backend.models import User
+
+
+@pytest.fixture(autouse=True)
+def _stop_tracemalloc():
+    yield
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def test_memory_endpoints_require_admin(app, client):
+    login_as(app, 'ivanov')
+    assert client.get('/api/admin/memory').status_code == 403
+    assert client.get('/api/admin/memory/objects').status_code == 403
+    assert client.post('/api/admin/memory/tracemalloc', json={'action': 'start'}).status_code == 403
+    assert client.post('/api/admin/memory/snapshots').status_code == 403
+    assert client.get('/api/admin/memory/diff?from=1&to=2').status_code == 403
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracemalloc_snapshot_diff_points_at_allocating_line(app, client):
+    login_as(app, 'admin', role='admin')
+    assert client.post('/api/admin/memory/snapshots').status_code == 409
+    assert client.post('/api/admin/memory/tracemalloc', json={'action': 'start', 'frames': 0}).status_code == 400
+
+    response = client.post('/api/admin/memory/tracemalloc', json={'action': 'start', 'frames': 5})
+    assert response.status_code == 200 and response.get_json()['tracing'] is True
+
+    first = client.post('/api/admin/memory/snapshots?limit=0').get_json()['id']
+    leak = [bytearray(1024) for _ in range(2000)]  # noqa: F841 — держим выделения до второго снимка
+    second = client.post('/api/admin/memory/snapshots').get_json()['id']
+
+    response = client.get(f'/api/admin/memory/diff?from={first}&to={second}')
+    assert response.status_code == 200
+    top = response.get_json()['stats'][0]
+    assert top['location'].startswith(__file__) and top['size_diff_bytes'] >= 2000 * 1024
+
+    assert client.get(f'/api/admin/memory/diff?from={first}&to={second}&group_by=filename').status_code == 200
+    assert client.get(f'/api/admin/memory/diff?from={first}&to={second}&group_by=bogus').status_code == 400
+    assert client.get(f'/api/admin/memory/diff?from={first}&to=999').status_code == 404
+
+    status = client.get('/api/admin/memory').get_json()
+    assert [item['id'] for item in status['tracemalloc']['snapshots']] == [first, second]
+    assert status['rss_bytes'] > 0
+
+    assert client.post('/api/admin/memory/tracemalloc', json={'action': 'stop'}).status_code == 200
+    assert not tracemalloc.is_tracing()
+    assert client.get('/api/admin/memory').get_json()['tracemalloc']['snapshots'] == []
+
+
+def test_object_counts_include_live_model_instances(app, client, db_session):
+    users = [User(username=f'user{i}', department='IT') for i in range(3)]
+    db_session.add_all(users)
+    db_session.commit()
+
+    login_as(app, 'admin', role='admin')
+    counts = client.get('/api/admin/memory/objects').get_json()
+    assert counts['models']['User'] >= 3
+    assert counts['sessions'] >= 1 and counts['identity_map_entries'] >= 3
+
+
+def test_ceiling_recycles_only_gunicorn_workers(monkeypatch):
+    kills = []
+    monkeypatch.setattr('backend.memory.os.kill', lambda pid, sig: kills.append(sig))
+    monitor = MemoryMonitor(interval=0, ceiling_bytes=1)
+
+    monitor.sample()
+    assert kills == [] and monitor.history
+
+    monitor.under_gunicorn = True
+    monitor.sample()
+    monitor.sample()
+    assert kills == [signal.SIGTERM]
+
+
+def test_pid_targets_the_worker_holding_tracemalloc_state(app, client):
+    login_as(app, 'admin', role='admin')
+    other = os.getpid() + 1
+
+    response = client.post('/api/admin/memory/tracemalloc', json={'action': 'start', 'pid': other})
+    assert response.status_code == 409 and response.get_json()['pid'] == os.getpid()
+    assert not tracemalloc.is_tracing()
+
+    started = client.post('/api/admin/memory/tracemalloc', json={'action': 'start'}).get_json()
+    pid = started['pid']
+    assert pid == os.getpid()
+    assert client.post(f'/api/admin/memory/snapshots?pid={other}').status_code == 409
+    first = client.post(f'/api/admin/memory/snapshots?pid={pid}').get_json()
+    second = client.post(f'/api/admin/memory/snapshots?pid={pid}').get_json()
+    assert first['pid'] == second['pid'] == pid
+    diff = client.get(f"/api/admin/memory/diff?pid={pid}&from={first['id']}&to={second['id']}")
+    assert diff.status_code == 200 and diff.get_json()['pid'] == pid
+    assert client.get(f"/api/admin/memory/diff?pid={other}&from=1&to=2").get_json()['pid'] == pid
+    assert client.post('/api/admin/memory/tracemalloc', json={'action': 'stop', 'pid': pid}).status_code == 200
@@ -0,0 +1,102 @@
+"""
+Тесты метрик Prometheus: подписи маршрутов, SQL-запросы и время хуков,
+доступ только для администраторов, сложение снимков воркеров.
+"""
+
+import json
+import os
+
+from conftest import login_as
+from backend.metrics import MetricsRegistry
+
+
+def test_metrics_requires_admin(app, client):
+    login_as(app, 'ivanov')
+    assert client.get('/metrics').status_code == 403
+
+
+def test_metrics_labels_routes_and_counts_queries(app, client):
+    login_as(app, 'admin', role='admin')
+    assert client.get('/api/courses').status_code == 200
+    assert client.get('/api/courses/999999').status_code == 404
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+
+    assert 'http_requests_total{method="GET",route="/api/courses",status="200"} 1' in text
+    assert 'http_requests_total{method="GET",route="/api/courses/<int:course_id>",status="404"} 1' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/courses"} 1' in text
+    assert 'http_response_size_bytes_count{method="GET",route="/api/courses"} 1' in text
+    assert 'http_hook_duration_seconds_count{hook="action_log"}' in text
+    queries = next(
+        line for line in text.splitlines()
+        if line.startswith('http_request_db_queries_sum{method="GET",route="/api/courses"}')
+    )
+    assert float(queries.split()[-1]) >= 1
+    assert 'http_requests_in_flight{method="GET",route="/api/courses"} 0' in text
+
+
+def test_collect_sums_worker_snapshots(tmp_path):
+    directory = tmp_path / 'metrics'
+    registry = MetricsRegistry(str(directory), flush_interval=0)
+    registry.inc('http_requests_total', {'method': 'GET', 'route': '/a', 'status': 200})
+    registry.observe('http_request_duration_seconds', {'method': 'GET', 'route': '/a'}, 0.02)
+
+    other = MetricsRegistry(str(directory), flush_interval=0)
+    other.inc('http_requests_total', {'method': 'GET', 'route': '/a', 'status': 200}, 2)
+    other.gauge_add('http_requests_in_flight', {'method': 'GET', 'route': '/a'}, 1)
+    other.observe('http_request_duration_seconds', {'method': 'GET', 'route': '/a'}, 0.3)
+    snapshot = other.snapshot()
+
+    os.makedirs(directory)
+    dead_pid = 2 ** 22 + 12345  # выше pid_max по умолчанию — такого процесса нет
+    for name in (f"metrics_{os.getppid()}_{dead_pid}.json", f"metrics_{dead_pid}_{dead_pid}.json"):
+        with open(directory / name, 'w', encoding='utf-8') as handle:
+            json.dump(snapshot, handle)
+
+    merged = registry.collect()
+    labels = (('method', 'GET'), ('route', '/a'))
+    assert merged['http_requests_total'][labels + (('status', '200'),)] == 3
+    assert merged['http_requests_in_flight'] == {}  # воркер завершился
+    histogram = merged['http_request_duration_seconds'][labels]
+    assert histogram[-1] == 2 and abs(histogram[-2] - 0.32) < 1e-9
+    # снимок прошлого запуска (мастер мёртв) удалён, снимок завершённого воркера
+    # перенесён в общий снимок мастера
+    ppid = os.getppid()
+    assert sorted(os.listdir(directory)) == [f"metrics_{ppid}.lock", f"metrics_{ppid}_0.json"]
+    assert registry.collect()['http_requests_total'][labels + (('status', '200'),)] == 3
+
+    text = registry.render()
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/a",le="0.025"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/a",le="+Inf"} 2' in text
+
+
+def test_dead_worker_snapshot_is_folded_once_and_flushed_at_exit(tmp_path, monkeypatch):
+    directory = tmp_path / 'metrics'
+    registry = MetricsRegistry(str(directory), flush_interval=0)
+    labels = {'method': 'GET', 'route': '/a', 'status': 200}
+    dead_pid = 2 ** 22 + 54321
+
+    worker = MetricsRegistry(str(directory), flush_interval=0)
+    worker.inc('http_requests_total', labels, 5)
+    worker.pid = dead_pid
+    worker.flush()
+    key = (('method', 'GET'), ('route', '/a'), ('status', '200'))
+    assert registry.collect()['http_requests_total'][key] == 5
+
+    # Упал между записью суммы и удалением файла: снимок не учитывается повторно
+    worker.flush()
+    assert registry.collect()['http_requests_total'][key] == 5
+    assert not (directory / f"metrics_{os.getppid()}_{dead_pid}.json").exists()
+
+    exiting = MetricsRegistry(str(directory), flush_interval=60)
+    handlers = []
+    monkeypatch.setattr('backend.metrics.atexit.register', lambda func, *args: handlers.append((func, args)))
+    exiting.start()
+    exiting.stop()
+    exiting.inc('http_requests_total', labels, 2)
+    (func, args), = handlers
+    func(*args)
+    assert (directory / f"metrics_{os.getppid()}_{os.getpid()}.json").exists()
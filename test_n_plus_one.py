@@ -0,0 +1,108 @@
+"""
+Тесты обнаружения N+1: ленивые загрузки связей в цикле дают NPlusOneError
+с атрибутом модели, планы загрузки и списки API проходят без повторов.
+"""
+
+import pytest
+from flask import jsonify
+
+from conftest import login_as
+from backend.loaders import loader_options
+from backend.models import Course, Question, User, UserCourseProgress, db_manager
+from backend.n_plus_one import NPlusOneError, allow_repeated_queries, fingerprint
+
+
+def _seed(session, count=6):
+    users = [User(username=f"user{i}", department="IT") for i in range(count)]
+    courses = [Course(title=f"Курс {i}", total_lessons=3) for i in range(count)]
+    session.add_all(users + courses)
+    session.commit()
+    session.add_all(Question(author_id=user.id, title=f"Вопрос {user.id}", body="?") for user in users)
+    session.add_all(
+        UserCourseProgress(user_id=user.id, course_id=course.id, lessons_completed=1)
+        for user in users for course in courses[:2]
+    )
+    session.commit()
+
+
+def _add_view(app, name, handler):
+    app.add_url_rule(f"/test/{name}", name, handler)
+
+
+def test_fingerprint_ignores_values_and_in_list_length():
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?) LIMIT 5") == \
+        fingerprint("SELECT *\n  FROM t WHERE id IN (?) LIMIT 50")
+    assert fingerprint("SELECT sum_1 FROM t WHERE name = 'x'") == "SELECT sum_1 FROM t WHERE name = ?"
+
+
+def test_lazy_relationship_in_loop_raises_with_origin(app, client, db_session):
+    _seed(db_session)
+
+    def authors():
+        session = db_manager.get_read_session()
+        try:
+            return jsonify([q.author.username for q in session.query(Question).all()])
+        finally:
+            session.close()
+
+    _add_view(app, 'authors', authors)
+    with pytest.raises(NPlusOneError) as excinfo:
+        client.get('/test/authors')
+    report = str(excinfo.value)
+    assert 'GET /test/authors' in report
+    assert 'источник: Question.author' in report
+    assert 'test_n_plus_one.py' in report and 'in authors' in report
+
+
+def test_loader_plan_and_allowed_block_pass(app, client, db_session):
+    _seed(db_session)
+
+    def planned():
+        session = db_manager.get_read_session()
+        try:
+            questions = session.query(Question).options(*loader_options('question.list')).all()
+            return jsonify([q.author.username for q in questions])
+        finally:
+            session.close()
+
+    def allowed():
+        session = db_manager.get_read_session()
+        try:
+            with allow_repeated_queries():
+                return jsonify([q.author.username for q in session.query(Question).all()])
+        finally:
+            session.close()
+
+    _add_view(app, 'planned', planned)
+    _add_view(app, 'allowed', allowed)
+    assert len(client.get('/test/planned').get_json()) == 6
+    assert len(client.get('/test/allowed').get_json()) == 6
+
+
+def test_warns_instead_of_raising_when_configured(app, client, db_session, caplog):
+    _seed(db_session)
+    app.config['N_PLUS_ONE_RAISE'] = False
+
+    def courses():
+        session = db_manager.get_read_session()
+        try:
+            return jsonify([len(course.user_progress) for course in session.query(Course).all()])
+        finally:
+            session.close()
+
+    _add_view(app, 'courses', courses)
+    assert client.get('/test/courses').status_code == 200
+    assert 'источник: Course.user_progress' in caplog.text
+
+
+@pytest.mark.parametrize('url', [
+    '/api/users?limit=50',
+    '/api/courses',
+    '/api/questions?limit=50',
+    '/api/current-user',
+    '/users-info',
+])
+def test_list_endpoints_have_no_n_plus_one(app, client, db_session, url):
+    _seed(db_session)
+    login_as(app, 'user0')
+    assert client.get(url).status_code == 200
@@ -0,0 +1,94 @@
+"""
+Тесты keyset-пагинации /api/users и /api/questions.
+"""
+
+import base64
+import json
+
+from backend.models import User, Question
+
+
+def _seed_users(session, count=25):
+    for i in range(count):
+        session.add(User(
+            username=f"user{i:03d}",
+            full_name=None if i % 5 == 0 else f"Сотрудник {i % 7}",
+            department=f"Отдел {i % 3}",
+        ))
+    session.commit()
+
+
+def _collect(client, url, key):
+    items, cursor, pages = [], None, 0
+    while True:
+        page_url = url + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(page_url)
+        assert response.status_code == 200, response.get_json()
+        data = response.get_json()
+        items.extend(data[key])
+        pages += 1
+        if not data['has_more']:
+            assert data['next_cursor'] is None
+            return items, pages
+        cursor = data['next_cursor']
+
+
+def test_users_legacy_response_without_limit(client, db_session):
+    _seed_users(db_session, 5)
+    data = client.get('/api/users').get_json()
+    assert data['total'] == 5
+    assert 'next_cursor' not in data
+
+
+def test_users_pages_cover_all_rows_once(client, db_session):
+    _seed_users(db_session)
+    for sort in ('id', 'username', 'full_name', 'department', 'created_at'):
+        for order in ('asc', 'desc'):
+            items, pages = _collect(client, f'/api/users?limit=4&sort={sort}&order={order}', 'users')
+            ids = [u['id'] for u in items]
+            assert len(ids) == 25 and len(set(ids)) == 25, sort
+            assert pages == 7
+
+
+def test_users_sort_by_nullable_full_name(client, db_session):
+    _seed_users(db_session, 10)
+    items, _ = _collect(client, '/api/users?limit=3&sort=full_name', 'users')
+    keys = [(u['full_name'] and db_session.get(User, u['id']).full_name or '', u['id']) for u in items]
+    assert keys == sorted(keys)
+
+
+def test_users_total_is_opt_in(client, db_session):
+    _seed_users(db_session, 12)
+    data = client.get('/api/users?limit=5&department=Отдел 1').get_json()
+    assert 'total' not in data
+    data = client.get('/api/users?limit=5&department=Отдел 1&include_total=true').get_json()
+    assert data['total'] == 4
+    data = client.get('/api/users?limit=5&include_total=estimate').get_json()
+    assert data['total'] >= 12
+
+
+def test_invalid_cursor_and_sort_rejected(client, db_session):
+    _seed_users(db_session, 6)
+    assert client.get('/api/users?limit=2&cursor=garbage').status_code == 400
+    assert client.get('/api/users?sort=password').status_code == 400
+    cursor = client.get('/api/users?limit=2&sort=username').get_json()['next_cursor']
+    assert client.get(f'/api/users?limit=2&sort=department&cursor={cursor}').status_code == 400
+
+
+def test_questions_paginated_newest_first(client, db_session):
+    _seed_users(db_session, 1)
+    author = db_session.query(User).first()
+    for i in range(9):
+        db_session.add(Question(author_id=author.id, title=f"Вопрос {i}", body="текст"))
+    db_session.commit()
+    items, pages = _collect(client, '/api/questions?limit=4', 'questions')
+    assert pages == 3
+    assert [q['id'] for q in items] == sorted((q['id'] for q in items), reverse=True)
+
+
+def test_cursor_with_non_scalar_key_rejected(client, db_session):
+    for key in ([1, 2], {'a': 1}):
+        payload = json.dumps(['id', 0, key, 1]).encode()
+        cursor = base64.urlsafe_b64encode(payload).decode().rstrip('=')
+        response = client.get(f'/api/users?limit=2&cursor={cursor}')
+        assert response.status_code == 400, response.get_json()
@@ -0,0 +1,82 @@
+"""
+Тесты профилирования по требованию: только администратор, дерево вызовов с
+SQL, свёрнутые стеки и ограниченное хранилище профилей.
+"""
+
+from conftest import login_as
+from backend.models import User
+from backend.profiler import ProfileStore, collapsed_stacks
+
+
+def _seed(session):
+    session.add_all(User(username=f"user{i}", department="IT") for i in range(3))
+    session.commit()
+
+
+def test_profile_is_taken_only_for_admin_with_trigger(app, client, db_session):
+    _seed(db_session)
+    login_as(app, 'ivanov')
+    response = client.get('/api/users', headers={'X-Profile': '1'})
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response.headers
+
+    login_as(app, 'admin', role='admin')
+    assert 'X-Profile-Id' not in client.get('/api/users').headers
+    assert 'X-Profile-Id' not in client.get('/api/users?_profile=0').headers
+
+    response = client.get('/api/users?_profile=1')
+    assert response.status_code == 200
+    assert len(response.get_json()['users']) == 3
+    profile_id = response.headers['X-Profile-Id']
+
+    profile = app.extensions['profiler'].load(profile_id)
+    assert profile['route'] == '/api/users' and profile['status'] == 200
+    assert profile['sql_count'] >= 1 and profile['tree']['sql_count'] == profile['sql_count']
+    frames = [entry['frame'] for entry in profile['sql_by_frame']]
+    assert any(frame.startswith('paginate (backend/utils/pagination.py') for frame in frames)
+    assert not any('profiler.py' in frame for frame in frames)
+
+
+def test_admin_pages_show_and_download_profiles(app, client, db_session):
+    _seed(db_session)
+    login_as(app, 'admin', role='admin')
+    profile_id = client.get('/api/courses', headers={'X-Profile': 'yes'}).headers['X-Profile-Id']
+
+    page = client.get('/admin/profiles')
+    assert page.status_code == 200
+    assert f'/admin/profiles/{profile_id}' in page.get_data(as_text=True)
+
+    detail = client.get(f'/admin/profiles/{profile_id}')
+    assert detail.status_code == 200
+    assert 'get_courses' in detail.get_data(as_text=True)
+
+    folded = client.get(f'/admin/profiles/{profile_id}/folded')
+    assert folded.status_code == 200
+    assert 'attachment' in folded.headers['Content-Disposition']
+    lines = folded.get_data(as_text=True).splitlines()
+    assert lines and all(line.startswith('<request>') and line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+    assert client.get(f'/admin/profiles/{profile_id}/json').get_json()['id'] == profile_id
+    assert client.get('/admin/profiles/../etc').status_code == 404
+    assert client.get('/admin/profiles/nope/json').status_code == 404
+
+    login_as(app, 'ivanov')
+    assert client.get('/admin/profiles').status_code == 403
+
+
+def test_collapsed_stacks_use_self_time():
+    tree = {'name': 'root', 'self_ms': 1.0, 'children': [
+        {'name': 'a', 'self_ms': 0.5, 'children': [{'name': 'b;c', 'self_ms': 2.0, 'children': []}]},
+    ]}
+    assert list(collapsed_stacks(tree)) == ['root 1000', 'root;a 500', 'root;a;b,c 2000']
+
+
+def test_store_keeps_only_latest_profiles(tmp_path):
+    store = ProfileStore(str(tmp_path), max_profiles=2)
+    ids = []
+    for index in range(3):
+        profile_id = store.new_id()
+        ids.append(profile_id)
+        store.save({'id': profile_id, 'created_at': f"2026-01-01T00:00:0{index}", 'tree': {}, 'sql_by_frame': []})
+    assert [meta['id'] for meta in store.list()] == [ids[2], ids[1]]
+    assert len(list(tmp_path.iterdir())) == 4
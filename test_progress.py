@@ -0,0 +1,111 @@
+"""
+Тесты учёта прохождения уроков и сводного прогресса по курсам.
+"""
+
+from sqlalchemy import insert
+
+from conftest import count_queries, login_as
+from backend.models import Course, CourseStats, Lesson, User, UserCourseProgress, UserLessonProgress
+from backend.progress import reconcile_progress
+from backend.stats_counters import check_counters
+
+
+def _seed(session, lessons=3):
+    user = User(username="student", department="IT")
+    course = Course(title="Курс", total_lessons=lessons)
+    session.add_all([user, course])
+    session.flush()
+    session.add_all(Lesson(course_id=course.id, title=f"Урок {i}", lesson_number=i) for i in range(1, lessons + 1))
+    session.commit()
+    lesson_ids = [lesson.id for lesson in session.query(Lesson).order_by(Lesson.lesson_number)]
+    return user.id, course.id, lesson_ids
+
+
+def _complete(client, lesson_id):
+    response = client.post(f'/api/lessons/{lesson_id}/complete')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_complete_lesson_is_idempotent_and_rolls_up(app, client, db_session):
+    user_id, course_id, lesson_ids = _seed(db_session)
+    login_as(app, "student")
+
+    first = _complete(client, lesson_ids[0])
+    assert first['already_completed'] is False
+    assert first['course_progress']['lessons_completed'] == 1
+    assert first['course_progress']['progress_percentage'] == 33.33
+
+    repeat = _complete(client, lesson_ids[0])
+    assert repeat['already_completed'] is True
+    assert repeat['course_progress']['lessons_completed'] == 1
+    assert db_session.query(UserLessonProgress).count() == 1
+
+    _complete(client, lesson_ids[1])
+    last = _complete(client, lesson_ids[2])['course_progress']
+    assert last['lessons_completed'] == 3
+    assert last['is_completed'] is True and last['completed_at']
+    assert last['progress_percentage'] == 100
+
+    assert db_session.get(CourseStats, course_id).completed_users == 1
+    assert check_counters(db_session) == []
+
+
+def test_complete_lesson_query_count_does_not_depend_on_course_size(app, client, db_session):
+    _, _, lesson_ids = _seed(db_session, lessons=30)
+    login_as(app, "student")
+    _complete(client, lesson_ids[0])
+
+    with count_queries() as small:
+        _complete(client, lesson_ids[1])
+    with count_queries() as large:
+        _complete(client, lesson_ids[20])
+    assert small.count == large.count
+    assert not any('count(' in statement.lower() for statement in large.statements)
+
+
+def test_complete_lesson_marks_legacy_null_row(app, client, db_session):
+    user_id, _, lesson_ids = _seed(db_session)
+    db_session.execute(insert(UserLessonProgress).values(user_id=user_id, lesson_id=lesson_ids[0], is_completed=None))
+    db_session.commit()
+    login_as(app, "student")
+
+    result = _complete(client, lesson_ids[0])
+    assert result['already_completed'] is False
+    assert result['course_progress']['lessons_completed'] == 1
+    db_session.expire_all()
+    assert db_session.query(UserLessonProgress).one().is_completed is True
+
+
+def test_complete_lesson_errors(app, client, db_session):
+    _, _, lesson_ids = _seed(db_session)
+    assert client.post(f'/api/lessons/{lesson_ids[0]}/complete').status_code == 401
+    login_as(app, "student")
+    assert client.post('/api/lessons/999/complete').status_code == 404
+
+
+def test_reconcile_repairs_rollups(app, db_session):
+    user_id, course_id, lesson_ids = _seed(db_session)
+    other = User(username="other", department="IT")
+    db_session.add(other)
+    db_session.commit()
+
+    # Отметки уроков в обход сервиса: сводки нет у other и она неверна у student
+    db_session.execute(insert(UserLessonProgress), [
+        {'user_id': uid, 'lesson_id': lid, 'is_completed': True}
+        for uid in (user_id, other.id) for lid in lesson_ids
+    ])
+    db_session.add(UserCourseProgress(user_id=user_id, course_id=course_id, lessons_completed=1))
+    db_session.commit()
+
+    assert reconcile_progress(db_session) == 2
+    db_session.commit()
+    rows = db_session.query(UserCourseProgress).order_by(UserCourseProgress.user_id).all()
+    assert [(row.lessons_completed, row.is_completed) for row in rows] == [(3, True), (3, True)]
+    assert all(row.completed_at for row in rows)
+    assert check_counters(db_session) == []
+
+    assert reconcile_progress(db_session) == 0
+    db_session.commit()
+    runner = app.test_cli_runner()
+    assert "исправлено строк: 0" in runner.invoke(args=["progress-reconcile"]).output
@@ -0,0 +1,163 @@
+"""
+Проверка планов запросов API: каждый SQL-запрос, который выполняют
+эндпоинты на синтетической БД, прогоняется через EXPLAIN QUERY PLAN. Тест
+падает, если таблица читается полным сканированием (``SCAN <таблица>`` без
+индекса) и это не записано в ALLOWED_FULL_SCANS с обоснованием.
+"""
+
+import re
+
+from sqlalchemy import text
+
+from conftest import count_queries, login_as
+from backend.models import Base, CourseStats, DatabaseManager, UserCourseProgress, db_manager
+from backend.stats_counters import rebuild_counters
+
+USERS, COURSES, LESSONS_PER_COURSE, QUESTIONS = 3000, 30, 12, 600
+
+# (метка, метод, URL, пользователь, роль, JSON-тело)
+REQUESTS = [
+    ('users.list', 'GET', '/api/users?limit=20', 'user1', 'user', None),
+    ('users.sorted', 'GET', '/api/users?limit=20&sort=full_name', 'user1', 'user', None),
+    ('users.sorted', 'GET', '/api/users?limit=20&sort=created_at&order=desc', 'user1', 'user', None),
+    ('users.sorted', 'GET', '/api/users?limit=20&sort=department', 'user1', 'user', None),
+    ('users.filter', 'GET', '/api/users?limit=20&department=Отдел 3&include_total=true', 'user1', 'user', None),
+    ('users.suggest', 'GET', '/api/users/suggest?q=сотр', 'user1', 'user', None),
+    ('users.detail', 'GET', '/api/users/7', 'user1', 'user', None),
+    ('users.progress', 'GET', '/api/users/7/progress', 'user1', 'user', None),
+    ('users.current', 'GET', '/api/current-user', 'user7', 'user', None),
+    ('users.check', 'GET', '/api/users/check-registration?username=user7', 'user7', 'user', None),
+    ('users.register', 'POST', '/api/users/register', 'user1', 'user', {'username': 'newcomer'}),
+    ('users.role', 'PUT', '/api/users/8/role', 'admin', 'admin', {'role': 'admin'}),
+    ('courses.list', 'GET', '/api/courses', 'user1', 'user', None),
+    ('courses.detail', 'GET', '/api/courses/3', 'user1', 'user', None),
+    ('courses.users', 'GET', '/api/courses/3/users', 'user1', 'user', None),
+    ('lessons.complete', 'POST', '/api/lessons/25/complete', 'user9', 'user', None),
+    ('departments', 'GET', '/api/departments', 'user1', 'user', None),
+    ('statistics', 'GET', '/api/statistics', 'user1', 'user', None),
+    ('questions.list', 'GET', '/api/questions?limit=20', 'user1', 'user', None),
+    ('questions.filter', 'GET', '/api/questions?limit=20&resolved=true&include_total=true', 'user1', 'user', None),
+    ('questions.filter', 'GET', '/api/questions?limit=20&resolved=false', 'user1', 'user', None),
+    ('questions.filter', 'GET', '/api/questions?limit=20&author_id=5', 'user1', 'user', None),
+    ('questions.filter', 'GET', '/api/questions?limit=20&mine=true', 'user5', 'user', None),
+    ('questions.search', 'GET', '/api/questions?limit=20&search=вопрос', 'user1', 'user', None),
+    ('questions.detail', 'GET', '/api/questions/11', 'user1', 'user', None),
+    ('answers.list', 'GET', '/api/questions/11/answers', 'user1', 'user', None),
+    ('questions.create', 'POST', '/api/questions', 'user5', 'user', {'title': 'Новый', 'body': 'Текст'}),
+    ('answers.create', 'POST', '/api/questions/11/answers', 'admin', 'admin', {'body': 'Ответ'}),
+    ('reports.progress', 'GET', '/api/reports/progress.csv?department=Отдел 3', 'admin', 'admin', None),
+    ('reports.progress', 'GET', '/api/reports/progress.csv?course_id=3', 'admin', 'admin', None),
+]
+
+# Полные сканирования, допустимые по смыслу запроса: (метка, таблица) -> причина
+ALLOWED_FULL_SCANS = {
+    ('users.list', 'users'): "keyset-пагинация по id: обход rowid по порядку с LIMIT",
+    ('users.filter', 'users'): "фильтр отдела — подстрока (ILIKE '%…%'), индекс неприменим",
+    ('users.suggest', 'users'): "построение in-memory индекса подсказок читает всех пользователей",
+    ('courses.list', 'courses'): "справочник курсов отдаётся целиком",
+    ('statistics', 'department_stats'): "счётчики отделов отдаются целиком",
+    ('statistics', 'course_stats'): "счётчики курсов отдаются целиком",
+    ('statistics', 'courses'): "статистика по всем активным курсам",
+    ('reports.progress', 'user_course_progress'): "выгрузка читает прогресс по всем курсам",
+    ('questions.list', 'questions'): "keyset-пагинация по id: обход rowid по порядку с LIMIT",
+}
+
+_FULL_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+_EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT INTO')
+
+
+def _seed(session):
+    conn = session.connection().connection.dbapi_connection
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO users (id, username, full_name, department, role, is_active) VALUES (?, ?, ?, ?, ?, 1)",
+        [(u, f"user{u}", f"Сотрудник {u}", f"Отдел {u % 40}", 'user') for u in range(1, USERS + 1)]
+        + [(USERS + 1, 'admin', 'Администратор', 'ИТ', 'admin')],
+    )
+    cur.executemany(
+        "INSERT INTO courses (id, title, total_lessons, is_active) VALUES (?, ?, ?, ?)",
+        [(c, f"Курс {c}", LESSONS_PER_COURSE, c % 10 != 0) for c in range(1, COURSES + 1)],
+    )
+    cur.executemany(
+        "INSERT INTO lessons (id, course_id, title, lesson_number, is_active) VALUES (?, ?, ?, ?, 1)",
+        [((c - 1) * LESSONS_PER_COURSE + n, c, f"Урок {n}", n)
+         for c in range(1, COURSES + 1) for n in range(1, LESSONS_PER_COURSE + 1)],
+    )
+    enrollments = [(u, c) for u in range(1, USERS + 1) for c in range(1 + u % 7, COURSES + 1, 7)]
+    cur.executemany(
+        "INSERT INTO user_course_progress (user_id, course_id, lessons_completed, is_completed) VALUES (?, ?, 2, 0)",
+        enrollments,
+    )
+    cur.executemany(
+        "INSERT INTO user_lesson_progress (user_id, lesson_id, is_completed) VALUES (?, ?, 1)",
+        [(u, (c - 1) * LESSONS_PER_COURSE + n) for u, c in enrollments for n in (1, 2)],
+    )
+    cur.executemany(
+        "INSERT INTO questions (id, author_id, title, body, is_resolved, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, datetime('now', ?), datetime('now'))",
+        [(q, 1 + q % 200, f"Вопрос {q}", f"Текст вопроса {q}", q % 3 == 0, f"-{q} minutes")
+         for q in range(1, QUESTIONS + 1)],
+    )
+    cur.executemany(
+        "INSERT INTO answers (question_id, author_id, body) VALUES (?, ?, ?)",
+        [(q, 1 + (q + a) % 300, f"Ответ {a}") for q in range(1, QUESTIONS + 1) for a in range(3)],
+    )
+    rebuild_counters(session)
+    session.commit()
+
+
+def _full_scans(session, statement, parameters):
+    plan = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).all()
+    tables = set(Base.metadata.tables)
+    scans = []
+    for row in plan:
+        match = _FULL_SCAN_RE.match(row[-1])
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans
+
+
+def test_api_queries_do_not_fall_back_to_full_scans(app, client, db_session):
+    _seed(db_session)
+    problems = []
+    checked = 0
+    for label, method, url, username, role, body in REQUESTS:
+        login_as(app, username, role)
+        with count_queries() as counter:
+            response = client.open(url, method=method, json=body)
+            response.get_data()
+        assert response.status_code < 400, (url, response.get_json())
+
+        for statement, parameters in zip(counter.statements, counter.parameters):
+            if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+                continue
+            checked += 1
+            for table in _full_scans(db_session, statement, parameters):
+                if (label, table) not in ALLOWED_FULL_SCANS:
+                    problems.append(f"{method} {url}: SCAN {table}\n    {' '.join(statement.split())}")
+        db_session.rollback()
+
+    assert checked > len(REQUESTS)
+    assert not problems, "Полные сканирования без индекса:\n" + "\n".join(problems)
+
+
+def test_create_tables_dedupes_course_progress_before_unique_index(tmp_path):
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'legacy.db'}")
+    manager.create_tables()
+    with manager.engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_user_course_progress_user_course"))
+        conn.execute(text("INSERT INTO users (id, username, department, role) VALUES (1, 'u1', 'ИТ', 'user')"))
+        conn.execute(text("INSERT INTO courses (id, title, total_lessons) VALUES (1, 'Курс', 5)"))
+        conn.execute(text(
+            "INSERT INTO user_course_progress (user_id, course_id, lessons_completed, is_completed) "
+            "VALUES (1, 1, 1, 0), (1, 1, 3, 0), (1, 1, 2, 0)"
+        ))
+
+    manager.create_tables()
+    session = manager.get_session()
+    try:
+        assert [row.lessons_completed for row in session.query(UserCourseProgress)] == [3]
+        assert session.get(CourseStats, 1).enrolled_users == 1
+    finally:
+        session.close()
+        manager.engine.dispose()
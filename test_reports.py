@@ -0,0 +1,99 @@
+"""
+Тесты потоковой выгрузки отчёта о прогрессе (CSV/XLSX).
+"""
+
+import csv
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+
+from backend.models import Course, User, UserCourseProgress
+from backend.reports import ProgressReportFilter, iter_progress_rows
+from conftest import login_as
+
+SHEET_NS = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+def _seed(session):
+    users = [User(username=f"user{i}", full_name=f"Пользователь <{i}> & Ко", department=dept)
+             for i, dept in enumerate(["ИТ", "ИТ", "Продажи"])]
+    courses = [Course(title="Python", total_lessons=4), Course(title="SQL", total_lessons=0)]
+    session.add_all(users + courses)
+    session.flush()
+    for user in users:
+        for course in courses:
+            session.add(UserCourseProgress(user_id=user.id, course_id=course.id, lessons_completed=1))
+    session.commit()
+    return [user.id for user in users], [course.id for course in courses]
+
+
+def _csv_rows(response):
+    text = response.get_data().decode('utf-8-sig')
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def test_progress_csv_export_with_filters(app, client, db_session):
+    user_ids, course_ids = _seed(db_session)
+    login_as(app, "admin", role="admin")
+
+    response = client.get('/api/reports/progress.csv')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    rows = _csv_rows(response)
+    assert len(rows) == 6
+    assert [(int(r['user_id']), int(r['course_id'])) for r in rows] == [(u, c) for u in user_ids for c in course_ids]
+    assert rows[0]['full_name'] == "Пользователь <0> & Ко"
+    assert rows[0]['progress_percentage'] == '25.0'
+    assert rows[1]['progress_percentage'] == '0'
+
+    filtered = _csv_rows(client.get(f'/api/reports/progress.csv?department=ИТ&course_id={course_ids[1]}'))
+    assert [(int(r['user_id']), r['course_title']) for r in filtered] == [(user_ids[0], "SQL"), (user_ids[1], "SQL")]
+
+
+def test_progress_xlsx_export_is_valid_workbook(app, client, db_session):
+    _seed(db_session)
+    login_as(app, "admin", role="admin")
+
+    response = client.get('/api/reports/progress.xlsx?department=Продажи')
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+    assert archive.testzip() is None
+    sheet = ET.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+    rows = sheet.findall('.//x:row', SHEET_NS)
+    assert len(rows) == 3
+    header = [cell.findtext('x:is/x:t', namespaces=SHEET_NS) for cell in rows[0]]
+    assert header[:3] == ['user_id', 'username', 'full_name']
+    first = rows[1]
+    assert first[2].findtext('x:is/x:t', namespaces=SHEET_NS) == "Пользователь <2> & Ко"
+    assert first[6].findtext('x:v', namespaces=SHEET_NS) == '1'
+    assert first[9].get('t') == 'b'
+
+
+def test_progress_export_requires_admin_and_known_format(app, client, db_session):
+    login_as(app, "user0")
+    assert client.get('/api/reports/progress.csv').status_code == 403
+    login_as(app, "admin", role="admin")
+    assert client.get('/api/reports/progress.pdf').status_code == 404
+
+
+def test_progress_rows_are_fetched_in_batches(db_session):
+    _seed(db_session)
+    batches = list(iter_progress_rows(db_session, ProgressReportFilter(), batch_size=4))
+    assert [len(batch) for batch in batches] == [4, 2]
+
+
+def test_progress_csv_escapes_formula_cells(app, client, db_session):
+    user = User(username="hacker", full_name='=HYPERLINK("http://evil")', department="@SUM(A1)")
+    course = Course(title="-1+1", total_lessons=2)
+    db_session.add_all([user, course])
+    db_session.flush()
+    db_session.add(UserCourseProgress(user_id=user.id, course_id=course.id, lessons_completed=1))
+    db_session.commit()
+    login_as(app, "admin", role="admin")
+
+    row, = _csv_rows(client.get('/api/reports/progress.csv'))
+    assert row['full_name'] == '\'=HYPERLINK("http://evil")'
+    assert row['department'] == "'@SUM(A1)" and row['course_title'] == "'-1+1"
+    assert row['lessons_completed'] == '1'
@@ -0,0 +1,100 @@
+"""
+Тесты отметки версии схемы: миграции выполняются один раз, а воркер с
+актуальной отметкой при старте делает один запрос.
+"""
+
+import threading
+
+from sqlalchemy import text
+
+from conftest import count_queries, make_test_config
+from backend import create_app
+from backend import schema_version
+from backend.models import Course, SchemaMeta, db_manager
+
+
+def test_worker_boot_with_current_stamp_runs_single_query(app, tmp_path):
+    with count_queries() as counter:
+        create_app(make_test_config(tmp_path))
+    assert counter.count == 1, counter.statements
+    assert "schema_meta" in counter.statements[0]
+
+
+def test_stale_stamp_triggers_migration(app, tmp_path, db_session, monkeypatch):
+    db_session.query(SchemaMeta).delete()
+    db_session.commit()
+
+    calls = []
+    original = db_manager.create_tables
+    monkeypatch.setattr(db_manager, 'create_tables', lambda **kwargs: calls.append(1) or original(**kwargs))
+    create_app(make_test_config(tmp_path, DATABASE_AUTO_MIGRATE=False))
+    assert calls == []
+    create_app(make_test_config(tmp_path))
+    create_app(make_test_config(tmp_path))
+    assert calls == [1]
+    assert schema_version.read_stamp(db_manager.engine) == {'schema': schema_version.SCHEMA_VERSION}
+
+
+def test_sample_data_is_seeded_once_per_version(tmp_path):
+    create_app(make_test_config(tmp_path, DATABASE_INIT_SAMPLE_DATA=True))
+    session = db_manager.get_session()
+    try:
+        courses = session.query(Course).count()
+        assert courses > 0
+        assert schema_version.read_stamp(db_manager.engine)['seed'] == schema_version.SEED_VERSION
+
+        with count_queries() as counter:
+            create_app(make_test_config(tmp_path, DATABASE_INIT_SAMPLE_DATA=True))
+        assert counter.count == 1
+        assert session.query(Course).count() == courses
+    finally:
+        session.close()
+        db_manager.dispose()
+
+
+def test_concurrent_upgrades_run_migrations_once(app, db_session):
+    db_session.execute(text("DELETE FROM schema_meta"))
+    db_session.commit()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(schema_version.upgrade_database(db_manager, sample_data=False)))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [[], [], ['schema']]
+
+
+def test_db_upgrade_command(app, db_session):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['db-upgrade'])
+    assert result.exit_code == 0, result.output
+    assert "актуальна" in result.output
+
+    result = runner.invoke(args=['db-upgrade', '--force'])
+    assert result.exit_code == 0, result.output
+    assert "schema" in result.output
+
+
+def test_worker_boot_leaves_backfill_to_cli(app, tmp_path, db_session, monkeypatch):
+    db_session.execute(text("CREATE TABLE kerberos_users (username VARCHAR(100), department VARCHAR(100))"))
+    db_session.execute(text("INSERT INTO kerberos_users (username, department) VALUES ('legacy', 'ИТ')"))
+    db_session.execute(text("DELETE FROM schema_meta"))
+    db_session.commit()
+
+    warned = []
+    original = schema_version.warn_pending_backfills
+    monkeypatch.setattr(schema_version, 'warn_pending_backfills', lambda engine: warned.extend(original(engine)))
+    create_app(make_test_config(tmp_path))
+    assert schema_version.read_stamp(db_manager.engine)['schema'] == schema_version.SCHEMA_VERSION
+    assert db_session.execute(text("SELECT count(*) FROM kerberos_users")).scalar() == 1
+    assert warned == ['merge-kerberos-users']
+
+    db_session.rollback()
+    result = app.test_cli_runner().invoke(args=['db-upgrade', '--force', '--no-sample-data'])
+    assert result.exit_code == 0, result.output
+    assert db_session.execute(text("SELECT username FROM users")).scalars().all() == ['legacy']
+    assert not db_session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'kerberos_users'")).first()
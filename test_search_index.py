@@ -0,0 +1,117 @@
+"""
+Тесты полнотекстового поиска по вопросам и ответам (FTS5).
+"""
+
+from sqlalchemy import text
+
+from backend.models import Answer, Question, User, db_manager
+from backend.search_index import FTS_TABLE, build_match_query, ensure_search_index
+
+
+def _author(session):
+    user = User(username="author", department="IT")
+    session.add(user)
+    session.commit()
+    return user
+
+
+def _search(client, query, extra=""):
+    response = client.get(f"/api/questions?search={query}{extra}")
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_cyrillic_search_is_case_insensitive_and_prefix(client, db_session):
+    author = _author(db_session)
+    db_session.add(Question(author_id=author.id, title="Сброс ПАРОЛЯ в почте", body="Не могу войти"))
+    db_session.add(Question(author_id=author.id, title="Принтер", body="Зелёная лампа мигает"))
+    db_session.commit()
+
+    assert [q['title'] for q in _search(client, "пароля")['questions']] == ["Сброс ПАРОЛЯ в почте"]
+    assert [q['title'] for q in _search(client, "паро")['questions']] == ["Сброс ПАРОЛЯ в почте"]
+    assert [q['title'] for q in _search(client, "зеленая")['questions']] == ["Принтер"]
+    assert '<mark>' in _search(client, "почте")['questions'][0]['snippet']
+
+
+def test_title_ranks_above_body_and_answers_are_indexed(client, db_session):
+    author = _author(db_session)
+    in_body = Question(author_id=author.id, title="Общий вопрос", body="Про VPN подключение")
+    in_title = Question(author_id=author.id, title="VPN не работает", body="Ошибка")
+    other = Question(author_id=author.id, title="Отпуск", body="Как оформить")
+    db_session.add_all([in_body, in_title, other])
+    db_session.commit()
+
+    ids = [q['id'] for q in _search(client, "vpn")['questions']]
+    assert ids == [in_title.id, in_body.id]
+
+    db_session.add(Answer(question_id=other.id, author_id=author.id, body="Через кадровый портал"))
+    db_session.commit()
+    assert [q['id'] for q in _search(client, "кадровый")['questions']] == [other.id]
+
+
+def test_triggers_follow_updates_and_deletes(client, db_session):
+    author = _author(db_session)
+    question = Question(author_id=author.id, title="Старый заголовок", body="текст")
+    db_session.add(question)
+    db_session.commit()
+
+    question.title = "Новый заголовок"
+    db_session.commit()
+    assert _search(client, "старый")['questions'] == []
+    assert len(_search(client, "новый")['questions']) == 1
+
+    db_session.delete(question)
+    db_session.commit()
+    assert _search(client, "новый")['questions'] == []
+
+
+def test_backfill_indexes_existing_rows_in_batches(app, db_session):
+    author = _author(db_session)
+    for i in range(23):
+        db_session.add(Question(author_id=author.id, title=f"Архивный вопрос {i}", body="тело"))
+    db_session.commit()
+
+    with db_manager.engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {FTS_TABLE}"))
+    assert ensure_search_index(db_manager.engine, batch_size=5)
+    # Повторный запуск ничего не дублирует
+    assert ensure_search_index(db_manager.engine, batch_size=5)
+
+    with db_manager.engine.connect() as conn:
+        count = conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'архивный'")).scalar()
+    assert count == 23
+
+
+def test_relevance_pagination(client, db_session):
+    author = _author(db_session)
+    for i in range(7):
+        db_session.add(Question(author_id=author.id, title=f"Доступ {i}", body="доступ " * i))
+    db_session.commit()
+
+    seen, cursor = [], None
+    while True:
+        extra = "&limit=3" + (f"&cursor={cursor}" if cursor else "")
+        data = _search(client, "доступ", extra)
+        seen.extend(q['id'] for q in data['questions'])
+        if not data['has_more']:
+            break
+        cursor = data['next_cursor']
+    assert len(seen) == 7 and len(set(seen)) == 7
+
+
+def test_match_query_strips_syntax():
+    assert build_match_query('ёлка OR "x" NEAR(') == '"елка"* "OR"* "x"* "NEAR"*'
+    assert build_match_query('  ***  ') is None
+
+
+def test_snippet_is_html_escaped_except_marks(client, db_session):
+    author = _author(db_session)
+    db_session.add(Question(author_id=author.id, title="Форма входа",
+                            body='Вставил <script>alert(1)</script> и <img src=x onerror="x()"> в пароль'))
+    db_session.commit()
+
+    snippet = _search(client, "пароль")['questions'][0]['snippet']
+    assert '<script>' not in snippet and '<img' not in snippet
+    assert '&lt;script&gt;alert(1)&lt;/script&gt;' in snippet and '&quot;x()&quot;' in snippet
+    assert '<mark>пароль</mark>' in snippet
+    assert snippet.replace('<mark>', '').replace('</mark>', '').count('<') == 0
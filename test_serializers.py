@@ -0,0 +1,52 @@
+"""
+Тесты сериализации пользователей: число SQL-запросов не зависит от размера выборки.
+"""
+
+from conftest import count_queries
+from backend.models import Course, User, UserCourseProgress
+
+
+def _seed(session, users_count):
+    course = Course(title="Курс", total_lessons=4)
+    session.add(course)
+    session.flush()
+    for i in range(users_count):
+        user = User(username=f"u{users_count}_{i}", full_name=f"Пользователь {i}", department="IT")
+        session.add(user)
+        session.flush()
+        session.add(UserCourseProgress(user_id=user.id, course_id=course.id,
+                                       lessons_completed=i % 5, is_completed=i % 5 == 4))
+    session.commit()
+
+
+def _users_query_count(client, url):
+    with count_queries() as counter:
+        response = client.get(url)
+    assert response.status_code == 200
+    return counter.count, response.get_json()
+
+
+def test_users_list_query_count_is_constant(client, db_session):
+    _seed(db_session, 3)
+    small, _ = _users_query_count(client, '/api/users')
+    _seed(db_session, 40)
+    large, data = _users_query_count(client, '/api/users')
+    assert data['total'] == 43
+    assert small == large
+
+
+def test_users_page_query_count_is_constant(client, db_session):
+    _seed(db_session, 60)
+    small, _ = _users_query_count(client, '/api/users?limit=5')
+    large, _ = _users_query_count(client, '/api/users?limit=50')
+    assert small == large
+
+
+def test_counters_match_lazy_to_dict(client, db_session):
+    _seed(db_session, 12)
+    data = client.get('/api/users').get_json()
+    by_id = {u['id']: u for u in data['users']}
+    for user in db_session.query(User).all():
+        expected = user.to_dict()
+        for key in ('courses_enrolled', 'courses_completed', 'total_lessons_completed'):
+            assert by_id[user.id][key] == expected[key]
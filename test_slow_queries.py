@@ -0,0 +1,68 @@
+"""
+Тесты журнала медленных SQL-запросов: маршрут, скрытые параметры, план
+EXPLAIN QUERY PLAN и доступ к буферу только для администраторов.
+"""
+
+from conftest import login_as
+from backend.models import Question, User, db_manager
+from backend.slow_queries import redact_parameters
+
+
+def _capture_all(app):
+    """Порог ниже любого времени выполнения — в журнал попадает каждое выражение."""
+    log = db_manager.slow_queries
+    log.configure(threshold_ms=1e-6, capacity=500)
+    log.clear()
+    return log
+
+
+def test_redact_parameters_hides_strings_and_blobs():
+    assert redact_parameters(("secret", 5, None, b"\x00" * 3, 1.5)) == ['<str:6>', 5, None, '<bytes:3>', 1.5]
+    assert redact_parameters({'q': "%vpn%"}) == {'q': '<str:5>'}
+
+
+def test_slow_query_sample_has_route_redacted_parameters_and_plan(app, client, db_session):
+    author = User(username="author", department="IT")
+    db_session.add(author)
+    db_session.commit()
+    db_session.add(Question(author_id=author.id, title="VPN не работает", body="Ошибка"))
+    db_session.commit()
+
+    log = _capture_all(app)
+    login_as(app, 'ivanov')
+    assert client.get('/api/users?limit=5&department=IT').status_code == 200
+    log.wait()
+
+    samples = [s for s in log.samples() if s.route == 'GET /api/users' and 'FROM users' in s.statement]
+    assert samples
+    sample = samples[0]
+    assert any(str(value).startswith('<str:') for value in sample.parameters)
+    assert not any('IT' in str(value) for value in sample.parameters)
+    assert sample.plan and any('users' in line for line in sample.plan)
+
+
+def test_admin_endpoint_lists_samples_and_summary(app, client):
+    log = _capture_all(app)
+    login_as(app, 'ivanov')
+    for _ in range(3):
+        client.get('/api/courses')
+    assert client.get('/api/admin/slow-queries').status_code == 403
+
+    login_as(app, 'admin', role='admin')
+    log.wait()
+    data = client.get('/api/admin/slow-queries?limit=2').get_json()
+    assert len(data['samples']) == 2
+    courses = [group for group in data['statements'] if 'GET /api/courses' in group['routes']]
+    assert courses and max(group['count'] for group in courses) >= 3
+
+    assert client.delete('/api/admin/slow-queries').get_json() == {'cleared': True}
+    assert log.samples() == []
+
+
+def test_fast_queries_are_not_recorded(app, client):
+    log = db_manager.slow_queries
+    log.configure(threshold_ms=10_000, capacity=10)
+    log.clear()
+    login_as(app, 'ivanov')
+    client.get('/api/courses')
+    assert log.samples() == []
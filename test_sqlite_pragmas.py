@@ -0,0 +1,178 @@
+"""
+Тесты профиля PRAGMA SQLite, фонового checkpoint журнала WAL и разделения
+соединений на пишущие и только для чтения.
+"""
+
+import io
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from conftest import count_queries, login_as
+from backend.config import BaseConfig
+from backend.models import Course, DatabaseManager, Lesson, Question, User, db_manager
+from backend.simplified_real_kerberos_auth import SimplifiedRealKerberosAuth
+from backend.sqlite_pragmas import SqlitePragmaProfile, WalCheckpointer
+
+
+def _pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_app_connections_use_configured_profile(app):
+    engine = db_manager.engine
+    assert _pragma(engine, "journal_mode") == "wal"
+    assert _pragma(engine, "synchronous") == 1  # NORMAL
+    assert _pragma(engine, "busy_timeout") == 5000
+    assert _pragma(engine, "temp_store") == 2  # MEMORY
+    assert _pragma(engine, "cache_size") == -20000
+
+
+def test_profile_from_config_overrides_and_disables():
+    profile = SqlitePragmaProfile.from_config({
+        'SQLITE_JOURNAL_MODE': 'delete',
+        'SQLITE_BUSY_TIMEOUT_MS': '250',
+        'SQLITE_MMAP_SIZE': '',
+    })
+    statements = list(profile.statements())
+    assert "PRAGMA journal_mode=DELETE" in statements
+    assert "PRAGMA busy_timeout=250" in statements
+    assert not any("mmap_size" in statement for statement in statements)
+    assert list(SqlitePragmaProfile.legacy().statements()) == []
+
+    with pytest.raises(ValueError):
+        list(SqlitePragmaProfile(journal_mode="WAL; DROP TABLE users").statements())
+
+
+def test_legacy_profile_keeps_rollback_journal(tmp_path):
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'legacy.db'}", SqlitePragmaProfile.legacy())
+    try:
+        assert _pragma(manager.engine, "journal_mode") == "delete"
+    finally:
+        manager.engine.dispose()
+
+
+def test_checkpointer_truncates_large_wal(tmp_path):
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'wal.db'}")
+    try:
+        manager.create_tables()
+        session = manager.get_session()
+        session.add_all(User(username=f"user{i}", department="ИТ", full_name="x" * 200) for i in range(500))
+        session.commit()
+        session.close()
+        wal_path = tmp_path / 'wal.db-wal'
+        assert os.path.getsize(wal_path) > 0
+
+        checkpointer = WalCheckpointer(manager, interval=60, truncate_bytes=10 * 1024 * 1024)
+        busy, _, _ = checkpointer.checkpoint()
+        assert busy == 0 and checkpointer.last_result[0] == 'PASSIVE'
+        assert os.path.getsize(wal_path) > 0
+
+        checkpointer.truncate_bytes = 0
+        checkpointer.checkpoint()
+        assert checkpointer.last_result[0] == 'TRUNCATE'
+        assert os.path.getsize(wal_path) == 0
+    finally:
+        manager.engine.dispose()
+
+
+def test_read_sessions_cannot_write(app, db_session):
+    db_session.add(User(username="reader", department="ИТ"))
+    db_session.commit()
+
+    session = db_manager.get_read_session()
+    try:
+        assert session.get_bind() is db_manager.read_engine is not db_manager.engine
+        assert session.query(User).filter(User.username == "reader").count() == 1
+        assert session.execute(text("PRAGMA query_only")).scalar() == 1
+        session.add(User(username="intruder", department="ИТ"))
+        with pytest.raises(OperationalError, match="readonly"):
+            session.commit()
+    finally:
+        session.rollback()
+        session.close()
+
+
+def test_get_requests_use_read_engine_and_writes_use_writer(app, client, db_session):
+    user = User(username="student", department="ИТ")
+    course = Course(title="Курс", total_lessons=1)
+    db_session.add_all([user, course])
+    db_session.flush()
+    lesson = Lesson(course_id=course.id, title="Урок", lesson_number=1)
+    db_session.add(lesson)
+    db_session.commit()
+    course_id, lesson_id = course.id, lesson.id
+    login_as(app, "student")
+
+    with count_queries(db_manager.read_engine) as reads, count_queries(db_manager.engine) as writes:
+        assert client.get(f'/api/courses/{course_id}').status_code == 200
+    assert reads.count > 0 and writes.count == 0
+
+    with count_queries(db_manager.read_engine) as reads, count_queries(db_manager.engine) as writes:
+        assert client.post(f'/api/lessons/{lesson_id}/complete').status_code == 200
+    assert writes.count > 0 and reads.count == 0
+
+
+def test_auto_register_touches_writer_only_for_new_users(app, db_session):
+    db_session.add(User(username="ivanov", department="ИТ"))
+    db_session.commit()
+    auth = SimplifiedRealKerberosAuth()
+
+    with count_queries(db_manager.engine) as writes:
+        auth._auto_register_user("Ivanov")
+    assert writes.count == 0
+
+    with count_queries(db_manager.engine) as writes:
+        auth._auto_register_user("petrov")
+    assert writes.count > 0
+    assert db_session.query(User).filter(User.username == "petrov").count() == 1
+
+
+def test_upload_does_not_hold_writer_while_saving_file(app, client, db_session, monkeypatch, tmp_path):
+    author = User(username="author", department="ИТ")
+    db_session.add(author)
+    db_session.commit()
+    question = Question(author_id=author.id, title="Вопрос", body="Текст")
+    db_session.add(question)
+    db_session.commit()
+    question_id = question.id
+    db_session.close()
+
+    from werkzeug.datastructures import FileStorage
+    monkeypatch.setattr("backend.api.api_bp.root_path", str(tmp_path))
+    pool = db_manager.engine.pool
+    baseline = pool.checkedout()
+    checked_out = []
+    original_save = FileStorage.save
+
+    def save(self, dst, *args, **kwargs):
+        checked_out.append(pool.checkedout())
+        return original_save(self, dst, *args, **kwargs)
+
+    monkeypatch.setattr(FileStorage, "save", save)
+    data = {"file": (io.BytesIO(b"log"), "log.txt")}
+    response = client.post(f"/api/questions/{question_id}/attachments", data=data,
+                           content_type="multipart/form-data")
+    assert response.status_code == 201, response.get_json()
+    assert checked_out == [baseline]
+
+    data = {"file": (io.BytesIO(b"log"), "log.txt")}
+    assert client.post("/api/questions/999/attachments", data=data,
+                       content_type="multipart/form-data").status_code == 404
+
+
+def test_writer_pool_is_serialized(tmp_path):
+    assert BaseConfig.DATABASE_WRITER_POOL_SIZE == 1
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'pool.db'}", writer_pool_size=1, reader_pool_size=4)
+    try:
+        manager.create_tables()
+        assert manager.engine.pool.size() == 1 and manager.engine.pool._max_overflow == 0
+        assert manager.read_engine.pool.size() == 4
+    finally:
+        manager.dispose()
+
+    memory = DatabaseManager("sqlite://")
+    assert memory.read_engine is memory.engine
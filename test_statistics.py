@@ -0,0 +1,50 @@
+"""
+Тесты /api/statistics: форма ответа и постоянное число SQL-запросов.
+"""
+
+from conftest import count_queries
+from backend.models import Course, User, UserCourseProgress
+
+
+def _seed(session, departments, courses, prefix):
+    course_objs = [Course(title=f"{prefix} курс {c}", total_lessons=3) for c in range(courses)]
+    session.add_all(course_objs)
+    session.flush()
+    for d in range(departments):
+        for i in range(3):
+            user = User(username=f"{prefix}{d}_{i}", department=f"{prefix} отдел {d}", is_active=i != 0)
+            session.add(user)
+            session.flush()
+            for c, course in enumerate(course_objs):
+                if (i + c) % 2 == 0:
+                    session.add(UserCourseProgress(user_id=user.id, course_id=course.id,
+                                                   lessons_completed=3 if i == 2 else 1, is_completed=i == 2))
+    session.commit()
+
+
+def _statistics(client):
+    with count_queries() as counter:
+        response = client.get('/api/statistics')
+    assert response.status_code == 200
+    return counter.count, response.get_json()
+
+
+def test_statistics_query_count_is_constant(client, db_session):
+    _seed(db_session, departments=2, courses=2, prefix="a")
+    small, _ = _statistics(client)
+    _seed(db_session, departments=10, courses=12, prefix="b")
+    large, data = _statistics(client)
+    assert small == large
+    assert data['overview']['total_courses'] == 14
+    assert len(data['departments']) == 12
+
+
+def test_statistics_values(client, db_session):
+    _seed(db_session, departments=2, courses=2, prefix="a")
+    _, data = _statistics(client)
+    assert data['overview'] == {'total_users': 6, 'active_users': 4, 'total_courses': 2}
+    assert {d['department']: d['users_count'] for d in data['departments']} == {'a отдел 0': 3, 'a отдел 1': 3}
+    first = data['courses'][0]
+    assert set(first) == {'course_id', 'course_title', 'total_lessons', 'enrolled_users',
+                          'completed_users', 'completion_rate'}
+    assert (first['enrolled_users'], first['completed_users'], first['completion_rate']) == (4, 2, 50.0)
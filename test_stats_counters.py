@@ -0,0 +1,97 @@
+"""
+Тесты материализованных счётчиков статистики (department_stats, course_stats).
+"""
+
+from sqlalchemy import insert
+
+from conftest import count_queries
+from backend.models import Course, CourseStats, User, UserCourseProgress
+from backend.statistics import compute_statistics, read_statistics
+from backend.stats_counters import check_counters, rebuild_counters
+
+
+def _seed(session):
+    courses = [Course(title=f"Курс {i}", total_lessons=4) for i in range(3)]
+    session.add_all(courses)
+    session.flush()
+    for i in range(9):
+        user = User(username=f"user{i}", department=f"Отдел {i % 3}", is_active=i % 4 != 0)
+        session.add(user)
+        session.flush()
+        for course in courses[: i % 3 + 1]:
+            session.add(UserCourseProgress(user_id=user.id, course_id=course.id,
+                                           lessons_completed=i % 5, is_completed=i % 5 == 4))
+    session.commit()
+    return courses
+
+
+def _assert_consistent(session):
+    assert check_counters(session) == []
+    assert read_statistics(session) == compute_statistics(session)
+
+
+def test_counters_follow_orm_changes(db_session):
+    courses = _seed(db_session)
+    _assert_consistent(db_session)
+
+    # Изменение выгруженных после commit объектов: старые значения должны подгрузиться
+    user = db_session.query(User).filter_by(username="user1").one()
+    db_session.commit()
+    user.department = "Новый отдел"
+    user.is_active = False
+    progress = db_session.query(UserCourseProgress).first()
+    db_session.commit()
+    progress.lessons_completed = 4
+    progress.is_completed = True
+    db_session.commit()
+    _assert_consistent(db_session)
+
+    db_session.delete(db_session.query(User).filter_by(username="user5").one())
+    db_session.commit()
+    _assert_consistent(db_session)
+
+    db_session.delete(courses[0])
+    db_session.add(Course(title="Пустой курс", total_lessons=2))
+    db_session.commit()
+    _assert_consistent(db_session)
+
+
+def test_rebuild_after_core_insert(db_session):
+    courses = _seed(db_session)
+    user = db_session.query(User).first()
+    db_session.execute(insert(UserCourseProgress).values(
+        user_id=user.id, course_id=courses[2].id, lessons_completed=1, is_completed=False))
+    db_session.commit()
+    assert check_counters(db_session)
+
+    rebuild_counters(db_session)
+    db_session.commit()
+    _assert_consistent(db_session)
+
+
+def test_course_users_summary_uses_counters(client, db_session):
+    courses = _seed(db_session)
+    data = client.get(f'/api/courses/{courses[0].id}/users').get_json()
+    stats = db_session.get(CourseStats, courses[0].id)
+    assert data['summary']['total_users'] == stats.enrolled_users == 9
+    assert data['summary']['completed_users'] == stats.completed_users
+    assert data['summary']['average_progress'] == stats.average_progress(4)
+
+
+def test_statistics_read_is_two_queries(client, db_session):
+    _seed(db_session)
+    session = db_session
+    with count_queries() as counter:
+        read_statistics(session)
+    assert counter.count == 2
+
+
+def test_cli_check_and_rebuild(app, db_session):
+    _seed(db_session)
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["stats-check"]).exit_code == 0
+    db_session.execute(insert(User).values(username="raw", department="Отдел 0", role="user"))
+    db_session.commit()
+    assert runner.invoke(args=["stats-check"]).exit_code == 1
+    assert runner.invoke(args=["stats-rebuild"]).exit_code == 0
+    assert runner.invoke(args=["stats-check"]).exit_code == 0
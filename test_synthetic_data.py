@@ -0,0 +1,103 @@
+"""
+Тесты генератора синтетических данных: объёмы, детерминированность и
+согласованность сводок, счётчиков и индексов.
+"""
+
+import hashlib
+
+import pytest
+from sqlalchemy import text
+
+from backend.models import Base, User, db_manager
+from backend.progress import reconcile_progress
+from backend.search_index import search_index_available
+from backend.stats_counters import check_counters
+from backend.synthetic_data import SyntheticVolumes, generate_dataset
+
+VOLUMES = SyntheticVolumes(users=300, departments=25, courses=12, lessons_per_course=6, courses_per_user=3,
+                           questions=80, lesson_content_bytes=2000)
+
+
+def _fingerprint(session):
+    digest = hashlib.sha256()
+    for table in ('users', 'user_lesson_progress', 'answers', 'question_attachments'):
+        for row in session.execute(text(f"SELECT * FROM {table} ORDER BY id")):
+            digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+
+def test_generated_dataset_is_consistent(app, db_session):
+    counts = generate_dataset(db_manager, VOLUMES, seed=7)
+    assert counts['users'] == 300 and counts['lessons'] == 72 and counts['user_course_progress'] == 900
+    assert counts['user_lesson_progress'] > 0 and counts['answers'] > 0
+
+    assert check_counters(db_session) == []
+    assert reconcile_progress(db_session) == 0
+    db_session.rollback()
+
+    existing = {row[0] for row in db_session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    for name in ('users', 'user_lesson_progress', 'questions'):
+        assert {index.name for index in Base.metadata.tables[name].indexes} <= existing
+    assert search_index_available(db_manager.engine)
+
+    user = db_session.query(User).filter(User.role == 'user').first()
+    assert len(user.full_name.split()) == 3 and user.email.endswith('@company.com')
+    content = db_session.execute(text("SELECT length(CAST(content AS BLOB)) FROM lessons LIMIT 1")).scalar()
+    assert content >= 2000
+
+
+def test_generation_is_deterministic_and_guards_existing_data(app, db_session):
+    generate_dataset(db_manager, VOLUMES, seed=7)
+    first = _fingerprint(db_session)
+    db_session.rollback()
+
+    with pytest.raises(ValueError):
+        generate_dataset(db_manager, VOLUMES, seed=7)
+
+    generate_dataset(db_manager, VOLUMES, seed=7, replace=True)
+    assert _fingerprint(db_session) == first
+    db_session.rollback()
+
+    generate_dataset(db_manager, VOLUMES, seed=8, replace=True)
+    assert _fingerprint(db_session) != first
+
+
+def test_failed_load_restores_indexes_search_and_synchronous(app, db_session, monkeypatch):
+    from backend import synthetic_data
+
+    insert = synthetic_data._insert
+    connections = []
+
+    def failing_insert(cursor, table, rows):
+        connections.append(cursor.connection)
+        if table == 'questions':
+            raise RuntimeError("обрыв загрузки")
+        return insert(cursor, table, rows)
+
+    monkeypatch.setattr(synthetic_data, '_insert', failing_insert)
+    synchronous = db_session.execute(text("PRAGMA synchronous")).scalar()
+    with pytest.raises(RuntimeError):
+        generate_dataset(db_manager, VOLUMES, seed=7)
+
+    db_session.rollback()
+    existing = {row[0] for row in db_session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    for name in ('user_course_progress', 'user_lesson_progress', 'questions'):
+        assert {index.name for index in Base.metadata.tables[name].indexes} <= existing
+    assert search_index_available(db_manager.engine)
+    assert db_session.execute(text("SELECT count(*) FROM questions")).scalar() == 0
+    assert connections[0].execute("PRAGMA synchronous").fetchone()[0] == synchronous
+
+
+def test_failed_restore_keeps_original_load_error(app, db_session, monkeypatch):
+    from backend import search_index, synthetic_data
+
+    def failing_insert(cursor, table, rows):
+        raise RuntimeError("обрыв загрузки")
+
+    def failing_search_index(engine):
+        raise OSError("нет места на диске")
+
+    monkeypatch.setattr(synthetic_data, '_insert', failing_insert)
+    monkeypatch.setattr(search_index, 'ensure_search_index', failing_search_index)
+    with pytest.raises(RuntimeError, match="обрыв загрузки"):
+        generate_dataset(db_manager, VOLUMES, seed=7)
@@ -0,0 +1,140 @@
+"""
+Тесты трассировки: спаны аутентификации, SQL, страницы и журнала действий в
+одной трассе OTLP/JSON, продолжение входящего traceparent и выборка.
+"""
+
+import io
+import json
+import os
+
+import pytest
+
+from backend import create_app
+from backend.api import api_bp
+from backend.tracing import JsonlExporter, Trace
+from backend.models import Question, User, db_manager
+from benchmarks.bench_load import negotiate_header
+from conftest import make_test_config
+
+
+@pytest.fixture
+def traced_app(tmp_path):
+    app = create_app(make_test_config(tmp_path, KERBEROS_AUTH_ENABLED=True, TRACING_SAMPLE_RATE=1.0,
+                                       TRACING_FOLLOW_TRACEPARENT=True))
+    yield app
+    db_manager.dispose()
+
+
+def _traces(app):
+    with open(app.config['TRACING_FILE'], encoding='utf-8') as handle:
+        return [json.loads(line) for line in handle]
+
+
+def _spans(trace):
+    (resource,) = trace['resourceSpans']
+    (scope,) = resource['scopeSpans']
+    return scope['spans']
+
+
+def _attributes(span):
+    return {item['key']: next(iter(item['value'].values())) for item in span['attributes']}
+
+
+def test_page_request_trace_has_nested_spans(traced_app):
+    client = traced_app.test_client()
+    response = client.get('/main', headers={'Authorization': negotiate_header('tracer')})
+    assert response.status_code == 200
+
+    (trace,) = _traces(traced_app)
+    spans = _spans(trace)
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span['name'], []).append(span)
+    root = by_name['GET /<page_key>'][0]
+    assert 'parentSpanId' not in root
+    assert response.headers['traceparent'] == f"00-{root['traceId']}-{root['spanId']}-01"
+    assert {span['traceId'] for span in spans} == {root['traceId']}
+    assert _attributes(root)['http.status_code'] == '200'
+    assert _attributes(root)['enduser.id'] == 'tracer'
+
+    auth = by_name['auth'][0]
+    assert auth['parentSpanId'] == root['spanId']
+    for name in ('auth.register_user', 'auth.role_lookup', 'auth.reverse_dns'):
+        assert by_name[name][0]['parentSpanId'] == auth['spanId']
+    register = by_name['auth.register_user'][0]
+    register_queries = [s for s in by_name['db.query'] if s['parentSpanId'] == register['spanId']]
+    assert register_queries and _attributes(register_queries[0])['db.system'] == 'sqlite'
+
+    assert by_name['render.split_head_body'][0]['parentSpanId'] == root['spanId']
+    assert _attributes(by_name['render_template'][0])['template.name']
+    assert by_name['action_log.write'][0]['parentSpanId'] == root['spanId']
+    for span in spans:
+        assert int(span['startTimeUnixNano']) <= int(span['endTimeUnixNano'])
+        assert int(root['startTimeUnixNano']) <= int(span['startTimeUnixNano'])
+
+
+def test_upload_span_and_incoming_traceparent(traced_app):
+    session = db_manager.get_session()
+    author = User(username='author', department='IT')
+    session.add(author)
+    session.commit()
+    question = Question(author_id=author.id, title='Вопрос', body='?')
+    session.add(question)
+    session.commit()
+    qid = question.id
+    session.close()
+
+    trace_id, parent_id = 'ab' * 16, 'cd' * 8
+    response = traced_app.test_client().post(
+        f'/api/questions/{qid}/attachments',
+        data={'file': (io.BytesIO(b'12345'), 'report.txt')},
+        headers={'Authorization': negotiate_header('tracer'), 'traceparent': f'00-{trace_id}-{parent_id}-01'},
+    )
+    assert response.status_code == 201
+
+    (trace,) = _traces(traced_app)
+    spans = _spans(trace)
+    root = next(span for span in spans if span['name'] == 'POST /api/questions/<int:qid>/attachments')
+    assert root['traceId'] == trace_id and root['parentSpanId'] == parent_id
+    upload = next(span for span in spans if span['name'] == 'upload.save')
+    assert _attributes(upload)['file.size'] == '5'
+
+    os.remove(os.path.join(api_bp.root_path, 'uploads', _attributes(upload)['file.name']))
+
+
+def test_unsampled_requests_are_not_exported(tmp_path):
+    app = create_app(make_test_config(tmp_path, TRACING_SAMPLE_RATE=1e-12))
+    try:
+        response = app.test_client().get('/api/courses')
+        assert response.status_code == 200
+        assert 'traceparent' not in response.headers
+        assert not (tmp_path / 'traces.jsonl').exists()
+    finally:
+        db_manager.dispose()
+
+
+def test_incoming_traceparent_is_ignored_by_default(tmp_path):
+    app = create_app(make_test_config(tmp_path, TRACING_SAMPLE_RATE=1e-12))
+    try:
+        response = app.test_client().get('/api/courses', headers={'traceparent': f"00-{'ab' * 16}-{'cd' * 8}-01"})
+        assert response.status_code == 200
+        assert 'traceparent' not in response.headers
+        assert not (tmp_path / 'traces.jsonl').exists()
+    finally:
+        db_manager.dispose()
+
+
+def test_exporter_rotates_file_and_keeps_backups(tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    exporter = JsonlExporter(str(path), max_bytes=2000, backup_count=2)
+    for _ in range(12):
+        trace = Trace('ab' * 16)
+        trace.end_span(trace.start_span('request', padding='x' * 100))
+        exporter.export(trace)
+
+    assert sorted(os.listdir(tmp_path)) == ['traces.jsonl', 'traces.jsonl.1', 'traces.jsonl.2', 'traces.jsonl.lock']
+    for name in ('traces.jsonl', 'traces.jsonl.1', 'traces.jsonl.2'):
+        size = os.path.getsize(tmp_path / name)
+        assert 0 < size <= 2000
+        with open(tmp_path / name, encoding='utf-8') as handle:
+            assert all(json.loads(line)['resourceSpans'] for line in handle)
@@ -0,0 +1,109 @@
+"""
+Тесты in-memory индекса подсказок пользователей (/api/users/suggest).
+"""
+
+import random
+from collections import namedtuple
+
+from backend.models import User
+from backend.user_suggest import _ID_MASK, UserSuggestIndex, normalize, tokenize
+
+Row = namedtuple("Row", "id username full_name surname fst_name sec_name department position is_active updated_at")
+
+
+def _seed(session):
+    session.add_all([
+        User(username="ivanov", surname="Иванов", fst_name="Пётр", sec_name="Сергеевич",
+             full_name="Иванов Пётр Сергеевич", department="Бухгалтерия"),
+        User(username="ivanenko", surname="Иваненко", fst_name="Олег",
+             full_name="Иваненко Олег", department="ИТ"),
+        User(username="smirnova", surname="Смирнова", fst_name="Алёна",
+             full_name="Смирнова Алёна", department="Отдел Иванова"),
+    ])
+    session.commit()
+
+
+def _usernames(entries):
+    return [entry.username for entry in entries]
+
+
+def test_normalization():
+    assert normalize("АЛЁНА") == "алена"
+    assert normalize(None) == ""
+
+
+def test_prefix_ranking_and_cyrillic_case(db_session):
+    _seed(db_session)
+    index = UserSuggestIndex()
+    index.refresh(db_session)
+
+    # Фамилия весит больше отдела, точное совпадение — больше префикса,
+    # при равенстве выше более короткое ФИО
+    assert _usernames(index.search("иван")) == ["ivanenko", "ivanov", "smirnova"]
+    assert _usernames(index.search("ИВАНОВ")) == ["ivanov", "smirnova"]
+    assert _usernames(index.search("алена")) == ["smirnova"]
+    assert _usernames(index.search("иван пет")) == ["ivanov"]
+    assert _usernames(index.search("иван", limit=1)) == ["ivanenko"]
+    assert index.search("   ") == []
+
+
+def test_incremental_refresh_from_watermark(db_session):
+    _seed(db_session)
+    index = UserSuggestIndex(full_rebuild_interval=3600)
+    index.refresh(db_session)
+
+    user = db_session.query(User).filter_by(username="ivanenko").one()
+    user.surname = "Петренко"
+    user.full_name = "Петренко Олег"
+    db_session.add(User(username="novikov", full_name="Новиков Иван", department="ИТ"))
+    db_session.commit()
+
+    index.refresh(db_session)
+    assert len(index) == 4
+    assert _usernames(index.search("петр")) == ["ivanov", "ivanenko"]
+    assert "ivanenko" not in _usernames(index.search("иваненко"))
+    assert _usernames(index.search("новик")) == ["novikov"]
+
+
+def test_early_termination_matches_full_scan():
+    rng = random.Random(7)
+    surnames = ["Иванов", "Иваненко", "Алексеев", "Семёнов", "Смирнов"]
+    names = ["Алексей", "Александр", "Иван", "Семён", "Алла"]
+    rows = [
+        Row(i, f"user{i}", None, rng.choice(surnames), rng.choice(names), rng.choice(["Иванович", "Ильич"]),
+            rng.choice(["ИТ", "Бухгалтерия", "Отдел Ивановой"]), None, rng.random() > 0.2, None)
+        for i in range(1, 1500)
+    ]
+    index = UserSuggestIndex()
+    index.load(rows)
+    snapshot = index._snapshot
+
+    for query in ["и", "ив", "иван ал", "ал ив", "семен ал", "user1", "бух и", "а и"]:
+        tokens = list(dict.fromkeys(tokenize(query)))
+        scored = [(-snapshot.score(code, tokens), code) for code in snapshot.user_tokens]
+        expected = [code & _ID_MASK for score, code in sorted(s for s in scored if s[0])[:7]]
+        assert [entry.id for entry in index.search(query, limit=7)] == expected, query
+
+
+def test_suggest_endpoint(client, db_session):
+    _seed(db_session)
+    response = client.get("/api/users/suggest?q=смир&limit=5")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [u['username'] for u in data['users']] == ["smirnova"]
+    assert data['users'][0]['full_name'] == "Смирнова Алёна"
+    assert client.get("/api/users/suggest?q=").get_json()['users'] == []
+
+
+def test_intervals_are_configured_once_at_startup(app, client, tmp_path):
+    from conftest import make_test_config
+    from backend import create_app
+    from backend.user_suggest import suggest_index
+
+    create_app(make_test_config(tmp_path, USER_SUGGEST_REFRESH_SECONDS=1.5, USER_SUGGEST_FULL_REBUILD_SECONDS=30))
+    assert (suggest_index.refresh_interval, suggest_index.full_rebuild_interval) == (1.5, 30)
+
+    # Запрос не перезаписывает общий индекс значениями из конфигурации
+    suggest_index.configure(7.0, 70.0)
+    assert client.get("/api/users/suggest?q=a").status_code == 200
+    assert (suggest_index.refresh_interval, suggest_index.full_rebuild_interval) == (7.0, 70.0)